@@ -0,0 +1,59 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+# Row counts by size label; 1m is roughly a 70 MB CSV
+SIZES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+# Largest statement written per format: openpyxl and odfpy writers are far
+# slower than the readers being measured (and .xlsx stops at 1,048,576 rows)
+FORMAT_MAX_ROWS = {"csv": None, "xlsx": 100_000, "ods": 10_000}
+
+MERCHANTS = {
+    "Groceries": ["TESCO STORES", "SAINSBURYS", "ALDI", "WAITROSE", "CO-OP FOOD"],
+    "Transport": ["TFL TRAVEL", "SHELL", "BP FUEL", "TRAINLINE", "UBER"],
+    "Dining": ["PRET A MANGER", "NANDOS", "PIZZA EXPRESS", "DELIVEROO", "COSTA"],
+    "Bills": ["BRITISH GAS", "THAMES WATER", "BT BROADBAND", "COUNCIL TAX", "EE MOBILE"],
+    "Shopping": ["AMAZON", "JOHN LEWIS", "ARGOS", "BOOTS", "MARKS & SPENCER"],
+    "Income": ["SALARY ACME LTD", "HMRC REFUND", "TRANSFER FROM SAVINGS", "INTEREST", "DIVIDEND"],
+}
+
+def bank_statement(rows: int, seed: int = 42) -> pd.DataFrame:
+    """
+    Synthetic current-account statement with the shape users upload:
+    dates, free-text descriptions, categories, signed amounts, a running
+    balance, and a "Paid Out" column formatted as currency text.
+    """
+    rng = np.random.default_rng(seed)
+    categories = np.array(list(MERCHANTS))
+    category = categories[rng.integers(0, len(categories), rows)]
+    merchant_index = rng.integers(0, 5, rows)
+    description = np.array([MERCHANTS[c][i] for c, i in zip(category, merchant_index)], dtype=object)
+
+    spend = np.round(rng.lognormal(mean=3.0, sigma=1.0, size=rows), 2)
+    income = np.round(rng.uniform(500, 3500, size=rows), 2)
+    is_income = category == "Income"
+    amount = np.where(is_income, income, -spend)
+
+    paid_out = np.where(is_income, "", np.char.add("£", np.char.mod("%.2f", spend)))
+    paid_out = pd.Series(paid_out).str.replace(r"(\d)(?=(\d{3})+\.)", r"\1,", regex=True)
+
+    dates = pd.Timestamp("2020-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 5 * 365, rows)), unit="D")
+    return pd.DataFrame({
+        "Date": dates.strftime("%Y-%m-%d"),
+        "Description": description,
+        "Category": category,
+        "Amount": amount,
+        "Paid Out": paid_out,
+        "Balance": np.round(2_000 + np.cumsum(amount), 2),
+        "Reference": np.char.add("TXN", np.arange(rows).astype(str)),
+    })
+
+def statement_bytes(df: pd.DataFrame, fmt: str) -> bytes:
+    """The statement as an uploaded file body (csv, xlsx or ods)"""
+    if fmt == "csv":
+        return df.to_csv(index=False).encode()
+    buf = io.BytesIO()
+    df.to_excel(buf, index=False, engine={"xlsx": "openpyxl", "ods": "odf"}[fmt])
+    return buf.getvalue()
@@ -0,0 +1,44 @@
+import sys
+
+import pytest
+
+sys.path.append('../backend')
+
+try:
+    import matplotlib
+    matplotlib.use("Agg")
+    from backend.Agent01.functions import make_chart, create_interactive_chart, CHART_KINDS
+    AGENT01_FUNCTIONS_AVAILABLE = True
+except ImportError:
+    AGENT01_FUNCTIONS_AVAILABLE = False
+    CHART_KINDS = set()
+    print("⚠️ Agent01.functions not available")
+
+pytestmark = pytest.mark.skipif(not AGENT01_FUNCTIONS_AVAILABLE, reason="Agent01.functions not available")
+
+# Kinds the matplotlib path draws (others answer "Unsupported chart type")
+STATIC_KINDS = ["bar", "line", "pie", "scatter", "histogram", "box", "area"]
+
+# Columns a user would ask for with each kind
+CHART_COLUMNS = {
+    "line": ["Date", "Amount"],
+    "area": ["Date", "Balance"],  # stacked areas need one sign per column
+    "scatter": ["Amount", "Balance"],
+    "histogram": ["Amount"],
+    "heatmap": ["Amount", "Balance"],
+}
+DEFAULT_COLUMNS = ["Category", "Amount"]
+
+@pytest.mark.parametrize("kind", STATIC_KINDS)
+def test_make_chart_static(measure, statement, kind):
+    """PNG render (300 dpi) through make_chart"""
+    measure.benchmark.group = f"make_chart[{kind}]"
+    chart = measure(make_chart, statement, kind, CHART_COLUMNS.get(kind, DEFAULT_COLUMNS))
+    assert not chart.startswith("{"), chart
+
+@pytest.mark.parametrize("kind", sorted(CHART_KINDS))
+def test_create_interactive_chart(measure, statement, kind):
+    """Plotly figure serialised to JSON"""
+    measure.benchmark.group = f"create_interactive_chart[{kind}]"
+    chart = measure(create_interactive_chart, statement, kind, CHART_COLUMNS.get(kind, DEFAULT_COLUMNS))
+    assert '"action": "error"' not in chart[:200]
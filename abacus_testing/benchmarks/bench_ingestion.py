@@ -0,0 +1,29 @@
+import sys
+
+import pytest
+
+sys.path.append('../backend')
+
+try:
+    from backend.Agent01.functions import read_excel_any, coerce_numeric
+    AGENT01_FUNCTIONS_AVAILABLE = True
+except ImportError:
+    AGENT01_FUNCTIONS_AVAILABLE = False
+    print("⚠️ Agent01.functions not available")
+
+pytestmark = pytest.mark.skipif(not AGENT01_FUNCTIONS_AVAILABLE, reason="Agent01.functions not available")
+
+@pytest.mark.parametrize("fmt", ["csv", "xlsx", "ods"])
+def test_read_upload(measure, upload, size, fmt):
+    """Upload parsing, as /upload does it (read_excel_any on the raw body)"""
+    raw = upload(fmt)
+    measure.benchmark.group = f"read_excel_any[{fmt}]"
+    measure.benchmark.extra_info["megabytes"] = round(len(raw) / 1_000_000, 2)
+    df = measure(read_excel_any, raw, f"statement.{fmt}")
+    assert len(df) > 0
+
+def test_coerce_currency_text(measure, statement):
+    """coerce_numeric on a "£1,234.56" text column (the slow, non-numeric path)"""
+    measure.benchmark.group = "coerce_numeric"
+    result = measure(coerce_numeric, statement["Paid Out"])
+    assert result.dtype.kind == "f"
@@ -0,0 +1,28 @@
+import sys
+
+import pytest
+
+sys.path.append('../backend')
+
+try:
+    from backend.Agent01.functions import summarise_dataframe, sample_df, _cleanse_chart_data
+    AGENT01_FUNCTIONS_AVAILABLE = True
+except ImportError:
+    AGENT01_FUNCTIONS_AVAILABLE = False
+    print("⚠️ Agent01.functions not available")
+
+pytestmark = pytest.mark.skipif(not AGENT01_FUNCTIONS_AVAILABLE, reason="Agent01.functions not available")
+
+def test_summarise_dataframe(measure, statement):
+    measure.benchmark.group = "summarise_dataframe"
+    summary = measure(summarise_dataframe, statement)
+    assert summary["num_rows"] == len(statement)
+
+def test_sample_df(measure, statement):
+    measure.benchmark.group = "sample_df"
+    measure(sample_df, statement)
+
+def test_cleanse_chart_data(measure, statement):
+    measure.benchmark.group = "_cleanse_chart_data"
+    cleansed = measure(_cleanse_chart_data, statement, ["Category", "Amount", "Balance"])
+    assert len(cleansed) == len(statement)
@@ -0,0 +1,62 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append('..')
+sys.path.append('../backend')
+
+from bank_statements import SIZES, FORMAT_MAX_ROWS, bank_statement, statement_bytes
+
+try:
+    import pytest_benchmark  # noqa: F401
+    BENCHMARK_AVAILABLE = True
+except ImportError:
+    BENCHMARK_AVAILABLE = False
+    print("⚠️ pytest-benchmark not installed: benchmarks will be skipped")
+
+# Sizes to run, e.g. ABACUS_BENCH_SIZES=1k,100k,1m (1m is opt-in: minutes per chart kind)
+BENCH_SIZES = [s.strip() for s in os.getenv("ABACUS_BENCH_SIZES", "1k,100k").split(",") if s.strip() in SIZES]
+
+# Fewer rounds as inputs grow, so a full run stays in minutes
+ROUNDS = {"1k": 10, "100k": 3, "1m": 1}
+
+_frames = {}
+_files = {}
+
+@pytest.fixture(params=BENCH_SIZES)
+def size(request):
+    return request.param
+
+@pytest.fixture
+def statement(size):
+    """Synthetic statement DataFrame for this size (generated once per run)"""
+    if size not in _frames:
+        _frames[size] = bank_statement(SIZES[size])
+    return _frames[size]
+
+@pytest.fixture
+def upload(size):
+    """fmt -> encoded upload body, generated once per run; skips sizes a format cannot hold in reasonable time"""
+    def encode(fmt: str) -> bytes:
+        limit = FORMAT_MAX_ROWS[fmt]
+        if limit is not None and SIZES[size] > limit:
+            pytest.skip(f"{fmt} statements are generated up to {limit:,} rows")
+        if (size, fmt) not in _files:
+            if size not in _frames:
+                _frames[size] = bank_statement(SIZES[size])
+            _files[size, fmt] = statement_bytes(_frames[size], fmt)
+        return _files[size, fmt]
+    return encode
+
+@pytest.fixture
+def measure(request, size):
+    """Benchmark a call with a round count suited to the input size; returns its result"""
+    if not BENCHMARK_AVAILABLE:
+        pytest.skip("pytest-benchmark not installed")
+    benchmark = request.getfixturevalue("benchmark")
+
+    def run(fn, *args, **kwargs):
+        return benchmark.pedantic(fn, args=args, kwargs=kwargs, rounds=ROUNDS[size], iterations=1, warmup_rounds=0)
+    run.benchmark = benchmark
+    return run
@@ -0,0 +1,371 @@
+"""
+Local stand-in for OpenAI, Yahoo Finance and DuckDuckGo, for load tests.
+
+    python mock_upstreams.py --port 8900 --latency-ms 400 --tokens-per-second 150
+
+Start the backend with
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1
+    UPSTREAM_REDIRECT_URL=http://127.0.0.1:8900
+    OPENAI_API_KEY=sk-mock
+so every outbound call lands here (Yahoo and DuckDuckGo are routed by path
+alone). Responses are deterministic per symbol and query; latency, token
+counts and error rate are set on the command line or with POST /_mock/config.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import Counter
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
+
+DEFAULTS = {
+    # OpenAI: time to first token, then streaming speed (a non-streamed reply waits for all of it)
+    "latency_ms": 400.0,
+    "jitter_ms": 100.0,
+    "tokens_per_second": 150.0,
+    "completion_tokens": 200,
+    "prompt_tokens": 0,  # 0 = estimate from the messages (~4 characters per token)
+    "error_rate": 0.0,   # share of completions answered with 503
+    # Yahoo Finance and DuckDuckGo
+    "yahoo_latency_ms": 80.0,
+    "ddg_latency_ms": 150.0,
+}
+
+config: Dict[str, Any] = dict(DEFAULTS)
+_counts: Counter = Counter()
+_counts_lock = threading.Lock()
+
+app = FastAPI(title="Abacus upstream stand-in")
+
+SECTORS = [
+    ("Technology", "Software—Infrastructure"),
+    ("Technology", "Consumer Electronics"),
+    ("Healthcare", "Drug Manufacturers—General"),
+    ("Industrials", "Specialty Industrial Machinery"),
+    ("Consumer Cyclical", "Auto Manufacturers"),
+    ("Financial Services", "Banks—Diversified"),
+]
+
+WORDS = (
+    "revenue margin growth balance sheet cash flow debt equity valuation outlook "
+    "sector demand guidance dividend earnings risk liquidity market share"
+).split()
+
+def _count(upstream: str):
+    with _counts_lock:
+        _counts[upstream] += 1
+
+async def _delay(ms: float, jitter_ms: float = 0.0):
+    wait = max(ms + random.uniform(-jitter_ms, jitter_ms), 0.0)
+    if wait:
+        await asyncio.sleep(wait / 1000)
+
+def _rng(*parts: str) -> random.Random:
+    """Same figures for the same symbol or query on every run"""
+    seed = hashlib.sha256("|".join(parts).encode()).hexdigest()[:16]
+    return random.Random(int(seed, 16))
+
+# --- Mock Control ---
+@app.get("/_mock/stats")
+async def mock_stats():
+    with _counts_lock:
+        return {"requests": dict(_counts), "config": config}
+
+@app.post("/_mock/config")
+async def mock_config(request: Request):
+    """Change latency, token counts or error rate while a test runs"""
+    updates = await request.json()
+    unknown = set(updates) - set(DEFAULTS)
+    if unknown:
+        return JSONResponse({"error": f"Unknown settings: {sorted(unknown)}"}, status_code=400)
+    config.update({k: type(DEFAULTS[k])(v) for k, v in updates.items()})
+    return config
+
+@app.post("/_mock/reset")
+async def mock_reset():
+    with _counts_lock:
+        _counts.clear()
+    return {"requests": {}}
+
+# --- OpenAI Chat Completions ---
+def _prompt_tokens(body: Dict[str, Any]) -> int:
+    if config["prompt_tokens"]:
+        return int(config["prompt_tokens"])
+    text = json.dumps(body.get("messages", []))
+    return max(len(text) // 4, 1)
+
+def _schema_instance(schema: Dict[str, Any], rng: random.Random) -> Any:
+    """Smallest value that satisfies a (strict structured output) JSON schema"""
+    if "enum" in schema:
+        return rng.choice(schema["enum"])
+    kind = schema.get("type")
+    if kind == "object":
+        return {k: _schema_instance(v, rng) for k, v in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [_schema_instance(schema["items"], rng)] if "items" in schema else []
+    if kind in ("number", "integer"):
+        return round(rng.uniform(0, 50), 2) if kind == "number" else rng.randint(0, 50)
+    if kind == "boolean":
+        return rng.random() < 0.5
+    return " ".join(rng.choices(WORDS, k=8))
+
+def _completion_text(body: Dict[str, Any], tokens: int) -> str:
+    prompt = json.dumps(body.get("messages", [])[-1:])
+    rng = _rng("openai", prompt)
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        instance = _schema_instance(response_format["json_schema"]["schema"], rng)
+        if isinstance(instance, dict):
+            # Long free-text fields carry the configured size
+            for key, value in instance.items():
+                if isinstance(value, str) and key.endswith("markdown"):
+                    instance[key] = " ".join(rng.choices(WORDS, k=tokens))
+        return json.dumps(instance)
+    if response_format.get("type") == "json_object":
+        return json.dumps({"answer": " ".join(rng.choices(WORDS, k=tokens))})
+    words = rng.choices(WORDS, k=max(tokens - 4, 1))
+    return "## Analysis\n" + " ".join(words) + "\nRecommendation: HOLD"
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> Dict[str, Any]:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": 0},
+    }
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    _count("openai")
+    body = await request.json()
+    if config["error_rate"] and random.random() < config["error_rate"]:
+        await _delay(config["latency_ms"] / 4)
+        return JSONResponse({"error": {"message": "Mock overload", "type": "server_error"}}, status_code=503)
+
+    model = body.get("model", "gpt-4o")
+    tokens = int(body.get("max_tokens") or body.get("max_completion_tokens") or config["completion_tokens"])
+    tokens = min(tokens, int(config["completion_tokens"]))
+    text = _completion_text(body, tokens)
+    prompt_tokens = _prompt_tokens(body)
+    completion_id = f"chatcmpl-mock{random.getrandbits(48):x}"
+    created = int(time.time())
+    per_token = 1.0 / config["tokens_per_second"] if config["tokens_per_second"] else 0.0
+
+    await _delay(config["latency_ms"], config["jitter_ms"])
+
+    if not body.get("stream"):
+        await asyncio.sleep(per_token * tokens)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": created,
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text, "refusal": None},
+                "logprobs": None,
+                "finish_reason": "stop",
+            }],
+            "usage": _usage(prompt_tokens, tokens),
+        }
+
+    include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+    def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish_reason}],
+        }
+        return f"data: {json.dumps(payload)}\n\n"
+
+    async def stream():
+        yield chunk({"role": "assistant", "content": ""})
+        pieces = text.split(" ")
+        # One chunk per word, spaced so the reply takes as long as `tokens` would
+        interval = per_token * tokens / len(pieces)
+        for i, piece in enumerate(pieces):
+            yield chunk({"content": piece if i == 0 else " " + piece})
+            if interval:
+                await asyncio.sleep(interval)
+        yield chunk({}, "stop")
+        if include_usage:
+            usage = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                     "model": model, "choices": [], "usage": _usage(prompt_tokens, tokens)}
+            yield f"data: {json.dumps(usage)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+@app.get("/v1/models")
+async def list_models():
+    _count("openai")
+    return {"object": "list", "data": [{"id": m, "object": "model", "owned_by": "mock"} for m in ("gpt-4o", "gpt-4o-mini")]}
+
+# --- Yahoo Finance (paths yfinance requests) ---
+def _company(symbol: str) -> Dict[str, Any]:
+    rng = _rng("yahoo", symbol)
+    sector, industry = rng.choice(SECTORS)
+    price = round(rng.uniform(20, 600), 2)
+    shares = rng.randint(200, 16_000) * 1_000_000
+    revenue = int(shares * price * rng.uniform(0.05, 0.4))
+    return {
+        "symbol": symbol,
+        "shortName": f"{symbol} Holdings",
+        "longName": f"{symbol} Holdings Inc.",
+        "currency": "USD",
+        "sector": sector,
+        "industry": industry,
+        "country": "United States",
+        "city": "New York",
+        "website": f"https://www.{symbol.lower()}.example",
+        "fullTimeEmployees": rng.randint(1_000, 200_000),
+        "longBusinessSummary": f"{symbol} Holdings designs and sells products in the {industry.lower()} industry.",
+        "price": price,
+        "marketCap": int(shares * price),
+        "totalRevenue": revenue,
+        "totalDebt": int(revenue * rng.uniform(0.05, 0.8)),
+        "totalCash": int(revenue * rng.uniform(0.05, 0.5)),
+        "trailingEps": round(price / rng.uniform(10, 40), 2),
+    }
+
+def _summary_modules(company: Dict[str, Any]) -> Dict[str, Any]:
+    price = company["price"]
+    return {
+        "assetProfile": {k: company[k] for k in ("sector", "industry", "country", "city", "website",
+                                                   "fullTimeEmployees", "longBusinessSummary")},
+        "quoteType": {"symbol": company["symbol"], "quoteType": "EQUITY", "shortName": company["shortName"],
+                      "longName": company["longName"], "exchange": "NMS"},
+        "summaryDetail": {
+            "currency": "USD", "marketCap": company["marketCap"],
+            "trailingPE": round(price / company["trailingEps"], 2),
+            "fiftyTwoWeekLow": round(price * 0.75, 2), "fiftyTwoWeekHigh": round(price * 1.2, 2),
+            "fiftyDayAverage": round(price * 0.98, 2), "twoHundredDayAverage": round(price * 0.93, 2),
+            "dividendYield": 0.6, "dividendRate": round(price * 0.006, 2),
+        },
+        "financialData": {
+            "currentPrice": price, "totalRevenue": company["totalRevenue"], "totalDebt": company["totalDebt"],
+            "totalCash": company["totalCash"], "debtToEquity": 45.2, "revenueGrowth": 0.08,
+            "grossMargins": 0.44, "ebitdaMargins": 0.31, "returnOnEquity": 0.27, "returnOnAssets": 0.12,
+            "freeCashflow": int(company["totalRevenue"] * 0.2), "operatingCashflow": int(company["totalRevenue"] * 0.25),
+            "ebitda": int(company["totalRevenue"] * 0.31), "financialCurrency": "USD",
+        },
+        "defaultKeyStatistics": {"trailingEps": company["trailingEps"], "priceToBook": 6.1, "enterpriseToEbitda": 18.4},
+    }
+
+@app.get("/")
+async def yahoo_cookie():
+    """fc.yahoo.com: yfinance only needs a cookie to come back"""
+    _count("yahoo")
+    response = PlainTextResponse("OK")
+    response.set_cookie("A3", "mock", max_age=365 * 24 * 3600)
+    return response
+
+@app.get("/v1/test/getcrumb")
+async def yahoo_crumb():
+    _count("yahoo")
+    return PlainTextResponse("mockcrumb")
+
+@app.get("/v10/finance/quoteSummary/{symbol}")
+async def yahoo_quote_summary(symbol: str, modules: str = ""):
+    _count("yahoo")
+    await _delay(config["yahoo_latency_ms"])
+    available = _summary_modules(_company(symbol.upper()))
+    wanted = [m for m in modules.split(",") if m in available] or list(available)
+    return {"quoteSummary": {"result": [{m: available[m] for m in wanted}], "error": None}}
+
+@app.get("/v7/finance/quote")
+async def yahoo_quote(symbols: str = ""):
+    _count("yahoo")
+    await _delay(config["yahoo_latency_ms"])
+    result = []
+    for symbol in filter(None, symbols.upper().split(",")):
+        company = _company(symbol)
+        result.append({
+            "symbol": symbol, "currency": "USD", "regularMarketPrice": company["price"],
+            "marketCap": company["marketCap"], "shortName": company["shortName"], "longName": company["longName"],
+            "quoteType": "EQUITY", "marketState": "REGULAR",
+        })
+    return {"quoteResponse": {"result": result, "error": None}}
+
+@app.get("/ws/fundamentals-timeseries/v1/finance/timeseries/{symbol}")
+async def yahoo_timeseries(symbol: str, type: str = ""):
+    """Four annual (or quarterly) periods for every statement row asked for"""
+    _count("yahoo")
+    await _delay(config["yahoo_latency_ms"])
+    company = _company(symbol.upper())
+    this_year = date.today().year
+    series = []
+    for key in filter(None, type.split(",")):
+        rng = _rng("timeseries", symbol.upper(), key)
+        periods = [date(this_year - i, 12, 31) for i in range(1, 5)]
+        scale = company["totalRevenue"] * rng.uniform(0.01, 1.0)
+        series.append({
+            "meta": {"symbol": [symbol.upper()], "type": [key]},
+            "timestamp": [int(time.mktime(p.timetuple())) for p in periods],
+            key: [{
+                "asOfDate": p.isoformat(),
+                "periodType": "12M",
+                "currencyCode": "USD",
+                "reportedValue": {"raw": round(scale * (1 - 0.05 * i)), "fmt": ""},
+            } for i, p in enumerate(periods)],
+        })
+    return {"timeseries": {"result": series, "error": None}}
+
+# --- DuckDuckGo HTML Search ---
+def _results_html(query: str, news: bool) -> str:
+    rng = _rng("ddg", query)
+    items: List[str] = []
+    for i in range(5):
+        title = f"{query.split()[0] if query else 'Company'} {rng.choice(WORDS)} {rng.choice(WORDS)} report {i + 1}"
+        snippet = " ".join(rng.choices(WORDS, k=25))
+        if news:
+            items.append(
+                f'<div class="news-result"><a class="news-result__title-link" href="https://news.example/{i}">{title}</a>'
+                f'<span class="news-result__source">Mock Wire</span><span class="news-result__date">2 days ago</span></div>'
+            )
+        else:
+            items.append(
+                f'<div class="result"><a class="result__a" href="https://example.com/{i}">{title}</a>'
+                f'<div class="result__snippet">{snippet}</div></div>'
+            )
+    return f"<html><body>{''.join(items)}</body></html>"
+
+@app.api_route("/html/", methods=["GET", "POST"])
+async def ddg_html(q: str = "", iar: str = ""):
+    _count("duckduckgo")
+    await _delay(config["ddg_latency_ms"])
+    return HTMLResponse(_results_html(q, news=iar == "news"))
+
+@app.api_route("/{path:path}", methods=["GET", "POST"])
+async def unmatched(path: str):
+    """Anything else: counted so a load test shows which calls it missed"""
+    _count("unmatched")
+    _count(f"unmatched:/{path}")
+    return JSONResponse({"error": f"No mock for /{path}"}, status_code=404)
+
+def main():
+    parser = argparse.ArgumentParser(description="OpenAI / Yahoo / DuckDuckGo stand-in for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    for key, value in DEFAULTS.items():
+        parser.add_argument(f"--{key.replace('_', '-')}", type=type(value), default=value)
+    args = parser.parse_args()
+    config.update({k: getattr(args, k) for k in DEFAULTS})
+
+    import uvicorn
+    print(f"🎭 Mock upstreams on http://{args.host}:{args.port} (OpenAI latency {config['latency_ms']:.0f} ms, "
+          f"{config['completion_tokens']} tokens at {config['tokens_per_second']:.0f}/s)")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="error")
+
+if __name__ == "__main__":
+    main()
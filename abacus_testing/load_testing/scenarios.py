@@ -0,0 +1,115 @@
+import random
+import string
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "benchmarks"))
+
+from bank_statements import bank_statement, statement_bytes
+
+SYMBOLS = [
+    "AAPL", "MSFT", "GOOGL", "AMZN", "NVDA", "META", "TSLA", "ASML", "ADBE", "CRM",
+    "ORCL", "INTC", "AMD", "QCOM", "TXN", "JNJ", "PFE", "MRK", "ABT", "NKE",
+    "KO", "PEP", "PG", "COST", "HD", "CAT", "DE", "HON", "UNP", "JPM",
+]
+
+QUESTIONS = [
+    "What did I spend the most on last year?",
+    "Summarise my monthly income and spending.",
+    "Which merchants do I pay most often?",
+    "Show my balance over time as a chart.",
+    "How much did I spend on dining per month?",
+]
+
+class Recorder:
+    """Latency samples and failures per step (one event loop, so no locking)"""
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def record(self, step: str, elapsed_ms: float, error: Optional[str] = None):
+        self.samples[step].append(elapsed_ms)
+        if error:
+            self.errors[step][error] += 1
+
+class VirtualUser:
+    """One simulated client: its own random stream, sharing the HTTP connection pool"""
+
+    def __init__(self, number: int, client: httpx.AsyncClient, recorder: Recorder,
+                 statement: bytes, unique_symbols: bool = False):
+        self.number = number
+        self.client = client
+        self.recorder = recorder
+        self.statement = statement
+        self.unique_symbols = unique_symbols
+        self.rng = random.Random(number)
+
+    async def call(self, step: str, method: str, url: str, **kwargs) -> Optional[httpx.Response]:
+        """Timed request; 4xx/5xx and transport errors count as failures"""
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            error = f"HTTP {response.status_code}" if response.status_code >= 400 else None
+        except httpx.HTTPError as e:
+            response, error = None, type(e).__name__
+        self.recorder.record(step, (time.perf_counter() - started) * 1000, error)
+        return response if error is None else None
+
+    def symbol(self) -> str:
+        """A popular ticker, or a never-seen one to get past the per-symbol caches"""
+        if self.unique_symbols:
+            return "".join(self.rng.choices(string.ascii_uppercase, k=5))
+        return self.rng.choice(SYMBOLS)
+
+# --- Scenarios ---
+async def upload_and_chat(user: VirtualUser):
+    """Upload a statement into a new session, then ask two questions about it"""
+    response = await user.call(
+        "upload", "POST", "/upload",
+        files={"file": ("statement.csv", user.statement, "text/csv")},
+    )
+    if response is None:
+        return
+    session_id = response.json()["session_id"]
+    for question in user.rng.sample(QUESTIONS, 2):
+        await user.call("chat", "POST", "/chat", json={"session_id": session_id, "message": question})
+
+async def stock_analysis(user: VirtualUser):
+    await user.call("stock.analyze", "POST", "/stock/analyze-sync", json={"symbol": user.symbol()})
+
+async def sharia_screening(user: VirtualUser):
+    await user.call("sharia.analyze", "POST", "/islamic/expert-analyze", json={"investment_query": user.symbol()})
+
+async def batch_screening(user: VirtualUser):
+    tickers = [user.symbol() for _ in range(10)]
+    await user.call("sharia.batch", "POST", "/islamic/batch-screen", json={"tickers": tickers, "use_llm": True})
+
+SCENARIOS: Dict[str, Callable[[VirtualUser], Awaitable[Any]]] = {
+    "chat": upload_and_chat,
+    "stock": stock_analysis,
+    "sharia": sharia_screening,
+    "batch": batch_screening,
+}
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """'chat=2,stock=1' -> scenario weights"""
+    weights = {}
+    for part in filter(None, (p.strip() for p in mix.split(","))):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}' (choose from {', '.join(SCENARIOS)})")
+        weights[name] = float(weight or 1)
+    if not weights or not any(weights.values()):
+        raise ValueError("No scenario selected")
+    return weights
+
+def upload_body(rows: int) -> bytes:
+    return statement_bytes(bank_statement(rows), "csv")
@@ -0,0 +1,69 @@
+"""
+Benchmark runner for ingestion, summarisation and chart rendering.
+
+    python run_benchmarks.py                      # 1k and 100k rows
+    python run_benchmarks.py --sizes 1k,100k,1m   # include 1M rows (slow)
+    python run_benchmarks.py --save main          # store a baseline
+    python run_benchmarks.py --compare main       # fail if any mean is >20% slower
+
+Baselines are written to benchmarks/baselines/ and are only comparable on
+the machine that recorded them.
+"""
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+HERE = Path(__file__).resolve().parent
+STORAGE = HERE / "benchmarks" / "baselines"
+
+def build_command(args) -> list:
+    cmd = [
+        sys.executable, "-m", "pytest", "benchmarks", "-q",
+        f"--benchmark-storage={STORAGE}",
+        "--benchmark-group-by=group,param:size",
+        "--benchmark-columns=min,mean,median,max,rounds",
+        "--benchmark-sort=mean",
+    ]
+    if args.save:
+        cmd.append(f"--benchmark-save={args.save}")
+    if args.compare is not None:
+        cmd.append(f"--benchmark-compare={args.compare}" if args.compare else "--benchmark-compare")
+        cmd.append(f"--benchmark-compare-fail=mean:{args.threshold}%")
+    if args.keyword:
+        cmd += ["-k", args.keyword]
+    return cmd
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Run the Abacus FinBot benchmark suite")
+    parser.add_argument("--sizes", default="1k,100k", help="Comma-separated sizes: 1k, 100k, 1m")
+    parser.add_argument("--save", metavar="NAME", help="Save results as a named baseline")
+    parser.add_argument("--compare", metavar="NAME", nargs="?", const="",
+                        help="Compare with a baseline (latest if no name) and fail on regressions")
+    parser.add_argument("--threshold", type=float, default=20.0, help="Allowed slowdown of the mean, in percent")
+    parser.add_argument("-k", dest="keyword", help="Only run benchmarks matching this expression")
+    args = parser.parse_args()
+
+    try:
+        import pytest_benchmark  # noqa: F401
+    except ImportError:
+        print("❌ pytest-benchmark not installed: pip install pytest-benchmark")
+        return 1
+
+    env = dict(os.environ, ABACUS_BENCH_SIZES=args.sizes)
+    # Same imports as the test suite: backend as a package and its modules top-level
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(HERE.parent), str(HERE.parent / "backend"), env.get("PYTHONPATH")]))
+
+    cmd = build_command(args)
+    print(f"🏁 Benchmarking sizes {args.sizes}")
+    print(f"📁 Baselines: {STORAGE}")
+    result = subprocess.run(cmd, cwd=HERE, env=env)
+    if result.returncode == 0:
+        print("✅ Benchmarks completed")
+    else:
+        print("❌ Benchmarks failed (or regressed beyond the threshold)")
+    return result.returncode
+
+if __name__ == "__main__":
+    sys.exit(main())
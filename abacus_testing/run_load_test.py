@@ -0,0 +1,228 @@
+"""
+Load test runner: virtual users replay upload+chat, stock analysis and
+Sharia screening against a running backend and report throughput and
+p50/p95/p99 latency per step.
+
+    python run_load_test.py --spawn --users 20 --duration 60
+    python run_load_test.py --target http://127.0.0.1:8000 --mix chat=1 --users 50
+    python run_load_test.py --spawn --mix sharia=1 --unique-symbols --mock-latency-ms 1500
+
+--spawn starts load_testing/mock_upstreams.py and the backend (pointed at
+the mock, with a throwaway database) so no OpenAI, Yahoo or DuckDuckGo
+traffic leaves the machine. Without it, start the backend yourself with
+OPENAI_BASE_URL and UPSTREAM_REDIRECT_URL set to the mock.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+HERE = Path(__file__).resolve().parent
+BACKEND = HERE.parent / "backend"
+sys.path.append(str(HERE / "load_testing"))
+
+from scenarios import SCENARIOS, Recorder, VirtualUser, parse_mix, upload_body
+
+MOCK_OPTIONS = ("latency_ms", "tokens_per_second", "completion_tokens", "error_rate",
+                "yahoo_latency_ms", "ddg_latency_ms")
+
+# --- Running ---
+async def virtual_user(number: int, args, weights: Dict[str, float], client: httpx.AsyncClient,
+                       recorder: Recorder, statement: bytes, deadline: float):
+    await asyncio.sleep(args.ramp_up * number / args.users)
+    user = VirtualUser(number, client, recorder, statement, args.unique_symbols)
+    names, cumulative = list(weights), list(weights.values())
+    while time.perf_counter() < deadline:
+        scenario = SCENARIOS[user.rng.choices(names, weights=cumulative)[0]]
+        await scenario(user)
+        if args.think_ms:
+            await asyncio.sleep(user.rng.uniform(0.5, 1.5) * args.think_ms / 1000)
+
+async def run_load(args, weights: Dict[str, float]) -> Recorder:
+    statement = upload_body(args.rows)
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.target, timeout=args.timeout, limits=limits) as client:
+        recorder = Recorder()
+        deadline = recorder.started + args.duration
+        await asyncio.gather(*(
+            virtual_user(i, args, weights, client, recorder, statement, deadline) for i in range(args.users)
+        ))
+        recorder.finished = time.perf_counter()
+    return recorder
+
+# --- Reporting ---
+def percentile(ordered: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    return ordered[min(len(ordered) - 1, max(math.ceil(pct / 100 * len(ordered)) - 1, 0))]
+
+def summarise(recorder: Recorder) -> Dict[str, Any]:
+    elapsed = (recorder.finished or time.perf_counter()) - recorder.started
+    steps = dict(recorder.samples)
+    steps["all"] = [ms for samples in recorder.samples.values() for ms in samples]
+    report = {"duration_seconds": round(elapsed, 1), "steps": {}}
+    for step, samples in steps.items():
+        if not samples:
+            continue
+        ordered = sorted(samples)
+        errors = (sum(sum(e.values()) for e in recorder.errors.values()) if step == "all"
+                  else sum(recorder.errors[step].values()))
+        report["steps"][step] = {
+            "requests": len(ordered),
+            "errors": errors,
+            "rps": round(len(ordered) / elapsed, 2),
+            "mean_ms": round(sum(ordered) / len(ordered), 1),
+            "p50_ms": round(percentile(ordered, 50), 1),
+            "p95_ms": round(percentile(ordered, 95), 1),
+            "p99_ms": round(percentile(ordered, 99), 1),
+            "max_ms": round(ordered[-1], 1),
+        }
+    report["errors"] = {step: dict(kinds) for step, kinds in recorder.errors.items() if kinds}
+    return report
+
+def print_report(report: Dict[str, Any], args):
+    print(f"\n{'='*92}")
+    print(f"📊 {args.users} users for {report['duration_seconds']}s against {args.target}")
+    print(f"{'='*92}")
+    header = f"{'step':<16}{'requests':>10}{'errors':>8}{'req/s':>9}{'mean':>10}{'p50':>10}{'p95':>10}{'p99':>10}{'max':>10}"
+    print(header)
+    print("-" * len(header))
+    for step, row in sorted(report["steps"].items(), key=lambda item: item[0] == "all"):
+        print(f"{step:<16}{row['requests']:>10}{row['errors']:>8}{row['rps']:>9.2f}{row['mean_ms']:>10.0f}"
+              f"{row['p50_ms']:>10.0f}{row['p95_ms']:>10.0f}{row['p99_ms']:>10.0f}{row['max_ms']:>10.0f}")
+    print("(latencies in ms)")
+    for step, kinds in report["errors"].items():
+        print(f"❌ {step}: " + ", ".join(f"{kind} x{count}" for kind, count in kinds.items()))
+    upstream = report.get("mock_upstreams")
+    if upstream:
+        calls = {k: v for k, v in upstream.items() if not k.startswith("unmatched:")}
+        print("🎭 Mock upstream calls: " + ", ".join(f"{k}={v}" for k, v in sorted(calls.items())))
+        missed = [k.split(":", 1)[1] for k in upstream if k.startswith("unmatched:")]
+        if missed:
+            print(f"⚠️ Calls the mock could not answer: {', '.join(sorted(missed))}")
+
+# --- Spawned Servers ---
+def wait_until_up(url: str, timeout: float = 90.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2.0).status_code < 500:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.5)
+    return False
+
+def spawn_servers(args, workdir: str) -> List[subprocess.Popen]:
+    mock_url = f"http://127.0.0.1:{args.mock_port}"
+    mock = subprocess.Popen(
+        [sys.executable, str(HERE / "load_testing" / "mock_upstreams.py"), "--port", str(args.mock_port)],
+    )
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="sk-mock",
+        OPENAI_BASE_URL=f"{mock_url}/v1",
+        UPSTREAM_REDIRECT_URL=mock_url,
+        DATABASE_URL=f"sqlite:///{workdir}/load_test.db",
+        SESSION_DATA_DIR=f"{workdir}/session_data",
+        SESSION_SECRET_KEY="load-test",
+    )
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=BACKEND, env=env,
+    )
+    args.target = f"http://127.0.0.1:{args.port}"
+    args.mock_url = mock_url
+    return [backend, mock]
+
+def configure_mock(args) -> Optional[Dict[str, Any]]:
+    """Apply --mock-* options and zero the mock's counters"""
+    updates = {k: getattr(args, f"mock_{k}") for k in MOCK_OPTIONS if getattr(args, f"mock_{k}") is not None}
+    try:
+        if updates:
+            httpx.post(f"{args.mock_url}/_mock/config", json=updates, timeout=5.0).raise_for_status()
+        httpx.post(f"{args.mock_url}/_mock/reset", timeout=5.0).raise_for_status()
+        return httpx.get(f"{args.mock_url}/_mock/stats", timeout=5.0).json()["config"]
+    except httpx.HTTPError as e:
+        print(f"⚠️ Mock upstreams unreachable at {args.mock_url}: {e}")
+        return None
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load test the Abacus FinBot API")
+    parser.add_argument("--target", default="http://127.0.0.1:8000", help="Backend base URL")
+    parser.add_argument("--users", type=int, default=10, help="Concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to keep starting scenarios")
+    parser.add_argument("--ramp-up", type=float, default=5.0, help="Seconds over which users start")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="Mean pause between a user's scenarios")
+    parser.add_argument("--mix", default="chat=2,stock=1,sharia=1",
+                        help=f"Scenario weights, from: {', '.join(SCENARIOS)}")
+    parser.add_argument("--rows", type=int, default=1000, help="Rows in each uploaded statement")
+    parser.add_argument("--unique-symbols", action="store_true",
+                        help="Random tickers, so verdict and analysis caches never hit")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Per-request timeout in seconds")
+    parser.add_argument("--json", metavar="PATH", help="Also write the report as JSON")
+    parser.add_argument("--spawn", action="store_true", help="Start the mock upstreams and the backend")
+    parser.add_argument("--port", type=int, default=8800, help="Backend port with --spawn")
+    parser.add_argument("--workers", type=int, default=1, help="Backend worker processes with --spawn")
+    parser.add_argument("--mock-url", default="http://127.0.0.1:8900", help="Mock upstreams (for its settings and counters)")
+    parser.add_argument("--mock-port", type=int, default=8900, help="Mock port with --spawn")
+    for key in MOCK_OPTIONS:
+        parser.add_argument(f"--mock-{key.replace('_', '-')}", type=int if key == "completion_tokens" else float)
+    args = parser.parse_args()
+
+    try:
+        weights = parse_mix(args.mix)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 2
+
+    processes: List[subprocess.Popen] = []
+    workdir = tempfile.TemporaryDirectory(prefix="abacus-load-")
+    try:
+        if args.spawn:
+            processes = spawn_servers(args, workdir.name)
+            print(f"🚀 Starting mock upstreams ({args.mock_url}) and backend ({args.target})")
+            if not (wait_until_up(f"{args.mock_url}/_mock/stats") and wait_until_up(f"{args.target}/health")):
+                print("❌ Servers did not come up")
+                return 1
+        mock_config = configure_mock(args)
+        if mock_config:
+            print(f"🎭 Mock: OpenAI {mock_config['latency_ms']:.0f} ms + {mock_config['completion_tokens']} tokens "
+                  f"at {mock_config['tokens_per_second']:.0f}/s, Yahoo {mock_config['yahoo_latency_ms']:.0f} ms")
+
+        print(f"🏁 {args.users} users, {args.duration:.0f}s, mix {weights}")
+        recorder = asyncio.run(run_load(args, weights))
+        report = summarise(recorder)
+        report.update(target=args.target, users=args.users, mix=weights)
+        if mock_config is not None:
+            try:
+                report["mock_upstreams"] = httpx.get(f"{args.mock_url}/_mock/stats", timeout=5.0).json()["requests"]
+            except httpx.HTTPError:
+                pass
+
+        print_report(report, args)
+        if args.json:
+            Path(args.json).write_text(json.dumps(report, indent=2))
+            print(f"📁 Report written to {args.json}")
+        return 0 if "all" in report["steps"] else 1
+    finally:
+        for process in processes:
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        workdir.cleanup()
+
+if __name__ == "__main__":
+    sys.exit(main())
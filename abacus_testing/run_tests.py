@@ -92,6 +92,7 @@ def main():
         print("   ├── test_Agent01.py")
         print("   ├── test_Agent02.py")
         print("   ├── test_Agent03.py")
+        print("   ├── test_Services.py")
         print("   ├── test_routes.py")
         print("   └── run_tests.py")
         print("\n🔧 You must be INSIDE the abacus_testing folder to run this script")
@@ -125,6 +126,11 @@ def main():
             "name": "Complete Agent_03 Tests",
             "cmd": [sys.executable, "-m", "pytest", "test_Agent03.py", "-v"],
             "critical": False
+        },
+        {
+            "name": "Shared Services Tests",
+            "cmd": [sys.executable, "-m", "pytest", "test_Services.py", "-v"],
+            "critical": False
         }
     ]
     
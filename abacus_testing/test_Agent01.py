@@ -23,6 +23,13 @@ except ImportError:
         AGENT01_FUNCTIONS_AVAILABLE = False
         print("⚠️ Agent01/Agent_01.functions not available")
 
+try:
+    from backend.Agent01 import session_store as session_store_module
+    AGENT01_SESSIONS_AVAILABLE = True
+except ImportError:
+    AGENT01_SESSIONS_AVAILABLE = False
+    print("⚠️ Agent01.session_store not available")
+
 class TestFunctions:
     """Tests for Agent01/functions.py"""
     
@@ -265,6 +272,136 @@ class TestDataProcessing:
             # If sample_df doesn't exist, skip the test
             pytest.skip("sample_df function not available")
 
+    @pytest.mark.skipif(not AGENT01_FUNCTIONS_AVAILABLE, reason="Agent01.functions not available")
+    def test_optimise_dataframe_memory(self):
+        """Test dates, repetitive text and numerics are compacted without changing values"""
+        from backend.Agent01.functions import optimise_dataframe_memory
+
+        df = pd.DataFrame({
+            "Date": ["2024-01-05", "2024-01-13", None, "2024-02-01"] * 250,
+            "Merchant": ["TESCO", "BOOTS", "TESCO", "SHELL"] * 250,
+            "Reference": [f"TXN{i}" for i in range(1000)],
+            "Amount": [-12.34, 2500.0, -3.5, -0.99] * 250,
+            "Count": [1, 2, 3, 4] * 250,
+            "Price": [1.5, 2.25, 3.0, 4.0] * 250,
+        })
+        result, report = optimise_dataframe_memory(df)
+
+        assert str(result["Date"].dtype) == "datetime64[ns]"
+        assert result["Date"].iloc[1] == pd.Timestamp("2024-01-13")
+        assert result["Date"].isna().sum() == 250
+        assert str(result["Merchant"].dtype) == "category"
+        assert str(result["Reference"].dtype) != "category"
+        assert result["Amount"].dtype == "float64"  # not exact in float32
+        assert result["Count"].dtype == "int32"
+        assert result["Price"].dtype == "float32"
+        assert (result["Amount"] == df["Amount"]).all()
+        assert (result["Merchant"].astype(str) == df["Merchant"]).all()
+        assert report["bytes_after"] < report["bytes_before"]
+        assert report["converted"]["Merchant"] == "object -> category"
+
+
+class TestSessionStore:
+    """Tests for Agent01/session_store.py"""
+
+    @pytest.fixture
+    def store_factory(self, tmp_path):
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from sqlalchemy.pool import StaticPool
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        session_store_module.ChatSession.__table__.create(engine)
+        session_store_module.ChatTurn.__table__.create(engine)
+        factory = sessionmaker(bind=engine)
+        return lambda: session_store_module.SessionStore(factory, data_dir=str(tmp_path))
+
+    @pytest.mark.skipif(not AGENT01_SESSIONS_AVAILABLE, reason="Agent01.session_store not available")
+    def test_session_survives_restart(self, store_factory):
+        """Test chat turns and dataset come back in a fresh store, the rows only on demand"""
+        store = store_factory()
+        session = store.create("s-1", owner=7)
+        df = pd.DataFrame({"Category": ["Food", "Rent"], "Amount": [50.0, 900.0]})
+        store.attach_dataset("s-1", session, df, {"num_rows": 2}, b"raw-upload", "budget.csv")
+        turns = [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}]
+        session["chat"].extend(turns)
+        store.append_turns("s-1", session, turns)
+
+        restarted = store_factory()
+        restored = restarted.get("s-1")
+        assert restored["owner"] == 7
+        assert [t["role"] for t in restored["chat"]] == ["system", "user", "assistant"]
+        assert restored["summary"] == {"num_rows": 2}
+        assert restored["df"] is None
+        pd.testing.assert_frame_equal(restarted.dataset(restored), df)
+        assert restarted.get("missing") is None
+
+    @pytest.mark.skipif(not AGENT01_SESSIONS_AVAILABLE, reason="Agent01.session_store not available")
+    def test_identical_uploads_share_one_file(self, store_factory, tmp_path):
+        """Test datasets are keyed by content hash"""
+        store = store_factory()
+        df = pd.DataFrame({"a": [1, 2]})
+        for session_id in ("s-1", "s-2"):
+            store.attach_dataset(session_id, store.create(session_id), df, {}, b"same-bytes")
+        assert len(list(tmp_path.iterdir())) == 1
+
+    @pytest.mark.skipif(not AGENT01_SESSIONS_AVAILABLE, reason="Agent01.session_store not available")
+    def test_reused_dataset_survives_concurrent_purge(self, store_factory, tmp_path, monkeypatch):
+        """Test reuse refreshes the file's mtime and a file purged mid-attach is written again"""
+        import os
+        store = store_factory()
+        df = pd.DataFrame({"a": [1, 2]})
+        store.attach_dataset("s-1", store.create("s-1"), df, {}, b"same-bytes")
+        (path,) = tmp_path.iterdir()
+        os.utime(path, (0, 0))
+
+        store.attach_dataset("s-2", store.create("s-2"), df, {}, b"same-bytes")
+        assert path.stat().st_mtime > 0
+
+        path.unlink()  # purged after the reuse check
+        monkeypatch.setattr(store, "_reuse_dataset", lambda digest: True)
+        store.attach_dataset("s-3", store.create("s-3"), df, {}, b"same-bytes")
+        pd.testing.assert_frame_equal(pd.read_parquet(path), df)
+
+    @pytest.mark.skipif(not AGENT01_SESSIONS_AVAILABLE, reason="Agent01.session_store not available")
+    def test_mixed_type_columns_are_stored_as_text(self, store_factory):
+        """Test columns Parquet cannot hold are normalised, and unfixable frames fail the upload"""
+        store = store_factory()
+        session = store.create("s-1")
+        df = pd.DataFrame({"Amount": pd.Series([10, "n/a", None], dtype=object), 2024: [1.0, 2.0, 3.0]})
+        store.attach_dataset("s-1", session, df, {}, b"mixed")
+        restarted = store_factory()
+        restored = restarted.dataset(restarted.get("s-1"))
+        assert list(restored.columns) == ["Amount", "2024"]
+        assert restored["Amount"].tolist()[:2] == ["10", "n/a"]
+        assert pd.isna(restored["Amount"].iloc[2])
+
+        duplicated = pd.DataFrame([[1, 2]], columns=["a", "a"])
+        with pytest.raises(ValueError):
+            store.attach_dataset("s-1", session, duplicated, {}, b"duplicated")
+
+    @pytest.mark.skipif(not AGENT01_SESSIONS_AVAILABLE, reason="Agent01.session_store not available")
+    def test_purge_expired_removes_idle_sessions_and_unused_files(self, store_factory, tmp_path):
+        """Test idle sessions lose their turns and datasets; active ones keep theirs"""
+        import os
+        from datetime import datetime, timedelta
+        store = store_factory()
+        for session_id, raw in (("old", b"old-bytes"), ("new", b"new-bytes")):
+            store.attach_dataset(session_id, store.create(session_id), pd.DataFrame({"a": [1]}), {}, raw)
+        db = store._session_factory()
+        db.query(session_store_module.ChatSession).filter_by(id="old").update(
+            {"updated_at": datetime.utcnow() - timedelta(days=60)})
+        db.commit()
+        db.close()
+        for path in tmp_path.iterdir():  # both files are past the orphan grace period
+            os.utime(path, (0, 0))
+
+        purged = store.purge_expired(retention_days=30)
+        assert purged == {"sessions": 1, "turns": 1, "datasets": 1}
+        assert store.get("old") is None
+        assert store.get("new") is not None
+        assert [p.name for p in tmp_path.iterdir()] == [f"{session_store_module.content_hash(b'new-bytes')}.parquet"]
+        assert store.purge_expired(retention_days=0) == {"sessions": 0, "turns": 0, "datasets": 0}
+
 
 # Simple test to check that the module works even without Agent01
 def test_module_import():
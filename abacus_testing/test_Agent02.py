@@ -28,9 +28,9 @@ class TestAgent02Tools:
     """Tests for Agent02/tools.py"""
     
     @pytest.mark.skipif(not AGENT02_TOOLS_AVAILABLE, reason="Agent02.tools not available")
-    @patch('Agent02.tools.DDGS_AVAILABLE', True)
-    @patch('Agent02.tools.DDGS')
-    def test_search_tool_success(self, mock_ddgs):
+    @patch('backend.Agent02.tools.DDGS_AVAILABLE', True)
+    @patch('backend.Agent02.tools.get_ddgs')
+    def test_search_tool_success(self, mock_get_ddgs):
         """Test successful web search"""
         mock_results = [
             {
@@ -47,7 +47,7 @@ class TestAgent02Tools:
         
         mock_ddgs_instance = Mock()
         mock_ddgs_instance.text.return_value = mock_results
-        mock_ddgs.return_value.__enter__.return_value = mock_ddgs_instance
+        mock_get_ddgs.return_value = mock_ddgs_instance
         
         result = search_tool("AAPL stock news")
         
@@ -56,7 +56,7 @@ class TestAgent02Tools:
         assert "https://example.com/apple-news" in result
     
     @pytest.mark.skipif(not AGENT02_TOOLS_AVAILABLE, reason="Agent02.tools not available")
-    @patch('Agent02.tools.DDGS_AVAILABLE', False)
+    @patch('backend.Agent02.tools.DDGS_AVAILABLE', False)
     def test_search_tool_unavailable(self):
         """Test when DDGS is not available"""
         result = search_tool("test query")
@@ -266,6 +266,197 @@ class TestAgent02Integration:
         assert "Tesla shows strong growth" in analysis
 
 
+try:
+    from backend.Agent02 import job_queue as job_queue_module
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    AGENT02_JOBS_AVAILABLE = True
+except ImportError:
+    AGENT02_JOBS_AVAILABLE = False
+    print("⚠️ Agent02.job_queue not available")
+
+class TestStockJobQueue:
+    """Tests for Agent02/job_queue.py"""
+
+    @pytest.fixture
+    def session_factory(self, tmp_path):
+        """File database holding the jobs table (one connection per thread, as in production)"""
+        engine = create_engine(
+            f"sqlite:///{tmp_path / 'jobs.db'}", connect_args={"check_same_thread": False, "timeout": 5}
+        )
+        job_queue_module.StockAnalysisJob.__table__.create(engine)
+        return sessionmaker(bind=engine)
+
+    @staticmethod
+    def wait_for(queue, job_id, statuses=("completed", "error", "cancelled"), timeout=5):
+        """Poll a job until it reaches one of the given statuses"""
+        import time
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = queue.get(job_id)
+            if job["status"] in statuses:
+                return job
+            time.sleep(0.01)
+        raise AssertionError(f"Job {job_id} stuck in {queue.get(job_id)['status']}")
+
+    @pytest.mark.skipif(not AGENT02_JOBS_AVAILABLE, reason="Agent02.job_queue not available")
+    def test_job_reports_stages_and_result(self, session_factory):
+        """Test that a job walks through every stage and stores the result"""
+        seen_stages = []
+
+        def runner(symbol, progress_callback=None):
+            for stage in job_queue_module.ANALYSIS_STAGES:
+                progress_callback(stage)
+                seen_stages.append(stage)
+            return {"status": "success", "analysis": f"{symbol} analysis", "recommendation": "BUY", "model_used": "gpt-4o"}
+
+        queue = job_queue_module.StockJobQueue(session_factory, runner, max_workers=1)
+        job, created = queue.submit("aapl")
+        assert created
+        assert job["symbol"] == "AAPL"
+
+        done = self.wait_for(queue, job["job_id"])
+        assert done["status"] == "completed"
+        assert done["progress"] == 100
+        assert done["analysis"] == "AAPL analysis"
+        assert seen_stages == list(job_queue_module.ANALYSIS_STAGES)
+        queue.shutdown()
+
+    @pytest.mark.skipif(not AGENT02_JOBS_AVAILABLE, reason="Agent02.job_queue not available")
+    def test_in_flight_symbol_is_deduplicated(self, session_factory):
+        """Test that a second request for a running symbol reuses the job"""
+        import threading
+        release = threading.Event()
+
+        def runner(symbol, progress_callback=None):
+            release.wait(5)
+            return {"status": "success", "analysis": "", "recommendation": ""}
+
+        queue = job_queue_module.StockJobQueue(session_factory, runner, max_workers=1)
+        first, created_first = queue.submit("MSFT")
+        second, created_second = queue.submit("msft")
+
+        assert created_first and not created_second
+        assert first["job_id"] == second["job_id"]
+        release.set()
+        self.wait_for(queue, first["job_id"])
+        queue.shutdown()
+
+    @pytest.mark.skipif(not AGENT02_JOBS_AVAILABLE, reason="Agent02.job_queue not available")
+    def test_cancel_running_job(self, session_factory):
+        """Test that cancelling stops the job at its next stage"""
+        import threading
+        started, release = threading.Event(), threading.Event()
+
+        def runner(symbol, progress_callback=None):
+            progress_callback("data")
+            started.set()
+            release.wait(5)
+            progress_callback("financial")
+            return {"status": "success", "analysis": "should not be stored", "recommendation": ""}
+
+        queue = job_queue_module.StockJobQueue(session_factory, runner, max_workers=1)
+        job, _ = queue.submit("TSLA")
+        assert started.wait(5)
+
+        cancelled = queue.cancel(job["job_id"])
+        release.set()
+
+        assert cancelled["status"] == "cancelled"
+        final = self.wait_for(queue, job["job_id"])
+        assert final["status"] == "cancelled"
+        assert final["analysis"] is None
+        queue.shutdown()
+
+    @pytest.mark.skipif(not AGENT02_JOBS_AVAILABLE, reason="Agent02.job_queue not available")
+    def test_recover_resumes_interrupted_jobs(self, session_factory):
+        """Test that jobs left running by a restart are executed again"""
+        db = session_factory()
+        db.add(job_queue_module.StockAnalysisJob(id="job-1", symbol="GOOGL", status="running", stage="market", progress=60))
+        db.commit()
+        db.close()
+
+        def runner(symbol, progress_callback=None):
+            return {"status": "success", "analysis": "resumed", "recommendation": ""}
+
+        queue = job_queue_module.StockJobQueue(session_factory, runner, max_workers=1)
+        assert queue.recover() == 1
+        assert self.wait_for(queue, "job-1")["analysis"] == "resumed"
+        queue.shutdown()
+
+    @pytest.mark.skipif(not AGENT02_JOBS_AVAILABLE, reason="Agent02.job_queue not available")
+    def test_recover_skips_jobs_leased_to_live_workers(self, session_factory):
+        """Test that only jobs whose lease has expired are taken over from another worker"""
+        from datetime import datetime, timedelta
+        db = session_factory()
+        db.add(job_queue_module.StockAnalysisJob(
+            id="live", symbol="AMZN", status="running", claimed_by="other:1",
+            lease_expires_at=datetime.utcnow() + timedelta(minutes=5)))
+        db.add(job_queue_module.StockAnalysisJob(
+            id="dead", symbol="META", status="running", claimed_by="other:2",
+            lease_expires_at=datetime.utcnow() - timedelta(seconds=1)))
+        db.commit()
+        db.close()
+
+        def runner(symbol, progress_callback=None):
+            return {"status": "success", "analysis": symbol, "recommendation": ""}
+
+        queue = job_queue_module.StockJobQueue(session_factory, runner, max_workers=1, heartbeat_seconds=0)
+        assert queue.recover() == 1
+        assert self.wait_for(queue, "dead")["analysis"] == "META"
+        assert queue.get("live")["status"] == "running"
+        assert queue.recover() == 0
+        queue.shutdown()
+
+    @pytest.mark.skipif(not AGENT02_JOBS_AVAILABLE, reason="Agent02.job_queue not available")
+    def test_jobs_are_scoped_to_their_user(self, session_factory):
+        """Test that owned jobs are neither shared nor visible across users"""
+        import threading
+        release = threading.Event()
+
+        def runner(symbol, progress_callback=None):
+            release.wait(5)
+            return {"status": "success", "analysis": "", "recommendation": ""}
+
+        queue = job_queue_module.StockJobQueue(session_factory, runner, max_workers=2)
+        mine, _ = queue.submit("NVDA", user_id=1)
+        theirs, created = queue.submit("NVDA", user_id=2)
+
+        assert created and mine["job_id"] != theirs["job_id"]
+        assert queue.get(mine["job_id"], user_id=1)["user_id"] == 1
+        assert queue.get(mine["job_id"], user_id=2) is None
+        assert queue.get(mine["job_id"], user_id=None) is None
+        assert queue.cancel(mine["job_id"], user_id=2) is None
+        release.set()
+        self.wait_for(queue, mine["job_id"])
+        self.wait_for(queue, theirs["job_id"])
+        queue.shutdown()
+
+    @pytest.mark.skipif(not AGENT02_JOBS_AVAILABLE, reason="Agent02.job_queue not available")
+    def test_stats_and_purge_of_finished_jobs(self, session_factory):
+        """Test status counts come from one grouped query and only old finished jobs are purged"""
+        from datetime import datetime, timedelta
+        old = datetime.utcnow() - timedelta(days=30)
+        db = session_factory()
+        db.add_all([
+            job_queue_module.StockAnalysisJob(id="old-done", symbol="A", status="completed", finished_at=old),
+            job_queue_module.StockAnalysisJob(id="old-error", symbol="B", status="error", created_at=old),
+            job_queue_module.StockAnalysisJob(id="new-done", symbol="C", status="completed", finished_at=datetime.utcnow()),
+            job_queue_module.StockAnalysisJob(id="old-running", symbol="D", status="running", created_at=old,
+                                              claimed_by="other:1", lease_expires_at=datetime.utcnow() + timedelta(minutes=5)),
+        ])
+        db.commit()
+        db.close()
+
+        queue = job_queue_module.StockJobQueue(session_factory, max_workers=1, heartbeat_seconds=0)
+        assert queue.stats()["jobs"] == {"queued": 0, "running": 1, "completed": 2, "error": 1, "cancelled": 0}
+        assert queue.purge_finished(retention_days=7) == 2
+        assert queue.get("old-done") is None and queue.get("old-error") is None
+        assert queue.get("new-done") and queue.get("old-running")
+        assert queue.purge_finished(retention_days=0) == 0
+        queue.shutdown()
+
+
 # Simple test to check that the module works even without Agent02
 def test_module_import():
     """Test that the test module works even if Agent02 is not available"""
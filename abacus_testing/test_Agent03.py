@@ -3,6 +3,7 @@ import sys
 from unittest.mock import patch, Mock, AsyncMock
 from pathlib import Path
 import tempfile
+import time
 
 sys.path.append('../backend')
 
@@ -29,6 +30,20 @@ except ImportError:
         ISLAMIC_ANALYZER_AVAILABLE = False
         print("⚠️ Agent03.islamic_analyzer not available")
 
+try:
+    from backend.Agent03.keyword_screener import HaramKeywordScreener
+    KEYWORD_SCREENER_AVAILABLE = True
+except ImportError:
+    KEYWORD_SCREENER_AVAILABLE = False
+    print("⚠️ Agent03.keyword_screener not available")
+
+try:
+    from backend.Agent03.batch_screening import BatchScreener, classify_holding, normalise_tickers
+    BATCH_SCREENING_AVAILABLE = True
+except ImportError:
+    BATCH_SCREENING_AVAILABLE = False
+    print("⚠️ Agent03.batch_screening not available")
+
 # Mock config_islamic at module level
 class MockIslamicRAGConfig:
     """Mock Islamic configuration to avoid importing config_islamic"""
@@ -73,6 +88,104 @@ class TestIslamicRAGConfig:
         assert "interest" in config.HARAM_KEYWORDS
 
 
+class TestHaramKeywordScreener:
+    """Tests for Agent03/keyword_screener.py"""
+
+    @pytest.fixture
+    def screener(self):
+        return HaramKeywordScreener()
+
+    @pytest.mark.skipif(not KEYWORD_SCREENER_AVAILABLE, reason="Agent03.keyword_screener not available")
+    def test_word_boundaries(self, screener):
+        """Test that terms inside other words do not match"""
+        assert screener.scan("Headquartered in Birmingham and Nottingham") == []
+        assert screener.scan("Strong interest in cloud products") == []
+
+        matches = screener.scan("Sells ham and bacon", "business_summary")
+        assert [m["term"] for m in matches] == ["ham", "bacon"]
+        assert (matches[0]["start"], matches[0]["end"]) == (6, 9)
+
+    @pytest.mark.skipif(not KEYWORD_SCREENER_AVAILABLE, reason="Agent03.keyword_screener not available")
+    def test_stems_and_phrases(self, screener):
+        """Test plural/inflected forms and hyphenated phrases"""
+        terms = [m["term"] for m in screener.scan("Operates breweries, casinos and interest-bearing deposits")]
+        assert terms == ["brewery", "casino", "interest-bearing"]
+
+    @pytest.mark.skipif(not KEYWORD_SCREENER_AVAILABLE, reason="Agent03.keyword_screener not available")
+    def test_screen_weights_fields(self, screener):
+        """Test nested research data scoring and backward-compatible keys"""
+        research = {
+            "financial_data": {"industry": "Beverages - Brewers", "website": "https://beer.example"},
+            "recent_news": {"news": [{"title": "Casino stocks rally", "url": "https://x"}]},
+        }
+        result = screener.screen(research)
+
+        assert result["haram_indicators_found"] == {"alcohol": ["brewer"]}
+        assert result["category_scores"]["gambling"] == 0.5  # one news title is below the threshold
+        assert result["is_likely_haram"] is True
+        assert result["risk_level"] == "MEDIUM"
+
+
+class TestBatchScreening:
+    """Tests for Agent03/batch_screening.py"""
+
+    @staticmethod
+    def _financial(industry="Software - Infrastructure", debt=10.0, cash=5.0):
+        return {
+            "company_name": "Example Corp",
+            "industry": industry,
+            "business_summary": "Develops cloud software.",
+            "sharia_ratios": {
+                "debt_to_market_capitalisation": {"value": debt, "limit": 33.0, "compliant": debt <= 33.0},
+                "cash_to_market_capitalisation": {"value": cash, "limit": 33.0, "compliant": cash <= 33.0},
+            },
+        }
+
+    @pytest.mark.skipif(not BATCH_SCREENING_AVAILABLE, reason="Agent03.batch_screening not available")
+    def test_normalise_tickers(self):
+        """Test de-duplication and validation of tickers"""
+        parsed = normalise_tickers([" aapl", "MSFT", "AAPL", "", "not a ticker!", "BRK-B"])
+        assert parsed["tickers"] == ["AAPL", "MSFT", "BRK-B"]
+        assert parsed["invalid"] == ["NOT A TICKER!"]
+
+    @pytest.mark.skipif(not BATCH_SCREENING_AVAILABLE, reason="Agent03.batch_screening not available")
+    def test_classify_holding_rules(self):
+        """Test that clear cases resolve without review and near-limit ratios are borderline"""
+        no_keywords = {"category_scores": {}}
+
+        assert classify_holding(self._financial(), no_keywords, margin=0.8)["verdict"] == "HALAL ✅"
+        assert classify_holding(self._financial(industry="Beverages - Brewers"), no_keywords)["verdict"] == "HARAM ❌"
+        assert classify_holding(self._financial(debt=40.0), no_keywords)["verdict"] == "HARAM ❌"
+
+        near_limit = classify_holding(self._financial(debt=30.0), no_keywords, margin=0.8)
+        assert near_limit["borderline"] is True
+        assert near_limit["verdict"] == "QUESTIONABLE ⚠️"
+
+    @pytest.mark.skipif(not BATCH_SCREENING_AVAILABLE, reason="Agent03.batch_screening not available")
+    def test_screen_streams_results_and_summary(self):
+        """Test the async pipeline with a stub agent and LLM review disabled"""
+        import asyncio
+
+        financials = {"MSFT": self._financial(), "BUD": self._financial(industry="Beverages - Brewers")}
+
+        class StubAgent:
+            async def _get_yahoo_finance_info(self, ticker):
+                return financials.get(ticker, {"error": "No financial data found"})
+
+        async def collect():
+            screener = BatchScreener(StubAgent(), concurrency=2, use_llm=False)
+            return [item async for item in screener.screen(["MSFT", "BUD", "ZZZZ"])]
+
+        items = asyncio.run(collect())
+        results = {i["ticker"]: i for i in items if i["type"] == "result"}
+
+        assert results["MSFT"]["verdict"] == "HALAL ✅"
+        assert results["BUD"]["verdict"] == "HARAM ❌"
+        assert results["ZZZZ"]["verdict"] == "UNKNOWN"
+        assert items[-1]["type"] == "summary"
+        assert items[-1]["llm_calls"] == 0
+
+
 class TestIslamicRAGAgent:
     """Tests for Agent03/islamic_agent.py"""
     
@@ -284,4 +397,452 @@ def temp_documents_folder():
             "Islamic banking alternatives include murabaha, ijara, and musharaka financing."
         )
         
-        yield temp_path
\ No newline at end of file
+        yield temp_path
+
+try:
+    from backend.Agent03 import verdict_store as verdict_store_module
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+    VERDICT_STORE_AVAILABLE = True
+except ImportError:
+    VERDICT_STORE_AVAILABLE = False
+    print("⚠️ Agent03.verdict_store not available")
+
+class TestVerdictStore:
+    """Tests for Agent03/verdict_store.py"""
+
+    FINANCIAL = {
+        "symbol": "AAPL", "company_name": "Apple Inc.", "sector": "Technology",
+        "total_debt": 100, "total_cash": 50, "revenue": 1000, "market_capitalisation": 10000,
+        "sharia_ratios": {"debt_to_market_capitalisation": {"value": 1.0, "limit": 33.0, "compliant": True}},
+    }
+
+    @pytest.fixture
+    def store(self):
+        """Store backed by an in-memory database"""
+        engine = create_engine(
+            "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+        )
+        verdict_store_module.ShariaVerdict.__table__.create(engine)
+        return verdict_store_module.VerdictStore(sessionmaker(bind=engine), ttl_hours=24, max_age_days=90)
+
+    def _report(self):
+        return {
+            "research_data": {"financial_data": self.FINANCIAL},
+            "sharia_analysis": {"status": "success", "verdict": "HALAL ✅", "confidence_level": "HIGH"},
+        }
+
+    @pytest.mark.skipif(not VERDICT_STORE_AVAILABLE, reason="Agent03.verdict_store not available")
+    def test_fingerprint_ignores_price_moves(self):
+        """Test that only fundamentals and ratio outcomes change the fingerprint"""
+        fingerprint = verdict_store_module.financial_fingerprint
+        base = fingerprint(self.FINANCIAL)
+
+        assert fingerprint({**self.FINANCIAL, "market_capitalisation": 12000, "current_price": 1}) == base
+        assert fingerprint({**self.FINANCIAL, "total_debt": 500}) != base
+
+    @pytest.mark.skipif(not VERDICT_STORE_AVAILABLE, reason="Agent03.verdict_store not available")
+    def test_save_lookup_and_freshness(self, store):
+        """Test lookup by symbol or query, TTL freshness and invalidation"""
+        fingerprint = verdict_store_module.financial_fingerprint(self.FINANCIAL)
+        store.save("AAPL", "Apple stock", self._report(), fingerprint)
+
+        row = store.lookup("aapl")
+        assert row.verdict == "HALAL ✅"
+        assert store.lookup("  apple   STOCK ").symbol == "AAPL"
+        assert store.is_fresh(row)
+
+        from datetime import datetime, timedelta
+        assert not store.is_fresh(row, now=datetime.utcnow() + timedelta(hours=25))
+        assert store.is_expired(row, now=datetime.utcnow() + timedelta(days=91))
+
+        report = store.cached_report(row, "hit")
+        assert report["cache"]["status"] == "hit"
+        assert report["sharia_analysis"]["verdict"] == "HALAL ✅"
+
+        assert store.stats()["entries"] == 1
+        assert store.invalidate("AAPL") is True
+        assert store.lookup("AAPL") is None
+        assert store.stats()["entries"] == 0
+
+    @pytest.mark.skipif(not VERDICT_STORE_AVAILABLE, reason="Agent03.verdict_store not available")
+    def test_plain_hits_are_batched(self, store):
+        """Test that plain hits are counted in memory and written in one flush"""
+        fingerprint = verdict_store_module.financial_fingerprint(self.FINANCIAL)
+        store.save("AAPL", "Apple stock", self._report(), fingerprint)
+        row = store.lookup("AAPL")
+
+        store.cached_report(row, "hit")
+        store.cached_report(row, "hit")
+        assert store.lookup("AAPL").hits == 0
+        assert store.get("AAPL")["hits"] == 2
+
+        assert store.flush_hits() == 1
+        assert store.lookup("AAPL").hits == 2
+        assert store.flush_hits() == 0
+
+        store.cached_report(row, "revalidated")
+        assert store.lookup("AAPL").hits == 3
+
+
+try:
+    from backend.Agent03.symbol_index import SymbolIndex, load_symbol_index, normalise_name
+    SYMBOL_INDEX_AVAILABLE = True
+except ImportError:
+    SYMBOL_INDEX_AVAILABLE = False
+    print("⚠️ Agent03.symbol_index not available")
+
+class TestSymbolIndex:
+    """Tests for Agent03/symbol_index.py"""
+
+    @pytest.fixture
+    def index(self):
+        listings = [
+            {"symbol": "AAPL", "name": "Apple Inc.", "sector": "Technology"},
+            {"symbol": "MSFT", "name": "Microsoft Corporation", "sector": "Technology"},
+            {"symbol": "BAC", "name": "Bank of America Corporation", "sector": "Financial Services"},
+            {"symbol": "F", "name": "Ford Motor Company", "sector": "Consumer Cyclical"},
+        ]
+        return SymbolIndex(listings, {"iphone": "AAPL"})
+
+    @pytest.mark.skipif(not SYMBOL_INDEX_AVAILABLE, reason="Agent03.symbol_index not available")
+    def test_normalise_name(self):
+        """Test removal of legal forms and punctuation"""
+        assert normalise_name("The Procter & Gamble Company") == "procter and gamble"
+        assert normalise_name("Apple Inc.") == "apple"
+
+    @pytest.mark.skipif(not SYMBOL_INDEX_AVAILABLE, reason="Agent03.symbol_index not available")
+    def test_resolution_methods(self, index):
+        """Test ticker, alias, name, prefix and fuzzy resolution"""
+        assert index.resolve("msft")["method"] == "symbol"
+        assert index.resolve("Is AAPL halal?")["symbol"] == "AAPL"
+        assert index.resolve("iPhone")["symbol"] == "AAPL"
+        assert index.resolve("Apple Inc shares")["method"] == "name"
+        assert index.resolve("Ford")["symbol"] == "F"
+
+        fuzzy = index.resolve("Microsfot Corp")
+        assert fuzzy["symbol"] == "MSFT"
+        assert fuzzy["method"] == "fuzzy"
+
+        assert index.resolve("Completely Unknown Widgets") is None
+        assert index.symbols_in_sector("technology") == ["AAPL", "MSFT"]
+
+    @pytest.mark.skipif(not SYMBOL_INDEX_AVAILABLE, reason="Agent03.symbol_index not available")
+    def test_bundled_listing_loads(self):
+        """Test the bundled listing and alias files"""
+        index = load_symbol_index()
+        assert len(index) > 100
+        assert index.resolve("Saudi Aramco")["symbol"] == "2222.SR"
+
+
+try:
+    import pandas as pd
+    from backend.Agent03.ratio_engine import screen_fundamentals, ratios_for_company, get_methodology, fundamentals_from_statements
+    RATIO_ENGINE_AVAILABLE = True
+except ImportError:
+    RATIO_ENGINE_AVAILABLE = False
+    print("⚠️ Agent03.ratio_engine not available")
+
+class TestRatioEngine:
+    """Tests for Agent03/ratio_engine.py"""
+
+    @pytest.fixture
+    def fundamentals(self):
+        return pd.DataFrame([
+            {"symbol": "CLEAN", "market_capitalisation": 1000, "total_debt": 100, "total_cash": 50,
+             "receivables": 80, "interest_income": 1, "revenue": 500},
+            {"symbol": "DEBT", "market_capitalisation": 1000, "total_debt": 310, "total_cash": 50,
+             "receivables": 80, "interest_income": 1, "revenue": 500},
+            {"symbol": "RIBA", "market_capitalisation": 1000, "total_debt": 100, "total_cash": 50,
+             "receivables": None, "interest_income": 40, "revenue": 500},
+            {"symbol": "NOCAP", "market_capitalisation": 0, "total_debt": 100, "total_cash": 50,
+             "receivables": 80, "interest_income": None, "revenue": None},
+        ]).set_index("symbol")
+
+    @pytest.mark.skipif(not RATIO_ENGINE_AVAILABLE, reason="Agent03.ratio_engine not available")
+    def test_vectorised_screen_per_methodology(self, fundamentals):
+        """Test limits differ between AAOIFI (30%) and DJIM (33%)"""
+        djim = screen_fundamentals(fundamentals, "DJIM")
+        assert djim.loc["CLEAN", "sharia_compliant"] == True
+        assert djim.loc["DEBT", "debt_to_market_capitalisation_value"] == 31.0
+        assert djim.loc["DEBT", "sharia_compliant"] == True
+        assert djim.loc["RIBA", "interest_income_to_revenue_compliant"] == False
+        assert pd.isna(djim.loc["RIBA", "receivables_to_market_capitalisation_value"])
+        assert pd.isna(djim.loc["NOCAP", "sharia_compliant"])
+
+        aaoifi = screen_fundamentals(fundamentals, "AAOIFI")
+        assert aaoifi.loc["DEBT", "sharia_compliant"] == False
+        assert get_methodology("s&p").name == "SP"
+        with pytest.raises(ValueError):
+            get_methodology("unknown")
+
+    @pytest.mark.skipif(not RATIO_ENGINE_AVAILABLE, reason="Agent03.ratio_engine not available")
+    def test_single_company_report_format(self):
+        """Test the per-company dict keeps the existing ratio keys"""
+        ratios = ratios_for_company({"market_capitalisation": 1000, "total_debt": 200, "total_cash": None}, "DJIM")
+        assert ratios["debt_to_market_capitalisation"] == {"value": 20.0, "limit": 33.0, "compliant": True}
+        assert ratios["cash_to_market_capitalisation"]["value"] == 0.0
+        assert "interest_income_to_revenue" in ratios["note"]
+
+    @pytest.mark.skipif(not RATIO_ENGINE_AVAILABLE, reason="Agent03.ratio_engine not available")
+    def test_fundamentals_from_statements(self):
+        """Test latest statement values are picked by row name"""
+        income = pd.DataFrame({"2024": [900.0, 12.0], "2023": [800.0, 10.0]},
+                              index=["Total Revenue", "Interest Income"])
+        balance = pd.DataFrame({"2024": [55.0]}, index=["Accounts Receivable"])
+        assert fundamentals_from_statements(income, balance) == {
+            "revenue": 900.0, "interest_income": 12.0, "receivables": 55.0,
+        }
+
+
+try:
+    import asyncio
+    from backend.Agent03.sector_index import SectorIndex, match_sectors
+    SECTOR_INDEX_AVAILABLE = True
+except ImportError:
+    SECTOR_INDEX_AVAILABLE = False
+    print("⚠️ Agent03.sector_index not available")
+
+class TestSectorIndex:
+    """Tests for Agent03/sector_index.py"""
+
+    @pytest.fixture
+    def symbol_index(self):
+        listings = [
+            {"symbol": "AAA", "name": "Alpha Tech", "sector": "Technology"},
+            {"symbol": "BBB", "name": "Beta Tech", "sector": "Technology"},
+            {"symbol": "CCC", "name": "Gamma Tech", "sector": "Technology"},
+            {"symbol": "SLOW", "name": "Slow Tech", "sector": "Technology"},
+            {"symbol": "BANK", "name": "Big Bank", "sector": "Financial Services"},
+        ]
+        return SymbolIndex(listings)
+
+    @staticmethod
+    def fake_fetch(calls):
+        async def fetch(symbol):
+            calls.append(symbol)
+            await asyncio.sleep(5 if symbol == "SLOW" else 0.2)
+            debt = 50 if symbol == "CCC" else 10
+            return {
+                "symbol": symbol, "company_name": f"{symbol} Corp", "industry": "Software",
+                "market_capitalisation": {"AAA": 100, "BBB": 300}.get(symbol, 200),
+                "sharia_ratios": {"debt_to_market_capitalisation": {"value": debt, "limit": 33.0, "compliant": debt <= 33}},
+            }
+        return fetch
+
+    @pytest.mark.skipif(not SECTOR_INDEX_AVAILABLE, reason="Agent03.sector_index not available")
+    def test_match_sectors(self):
+        """Test free-text sectors map onto listing sectors"""
+        known = ["Technology", "Consumer Cyclical", "Consumer Defensive", "Financial Services"]
+        assert match_sectors("tech", known) == ["Technology"]
+        assert match_sectors("Consumer", known) == ["Consumer Cyclical", "Consumer Defensive"]
+        assert match_sectors("banking", known) == ["Financial Services"]
+
+    @pytest.mark.skipif(not SECTOR_INDEX_AVAILABLE, reason="Agent03.sector_index not available")
+    def test_concurrent_lookup_with_timeout_and_cache(self, symbol_index):
+        """Test lookups overlap, slow tickers time out and results are cached"""
+        calls = []
+        index = SectorIndex(self.fake_fetch(calls), concurrency=8, timeout=1.0)
+        with patch("backend.Agent03.sector_index.get_symbol_index", return_value=symbol_index):
+            started = time.perf_counter()
+            result = asyncio.run(index.alternatives("technology", limit=5, exclude=["AAA"]))
+            elapsed = time.perf_counter() - started
+
+            assert elapsed < 1.5  # one timeout, not the sum of four lookups
+            assert result["suggested_alternatives"] == ["BBB"]
+            assert "SLOW" in result["unavailable"]
+            assert "AAA" not in calls
+
+            calls.clear()
+            again = asyncio.run(index.alternatives("technology", limit=5, exclude=["AAA"]))
+            assert again["from_cache"] == 1
+            assert calls == ["SLOW"]  # CCC is cached as non-compliant and skipped
+
+    @pytest.mark.skipif(not SECTOR_INDEX_AVAILABLE, reason="Agent03.sector_index not available")
+    def test_screening_continues_until_limit_is_met(self):
+        """Test that further rounds run while compliant names are missing, up to max_screened"""
+        listings = [{"symbol": f"T{i:02d}", "name": f"Tech {i}", "sector": "Technology"} for i in range(20)]
+        calls = []
+
+        async def fetch(symbol):
+            calls.append(symbol)
+            debt = 10 if int(symbol[1:]) >= 8 else 50  # the first eight are non-compliant
+            return {"symbol": symbol, "company_name": symbol, "market_capitalisation": 100,
+                    "sharia_ratios": {"debt_to_market_capitalisation": {"value": debt, "limit": 33.0, "compliant": debt <= 33}}}
+
+        index = SectorIndex(fetch, concurrency=8, timeout=1.0, max_screened=15)
+        with patch("backend.Agent03.sector_index.get_symbol_index", return_value=SymbolIndex(listings)):
+            result = asyncio.run(index.alternatives("technology", limit=2))
+            assert len(result["suggested_alternatives"]) == 2
+            assert len(calls) == 10  # two rounds of limit + 3
+
+            fresh = SectorIndex(fetch, concurrency=8, timeout=1.0, max_screened=15)
+            many = asyncio.run(fresh.alternatives("technology", limit=10))
+            assert many["screened"] == 15  # capped by max_screened
+            assert len(many["suggested_alternatives"]) == 7
+
+
+try:
+    from backend.Agent03.prompt_compiler import PromptCompiler, count_tokens
+    PROMPT_COMPILER_AVAILABLE = True
+except ImportError:
+    PROMPT_COMPILER_AVAILABLE = False
+    print("⚠️ Agent03.prompt_compiler not available")
+
+class TestPromptCompiler:
+    """Tests for Agent03/prompt_compiler.py"""
+
+    @pytest.fixture
+    def research(self):
+        return {
+            "financial_data": {
+                "symbol": "AAPL", "company_name": "Apple Inc.", "website": "https://www.apple.com",
+                "market_capitalisation": 2910000000000,
+                "business_summary": "Apple designs smartphones. " * 5 + "Apple also sells services worldwide. " * 200,
+                "sharia_ratios": {"debt_to_market_capitalisation": {"value": 3.47, "limit": 33.0, "compliant": True}},
+            },
+            "web_research": {"results": [
+                {"title": "Apple profile", "url": "https://example.com/a", "snippet": "Apple designs smartphones."},
+                {"title": "Apple profile", "url": "https://example.com/b", "snippet": "Apple designs smartphones."},
+            ]},
+            "recent_news": {"news": [{"title": "Apple results", "url": "https://example.com/n", "snippet": "Revenue rose."}]},
+        }
+
+    @pytest.mark.skipif(not PROMPT_COMPILER_AVAILABLE, reason="Agent03.prompt_compiler not available")
+    def test_static_prefix_and_compact_payload(self, research):
+        """Test the knowledge base sits in the system prefix and URLs/duplicates are dropped"""
+        compiler = PromptCompiler("KNOWLEDGE BASE TEXT", token_budget=300)
+        compiled = compiler.compile("Is Apple halal?", research, {"risk_level": "LOW", "matches": [{"x": 1}]})
+
+        system, user = compiled.messages()
+        assert "KNOWLEDGE BASE TEXT" in system["content"]
+        assert "KNOWLEDGE BASE TEXT" not in user["content"]
+        assert "https://" not in compiled.user
+        assert "2.91T" in compiled.user
+        assert compiled.user.count("Apple designs smartphones.") == 1
+        assert "matches" not in compiled.user
+        assert count_tokens(compiled.user) <= 300 + 20
+
+    @pytest.mark.skipif(not PROMPT_COMPILER_AVAILABLE, reason="Agent03.prompt_compiler not available")
+    def test_records_tokens_saved(self, research):
+        """Test savings against the full-JSON prompt are accumulated"""
+        compiler = PromptCompiler("KNOWLEDGE BASE TEXT", token_budget=300)
+        first = compiler.compile("Is Apple halal?", research, {})
+        compiler.compile("Is Apple halal?", research, {})
+        compiler.record_usage(Mock(prompt_tokens_details=Mock(cached_tokens=64)))
+
+        stats = compiler.stats()
+        assert first.saved_tokens > 0
+        assert stats["calls"] == 2
+        assert stats["tokens_saved"] == 2 * first.saved_tokens
+        assert stats["provider_cached_tokens"] == 64
+
+
+try:
+    import json
+    from backend.Agent03.verdict_schema import parse_structured, parse_free_text, VERDICT_SCHEMA
+    VERDICT_SCHEMA_AVAILABLE = True
+except ImportError:
+    VERDICT_SCHEMA_AVAILABLE = False
+    print("⚠️ Agent03.verdict_schema not available")
+
+class TestVerdictSchema:
+    """Tests for Agent03/verdict_schema.py"""
+
+    BREACHED_RATIOS = {
+        "debt_to_market_capitalisation": {"value": 45.2, "limit": 33.0, "compliant": False},
+        "cash_to_market_capitalisation": {"value": 4.0, "limit": 33.0, "compliant": True},
+    }
+
+    @pytest.mark.skipif(not VERDICT_SCHEMA_AVAILABLE, reason="Agent03.verdict_schema not available")
+    def test_free_text_reads_headings_only(self):
+        """Test 'HIGH' elsewhere in the text no longer sets the confidence"""
+        text = (
+            "## 🕌 SHARIA VERDICT: HARAM ❌\n\n### 💰 FINANCIAL ANALYSIS:\n"
+            "Debt is HIGH relative to market value; a HALAL ✅ peer is cheaper.\n\n"
+            "### 🎯 CONFIDENCE LEVEL: LOW\nLimited data."
+        )
+        parsed = parse_free_text(text, self.BREACHED_RATIOS)
+        assert parsed["verdict"] == "HARAM"
+        assert parsed["confidence"] == "LOW"
+        assert parsed["ratio_breaches"] == [{"ratio": "debt_to_market_capitalisation", "value": 45.2, "limit": 33.0}]
+
+        assert parse_free_text("### 🎯 CONFIDENCE LEVEL:\n**MEDIUM**")["confidence"] == "MEDIUM"
+        assert parse_free_text("No headings, HIGH risk")["confidence"] == "MEDIUM"
+
+    @pytest.mark.skipif(not VERDICT_SCHEMA_AVAILABLE, reason="Agent03.verdict_schema not available")
+    def test_structured_reply_validation(self):
+        """Test typed fields are parsed and invalid replies rejected"""
+        reply = {
+            "verdict": "HALAL", "confidence": "HIGH",
+            "criteria": [{"criterion": "debt_ratio", "finding": "pass", "explanation": "3% of market value"}],
+            "ratio_breaches": [], "halal_alternatives": ["SPUS"], "analysis_markdown": "## 🕌 SHARIA VERDICT: HALAL ✅",
+        }
+        parsed = parse_structured(json.dumps(reply))
+        assert parsed["verdict"] == "HALAL"
+        assert parsed["criteria"][0]["finding"] == "pass"
+        assert parsed["source"] == "structured"
+        assert set(VERDICT_SCHEMA["schema"]["required"]) == set(reply)
+
+        with pytest.raises(ValueError):
+            parse_structured(json.dumps({**reply, "verdict": "MAYBE"}))
+        with pytest.raises(ValueError):
+            parse_structured("not json")
+
+    @pytest.mark.skipif(not (VERDICT_SCHEMA_AVAILABLE and PROMPT_COMPILER_AVAILABLE), reason="Agent03 modules not available")
+    def test_agent_requests_json_schema(self):
+        """Test the agent sends response_format and returns typed fields next to the prose"""
+        from backend.Agent03.sharia_expert_agent import ShariaExpertAgent
+        reply = {
+            "verdict": "HARAM", "confidence": "MEDIUM", "criteria": [], "ratio_breaches": [],
+            "halal_alternatives": [], "analysis_markdown": "## 🕌 SHARIA VERDICT: HARAM ❌",
+        }
+        client = Mock()
+        client.chat.completions.create.return_value = Mock(
+            choices=[Mock(message=Mock(content=json.dumps(reply)))], usage=None
+        )
+        agent = ShariaExpertAgent("test-key", "gpt-4o", client=client)
+        research = {"financial_data": {"symbol": "XYZ", "sharia_ratios": self.BREACHED_RATIOS}}
+
+        with patch("backend.Agent03.sharia_expert_agent.run_in_executor",
+                   new=AsyncMock(side_effect=lambda pool, fn, *a, **kw: fn(*a, **kw))):
+            result = asyncio.run(agent._analyse_with_ai("XYZ", research, {}))
+
+        kwargs = client.chat.completions.create.call_args.kwargs
+        assert kwargs["response_format"]["type"] == "json_schema"
+        assert result["verdict"] == "HARAM ❌"
+        assert result["confidence_level"] == "MEDIUM"
+        assert result["analysis_text"].startswith("## 🕌 SHARIA VERDICT")
+        assert result["structured"]["ratio_breaches"][0]["ratio"] == "debt_to_market_capitalisation"
+
+    @pytest.mark.skipif(not PROMPT_COMPILER_AVAILABLE, reason="Agent03 modules not available")
+    def test_research_propagates_executor_saturation(self):
+        """Test a full market-io pool surfaces as 503 instead of an empty research result"""
+        from backend.Agent03.sharia_expert_agent import ShariaExpertAgent, ExecutorSaturated
+        agent = ShariaExpertAgent("test-key", "gpt-4o", client=Mock())
+        saturated = AsyncMock(side_effect=ExecutorSaturated("market-io"))
+
+        with patch("backend.Agent03.sharia_expert_agent.run_in_executor", new=saturated):
+            for research in (agent._get_yahoo_finance_info("AAPL"), agent._search_web_company_info("Apple"),
+                             agent._search_company_news("Apple"), agent.search_company_info("Apple")):
+                with pytest.raises(ExecutorSaturated):
+                    asyncio.run(research)
+
+    @pytest.mark.skipif(not PROMPT_COMPILER_AVAILABLE, reason="Agent03 modules not available")
+    def test_statement_fundamentals_cached_per_symbol(self):
+        """Test repeat lookups fetch the profile but reuse the cached statements"""
+        from backend.Agent03.sharia_expert_agent import ShariaExpertAgent
+        agent = ShariaExpertAgent("test-key", "gpt-4o", client=Mock())
+        agent._get_statement_fundamentals = Mock(return_value={"interest_income": 5.0})
+        ticker = Mock(ticker="AAPL", info={"symbol": "AAPL", "marketCap": 1000, "totalRevenue": 200})
+
+        with patch("backend.Agent03.sharia_expert_agent.run_in_executor",
+                   new=AsyncMock(side_effect=lambda pool, fn, *a, **kw: fn(*a, **kw))), \
+                patch("backend.Agent03.sharia_expert_agent.yf", Mock(Ticker=Mock(return_value=ticker))), \
+                patch("backend.Agent03.sharia_expert_agent.get_yahoo_session"):
+            first = asyncio.run(agent._get_yahoo_finance_info("AAPL"))
+            second = asyncio.run(agent._get_yahoo_finance_info("AAPL"))
+
+        assert agent._get_statement_fundamentals.call_count == 1
+        assert first["interest_income"] == second["interest_income"] == 5.0
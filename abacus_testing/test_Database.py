@@ -0,0 +1,293 @@
+import pytest
+import sys
+import time
+import asyncio
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock, Mock, patch
+
+sys.path.append('../backend')
+
+try:
+    from backend.Database import tokens
+    from backend.Database.tokens import create_session_token, verify_session_token
+    DATABASE_TOKENS_AVAILABLE = True
+except ImportError:
+    DATABASE_TOKENS_AVAILABLE = False
+    print("⚠️ Database.tokens not available")
+
+try:
+    from fastapi import HTTPException
+    from fastapi.security import HTTPAuthorizationCredentials
+    from backend.Database.auth import get_current_user, get_optional_user, require_admin, settings as auth_settings
+    from backend.Database.user_cache import UserCache
+    DATABASE_USERS_AVAILABLE = True
+except ImportError:
+    DATABASE_USERS_AVAILABLE = False
+    print("⚠️ Database.user_cache not available")
+
+try:
+    from backend.Database import database
+    DATABASE_ENGINE_AVAILABLE = True
+except ImportError:
+    DATABASE_ENGINE_AVAILABLE = False
+    print("⚠️ Database.database not available")
+
+try:
+    from backend.Database import token_ledger as ledger_module
+    DATABASE_LEDGER_AVAILABLE = True
+except ImportError:
+    DATABASE_LEDGER_AVAILABLE = False
+    print("⚠️ Database.token_ledger not available")
+
+try:
+    from backend.Database.auth import authenticate_user_async, get_password_hash
+    DATABASE_AUTH_AVAILABLE = True
+except ImportError:
+    DATABASE_AUTH_AVAILABLE = False
+    print("⚠️ Database.auth not available")
+
+class TestSessionTokens:
+    """Tests for Database/tokens.py"""
+
+    @pytest.mark.skipif(not DATABASE_TOKENS_AVAILABLE, reason="Database.tokens not available")
+    def test_round_trip(self):
+        """Test a fresh token verifies and carries the user claims"""
+        issued = create_session_token(7, "user@example.com", "User", ttl_minutes=5)
+        assert issued["token_type"] == "bearer"
+        assert issued["expires_in"] == 300
+
+        claims = verify_session_token(issued["access_token"])
+        assert claims["uid"] == 7
+        assert claims["sub"] == "user@example.com"
+
+    @pytest.mark.skipif(not DATABASE_TOKENS_AVAILABLE, reason="Database.tokens not available")
+    def test_rejects_tampered_and_expired(self):
+        """Test signature and expiry checks"""
+        token = create_session_token(7, "user@example.com")["access_token"]
+        payload, signature = token.split(".")
+        forged = create_session_token(1, "admin@example.com")["access_token"].split(".")[0]
+
+        assert verify_session_token(f"{forged}.{signature}") is None
+        assert verify_session_token("not-a-token") is None
+        assert verify_session_token("") is None
+
+        with patch.object(tokens.time, "time", return_value=time.time() + 24 * 3600):
+            assert verify_session_token(token) is None
+
+class TestAsyncAuthentication:
+    """Tests for the executor-backed helpers in Database/auth.py"""
+
+    @pytest.mark.skipif(not DATABASE_AUTH_AVAILABLE, reason="Database.auth not available")
+    def test_verify_does_not_block_event_loop(self):
+        """Test bcrypt runs off the loop: a concurrent ticker keeps running"""
+        user = Mock(password_hash=get_password_hash("secret"), email="user@example.com")
+        db = Mock()  # AsyncSession: execute() is awaited
+        db.execute = AsyncMock(return_value=Mock(**{"scalars.return_value.first.return_value": user}))
+
+        async def scenario():
+            ticks = 0
+
+            async def ticker():
+                nonlocal ticks
+                while True:
+                    await asyncio.sleep(0.005)
+                    ticks += 1
+
+            task = asyncio.create_task(ticker())
+            started = time.perf_counter()
+            results = await asyncio.gather(
+                authenticate_user_async(db, "user@example.com", "secret"),
+                authenticate_user_async(db, "user@example.com", "wrong"),
+            )
+            elapsed = time.perf_counter() - started
+            task.cancel()
+            return results, ticks, elapsed
+
+        (ok, bad), ticks, elapsed = asyncio.run(scenario())
+        assert ok is user
+        assert bad is False
+        # The loop kept ticking roughly every 5 ms while bcrypt ran
+        assert ticks >= elapsed / 0.005 * 0.3
+
+class TestCurrentUser:
+    """Tests for token-based get_current_user and the profile cache"""
+
+    @pytest.mark.skipif(not DATABASE_USERS_AVAILABLE, reason="Database.user_cache not available")
+    def test_current_user_from_token(self):
+        """Test the caller comes from the token claims, with 401 for bad tokens"""
+        token = create_session_token(7, "user@example.com", "User")["access_token"]
+        user = get_current_user(HTTPAuthorizationCredentials(scheme="Bearer", credentials=token))
+        assert (user.id, user.email, user.name) == (7, "user@example.com", "User")
+
+        assert get_optional_user(None) is None
+        for credentials in (None, HTTPAuthorizationCredentials(scheme="Bearer", credentials="forged.token")):
+            with pytest.raises(HTTPException) as error:
+                get_current_user(credentials)
+            assert error.value.status_code == 401
+
+    @pytest.mark.skipif(not DATABASE_USERS_AVAILABLE, reason="Database.user_cache not available")
+    def test_require_admin_fails_closed(self):
+        """Test admin routes are closed without ADMIN_API_KEY unless opted in for development"""
+        with patch.object(auth_settings, "ADMIN_API_KEY", ""), patch.object(auth_settings, "ENVIRONMENT", "development"):
+            with pytest.raises(HTTPException) as error:
+                require_admin(None)
+            assert error.value.status_code == 403
+            with patch.object(auth_settings, "ADMIN_OPEN_WITHOUT_KEY", True):
+                assert require_admin(None) is True
+
+        with patch.object(auth_settings, "ADMIN_API_KEY", "secret"):
+            assert require_admin("secret") is True
+            with pytest.raises(HTTPException):
+                require_admin("wrong")
+
+    @pytest.mark.skipif(not DATABASE_USERS_AVAILABLE, reason="Database.user_cache not available")
+    def test_user_cache_ttl(self):
+        """Test profiles are served from cache until the TTL passes"""
+        row = Mock(id=7, email="user@example.com", created_at=None)
+        row.name = "User"
+        db = Mock()
+        db.get.return_value = row
+        cache = UserCache(ttl_seconds=60, max_entries=2)
+
+        assert cache.get(db, 7)["email"] == "user@example.com"
+        assert cache.get(db, 7)["name"] == "User"
+        assert db.get.call_count == 1
+        assert cache.stats()["hits"] == 1
+
+        with patch("backend.Database.user_cache.time.monotonic", return_value=time.monotonic() + 120):
+            cache.get(db, 7)
+        assert db.get.call_count == 2
+
+    @pytest.mark.skipif(not DATABASE_USERS_AVAILABLE, reason="Database.user_cache not available")
+    def test_user_cache_async_loads_misses_only(self):
+        """Test async lookups await the session on a miss and skip it on a hit"""
+        row = Mock(id=7, email="user@example.com", created_at=None)
+        row.name = "User"
+        db = Mock()
+        db.get = AsyncMock(return_value=row)
+        cache = UserCache(ttl_seconds=60)
+
+        assert asyncio.run(cache.get_async(db, 7))["email"] == "user@example.com"
+        assert asyncio.run(cache.get_async(db, 7))["name"] == "User"
+        assert db.get.await_count == 1
+
+class TestEngineConfiguration:
+    """Tests for the settings-driven engine in Database/database.py"""
+
+    @pytest.mark.skipif(not DATABASE_ENGINE_AVAILABLE, reason="Database.database not available")
+    def test_file_sqlite_uses_wal_and_pool(self, tmp_path):
+        """Test file databases get a sized pool and WAL on every connection"""
+        engine = database.build_engine(f"sqlite:///{tmp_path / 'users.db'}")
+        with engine.connect() as connection:
+            assert connection.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+            assert connection.exec_driver_sql("PRAGMA busy_timeout").scalar() == database.settings.SQLITE_BUSY_TIMEOUT_MS
+        assert engine.pool.size() == database.settings.DB_POOL_SIZE
+        engine.dispose()
+
+    @pytest.mark.skipif(not DATABASE_ENGINE_AVAILABLE, reason="Database.database not available")
+    def test_urls_and_options(self):
+        """Test async URL derivation and per-backend pool options"""
+        assert database.async_database_url("sqlite:///./x.db") == "sqlite+aiosqlite:///./x.db"
+        assert database.async_database_url("postgresql://u:p@host/db") == "postgresql+asyncpg://u:p@host/db"
+        assert database.engine_options("sqlite://")["poolclass"] is database.StaticPool
+        postgres = database.engine_options("postgresql://u:p@host/db")
+        assert postgres["pool_pre_ping"] and postgres["pool_size"] == database.settings.DB_POOL_SIZE
+
+class TestUserQueries:
+    """Tests for the aggregate and keyset user queries"""
+
+    @pytest.fixture
+    def session(self):
+        from sqlalchemy.orm import sessionmaker
+        engine = database.build_engine("sqlite://")
+        database.User.__table__.create(engine)
+        db = sessionmaker(bind=engine)()
+        db.add_all([
+            database.User(name=f"User {i}", email=f"user{i}@example.com",
+                          password_hash="$2b$12$" + "x" * 53 if i % 3 else "a" * 64)
+            for i in range(10)
+        ])
+        db.commit()
+        yield db
+        db.close()
+
+    @pytest.mark.skipif(not DATABASE_ENGINE_AVAILABLE, reason="Database.database not available")
+    def test_hash_counts_in_one_query(self, session):
+        """Test the aggregate counts match the rows"""
+        counts = database._hash_counts(session)
+        assert counts == {"total": 10, "bcrypt": 6, "sha256": 4, "invalid": 0}
+
+    @pytest.mark.skipif(not DATABASE_ENGINE_AVAILABLE, reason="Database.database not available")
+    def test_keyset_pages_cover_every_user_once(self, session):
+        """Test walking pages by cursor visits each user exactly once"""
+        seen, cursor = [], None
+        while True:
+            rows = session.execute(database.users_page_statement(4, after_id=cursor)).all()
+            seen.extend(r.id for r in rows)
+            if len(rows) < 4:
+                break
+            cursor = rows[-1].id
+        assert seen == sorted(set(seen)) and len(seen) == 10
+
+        future = datetime.utcnow() + timedelta(days=1)
+        assert session.execute(database.users_page_statement(4, created_from=future)).all() == []
+
+    @pytest.mark.skipif(not (DATABASE_ENGINE_AVAILABLE and DATABASE_USERS_AVAILABLE), reason="Database modules not available")
+    def test_user_changes_invalidate_cached_profile(self, session):
+        """Test a password change or deletion drops the user's cached profile"""
+        from sqlalchemy.orm import sessionmaker
+        from backend.Database.user_cache import user_cache
+        user = session.query(database.User).filter_by(email="user1@example.com").one()
+        with patch.object(database, "SessionLocal", sessionmaker(bind=session.get_bind())):
+            user_cache.put({"id": user.id, "name": user.name, "email": user.email, "created_at": None})
+            assert database.update_user_password("user1@example.com", "new-secret")
+            assert user.id not in user_cache._entries
+
+            user_cache.put({"id": user.id, "name": user.name, "email": user.email, "created_at": None})
+            assert database.delete_user_by_email("user1@example.com")
+            assert user.id not in user_cache._entries
+
+class TestTokenLedger:
+    """Tests for Database/token_ledger.py"""
+
+    @pytest.fixture
+    def ledger(self):
+        from sqlalchemy.orm import sessionmaker
+        engine = database.build_engine("sqlite://")
+        return ledger_module.TokenLedger(session_factory=sessionmaker(bind=engine), flush_seconds=60, max_pending=100)
+
+    @pytest.mark.skipif(not DATABASE_LEDGER_AVAILABLE, reason="Database.token_ledger not available")
+    def test_batched_calls_are_tagged_and_reported(self, ledger):
+        """Test calls wait in memory, flush in one batch and group by route and user"""
+        with ledger_module.usage_tags(user_id=7, session_id="s1"):
+            ledger.record("/chat", "gpt-4o", 100, 20, 50, 250.0)
+            ledger.record("/chat", "gpt-4o", 60, 20, 0, 150.0)
+        ledger.record("/stock/analyze-sync", "gpt-4o", 10, 5)
+        assert ledger.stats()["pending"] == 3
+
+        assert ledger.flush() == 3
+        by_route = {row["route"]: row for row in ledger.report("route")}
+        assert by_route["/chat"]["calls"] == 2
+        assert by_route["/chat"]["total_tokens"] == 200
+        assert by_route["/chat"]["avg_latency_ms"] == 200.0
+        assert [row["user"] for row in ledger.report("user", user_id=7)] == [7]
+
+    @pytest.mark.skipif(not DATABASE_LEDGER_AVAILABLE, reason="Database.token_ledger not available")
+    def test_budget_degrades_model_then_context(self, ledger):
+        """Test spend past the daily budget switches model, then summary-only"""
+        settings = ledger_module.settings
+        with patch.object(settings, "LLM_DAILY_TOKEN_BUDGET", 100), \
+             patch.object(settings, "LLM_USER_TOKEN_BUDGETS", {8: 0}), \
+             patch.object(settings, "LLM_BUDGET_SUMMARY_ONLY_FACTOR", 2.0):
+            with ledger_module.usage_tags(user_id=7):
+                assert ledger.select_model("gpt-4o") == "gpt-4o"
+                ledger.record("/chat", "gpt-4o", 80, 40)
+                assert ledger.select_model("gpt-4o") == settings.LLM_BUDGET_FALLBACK_MODEL
+                ledger.flush()
+                ledger.record("/chat", "gpt-4o", 80, 0)
+                status = ledger.budget_status(7)
+            assert status["used_today"] == 200
+            assert status["state"] == ledger_module.BUDGET_SUMMARY_ONLY
+            # Per-user override (0 = unlimited) and anonymous callers are never degraded
+            assert ledger.budget_status(8)["state"] == ledger_module.BUDGET_OK
+            assert ledger.budget_status(None)["state"] == ledger_module.BUDGET_OK
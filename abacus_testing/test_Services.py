@@ -0,0 +1,446 @@
+import pytest
+import sys
+import threading
+import asyncio
+
+sys.path.append('../backend')
+
+try:
+    from backend.Services.executors import BoundedExecutor, ExecutorSaturated
+    SERVICES_EXECUTORS_AVAILABLE = True
+except ImportError:
+    SERVICES_EXECUTORS_AVAILABLE = False
+    print("⚠️ Services.executors not available")
+
+try:
+    from backend.Services.agent_registry import AgentRegistry
+    SERVICES_REGISTRY_AVAILABLE = True
+except ImportError:
+    SERVICES_REGISTRY_AVAILABLE = False
+    print("⚠️ Services.agent_registry not available")
+
+try:
+    from backend.Services import http_clients
+    SERVICES_HTTP_AVAILABLE = True
+except ImportError:
+    SERVICES_HTTP_AVAILABLE = False
+    print("⚠️ Services.http_clients not available")
+
+try:
+    from backend.Services import metrics as metrics_module
+    SERVICES_METRICS_AVAILABLE = True
+except ImportError:
+    SERVICES_METRICS_AVAILABLE = False
+    print("⚠️ Services.metrics not available")
+
+try:
+    from backend.Services import tracing
+    SERVICES_TRACING_AVAILABLE = True
+except ImportError:
+    SERVICES_TRACING_AVAILABLE = False
+    print("⚠️ Services.tracing not available")
+
+try:
+    from backend.Services import lazy_imports
+    SERVICES_LAZY_AVAILABLE = True
+except ImportError:
+    SERVICES_LAZY_AVAILABLE = False
+    print("⚠️ Services.lazy_imports not available")
+
+try:
+    from backend.Services.health_monitor import HealthMonitor, SnapshotCache
+    from backend.config import settings as backend_settings
+    SERVICES_HEALTH_AVAILABLE = True
+except ImportError:
+    SERVICES_HEALTH_AVAILABLE = False
+    print("⚠️ Services.health_monitor not available")
+
+class TestBoundedExecutor:
+    """Tests for Services/executors.py"""
+
+    @pytest.mark.skipif(not SERVICES_EXECUTORS_AVAILABLE, reason="Services.executors not available")
+    def test_submit_returns_result(self):
+        """Test that submitted work runs and is counted"""
+        executor = BoundedExecutor("test", max_workers=2, max_queue=2)
+
+        assert executor.submit(lambda x: x * 2, 21).result(timeout=5) == 42
+
+        stats = executor.stats()
+        assert stats["submitted"] == 1
+        assert stats["completed"] == 1
+        assert stats["rejected"] == 0
+        executor.shutdown()
+
+    @pytest.mark.skipif(not SERVICES_EXECUTORS_AVAILABLE, reason="Services.executors not available")
+    def test_rejects_when_queue_full(self):
+        """Test back-pressure once workers and queue slots are used up"""
+        executor = BoundedExecutor("test", max_workers=1, max_queue=1, reject_status=429)
+        release = threading.Event()
+
+        running = executor.submit(release.wait, 5)
+        queued = executor.submit(release.wait, 5)
+
+        with pytest.raises(ExecutorSaturated) as excinfo:
+            executor.submit(release.wait, 5)
+        assert excinfo.value.status_code == 429
+        assert "Retry-After" in excinfo.value.headers
+
+        stats = executor.stats()
+        assert stats["in_flight"] == 2
+        assert stats["saturation"] == 1.0
+        assert stats["rejected"] == 1
+
+        release.set()
+        running.result(timeout=5)
+        queued.result(timeout=5)
+
+        # Capacity is released once work finishes
+        assert executor.submit(lambda: "ok").result(timeout=5) == "ok"
+        executor.shutdown()
+
+    @pytest.mark.skipif(not SERVICES_EXECUTORS_AVAILABLE, reason="Services.executors not available")
+    def test_run_awaits_result(self):
+        """Test the async helper used by routes"""
+        executor = BoundedExecutor("test", max_workers=1, max_queue=0)
+
+        result = asyncio.run(executor.run(sum, [1, 2, 3]))
+
+        assert result == 6
+        executor.shutdown()
+
+class TestAgentRegistry:
+    """Tests for Services/agent_registry.py"""
+
+    @pytest.mark.skipif(not SERVICES_REGISTRY_AVAILABLE, reason="Services.agent_registry not available")
+    def test_lazy_single_build(self):
+        """Test entries are built on first use and then shared"""
+        registry = AgentRegistry()
+        builds = []
+        registry.register("client", lambda: builds.append(1) or {"name": "shared"})
+
+        assert registry.peek("client") is None
+        assert registry.status()["client"]["state"] == "pending"
+
+        first = registry.get("client")
+        assert registry.get("client") is first
+        assert len(builds) == 1
+        assert registry.status()["client"]["state"] == "ready"
+
+    @pytest.mark.skipif(not SERVICES_REGISTRY_AVAILABLE, reason="Services.agent_registry not available")
+    def test_proxy_and_warm_up(self):
+        """Test the proxy resolves lazily and warm_up records failures"""
+        registry = AgentRegistry()
+        registry.register("text", lambda: "abc")
+        registry.register("broken", lambda: 1 / 0)
+
+        proxy = registry.proxy("text")
+        assert registry.peek("text") is None
+        assert proxy.upper() == "ABC"
+
+        asyncio.run(registry.warm_up())
+        assert registry.status()["broken"]["state"] == "error"
+
+class TestHttpClients:
+    """Tests for Services/http_clients.py"""
+
+    @pytest.mark.skipif(not SERVICES_HTTP_AVAILABLE, reason="Services.http_clients not available")
+    def test_pooled_session_reuses_connection(self):
+        """Test keep-alive: repeated requests share one connection"""
+        import http.server
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"ok")
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            session = http_clients._build_pooled_session("duckduckgo")
+            url = f"http://127.0.0.1:{server.server_address[1]}/"
+            for _ in range(3):
+                assert session.get(url).text == "ok"
+
+            pool = http_clients._pool_metrics(session)
+            assert pool["connections_opened"] == 1
+            assert pool["requests_served"] == 3
+            assert pool["reused"] == 2
+        finally:
+            server.shutdown()
+
+    @pytest.mark.skipif(not SERVICES_HTTP_AVAILABLE, reason="Services.http_clients not available")
+    def test_upstream_redirect_keeps_path(self, monkeypatch):
+        """Test load-test redirect: upstream URLs go to the stand-in with path and query intact"""
+        import http.server
+        seen = []
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                seen.append(self.path)
+                self.send_response(200)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"ok")
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            mock_url = f"http://127.0.0.1:{server.server_address[1]}"
+            assert http_clients._redirect("https://duckduckgo.com/html/?q=x") == "https://duckduckgo.com/html/?q=x"
+
+            monkeypatch.setattr(http_clients.settings, "UPSTREAM_REDIRECT_URL", mock_url)
+            assert http_clients._redirect("https://query2.finance.yahoo.com/v1/test/getcrumb") == f"{mock_url}/v1/test/getcrumb"
+            assert http_clients.get_ddgs() is None
+
+            session = http_clients._build_pooled_session("duckduckgo")
+            assert session.get("https://duckduckgo.com/html/?q=AAPL").text == "ok"
+            assert seen == ["/html/?q=AAPL"]
+        finally:
+            server.shutdown()
+
+    @pytest.mark.skipif(not (SERVICES_HTTP_AVAILABLE and http_clients.CURL_CFFI_AVAILABLE),
+                        reason="curl_cffi not available")
+    def test_yahoo_session_retries_rate_limit(self):
+        """Test a 429 is retried after the Retry-After delay"""
+        import http.server
+        statuses = [429, 200]
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(statuses.pop(0))
+                self.send_header("Retry-After", "0")
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"ok")
+
+            def log_message(self, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            session = http_clients._build_yahoo_session()
+            response = session.get(f"http://127.0.0.1:{server.server_address[1]}/")
+            assert response.status_code == 200
+            assert statuses == []
+        finally:
+            server.shutdown()
+
+    @pytest.mark.skipif(not (SERVICES_HTTP_AVAILABLE and http_clients.DDGS_AVAILABLE), reason="ddgs not available")
+    def test_ddgs_instance_per_thread(self):
+        """Test each thread gets its own DDGS instance"""
+        instances = []
+        worker = threading.Thread(target=lambda: instances.append(http_clients.get_ddgs()))
+        worker.start()
+        worker.join()
+
+        assert http_clients.get_ddgs() is http_clients.get_ddgs()
+        assert instances[0] is not http_clients.get_ddgs()
+
+
+def test_import_availability():
+    """Test availability of Services modules"""
+    print(f"Services.executors available: {SERVICES_EXECUTORS_AVAILABLE}")
+    print(f"Services.agent_registry available: {SERVICES_REGISTRY_AVAILABLE}")
+    print(f"Services.http_clients available: {SERVICES_HTTP_AVAILABLE}")
+
+    if not (SERVICES_EXECUTORS_AVAILABLE and SERVICES_REGISTRY_AVAILABLE and SERVICES_HTTP_AVAILABLE):
+        pytest.skip("Services modules not available")
+
+class TestMetrics:
+    """Tests for Services/metrics.py"""
+
+    @pytest.mark.skipif(not SERVICES_METRICS_AVAILABLE, reason="Services.metrics not available")
+    def test_histogram_exposition(self):
+        """Test cumulative buckets, sum and count in the text format"""
+        registry = metrics_module.MetricsRegistry(prefix="t_")
+        latency = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            latency.observe(value, route="/a")
+
+        text = registry.render()
+        assert "# TYPE t_latency_seconds histogram" in text
+        assert 't_latency_seconds_bucket{route="/a",le="0.1"} 1' in text
+        assert 't_latency_seconds_bucket{route="/a",le="1"} 2' in text
+        assert 't_latency_seconds_bucket{route="/a",le="+Inf"} 3' in text
+        assert 't_latency_seconds_count{route="/a"} 3' in text
+
+    @pytest.mark.skipif(not SERVICES_METRICS_AVAILABLE, reason="Services.metrics not available")
+    def test_middleware_labels_route_template(self):
+        """Test requests are labelled by route template and token usage by route"""
+        from fastapi import FastAPI
+        from fastapi.testclient import TestClient
+
+        app = FastAPI()
+        app.add_middleware(metrics_module.MetricsMiddleware)
+
+        @app.get("/items/{item_id}")
+        async def item(item_id: str):
+            metrics_module.record_llm_usage({"prompt_tokens": 10, "completion_tokens": 5}, "test-model")
+            return {"id": item_id}
+
+        client = TestClient(app)
+        for item_id in ("a", "b"):
+            assert client.get(f"/items/{item_id}").status_code == 200
+
+        seconds = metrics_module.HTTP_REQUEST_SECONDS
+        assert seconds.count(method="GET", route="/items/{item_id}", status=200) >= 2
+        assert seconds.count(method="GET", route="/items/a", status=200) == 0
+        tokens = metrics_module.LLM_TOKENS
+        assert tokens.value(route="/items/{item_id}", model="test-model", kind="prompt") >= 20
+
+class TestTracing:
+    """Tests for Services/tracing.py"""
+
+    @pytest.mark.skipif(not SERVICES_TRACING_AVAILABLE, reason="Services.tracing not available")
+    def test_stages_nest_under_root(self, monkeypatch):
+        """Test stage and decorated spans form one trace, kept with a breakdown when slow"""
+        tracer = tracing.Tracer(enabled=True, sample_rate=1.0, slow_seconds=0, slow_keep=5)
+        monkeypatch.setattr(tracing, "tracer", tracer)
+
+        @tracing.traced("fetch")
+        async def fetch():
+            await asyncio.sleep(0)
+
+        @tracing.traced("analysis")
+        def analysis():
+            stages = tracing.StageSpans("stock")
+            stages.start("data")
+            asyncio.run(fetch())
+            stages.start("recommendation")
+            stages.close()
+
+        analysis()
+        trace = tracer.slow_traces()[0]
+        spans = {s["name"]: s for s in trace["spans"]}
+        assert trace["name"] == "analysis"
+        assert set(spans) == {"analysis", "stock.data", "fetch", "stock.recommendation"}
+        assert spans["fetch"]["parent_id"] == spans["stock.data"]["span_id"]
+        assert spans["stock.recommendation"]["parent_id"] == spans["analysis"]["span_id"]
+        assert tracing.current_span() is None
+
+    @pytest.mark.skipif(not SERVICES_TRACING_AVAILABLE, reason="Services.tracing not available")
+    def test_traceparent_and_otlp_file_export(self, tmp_path):
+        """Test an incoming traceparent is continued and written as OTLP/JSON"""
+        import json
+        remote = tracing.parse_traceparent("00-" + "ab" * 16 + "-" + "cd" * 8 + "-01")
+        assert remote == ("ab" * 16, "cd" * 8, True)
+        assert tracing.parse_traceparent("00-" + "0" * 32 + "-" + "cd" * 8 + "-01") is None
+        assert tracing.parse_traceparent("garbage") is None
+
+        exporter = tracing.JsonFileExporter(str(tmp_path / "traces.jsonl"))
+        tracer = tracing.Tracer(enabled=True, exporter=exporter, slow_seconds=60)
+        with pytest.raises(ValueError):
+            with tracer.span("GET /items", remote=remote, kind=2):
+                with tracer.span("lookup", {"item": 1}):
+                    raise ValueError("boom")
+        tracer.shutdown()
+
+        payload = json.loads((tmp_path / "traces.jsonl").read_text().splitlines()[0])
+        spans = payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert {s["traceId"] for s in spans} == {"ab" * 16}
+        root = next(s for s in spans if s["name"] == "GET /items")
+        assert root["parentSpanId"] == "cd" * 8
+        assert all(s["status"]["code"] == tracing.STATUS_ERROR for s in spans)
+        assert tracer.slow_traces() == []
+
+
+class TestLazyImports:
+    """Tests for Services/lazy_imports.py"""
+
+    @pytest.mark.skipif(not SERVICES_LAZY_AVAILABLE, reason="Services.lazy_imports not available")
+    def test_import_deferred_until_first_use(self, tmp_path, monkeypatch):
+        """Test the module loads on first attribute access, runs on_load once and can be patched"""
+        from unittest.mock import patch
+        (tmp_path / "abacus_lazy_probe.py").write_text("VALUE = 1\n")
+        monkeypatch.syspath_prepend(str(tmp_path))
+        monkeypatch.delitem(sys.modules, "abacus_lazy_probe", raising=False)
+        loads = []
+
+        probe = lazy_imports.lazy_import("abacus_lazy_probe", on_load=lambda m: loads.append(m.VALUE))
+        assert "abacus_lazy_probe" not in sys.modules
+        assert lazy_imports.lazy_import_status()["abacus_lazy_probe"]["state"] == "pending"
+
+        assert probe.VALUE == 1
+        assert probe.VALUE == 1
+        assert loads == [1]
+        assert lazy_imports.lazy_import_status()["abacus_lazy_probe"]["state"] == "loaded"
+        with patch.object(probe, "VALUE", 2):
+            assert sys.modules["abacus_lazy_probe"].VALUE == 2
+        assert probe.VALUE == 1
+        assert lazy_imports.is_available("abacus_lazy_probe")
+        assert not lazy_imports.is_available("abacus_no_such_module")
+
+    @pytest.mark.skipif(not SERVICES_LAZY_AVAILABLE, reason="Services.lazy_imports not available")
+    def test_parse_importtime(self):
+        """Test -X importtime output is split into module, timings and depth"""
+        output = "\n".join([
+            "import time: self [us] | cumulative | imported package",
+            "import time:       120 |        120 |   json.decoder",
+            "import time:       300 |       2420 | json",
+        ])
+        rows = lazy_imports.parse_importtime(output)
+        assert rows == [
+            {"module": "json.decoder", "self_ms": 0.1, "cumulative_ms": 0.1, "depth": 1},
+            {"module": "json", "self_ms": 0.3, "cumulative_ms": 2.4, "depth": 0},
+        ]
+
+class TestHealthMonitor:
+    """Tests for Services/health_monitor.py"""
+
+    @pytest.mark.skipif(not SERVICES_HEALTH_AVAILABLE, reason="Services.health_monitor not available")
+    def test_critical_upstream_down_fails_readiness(self):
+        """Test repeated probe failures mark a critical upstream down and recovery clears it"""
+        monitor = HealthMonitor()
+        reachable = {"value": False}
+
+        def check():
+            if not reachable["value"]:
+                raise ConnectionError("refused")
+
+        monitor.register("llm", check, critical=True)
+        monitor.register("search", lambda: None)
+        monitor.register("unset", check, enabled=lambda: False, critical=True)
+        assert monitor.upstream("llm")["status"] == "unknown"
+
+        for _ in range(backend_settings.HEALTH_FAILURE_THRESHOLD):
+            asyncio.run(monitor.probe())
+        snapshot = monitor.snapshot()
+        assert snapshot["upstreams"]["llm"]["status"] == "down"
+        assert snapshot["upstreams"]["llm"]["error_rate"] == 1.0
+        assert "ConnectionError" in snapshot["upstreams"]["llm"]["last_error"]
+        assert snapshot["upstreams"]["search"]["status"] == "up"
+        assert snapshot["upstreams"]["unset"]["status"] == "disabled"
+        assert monitor.readiness() == (False, ["llm"])
+
+        reachable["value"] = True
+        asyncio.run(monitor.probe(["llm"]))
+        assert monitor.upstream("llm")["status"] == "degraded"  # earlier failures still in the window
+        assert monitor.readiness() == (True, [])
+
+    @pytest.mark.skipif(not SERVICES_HEALTH_AVAILABLE, reason="Services.health_monitor not available")
+    def test_snapshot_cache_rebuilds_on_state_change(self):
+        """Test cached bodies are reused until the state key changes or they expire"""
+        cache = SnapshotCache()
+        builds = []
+
+        def build():
+            builds.append(1)
+            return {"build": len(builds)}
+
+        assert cache.get_json("ready", ("a", 1), build) == b'{"build": 1}'
+        assert cache.get_json("ready", ("a", 1), build) == b'{"build": 1}'
+        assert cache.get_json("ready", ("a", 2), build) == b'{"build": 2}'
+        assert cache.get("islamic", 1, build, max_age=0) == {"build": 3}
+        assert cache.get("islamic", 1, build, max_age=0) == {"build": 4}
+        assert len(builds) == 4
@@ -7,6 +7,6 @@ This module provides AI-powered financial analysis and chat functionality.
 from .functions import *
 
 __all__ = [
-    'coerce_numeric', 'read_excel_any', 'summarise_dataframe', 
+    'coerce_numeric', 'optimise_dataframe_memory', 'read_excel_any', 'summarise_dataframe', 
     'sample_df', 'call_openai', 'make_chart'
 ]
@@ -4,11 +4,6 @@ import os
 import io
 import random
 import base64
-import matplotlib.pyplot as plt
-import seaborn as sns
-import plotly.graph_objects as go
-import plotly.express as px
-from plotly.utils import PlotlyJSONEncoder
 import numpy as np
 from pandas.api.types import (
     is_numeric_dtype,
@@ -19,24 +14,38 @@ import logging
 import time
 import json
 from datetime import datetime
-from openai import OpenAI, OpenAIError
-import openai
+from Services.agent_registry import agent_registry
+from Services.lazy_imports import lazy_import, is_available
+from Services.metrics import CHART_RENDER_SECONDS
+from Services.tracing import traced, span, annotate
+from Database.token_ledger import token_ledger
 
 # --- Globals & Configuration ---
 now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 logger = logging.getLogger("finbot")
 from config import settings
 
-# Configure OpenAI client with timeout and retry settings
-client = OpenAI(
-    api_key=settings.OPENAI_API_KEY,
-    timeout=60.0,  # 60 second timeout
-    max_retries=3  # Built-in retry mechanism
-)
+# Arrow-backed strings for high-cardinality text columns (optional)
+PYARROW_AVAILABLE = is_available("pyarrow")
+
+# Shared OpenAI client (pooled HTTP, timeouts/retries from settings), created on first use
+client = agent_registry.proxy("openai_client")
 
+# --- Charting Stack (imported on first chart, or by the post-startup warm-up) ---
+# Figures are built on their own Agg canvas rather than through pyplot, whose global
+# figure manager is not thread-safe and keeps every unclosed figure alive
+def _apply_chart_style(figure_module):
+    from matplotlib import style
+    style.use('seaborn-v0_8')
+    sns.set_palette("husl")
 
-plt.style.use('seaborn-v0_8')
-sns.set_palette("husl")
+sns = lazy_import("seaborn")
+mpl_figure = lazy_import("matplotlib.figure", on_load=_apply_chart_style)
+mpl_agg = lazy_import("matplotlib.backends.backend_agg")
+go = lazy_import("plotly.graph_objects")
+px = lazy_import("plotly.express")
+plotly_utils = lazy_import("plotly.utils")
+openai = lazy_import("openai")
 
 SYSTEM_PROMPT = (
     # System prompt for OpenAI agent
@@ -114,9 +123,86 @@ def coerce_numeric(col: pd.Series) -> pd.Series:
             return nums
     return col
 
+# --- DataFrame Memory Optimisation ---
+_DATE_NAME_RE = re.compile(r"(date|time|posted|booked|settled|day)", re.I)
+_DATE_VALUE_RE = re.compile(r"^\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}([ T]\d{1,2}:\d{2}(:\d{2})?)?$")
+
+def _parse_dates(col: pd.Series) -> pd.Series | None:
+    """datetime64 version of a column of date strings, or None if any value does not parse"""
+    values = col.dropna()
+    if values.empty or not _DATE_NAME_RE.search(str(col.name)):
+        return None
+    if not values.head(50).astype(str).str.strip().str.match(_DATE_VALUE_RE).all():
+        return None
+    # ISO first; anything else (01/02/2024) is read day-first, as on UK statements
+    for options in ({"format": "ISO8601"}, {"dayfirst": True}):
+        parsed = pd.to_datetime(col, errors="coerce", **options)
+        if parsed.notna().sum() == len(values):
+            return parsed
+    return None
+
+def _compact_strings(col: pd.Series) -> pd.Series:
+    """category for repetitive text (merchants, categories), Arrow strings for the rest when available"""
+    values = col.dropna()
+    if len(values) and values.nunique() <= settings.DATAFRAME_CATEGORY_MAX_RATIO * len(values):
+        return col.astype("category")
+    if PYARROW_AVAILABLE:
+        return col.astype("string[pyarrow]")
+    return col
+
+def _downcast_numeric(col: pd.Series) -> pd.Series:
+    """int64 -> int32 when in range; float64 -> float32 only when every value survives the round trip"""
+    if pd.api.types.is_integer_dtype(col) and col.dtype.itemsize > 4:
+        info = np.iinfo(np.int32)
+        if col.empty or (col.min() >= info.min and col.max() <= info.max):
+            return col.astype("int32")
+    elif pd.api.types.is_float_dtype(col) and col.dtype.itemsize > 4:
+        narrow = col.astype("float32")
+        if ((narrow.astype("float64") == col) | col.isna()).all():
+            return narrow
+    return col
+
+@traced("dataset.optimise")
+def optimise_dataframe_memory(df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+    """
+    Shrink an uploaded DataFrame for the session cache: date strings to
+    datetime64, repetitive text to category, numerics downcast where lossless.
+    Returns the new frame and a before/after memory report.
+    """
+    before = int(df.memory_usage(deep=True).sum())
+    if not settings.DATAFRAME_OPTIMISE_MEMORY:
+        return df, {"bytes_before": before, "bytes_after": before, "reduction": 1.0, "converted": {}}
+
+    optimised, converted = {}, {}
+    for name in df.columns:
+        col = df[name]
+        new = col
+        if col.dtype == "object" and pd.api.types.infer_dtype(col, skipna=True) == "string":
+            dates = _parse_dates(col)
+            new = dates if dates is not None else _compact_strings(col)
+        elif is_numeric_dtype(col) and not pd.api.types.is_bool_dtype(col):
+            new = _downcast_numeric(col)
+        if new.dtype != col.dtype:
+            converted[str(name)] = f"{col.dtype} -> {new.dtype}"
+        optimised[name] = new
+
+    result = pd.DataFrame(optimised, index=df.index) if converted else df
+    after = int(result.memory_usage(deep=True).sum())
+    report = {
+        "bytes_before": before,
+        "bytes_after": after,
+        "reduction": round(before / after, 2) if after else 1.0,
+        "converted": converted,
+    }
+    annotate({"dataset.bytes_before": before, "dataset.bytes_after": after})
+    logger.info(f"🗜️ DataFrame memory {before / 1e6:.2f} MB -> {after / 1e6:.2f} MB ({report['reduction']}x)")
+    return result, report
+
+@traced("dataset.read")
 def read_excel_any(data: bytes, filename: str) -> pd.DataFrame:
     """Read any Excel or CSV file and coerce columns to numeric if possible."""
     ext = os.path.splitext(filename)[-1].lower()
+    annotate({"file.extension": ext, "file.bytes": len(data)})
     if ext == ".csv":
         try:
             return pd.read_csv(io.BytesIO(data))
@@ -177,6 +263,7 @@ def _with_system_prompt(messages: list[dict]) -> list[dict]:
         return [{"role": "system", "content": SYSTEM_PROMPT}] + messages
     return messages
 
+@traced("openai.chat")
 def call_openai(messages: list[dict]) -> str:
     """Wrapper that injects the system prompt and returns the assistant's reply."""
     prepared = _with_system_prompt(messages)
@@ -189,13 +276,13 @@ def call_openai(messages: list[dict]) -> str:
     for attempt in range(4):
         try:
             logger.info(f"OpenAI API call attempt {attempt + 1}/4")
+            annotate({"llm.attempts": attempt + 1})
             logger.info("Prompt sent to OpenAI:\n%s", json.dumps(prepared, indent=2, ensure_ascii=False))
             
             resp = client.chat.completions.create(
-                model=settings.MODEL_NAME,
+                model=token_ledger.select_model(settings.MODEL_NAME),
                 messages=prepared,
-                temperature=0.3,
-                timeout=60  # Explicit timeout per request
+                temperature=0.3
             )
             logger.info("OpenAI API call successful")
             return resp.choices[0].message.content
@@ -273,7 +360,7 @@ def create_interactive_chart(df: pd.DataFrame, kind: str, columns: list[str], ti
         
         if kind == "bar":
             if cats and nums:
-                gb = df.groupby(cats[0])[nums[0]].sum().reset_index()
+                gb = df.groupby(cats[0], observed=True)[nums[0]].sum().reset_index()
                 fig = px.bar(gb, x=cats[0], y=nums[0], title=title or f"Bar Chart: {nums[0]} by {cats[0]}")
             elif nums:
                 fig = px.bar(df, y=nums[0], title=title or f"Bar Chart: {nums[0]}")
@@ -283,14 +370,14 @@ def create_interactive_chart(df: pd.DataFrame, kind: str, columns: list[str], ti
                 if is_datetime64_any_dtype(df[cats[0]]):
                     fig = px.line(df, x=cats[0], y=nums[0], title=title or f"Line Chart: {nums[0]} over time")
                 else:
-                    gb = df.groupby(cats[0])[nums[0]].sum().reset_index()
+                    gb = df.groupby(cats[0], observed=True)[nums[0]].sum().reset_index()
                     fig = px.line(gb, x=cats[0], y=nums[0], title=title or f"Line Chart: {nums[0]} by {cats[0]}")
             elif nums:
                 fig = px.line(df, y=nums[0], title=title or f"Line Chart: {nums[0]}")
                 
         elif kind == "pie":
             if cats and nums:
-                gb = df.groupby(cats[0])[nums[0]].sum().reset_index()
+                gb = df.groupby(cats[0], observed=True)[nums[0]].sum().reset_index()
                 gb = gb[gb[nums[0]] > 0] 
                 fig = px.pie(gb, values=nums[0], names=cats[0], title=title or f"Pie Chart: {nums[0]} by {cats[0]}")
             elif cats:
@@ -331,12 +418,12 @@ def create_interactive_chart(df: pd.DataFrame, kind: str, columns: list[str], ti
                 if is_datetime64_any_dtype(df[cats[0]]):
                     fig = px.area(df, x=cats[0], y=nums[0], title=title or f"Area Chart: {nums[0]} over time")
                 else:
-                    gb = df.groupby(cats[0])[nums[0]].sum().reset_index()
+                    gb = df.groupby(cats[0], observed=True)[nums[0]].sum().reset_index()
                     fig = px.area(gb, x=cats[0], y=nums[0], title=title or f"Area Chart: {nums[0]} by {cats[0]}")
                     
         elif kind == "donut":
             if cats and nums:
-                gb = df.groupby(cats[0])[nums[0]].sum().reset_index()
+                gb = df.groupby(cats[0], observed=True)[nums[0]].sum().reset_index()
                 gb = gb[gb[nums[0]] > 0]
                 fig = px.pie(gb, values=nums[0], names=cats[0], title=title or f"Donut Chart: {nums[0]} by {cats[0]}")
                 fig.update_traces(hole=.3)
@@ -356,17 +443,26 @@ def create_interactive_chart(df: pd.DataFrame, kind: str, columns: list[str], ti
             margin=dict(l=50, r=50, t=80, b=50)
         )
         
-        return json.dumps(fig, cls=PlotlyJSONEncoder)
+        return json.dumps(fig, cls=plotly_utils.PlotlyJSONEncoder)
         
     except Exception as e:
         logger.error(f"Error creating interactive chart: {e}")
         return json.dumps({"action": "error", "message": f"Chart creation failed: {str(e)}"})
 
+# Chart kinds reported as their own metric label; anything else is counted as "other"
+CHART_KINDS = {"bar", "line", "pie", "scatter", "histogram", "box", "violin", "heatmap", "area", "donut"}
+
 def make_chart(df: pd.DataFrame, kind: str, columns: list[str], prompt: str = "", interactive: bool = False) -> str:
     """
     Create a chart and return it base-64 encoded (static) or as JSON (interactive).
     Cleanses data before plotting. Returns error JSON if not enough valid data.
     """
+    label = kind if kind in CHART_KINDS else "other"
+    with span("chart.render", {"chart.kind": label, "chart.interactive": interactive, "chart.rows": len(df)}):
+        with CHART_RENDER_SECONDS.time(kind=label):
+            return _make_chart(df, kind, columns, prompt, interactive)
+
+def _make_chart(df: pd.DataFrame, kind: str, columns: list[str], prompt: str, interactive: bool) -> str:
     if interactive:
         return create_interactive_chart(df, kind, columns, prompt)
     
@@ -378,7 +474,9 @@ def make_chart(df: pd.DataFrame, kind: str, columns: list[str], prompt: str = ""
     if len(df) < 3:
         return json.dumps({"action": "error", "message": "Not enough valid data to plot."})
 
-    fig, ax = plt.subplots(figsize=(12, 8))
+    fig = mpl_figure.Figure(figsize=(12, 8))
+    mpl_agg.FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
     cats, nums = _split_cols(df, cols)
 
     try:
@@ -388,12 +486,12 @@ def make_chart(df: pd.DataFrame, kind: str, columns: list[str], prompt: str = ""
                 plot_df = df.set_index(cats[0])[nums or _all_numeric(df)]
                 plot_df.plot(kind=kind, ax=ax)
             elif cats and nums:
-                gb = df.groupby(cats[0])[nums].sum()
+                gb = df.groupby(cats[0], observed=True)[nums].sum()
                 gb.plot(kind=kind, ax=ax)
             elif not nums and cats:
                 maybe = _best_numeric(df)
                 if maybe:
-                    series = df.groupby(cats[0])[maybe].sum()
+                    series = df.groupby(cats[0], observed=True)[maybe].sum()
                     series.plot(kind=kind, ax=ax)
                     nums = [maybe]
                 else:
@@ -407,7 +505,7 @@ def make_chart(df: pd.DataFrame, kind: str, columns: list[str], prompt: str = ""
                 plot_df = df.set_index(cats[0])[nums or _all_numeric(df)]
                 plot_df.plot(kind=kind, ax=ax, marker='o')
             elif cats and nums:
-                gb = df.groupby(cats[0])[nums].sum()
+                gb = df.groupby(cats[0], observed=True)[nums].sum()
                 gb.plot(kind=kind, ax=ax, marker='o')
             elif nums:
                 df[nums].plot(kind=kind, ax=ax, marker='o')
@@ -418,7 +516,7 @@ def make_chart(df: pd.DataFrame, kind: str, columns: list[str], prompt: str = ""
                 best_num = _best_numeric(df)
                 nums = [best_num] if best_num else []
             if cats and nums:
-                series = df.groupby(cats[0])[nums[0]].sum()
+                series = df.groupby(cats[0], observed=True)[nums[0]].sum()
             elif cats:
                 series = df[cats[0]].value_counts()
             elif nums:
@@ -469,7 +567,7 @@ def make_chart(df: pd.DataFrame, kind: str, columns: list[str], prompt: str = ""
                 plot_df = df.set_index(cats[0])[nums or _all_numeric(df)]
                 plot_df.plot(kind="area", ax=ax, alpha=0.7)
             elif cats and nums:
-                gb = df.groupby(cats[0])[nums].sum()
+                gb = df.groupby(cats[0], observed=True)[nums].sum()
                 gb.plot(kind="area", ax=ax, alpha=0.7)
             elif nums:
                 df[nums].plot(kind="area", ax=ax, alpha=0.7)
@@ -480,17 +578,15 @@ def make_chart(df: pd.DataFrame, kind: str, columns: list[str], prompt: str = ""
         # Styling
         ax.set_title(f"{kind.title()} Chart – {', '.join(cols or nums)}", fontsize=14, fontweight='bold')
         ax.grid(True, alpha=0.3)
-        plt.xticks(rotation=45)
-        plt.tight_layout()
+        ax.tick_params(axis="x", labelrotation=45)
+        fig.tight_layout()
 
         # Save to base64
         buf = io.BytesIO()
         fig.savefig(buf, format="png", dpi=300, bbox_inches='tight')
-        plt.close(fig)
         return base64.b64encode(buf.getvalue()).decode()
 
     except Exception as e:
-        plt.close(fig)
         logger.error(f"Error creating chart: {e}")
         return json.dumps({"action": "error", "message": f"Chart creation failed: {str(e)}"})
 
@@ -0,0 +1,325 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+import pandas as pd
+from sqlalchemy import select
+
+from config import settings
+from Database.database import SessionLocal, ChatSession, ChatTurn
+from Services.executors import run_in_executor
+from Services.metrics import DATAFRAME_ROWS, DATAFRAME_BYTES
+
+# --- Logging Setup ---
+logger = logging.getLogger("abacus.sessions")
+
+SYSTEM_PROMPT = "You are FinBot, an AI financial adviser."
+
+# Dataset files nothing points at yet may belong to an upload that is still updating its session
+ORPHAN_GRACE_SECONDS = 3600
+
+def content_hash(raw: bytes) -> str:
+    """Dataset key: identical uploads share one file"""
+    return hashlib.sha256(raw).hexdigest()[:32]
+
+def parquet_ready(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    The frame as Parquet can store it: string column names, and text columns
+    that mix in numbers, booleans or dates (e.g. "n/a" in an amount column)
+    turned into strings. Missing values stay missing.
+    """
+    fixed = {}
+    for position, name in enumerate(df.columns):
+        col = df.iloc[:, position]
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            if col.cat.categories.inferred_type in ("mixed", "mixed-integer"):
+                fixed[position] = col.astype(object).where(col.isna(), col.astype(str)).astype("category")
+        elif col.dtype == object and pd.api.types.infer_dtype(col, skipna=True) in ("mixed", "mixed-integer"):
+            fixed[position] = col.where(col.isna(), col.astype(str))
+    if not fixed and all(isinstance(c, str) for c in df.columns):
+        return df
+    df = df.copy()
+    for position, col in fixed.items():
+        df.isetitem(position, col)
+    df.columns = [str(c) for c in df.columns]
+    return df
+
+class SessionStore:
+    """
+    Chat sessions persisted in the database, with uploaded DataFrames stored
+    once per content hash under SESSION_DATA_DIR as Parquet.
+    - Each worker keeps an LRU of sessions, revalidated against updated_at so
+      any worker can serve any session (no sticky routing).
+    - Datasets are read from disk only when a request needs the rows, then
+      kept in a small LRU shared by all sessions of this worker.
+    - Sessions idle for SESSION_RETENTION_DAYS are purged with their turns,
+      then dataset files no session points at.
+    """
+
+    def __init__(self, session_factory: Callable = SessionLocal, data_dir: str = None,
+                 cache_size: int = None, dataset_cache_size: int = None):
+        self._session_factory = session_factory
+        self.data_dir = Path(data_dir or settings.SESSION_DATA_DIR)
+        self.cache_size = cache_size or settings.SESSION_CACHE_SIZE
+        self.dataset_cache_size = dataset_cache_size or settings.SESSION_DATASET_CACHE_SIZE
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._datasets: "OrderedDict[str, pd.DataFrame]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._restored = 0
+        self._dataset_loads = 0
+        self._tables_ready = False
+
+    # --- Sessions ---
+    def create(self, session_id: str, owner: Optional[int] = None) -> Dict[str, Any]:
+        """New session with the FinBot system prompt as its first turn"""
+        now = datetime.utcnow()
+        db = self._session_factory()
+        try:
+            self._ensure_tables(db)
+            db.add(ChatSession(id=session_id, user_id=owner, created_at=now, updated_at=now))
+            db.add(ChatTurn(session_id=session_id, role="system", content=SYSTEM_PROMPT, created_at=now))
+            db.commit()
+        finally:
+            db.close()
+        session = {
+            "owner": owner,
+            "df": None,
+            "summary": {},
+            "chat": [{"role": "system", "content": SYSTEM_PROMPT}],
+            "dataset_hash": None,
+            "dataset_name": None,
+            "version": now,
+        }
+        self._remember(session_id, session)
+        return session
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """The session (cached if current, otherwise rebuilt from the database), or None"""
+        db = self._session_factory()
+        try:
+            self._ensure_tables(db)
+            row = db.get(ChatSession, session_id)
+            if row is None:
+                return None
+            with self._lock:
+                cached = self._sessions.get(session_id)
+                if cached is not None and cached["version"] == row.updated_at:
+                    self._sessions.move_to_end(session_id)
+                    return cached
+
+            turns = (
+                db.query(ChatTurn.role, ChatTurn.content)
+                .filter(ChatTurn.session_id == session_id)
+                .order_by(ChatTurn.id)
+                .all()
+            )
+            session = {
+                "owner": row.user_id,
+                "df": None,  # loaded on demand by dataset()
+                "summary": json.loads(row.summary) if row.summary else {},
+                "chat": [{"role": role, "content": content} for role, content in turns],
+                "dataset_hash": row.dataset_hash,
+                "dataset_name": row.dataset_name,
+                "version": row.updated_at,
+            }
+        finally:
+            db.close()
+        self._restored += 1
+        self._remember(session_id, session)
+        return session
+
+    def append_turns(self, session_id: str, session: Dict[str, Any], turns: List[Dict[str, str]]):
+        """Persist new chat turns (already appended to session["chat"])"""
+        now = datetime.utcnow()
+        db = self._session_factory()
+        try:
+            db.add_all(ChatTurn(session_id=session_id, role=t["role"], content=t["content"], created_at=now) for t in turns)
+            db.query(ChatSession).filter(ChatSession.id == session_id).update({"updated_at": now})
+            db.commit()
+        finally:
+            db.close()
+        session["version"] = now
+        self._remember(session_id, session)
+
+    # --- Datasets ---
+    def attach_dataset(self, session_id: str, session: Dict[str, Any], df: pd.DataFrame,
+                       summary: Dict[str, Any], raw: bytes, filename: str = None):
+        """
+        Store the upload under its content hash and point the session at it
+        (blocking: run on an executor). Raises ValueError when the frame
+        cannot be written as Parquet even after parquet_ready().
+        """
+        df = parquet_ready(df)
+        digest = content_hash(raw)
+        if not self._reuse_dataset(digest):
+            self._write_dataset(digest, df)
+        now = datetime.utcnow()
+        db = self._session_factory()
+        try:
+            db.query(ChatSession).filter(ChatSession.id == session_id).update({
+                "dataset_hash": digest,
+                "dataset_name": filename,
+                "summary": json.dumps(summary, default=str),
+                "updated_at": now,
+            })
+            db.commit()
+        finally:
+            db.close()
+        if self._dataset_path(digest) is None:
+            # Purged between the check and the update above: the reference now protects a rewrite
+            self._write_dataset(digest, df)
+        session.update(df=df, summary=summary, dataset_hash=digest, dataset_name=filename, version=now)
+        DATAFRAME_ROWS.observe(len(df))
+        DATAFRAME_BYTES.observe(int(df.memory_usage(deep=True).sum()))
+        self._cache_dataset(digest, df)
+        self._remember(session_id, session)
+
+    def dataset(self, session: Dict[str, Any]) -> Optional[pd.DataFrame]:
+        """The session's DataFrame, read from disk on first use (blocking: run on an executor)"""
+        if session.get("df") is not None or not session.get("dataset_hash"):
+            return session.get("df")
+        digest = session["dataset_hash"]
+        with self._lock:
+            df = self._datasets.get(digest)
+            if df is not None:
+                self._datasets.move_to_end(digest)
+        if df is None:
+            path = self._dataset_path(digest)
+            if path is None:
+                logger.warning(f"⚠️ Dataset {digest} missing from {self.data_dir}")
+                return None
+            df = pd.read_parquet(path)
+            self._dataset_loads += 1
+            self._cache_dataset(digest, df)
+        session["df"] = df
+        return df
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "cached_sessions": len(self._sessions),
+                "cached_datasets": len(self._datasets),
+                "sessions_restored": self._restored,
+                "datasets_loaded_from_disk": self._dataset_loads,
+                "data_dir": str(self.data_dir),
+            }
+
+    # --- Cleanup ---
+    def purge_expired(self, retention_days: float = None) -> Dict[str, int]:
+        """
+        Delete sessions idle for longer than the retention with their turns,
+        then dataset files no remaining session uses (blocking: run on an
+        executor). A retention of 0 keeps sessions forever.
+        """
+        days = settings.SESSION_RETENTION_DAYS if retention_days is None else retention_days
+        purged = {"sessions": 0, "turns": 0, "datasets": 0}
+        if days <= 0:
+            return purged
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        db = self._session_factory()
+        try:
+            self._ensure_tables(db)
+            expired = select(ChatSession.id).where(ChatSession.updated_at < cutoff)
+            purged["turns"] = (
+                db.query(ChatTurn).filter(ChatTurn.session_id.in_(expired)).delete(synchronize_session=False)
+            )
+            purged["sessions"] = (
+                db.query(ChatSession).filter(ChatSession.updated_at < cutoff).delete(synchronize_session=False)
+            )
+            db.commit()
+            in_use = {digest for (digest,) in db.query(ChatSession.dataset_hash).distinct() if digest}
+        finally:
+            db.close()
+        purged["datasets"] = self._purge_files(in_use)
+        if any(purged.values()):
+            logger.info(f"🧹 Purged {purged['sessions']} sessions, {purged['turns']} turns "
+                        f"and {purged['datasets']} dataset files")
+        return purged
+
+    async def run_cleanup_loop(self, interval_hours: float = None):
+        """Background task purging expired sessions (started at startup, cancelled at shutdown)"""
+        interval = (interval_hours or settings.SESSION_CLEANUP_INTERVAL_HOURS) * 3600
+        while True:
+            try:
+                await run_in_executor("db-io", self.purge_expired)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Session cleanup error: {e}")
+            await asyncio.sleep(interval)
+
+    def _purge_files(self, in_use: set) -> int:
+        """Remove unused datasets, stale temp files and pre-Parquet pickles past the grace period"""
+        if not self.data_dir.is_dir():
+            return 0
+        removed = 0
+        cutoff = time.time() - ORPHAN_GRACE_SECONDS
+        for path in self.data_dir.iterdir():
+            digest, _, suffix = path.name.partition(".")
+            if suffix == "parquet" and digest in in_use:
+                continue
+            try:
+                if path.is_file() and path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed += 1
+            except FileNotFoundError:
+                pass  # another worker removed it first
+        return removed
+
+    # --- Internals ---
+    def _ensure_tables(self, db):
+        """Create the session tables on first use (workers that skipped create_tables still work)"""
+        if not self._tables_ready:
+            for table in (ChatSession.__table__, ChatTurn.__table__):
+                table.create(bind=db.get_bind(), checkfirst=True)
+            self._tables_ready = True
+
+    def _remember(self, session_id: str, session: Dict[str, Any]):
+        with self._lock:
+            self._sessions[session_id] = session
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.cache_size:
+                self._sessions.popitem(last=False)
+
+    def _cache_dataset(self, digest: str, df: pd.DataFrame):
+        with self._lock:
+            self._datasets[digest] = df
+            self._datasets.move_to_end(digest)
+            while len(self._datasets) > self.dataset_cache_size:
+                self._datasets.popitem(last=False)
+
+    def _dataset_path(self, digest: str) -> Optional[Path]:
+        path = self.data_dir / f"{digest}.parquet"
+        return path if path.exists() else None
+
+    def _reuse_dataset(self, digest: str) -> bool:
+        """Refresh the mtime of an existing dataset file so purge keeps it through its grace period"""
+        try:
+            os.utime(self.data_dir / f"{digest}.parquet")
+            return True
+        except FileNotFoundError:
+            return False
+
+    def _write_dataset(self, digest: str, df: pd.DataFrame):
+        """Write atomically (temp file + rename) so a crash never leaves a half file"""
+        self.data_dir.mkdir(parents=True, exist_ok=True)
+        # Unique per writer: concurrent uploads of the same content must not share a temp file
+        tmp = self.data_dir / f"{digest}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        try:
+            df.to_parquet(tmp, index=True)
+        except (ValueError, TypeError, NotImplementedError) as e:
+            # pyarrow's conversion errors subclass ValueError/TypeError
+            tmp.unlink(missing_ok=True)
+            raise ValueError(f"Dataset cannot be stored as Parquet: {e}") from e
+        tmp.replace(self.data_dir / f"{digest}.parquet")
+
+session_store = SessionStore()
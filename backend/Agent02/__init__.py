@@ -6,8 +6,10 @@ This module provides comprehensive stock analysis using GPT-4o.
 
 from .direct_analysis import *
 from .tools import *
+from .job_queue import stock_job_queue, StockJobQueue
 
 __all__ = [
     'run_stock_analysis_direct', 'get_analysis_results_direct',
-    'get_current_stock_price', 'get_company_info'
+    'get_current_stock_price', 'get_company_info',
+    'stock_job_queue', 'StockJobQueue'
 ]
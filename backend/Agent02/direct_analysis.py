@@ -1,8 +1,11 @@
 from pathlib import Path
 from datetime import datetime
-from openai import OpenAI
 from config import settings
+from Services.agent_registry import agent_registry
+from Services.tracing import traced, StageSpans, annotate
+from Database.token_ledger import token_ledger
 from .tools import get_current_stock_price, get_company_info, search_tool
+from typing import Callable, Optional
 import logging
 
 # --- Logging Setup ---
@@ -14,9 +17,16 @@ if not logger.hasHandlers():
     handler.setFormatter(formatter)
     logger.addHandler(handler)
 
-# --- OpenAI Client ---
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
+# --- OpenAI Client (shared, created on first use) ---
+client = agent_registry.proxy("openai_client")
 
+# --- Analysis Stages (reported to progress callbacks in this order) ---
+ANALYSIS_STAGES = ("data", "financial", "market", "recommendation")
+
+class AnalysisCancelled(Exception):
+    """Raised by a progress callback to abort a running analysis"""
+
+@traced("openai.chat")
 def analyse_with_openai(prompt: str, system_prompt: str = None, max_tokens: int = 2000) -> str:
     """Analysis function using OpenAI GPT-4o directly"""
     try:
@@ -28,7 +38,7 @@ def analyse_with_openai(prompt: str, system_prompt: str = None, max_tokens: int
 
         # Call OpenAI API
         response = client.chat.completions.create(
-            model=settings.MODEL_NAME,
+            model=token_ledger.select_model(settings.MODEL_NAME),
             messages=messages,
             temperature=0.1,
             max_tokens=max_tokens
@@ -40,15 +50,29 @@ def analyse_with_openai(prompt: str, system_prompt: str = None, max_tokens: int
         logger.error(error_msg)
         return error_msg
 
-def run_stock_analysis_direct(stock_symbol: str) -> dict:
-    """Complete stock analysis using OpenAI GPT-4o"""
+@traced("stock.analysis")
+def run_stock_analysis_direct(stock_symbol: str, progress_callback: Optional[Callable[[str], None]] = None) -> dict:
+    """Complete stock analysis using OpenAI GPT-4o
+
+    progress_callback, if given, is called with each name in ANALYSIS_STAGES
+    as that stage starts. It may raise AnalysisCancelled to stop the analysis.
+    """
+    stages = StageSpans("stock")
+
+    def report_stage(stage: str):
+        stages.start(stage)
+        if progress_callback:
+            progress_callback(stage)
+
     try:
         # --- Input Preparation ---
         stock_symbol = stock_symbol.upper().strip()
+        annotate({"stock.symbol": stock_symbol})
         logger.info(f"🚀 Analysing {stock_symbol} with GPT-4o")
         logger.info(f"📅 Date: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
 
         # --- STEP 1: Data Collection ---
+        report_stage("data")
         logger.info("📊 Collecting financial data...")
         company_info = get_company_info(stock_symbol)
         current_price = get_current_stock_price(stock_symbol)
@@ -58,6 +82,7 @@ def run_stock_analysis_direct(stock_symbol: str) -> dict:
         news_search = search_tool(f"{stock_symbol} recent financial news 2024 2025")
 
         # --- STEP 3: Financial Analysis ---
+        report_stage("financial")
         logger.info("🔍 Financial analysis in progress...")
         financial_system_prompt = (
             "You are a senior financial analyst with 20 years of experience in company valuation. "
@@ -103,6 +128,7 @@ def run_stock_analysis_direct(stock_symbol: str) -> dict:
         financial_analysis = analyse_with_openai(financial_prompt, financial_system_prompt, 2500)
 
         # --- STEP 4: Market Context Analysis ---
+        report_stage("market")
         logger.info("📈 Analysing market context and news...")
         market_system_prompt = (
             "You are a market analyst expert in financial news and impact assessment. "
@@ -148,6 +174,7 @@ def run_stock_analysis_direct(stock_symbol: str) -> dict:
         market_analysis = analyse_with_openai(market_prompt, market_system_prompt, 2000)
 
         # --- STEP 5: Investment Recommendation ---
+        report_stage("recommendation")
         logger.info("💡 Generating investment recommendation...")
         recommendation_system_prompt = (
             "You are a certified senior investment adviser with recognised expertise "
@@ -267,6 +294,7 @@ before any investment decision.
         logger.info(f"📁 Results saved in: {output_dir}")
 
         # --- Return Success Response ---
+        stages.close()
         return {
             "status": "success",
             "symbol": stock_symbol,
@@ -277,7 +305,12 @@ before any investment decision.
             "output_directory": str(output_dir)
         }
 
+    except AnalysisCancelled as e:
+        stages.close(e)
+        logger.info(f"🛑 Analysis of {stock_symbol} cancelled")
+        raise
     except Exception as e:
+        stages.close(e)
         error_msg = f"Error during analysis of {stock_symbol}: {str(e)}"
         logger.error(error_msg)
         # --- Return Error Response ---
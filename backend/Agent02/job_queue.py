@@ -0,0 +1,365 @@
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, or_
+
+from config import settings
+from Database.database import SessionLocal, StockAnalysisJob
+from Database.token_ledger import usage_tags
+from .direct_analysis import run_stock_analysis_direct, AnalysisCancelled, ANALYSIS_STAGES
+
+# --- Logging Setup ---
+logger = logging.getLogger("abacus.jobs")
+
+# --- Job States ---
+ACTIVE_STATUSES = ("queued", "running")
+FINAL_STATUSES = ("completed", "error", "cancelled")
+# Returned by _update when another worker has taken the job over
+RECLAIMED = "reclaimed"
+
+# Finished jobs past STOCK_JOB_RETENTION_DAYS are purged by the heartbeat at most this often
+PURGE_INTERVAL_SECONDS = 3600
+
+# Passed as user_id to get()/cancel() by internal callers that skip the ownership check
+ANY_USER = object()
+
+# Progress percentage reported when each stage starts
+STAGE_PROGRESS = {stage: 10 + index * 25 for index, stage in enumerate(ANALYSIS_STAGES)}
+
+def job_to_dict(job: StockAnalysisJob) -> Dict[str, Any]:
+    """Serialise a job row into a plain dict"""
+    return {
+        "job_id": job.id,
+        "symbol": job.symbol,
+        "user_id": job.user_id,
+        "status": job.status,
+        "stage": job.stage,
+        "progress": job.progress or 0,
+        "analysis": job.analysis,
+        "recommendation": job.recommendation,
+        "model_used": job.model_used,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+class StockJobQueue:
+    """
+    Durable queue of stock analyses executed by a bounded worker pool.
+    Job state lives in the database so it survives restarts; identical
+    in-flight symbols from the same user share a single job. Jobs submitted
+    by a signed-in user are only visible to that user.
+
+    Each active job is leased to the worker process running it, which renews
+    the lease on a heartbeat. Other workers only take a job over once its
+    lease has expired, so several uvicorn workers (or a rolling restart)
+    never run the same job twice.
+    """
+
+    def __init__(
+        self,
+        session_factory: Callable = SessionLocal,
+        runner: Callable[..., dict] = run_stock_analysis_direct,
+        max_workers: int = settings.STOCK_JOB_WORKERS,
+        lease_seconds: float = settings.STOCK_JOB_LEASE_SECONDS,
+        heartbeat_seconds: float = settings.STOCK_JOB_HEARTBEAT_SECONDS,
+    ):
+        self._session_factory = session_factory
+        self._runner = runner
+        self._max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="stock-job")
+        self._lock = threading.Lock()
+        self._cancelled: set = set()
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._lease_seconds = lease_seconds
+        self._heartbeat_seconds = heartbeat_seconds
+        self._heartbeat: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._last_purge = 0.0
+
+    # --- Public API ---
+    def submit(self, symbol: str, user_id: int = None) -> Tuple[Dict[str, Any], bool]:
+        """
+        Enqueue an analysis for symbol.
+        Returns (job, created); created is False when an in-flight job was reused.
+        """
+        symbol = symbol.upper().strip()
+        with self._lock:
+            db = self._session_factory()
+            try:
+                owner = StockAnalysisJob.user_id.is_(None) if user_id is None else StockAnalysisJob.user_id == user_id
+                existing = (
+                    db.query(StockAnalysisJob)
+                    .filter(StockAnalysisJob.symbol == symbol, StockAnalysisJob.status.in_(ACTIVE_STATUSES), owner)
+                    .order_by(StockAnalysisJob.created_at)
+                    .first()
+                )
+                if existing:
+                    return job_to_dict(existing), False
+
+                job = StockAnalysisJob(
+                    id=str(uuid.uuid4()),
+                    symbol=symbol,
+                    user_id=user_id,
+                    status="queued",
+                    stage="queued",
+                    progress=0,
+                    claimed_by=self.worker_id,
+                    lease_expires_at=self._lease_expiry(),
+                )
+                db.add(job)
+                db.commit()
+                job_data = job_to_dict(job)
+            finally:
+                db.close()
+
+        self._ensure_heartbeat()
+        self._executor.submit(self._run, job_data["job_id"], symbol, user_id)
+        logger.info(f"📥 Queued analysis of {symbol} (job: {job_data['job_id']})")
+        return job_data, True
+
+    def get(self, job_id: str, user_id: Any = ANY_USER) -> Optional[Dict[str, Any]]:
+        """Return the current state of a job, or None if unknown or owned by another user"""
+        db = self._session_factory()
+        try:
+            job = db.get(StockAnalysisJob, job_id)
+            return job_to_dict(job) if job and self._visible(job, user_id) else None
+        finally:
+            db.close()
+
+    def cancel(self, job_id: str, user_id: Any = ANY_USER) -> Optional[Dict[str, Any]]:
+        """Cancel a queued or running job; finished jobs are returned unchanged"""
+        db = self._session_factory()
+        try:
+            job = db.get(StockAnalysisJob, job_id)
+            if not job or not self._visible(job, user_id):
+                return None
+            if job.status in ACTIVE_STATUSES:
+                self._cancelled.add(job_id)
+                job.status = "cancelled"
+                job.finished_at = datetime.utcnow()
+                db.commit()
+                logger.info(f"🛑 Cancelled job {job_id} ({job.symbol})")
+            return job_to_dict(job)
+        finally:
+            db.close()
+
+    def recover(self) -> int:
+        """
+        Re-enqueue active jobs whose lease has expired (their worker stopped or
+        died); jobs still leased to a live worker are left alone. Returns how
+        many were resumed. Also runs on every heartbeat.
+        """
+        resumed = self._claim_expired()
+        for job_id, symbol, user_id in resumed:
+            self._executor.submit(self._run, job_id, symbol, user_id)
+        if resumed:
+            logger.info(f"♻️ Resumed {len(resumed)} interrupted stock analysis job(s)")
+        self._ensure_heartbeat()
+        return len(resumed)
+
+    def stats(self) -> Dict[str, Any]:
+        """Counts of jobs per status (one GROUP BY on the status index)"""
+        db = self._session_factory()
+        try:
+            counts = {status: 0 for status in ACTIVE_STATUSES + FINAL_STATUSES}
+            rows = db.query(StockAnalysisJob.status, func.count()).group_by(StockAnalysisJob.status).all()
+            counts.update({status: count for status, count in rows})
+            return {"workers": self._max_workers, "jobs": counts}
+        finally:
+            db.close()
+
+    def purge_finished(self, retention_days: float = None) -> int:
+        """
+        Delete completed, failed and cancelled jobs that finished more than
+        retention_days ago (0 keeps them forever). Returns how many were deleted.
+        """
+        days = settings.STOCK_JOB_RETENTION_DAYS if retention_days is None else retention_days
+        if days <= 0:
+            return 0
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        db = self._session_factory()
+        try:
+            deleted = (
+                db.query(StockAnalysisJob)
+                .filter(
+                    StockAnalysisJob.status.in_(FINAL_STATUSES),
+                    or_(StockAnalysisJob.finished_at < cutoff,
+                        StockAnalysisJob.finished_at.is_(None) & (StockAnalysisJob.created_at < cutoff)),
+                )
+                .delete(synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+        if deleted:
+            logger.info(f"🧹 Purged {deleted} finished stock analysis job(s)")
+        return deleted
+
+    def shutdown(self):
+        """Stop accepting work; unfinished jobs are released so the next worker resumes them at once"""
+        self._stopping.set()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        db = self._session_factory()
+        try:
+            self._own_active(db).update({"lease_expires_at": datetime.utcnow()}, synchronize_session=False)
+            db.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not release job leases: {e}")
+        finally:
+            db.close()
+
+    @staticmethod
+    def _visible(job: StockAnalysisJob, user_id: Any) -> bool:
+        """Anonymous jobs are visible to everyone; owned jobs only to their owner"""
+        return user_id is ANY_USER or job.user_id is None or job.user_id == user_id
+
+    # --- Leases ---
+    def _lease_expiry(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=self._lease_seconds)
+
+    def _own_active(self, db):
+        return db.query(StockAnalysisJob).filter(
+            StockAnalysisJob.claimed_by == self.worker_id, StockAnalysisJob.status.in_(ACTIVE_STATUSES)
+        )
+
+    def _claim_expired(self) -> List[Tuple[str, str, Optional[int]]]:
+        """Take over active jobs that are unclaimed or whose lease has lapsed (never our own: they are queued here)"""
+        expired = or_(
+            StockAnalysisJob.claimed_by.is_(None),
+            (StockAnalysisJob.claimed_by != self.worker_id) & or_(
+                StockAnalysisJob.lease_expires_at.is_(None),
+                StockAnalysisJob.lease_expires_at < datetime.utcnow(),
+            ),
+        )
+        claimed = []
+        db = self._session_factory()
+        try:
+            candidates = (
+                db.query(StockAnalysisJob.id, StockAnalysisJob.symbol, StockAnalysisJob.user_id)
+                .filter(StockAnalysisJob.status.in_(ACTIVE_STATUSES), expired)
+                .all()
+            )
+            for job_id, symbol, user_id in candidates:
+                # Conditional update, so only one worker wins a job when several recover at once
+                won = (
+                    db.query(StockAnalysisJob)
+                    .filter(StockAnalysisJob.id == job_id, StockAnalysisJob.status.in_(ACTIVE_STATUSES), expired)
+                    .update({
+                        "claimed_by": self.worker_id,
+                        "lease_expires_at": self._lease_expiry(),
+                        "status": "queued",
+                        "stage": "queued",
+                        "progress": 0,
+                    }, synchronize_session=False)
+                )
+                db.commit()
+                if won:
+                    claimed.append((job_id, symbol, user_id))
+        finally:
+            db.close()
+        return claimed
+
+    def _renew_leases(self) -> int:
+        db = self._session_factory()
+        try:
+            renewed = self._own_active(db).update({"lease_expires_at": self._lease_expiry()}, synchronize_session=False)
+            db.commit()
+            return renewed
+        finally:
+            db.close()
+
+    def _ensure_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is not None or self._heartbeat_seconds <= 0 or self._stopping.is_set():
+                return
+            self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="stock-job-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+    def _heartbeat_loop(self):
+        """Renew this worker's leases, pick up jobs abandoned by dead workers and purge old finished ones"""
+        while not self._stopping.wait(self._heartbeat_seconds):
+            try:
+                self._renew_leases()
+                self.recover()
+                if time.monotonic() - self._last_purge >= PURGE_INTERVAL_SECONDS:
+                    self._last_purge = time.monotonic()
+                    self.purge_finished()
+            except Exception as e:
+                logger.warning(f"⚠️ Job heartbeat failed: {e}")
+
+    # --- Worker Internals ---
+    def _update(self, job_id: str, **fields) -> Optional[str]:
+        """Apply fields to a job unless it was cancelled or taken over; returns the job status"""
+        db = self._session_factory()
+        try:
+            job = db.get(StockAnalysisJob, job_id)
+            if not job:
+                return None
+            if job.claimed_by not in (None, self.worker_id):
+                return RECLAIMED
+            if job.status == "cancelled":
+                return job.status
+            for key, value in fields.items():
+                setattr(job, key, value)
+            db.commit()
+            return job.status
+        finally:
+            db.close()
+
+    def _on_stage(self, job_id: str, stage: str):
+        """Progress callback handed to the analysis runner"""
+        if job_id in self._cancelled:
+            raise AnalysisCancelled(job_id)
+        status = self._update(job_id, stage=stage, progress=STAGE_PROGRESS.get(stage, 0))
+        if status in ("cancelled", RECLAIMED):
+            raise AnalysisCancelled(job_id)
+
+    def _run(self, job_id: str, symbol: str, user_id: int = None):
+        """Execute one job on a worker thread (its LLM usage is charged to the job's owner)"""
+        status = self._update(job_id, status="running", started_at=datetime.utcnow())
+        if status != "running":
+            self._cancelled.discard(job_id)
+            return
+
+        try:
+            with usage_tags(user_id=user_id):
+                result = self._runner(symbol, progress_callback=lambda stage: self._on_stage(job_id, stage))
+        except AnalysisCancelled:
+            self._cancelled.discard(job_id)
+            return
+        except Exception as e:
+            logger.error(f"❌ Job {job_id} ({symbol}) failed: {e}")
+            self._update(job_id, status="error", error=str(e), finished_at=datetime.utcnow())
+            return
+
+        if result.get("status") == "success":
+            self._update(
+                job_id,
+                status="completed",
+                stage="completed",
+                progress=100,
+                analysis=result.get("analysis", ""),
+                recommendation=result.get("recommendation", ""),
+                model_used=result.get("model_used"),
+                finished_at=datetime.utcnow(),
+            )
+            logger.info(f"✅ Job {job_id} ({symbol}) completed")
+        else:
+            self._update(
+                job_id,
+                status="error",
+                error=result.get("error", "Unknown error"),
+                finished_at=datetime.utcnow(),
+            )
+
+# Global instance
+stock_job_queue = StockJobQueue()
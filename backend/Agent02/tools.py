@@ -1,60 +1,39 @@
 import json
 import os
 import time
-import yfinance as yf
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 import io
 import base64
 from datetime import datetime
 
-# --- Optional Dependency Management ---
-try:
-    from curl_cffi import requests
-    session = requests.Session(impersonate="chrome")
-    CURL_CFFI_AVAILABLE = True
-except ImportError:
-    import requests
-    session = requests.Session()
-    CURL_CFFI_AVAILABLE = False
+from Services.http_clients import get_yahoo_session, get_ddgs, CURL_CFFI_AVAILABLE, DDGS_AVAILABLE
+from Services.tracing import traced
+from Services.lazy_imports import lazy_import
 
-try:
-    from ddgs import DDGS
-    DDGS_AVAILABLE = True
-except ImportError:
-    DDGS_AVAILABLE = False
-
-try:
-    import openai
-    from openai import OpenAI
-    openai_api_key = os.getenv("OPENAI_API_KEY")
-    if openai_api_key:
-        openai_client = OpenAI(api_key=openai_api_key)
-        OPENAI_AVAILABLE = True
-    else:
-        OPENAI_AVAILABLE = False
-except ImportError:
-    OPENAI_AVAILABLE = False
+# Market data stack, imported on first lookup
+yf = lazy_import("yfinance")
 
 # --- DuckDuckGo Search Tool ---
+@traced("ddgs.search")
 def search_tool(search_query: str) -> str:
     """
     Search for information on the internet using DuckDuckGo.
     Returns a formatted string of results or an error message.
     """
-    if not DDGS_AVAILABLE:
+    ddgs = get_ddgs() if DDGS_AVAILABLE else None
+    if ddgs is None:
         return f"Search not available for: {search_query}"
     try:
-        with DDGS() as ddgs:
-            results = []
-            for r in ddgs.text(search_query, max_results=5):
-                results.append(f"Title: {r['title']}\nSummary: {r['body']}\nURL: {r['href']}\n")
-            return "\n---\n".join(results) if results else f"No results found for: {search_query}"
+        results = []
+        for r in ddgs.text(search_query, max_results=5):
+            results.append(f"Title: {r['title']}\nSummary: {r['body']}\nURL: {r['href']}\n")
+        return "\n---\n".join(results) if results else f"No results found for: {search_query}"
     except Exception as e:
         return f"Search error for '{search_query}': {str(e)}"
 
 # --- Share Price Retrieval ---
+@traced("yahoo.price")
 def get_current_share_price(symbol: str) -> str:
     """
     Get the current share price for a given symbol.
@@ -62,7 +41,7 @@ def get_current_share_price(symbol: str) -> str:
     """
     try:
         time.sleep(0.5)
-        stock = yf.Ticker(symbol, session=session) if CURL_CFFI_AVAILABLE else yf.Ticker(symbol)
+        stock = yf.Ticker(symbol, session=get_yahoo_session())
         info = stock.info
         current_price = info.get("regularMarketPrice") or info.get("currentPrice")
         currency = info.get("currency", "USD")
@@ -83,13 +62,14 @@ def get_current_stock_price(symbol: str) -> str:
     return get_current_share_price(symbol)
 
 # --- Company Info Retrieval ---
+@traced("yahoo.info")
 def get_company_info(symbol: str) -> str:
     """
     Get complete company information for a given symbol.
     Returns a JSON string of cleaned info or an error message.
     """
     try:
-        stock = yf.Ticker(symbol, session=session) if CURL_CFFI_AVAILABLE else yf.Ticker(symbol)
+        stock = yf.Ticker(symbol, session=get_yahoo_session())
         company_info_full = stock.info
         if not company_info_full:
             return f"Information not available for {symbol}"
@@ -141,7 +121,7 @@ def get_income_statements(symbol: str) -> str:
     Returns JSON string or error message.
     """
     try:
-        stock = yf.Ticker(symbol, session=session) if CURL_CFFI_AVAILABLE else yf.Ticker(symbol)
+        stock = yf.Ticker(symbol, session=get_yahoo_session())
         financials = stock.financials
         if financials.empty:
             return f"Financial statements not available for {symbol}"
@@ -3,6 +3,15 @@ Agent03 - Sharia Expert with Research Tools
 Advanced Islamic investment analysis with real-time research capabilities
 """
 
-from .sharia_expert_agent import sharia_expert_agent, initialize_sharia_expert
+from .sharia_expert_agent import ShariaExpertAgent, sharia_expert_agent, initialise_sharia_expert
+from .keyword_screener import HaramKeywordScreener, haram_screener
+from .batch_screening import BatchScreener, classify_holding, normalise_tickers
+from .verdict_store import VerdictStore
+from .symbol_index import SymbolIndex, get_symbol_index
+from .ratio_engine import METHODOLOGIES, get_methodology, screen_fundamentals, ratios_for_company
 
-__all__ = ['sharia_expert_agent', 'initialize_sharia_expert']
\ No newline at end of file
+__all__ = ['ShariaExpertAgent', 'sharia_expert_agent', 'initialise_sharia_expert',
+           'HaramKeywordScreener', 'haram_screener',
+           'BatchScreener', 'classify_holding', 'normalise_tickers',
+           'VerdictStore', 'SymbolIndex', 'get_symbol_index',
+           'METHODOLOGIES', 'get_methodology', 'screen_fundamentals', 'ratios_for_company']
\ No newline at end of file
@@ -0,0 +1,216 @@
+import asyncio
+import re
+import time
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from config import settings
+from Services.executors import run_in_executor
+from Database.token_ledger import token_ledger
+from .keyword_screener import haram_screener
+
+# --- Rule Configuration ---
+TICKER_PATTERN = re.compile(r"^[A-Z0-9][A-Z0-9.\-^=]{0,14}$")
+TICKER_COLUMNS = ("ticker", "symbol", "tickers", "symbols", "code")
+
+# Yahoo Finance industries whose core activity is non-compliant
+NON_COMPLIANT_INDUSTRIES = {
+    "Banks - Diversified": "conventional_banking",
+    "Banks - Regional": "conventional_banking",
+    "Mortgage Finance": "conventional_banking",
+    "Credit Services": "conventional_banking",
+    "Insurance - Life": "conventional_banking",
+    "Insurance - Diversified": "conventional_banking",
+    "Insurance - Property & Casualty": "conventional_banking",
+    "Beverages - Brewers": "alcohol",
+    "Beverages - Wineries & Distilleries": "alcohol",
+    "Tobacco": "tobacco",
+    "Gambling": "gambling",
+    "Resorts & Casinos": "gambling",
+}
+
+# Keyword score that settles a case without review (e.g. a term in the industry or name)
+DECISIVE_KEYWORD_SCORE = 1.5
+
+def normalise_tickers(raw: Iterable[Any]) -> Dict[str, List[str]]:
+    """Upper-case, de-duplicate (keeping order) and validate ticker symbols"""
+    valid, invalid, seen = [], [], set()
+    for item in raw:
+        if item is None or (isinstance(item, float) and pd.isna(item)):
+            continue
+        ticker = str(item).strip().upper()
+        if not ticker or ticker in seen:
+            continue
+        seen.add(ticker)
+        (valid if TICKER_PATTERN.match(ticker) else invalid).append(ticker)
+    return {"tickers": valid, "invalid": invalid}
+
+def tickers_from_dataframe(df: pd.DataFrame) -> List[Any]:
+    """Ticker column of an uploaded holdings file (named ticker/symbol, else the first column)"""
+    for col in df.columns:
+        if str(col).strip().lower() in TICKER_COLUMNS:
+            return df[col].tolist()
+    # Headerless single-column files: the header row is itself a ticker
+    first = df.columns[0]
+    return [first] + df[first].tolist()
+
+def tickers_from_text(text: str) -> List[str]:
+    """Tickers from a plain-text list separated by newlines, commas or spaces"""
+    return [t for t in re.split(r"[\s,;]+", text) if t]
+
+def classify_holding(financial: Dict[str, Any], keywords: Dict[str, Any],
+                     margin: float = None) -> Dict[str, Any]:
+    """
+    Rule-based verdict from ratios and keyword screening.
+    Returns a verdict plus whether the case is borderline and needs the LLM.
+    """
+    margin = settings.SHARIA_BORDERLINE_MARGIN if margin is None else margin
+    reasons = []
+
+    industry_category = NON_COMPLIANT_INDUSTRIES.get(financial.get("industry") or "")
+    if industry_category:
+        return {"verdict": "HARAM ❌", "borderline": False,
+                "reasons": [f"Industry '{financial['industry']}' is {industry_category.replace('_', ' ')}"]}
+
+    scores = keywords.get("category_scores", {})
+    decisive = [c for c, s in scores.items() if s >= DECISIVE_KEYWORD_SCORE]
+    if decisive:
+        return {"verdict": "HARAM ❌", "borderline": False,
+                "reasons": [f"Strong haram indicators: {', '.join(decisive)}"]}
+
+    borderline = False
+    if scores:
+        borderline = True
+        reasons.append(f"Weak haram indicators: {', '.join(scores)}")
+
+    ratios = financial.get("sharia_ratios") or {}
+    checked = [r for r in ratios.values() if isinstance(r, dict) and "compliant" in r]
+    if not checked:
+        borderline = True
+        reasons.append("Financial ratios unavailable")
+    for name, ratio in ratios.items():
+        if not isinstance(ratio, dict) or "compliant" not in ratio:
+            continue
+        if not ratio["compliant"]:
+            return {"verdict": "HARAM ❌", "borderline": False,
+                    "reasons": [f"{name} {ratio['value']}% exceeds {ratio['limit']}%"]}
+        if ratio["value"] >= ratio["limit"] * margin:
+            borderline = True
+            reasons.append(f"{name} {ratio['value']}% is close to the {ratio['limit']}% limit")
+
+    if borderline:
+        return {"verdict": "QUESTIONABLE ⚠️", "borderline": True, "reasons": reasons}
+    return {"verdict": "HALAL ✅", "borderline": False,
+            "reasons": ["Compliant industry and financial ratios within limits"]}
+
+class BatchScreener:
+    """
+    Screens a portfolio of tickers with bounded concurrency.
+    Quantitative ratios and keyword screening settle most holdings; only
+    borderline cases are sent to the LLM for a short review.
+    """
+
+    def __init__(self, agent, concurrency: int = None, llm_concurrency: int = None, use_llm: bool = True):
+        self.agent = agent
+        self.use_llm = use_llm and bool(settings.OPENAI_API_KEY)
+        self._lookups = asyncio.Semaphore(concurrency or settings.SHARIA_BATCH_CONCURRENCY)
+        self._llm_calls = asyncio.Semaphore(llm_concurrency or settings.SHARIA_BATCH_LLM_CONCURRENCY)
+
+    async def screen(self, tickers: List[str]) -> AsyncIterator[Dict[str, Any]]:
+        """Yield one result per ticker as soon as it is ready, then a summary"""
+        started = time.perf_counter()
+        totals = {"HALAL ✅": 0, "HARAM ❌": 0, "QUESTIONABLE ⚠️": 0, "UNKNOWN": 0}
+        llm_calls = 0
+
+        tasks = [asyncio.create_task(self._screen_one(i, t)) for i, t in enumerate(tickers)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                totals[result["verdict"]] = totals.get(result["verdict"], 0) + 1
+                llm_calls += int(result["resolved_by"] == "llm")
+                yield result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        yield {
+            "type": "summary",
+            "total": len(tickers),
+            "verdicts": totals,
+            "llm_calls": llm_calls,
+            "resolved_without_llm": len(tickers) - llm_calls,
+            "elapsed_seconds": round(time.perf_counter() - started, 2),
+            "timestamp": datetime.now().isoformat(),
+        }
+
+    async def _screen_one(self, index: int, ticker: str) -> Dict[str, Any]:
+        result = {"type": "result", "index": index, "ticker": ticker}
+        async with self._lookups:
+            financial = await self.agent._get_yahoo_finance_info(ticker)
+
+        if not financial or "error" in financial:
+            result.update({
+                "verdict": "UNKNOWN", "resolved_by": "rules",
+                "reasons": [financial.get("error", "No financial data found") if financial else "No financial data found"],
+            })
+            return result
+
+        keywords = haram_screener.screen({"financial_data": financial})
+        decision = classify_holding(financial, keywords)
+        result.update({
+            "company_name": financial.get("company_name"),
+            "sector": financial.get("sector"),
+            "industry": financial.get("industry"),
+            "sharia_ratios": financial.get("sharia_ratios"),
+            "haram_indicators": keywords.get("haram_indicators_found", {}),
+            "verdict": decision["verdict"],
+            "reasons": decision["reasons"],
+            "resolved_by": "rules",
+        })
+
+        if decision["borderline"] and self.use_llm:
+            review = await self._review_with_llm(ticker, financial, keywords, decision)
+            if review:
+                result.update(review)
+        return result
+
+    async def _review_with_llm(self, ticker: str, financial: Dict, keywords: Dict,
+                               decision: Dict) -> Optional[Dict[str, Any]]:
+        """Short LLM review of a borderline holding (a few hundred tokens, not a full report)"""
+        summary = (financial.get("business_summary") or "")[:800]
+        prompt = f"""Holding: {ticker} ({financial.get('company_name')})
+Sector / industry: {financial.get('sector')} / {financial.get('industry')}
+Business summary: {summary}
+Sharia ratios: {financial.get('sharia_ratios')}
+Keyword screening: {keywords.get('category_scores')}
+Why it needs review: {'; '.join(decision['reasons'])}
+
+Answer with a first line "VERDICT: HALAL", "VERDICT: HARAM" or "VERDICT: QUESTIONABLE",
+then at most three sentences of justification in British English."""
+        try:
+            async with self._llm_calls:
+                response = await run_in_executor(
+                    "llm-io",
+                    self.agent.client.chat.completions.create,
+                    model=token_ledger.select_model(self.agent.model_name),
+                    messages=[
+                        {"role": "system", "content": "You are an Islamic finance screening analyst applying AAOIFI standards."},
+                        {"role": "user", "content": prompt},
+                    ],
+                    max_tokens=200,
+                    temperature=0.1,
+                )
+        except Exception as e:
+            print(f"⚠️ Batch LLM review failed for {ticker}: {e}")
+            return None
+
+        text = response.choices[0].message.content or ""
+        first_line = text.strip().splitlines()[0].upper() if text.strip() else ""
+        verdict = "QUESTIONABLE ⚠️"
+        if "HALAL" in first_line:
+            verdict = "HALAL ✅"
+        elif "HARAM" in first_line:
+            verdict = "HARAM ❌"
+        return {"verdict": verdict, "resolved_by": "llm", "llm_review": text.strip()}
@@ -0,0 +1,139 @@
+import re
+from typing import Any, Dict, Iterator, List, Tuple
+
+# --- Haram Vocabulary ---
+# Multi-word entries are phrases; bare words that are too generic on their own
+# ("interest", "gaming", "smoking") are only listed inside a disambiguating phrase.
+HARAM_TERMS: Dict[str, List[str]] = {
+    "alcohol": [
+        "alcohol", "alcoholic beverage", "beer", "wine", "winery", "spirits",
+        "brewery", "brewer", "brewing", "distillery", "distiller", "liquor",
+    ],
+    "pork": ["pork", "pig farming", "swine", "bacon", "ham"],
+    "gambling": [
+        "casino", "gambling", "lottery", "betting", "sportsbook", "wagering",
+        "casino gaming", "gaming machine", "igaming",
+    ],
+    "tobacco": ["tobacco", "cigarette", "e-cigarette", "cigar", "nicotine", "vaping product"],
+    "adult_entertainment": ["adult entertainment", "pornography", "strip club"],
+    "conventional_banking": [
+        "interest income", "interest-bearing", "net interest margin", "usury",
+        "conventional banking", "mortgage lending", "consumer lending", "payday loan",
+    ],
+}
+
+# Irregular forms the suffix rules below do not produce
+EXTRA_FORMS: Dict[str, List[str]] = {
+    "pornography": ["pornographic"],
+    "gambling": ["gamble", "gambler"],
+    "alcohol": ["alcoholic"],
+}
+
+# Weight of a match by the field it was found in (keyed on the leaf field name)
+FIELD_WEIGHTS: Dict[str, float] = {
+    "company_name": 1.5,
+    "industry": 1.5,
+    "sector": 1.0,
+    "business_summary": 1.0,
+    "snippet": 0.6,
+    "title": 0.5,
+}
+DEFAULT_FIELD_WEIGHT = 0.5
+CATEGORY_THRESHOLD = 1.0
+
+# Fields never worth scanning (URLs, dates, identifiers)
+SKIPPED_FIELDS = {"url", "href", "website", "timestamp", "date", "symbol", "source", "symbol_resolution"}
+
+def _inflect(word: str) -> str:
+    """Regex for a word plus its regular plural/verb suffixes"""
+    escaped = re.escape(word)
+    if word.endswith("y") and len(word) > 3:
+        return f"{re.escape(word[:-1])}(?:y|ies)"
+    if word.endswith(("s", "x", "ch", "sh")):
+        return f"{escaped}(?:es)?"
+    return f"{escaped}s?"
+
+def _term_pattern(term: str) -> str:
+    """Phrase words may be separated by spaces or hyphens; the last word is inflected"""
+    words = re.split(r"[\s\-]+", term)
+    body = r"[\s\-]+".join([re.escape(w) for w in words[:-1]] + [_inflect(words[-1])])
+    forms = [body] + [re.escape(extra) for extra in EXTRA_FORMS.get(term, [])]
+    return "|".join(forms)
+
+class HaramKeywordScreener:
+    """
+    Word-boundary keyword screener compiled into a single alternation regex.
+    One pass over each text finds every term; longer phrases are tried first.
+    """
+
+    def __init__(self, terms: Dict[str, List[str]] = HARAM_TERMS,
+                 field_weights: Dict[str, float] = FIELD_WEIGHTS,
+                 threshold: float = CATEGORY_THRESHOLD):
+        self.field_weights = field_weights
+        self.threshold = threshold
+        self._index: List[Tuple[str, str]] = []  # group number - 1 -> (category, term)
+        alternatives = []
+        ordered = sorted(
+            ((category, term) for category, words in terms.items() for term in words),
+            key=lambda item: -len(item[1]),
+        )
+        for category, term in ordered:
+            self._index.append((category, term))
+            alternatives.append(f"({_term_pattern(term)})")
+        self._pattern = re.compile(r"\b(?:" + "|".join(alternatives) + r")\b", re.IGNORECASE)
+
+    def scan(self, text: str, field: str = "text") -> List[Dict[str, Any]]:
+        """All matches in one text with character positions"""
+        weight = self.field_weights.get(field.rsplit(".", 1)[-1].split("[")[0], DEFAULT_FIELD_WEIGHT)
+        matches = []
+        for m in self._pattern.finditer(text):
+            category, term = self._index[m.lastindex - 1]
+            matches.append({
+                "category": category,
+                "term": term,
+                "matched": m.group(0),
+                "field": field,
+                "start": m.start(),
+                "end": m.end(),
+                "weight": weight,
+            })
+        return matches
+
+    def screen(self, data: Any) -> Dict[str, Any]:
+        """Scan every text field of (nested) research data and score each category"""
+        matches = []
+        for path, text in _iter_text_fields(data):
+            matches.extend(self.scan(text, path))
+
+        scores: Dict[str, float] = {}
+        terms: Dict[str, List[str]] = {}
+        for match in matches:
+            scores[match["category"]] = scores.get(match["category"], 0.0) + match["weight"]
+            found = terms.setdefault(match["category"], [])
+            if match["term"] not in found:
+                found.append(match["term"])
+
+        flagged = {c: t for c, t in terms.items() if scores[c] >= self.threshold}
+        return {
+            "haram_indicators_found": flagged,
+            "is_likely_haram": len(flagged) > 0,
+            "risk_level": "HIGH" if len(flagged) > 2 else "MEDIUM" if len(flagged) > 0 else "LOW",
+            "category_scores": {c: round(s, 2) for c, s in scores.items()},
+            "matches": matches,
+        }
+
+def _iter_text_fields(data: Any, path: str = "") -> Iterator[Tuple[str, str]]:
+    """Yield (field path, text) for every string leaf, skipping URLs and dates"""
+    if isinstance(data, dict):
+        for key, value in data.items():
+            if key in SKIPPED_FIELDS:
+                continue
+            yield from _iter_text_fields(value, f"{path}.{key}" if path else str(key))
+    elif isinstance(data, (list, tuple)):
+        for i, value in enumerate(data):
+            yield from _iter_text_fields(value, f"{path}[{i}]")
+    elif isinstance(data, str) and data:
+        yield path or "text", data
+
+# Global instance
+haram_screener = HaramKeywordScreener()
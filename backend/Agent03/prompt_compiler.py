@@ -0,0 +1,272 @@
+import json
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+from config import settings
+from .verdict_schema import STRUCTURED_INSTRUCTIONS
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    TIKTOKEN_AVAILABLE = False
+
+# --- Static Prompt Parts ---
+# Everything here is identical across calls and sent first, so provider-side
+# prompt caching can reuse it; only the compact research payload varies.
+ROLE = "You are an Expert Mufti in Islamic Finance, certified by AAOIFI and Al-Azhar University, with access to real-time research tools."
+
+ANALYSIS_INSTRUCTIONS = """ANALYSIS MISSION:
+1. Complete analysis according to Islamic Sharia principles
+2. Use the real-time research data supplied by the user message
+3. Verify both business AND financial compliance
+4. Determine status: HALAL ✅, HARAM ❌, or QUESTIONABLE ⚠️
+5. Justify with precise references to Islamic principles
+6. Propose halal alternatives if necessary
+
+EVALUATION CRITERIA:
+- Main activity (>95% halal required)
+- Financial ratios (limits are given with each ratio)
+- Interest income (<5% of revenue)
+- Forbidden sectors (alcohol, gambling, tobacco, etc.)
+- Ethical governance
+
+MANDATORY RESPONSE FORMAT:
+## 🕌 SHARIA VERDICT: [HALAL ✅ / HARAM ❌ / QUESTIONABLE ⚠️]
+
+### 📊 BUSINESS ANALYSIS:
+[Analysis of main activity based on collected data]
+
+### 💰 FINANCIAL ANALYSIS:
+[Sharia ratios, debt, interest income]
+
+### 🔍 AUTOMATED SCREENING:
+[Results of haram screening and validation]
+
+### 🤲 ISLAMIC JUSTIFICATION:
+[References to hadiths, Quran, and Sharia principles]
+
+### 📈 RESEARCH DATA USED:
+[Which sources were used for analysis]
+
+### 💡 HALAL ALTERNATIVES:
+[If HARAM/QUESTIONABLE, propose compliant investments]
+
+### 🎯 CONFIDENCE LEVEL: [HIGH/MEDIUM/LOW]
+[Based on quality of available data]
+
+### 🔄 RECOMMENDATIONS:
+[Additional recommended actions]
+
+Respond in British English with precision and religious authority."""
+
+# Financial fields that bear on a verdict (URLs, prices and identifiers are left out)
+FINANCIAL_FIELDS = (
+    "symbol", "company_name", "sector", "industry", "country",
+    "market_capitalisation", "revenue", "total_debt", "total_cash",
+    "interest_income", "receivables",
+)
+MONEY_FIELDS = {"market_capitalisation", "revenue", "total_debt", "total_cash", "interest_income", "receivables"}
+MIN_SECTION_TOKENS = 12
+
+def count_tokens(text: str, model: str = None) -> int:
+    """Token count with tiktoken when installed, otherwise ~4 characters per token"""
+    if TIKTOKEN_AVAILABLE:
+        return len(_encoding(model or settings.MODEL_NAME).encode(text))
+    return max(1, len(text) // 4) if text else 0
+
+_encodings: Dict[str, Any] = {}
+
+def _encoding(model: str):
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding("o200k_base")
+    return _encodings[model]
+
+def _money(value: Any) -> Any:
+    """Short money figure (2.91T, 845.0M) — fewer tokens than a 13-digit integer"""
+    if not isinstance(value, (int, float)):
+        return value
+    for unit, size in (("T", 1e12), ("B", 1e9), ("M", 1e6), ("K", 1e3)):
+        if abs(value) >= size:
+            return f"{value / size:.2f}{unit}"
+    return f"{value:g}"
+
+def _normalise(text: str) -> str:
+    return re.sub(r"[^a-z0-9 ]+", "", re.sub(r"\s+", " ", text.lower())).strip()
+
+def _dedupe_sentences(text: str, seen: set) -> str:
+    """Drop sentences already seen in this prompt (repeated boilerplate across sources)"""
+    kept = []
+    for sentence in re.split(r"(?<=[.!?])\s+", text.strip()):
+        key = _normalise(sentence)
+        if key and key not in seen:
+            seen.add(key)
+            kept.append(sentence)
+    return " ".join(kept)
+
+def _truncate(text: str, budget: int, model: str = None) -> str:
+    """Cut text to a token budget at a sentence (or word) boundary"""
+    if count_tokens(text, model) <= budget:
+        return text
+    approx = text[: budget * 4]
+    while approx and count_tokens(approx, model) > budget:
+        approx = approx[: int(len(approx) * 0.85)]
+    cut = max(approx.rfind(". "), approx.rfind("; "))
+    if cut < len(approx) // 2:
+        cut = approx.rfind(" ")
+    return approx[: cut + 1].rstrip() + " …" if cut > 0 else approx
+
+@dataclass
+class CompiledPrompt:
+    system: str
+    user: str
+    prompt_tokens: int
+    baseline_tokens: int
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(0, self.baseline_tokens - self.prompt_tokens)
+
+    def messages(self) -> List[Dict[str, str]]:
+        return [{"role": "system", "content": self.system}, {"role": "user", "content": self.user}]
+
+class PromptCompiler:
+    """
+    Builds the verdict prompt from research data:
+    - a static system prefix (role, knowledge base, instructions, format)
+    - a compact user payload with only verdict-relevant fields, de-duplicated
+      snippets, truncated lowest-priority-first to SHARIA_PROMPT_TOKEN_BUDGET
+    and records tokens sent and saved against the old full-JSON prompt.
+    """
+
+    def __init__(self, knowledge_base: str, token_budget: int = None, model: str = None):
+        self.model = model or settings.MODEL_NAME
+        self.token_budget = token_budget or settings.SHARIA_PROMPT_TOKEN_BUDGET
+        self.knowledge_base = knowledge_base
+        self.system_prefix = f"{ROLE}\n\nSHARIA KNOWLEDGE BASE:\n{knowledge_base.strip()}\n\n{ANALYSIS_INSTRUCTIONS}"
+        self.structured_prefix = f"{self.system_prefix}\n\n{STRUCTURED_INSTRUCTIONS}"
+        self.system_tokens = count_tokens(self.system_prefix, self.model)
+        self.structured_tokens = count_tokens(self.structured_prefix, self.model)
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._prompt_tokens = 0
+        self._saved_tokens = 0
+        self._cached_tokens = 0
+
+    def compile(self, query: str, research_data: Dict[str, Any], haram_check: Dict[str, Any],
+                structured: bool = False) -> CompiledPrompt:
+        """Compact prompt for one verdict, with token accounting"""
+        system = self.structured_prefix if structured else self.system_prefix
+        sections = self._sections(research_data, haram_check)
+        user = self._render(query, sections)
+        prefix_tokens = self.structured_tokens if structured else self.system_tokens
+        prompt_tokens = prefix_tokens + count_tokens(user, self.model)
+        baseline_tokens = count_tokens(self._baseline(query, research_data, haram_check), self.model)
+
+        compiled = CompiledPrompt(system, user, prompt_tokens, baseline_tokens)
+        with self._lock:
+            self._calls += 1
+            self._prompt_tokens += compiled.prompt_tokens
+            self._saved_tokens += compiled.saved_tokens
+        return compiled
+
+    def record_usage(self, usage: Any):
+        """Count prompt tokens the provider served from its cache (when reported)"""
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) or 0
+        with self._lock:
+            self._cached_tokens += cached
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "calls": self._calls,
+                "system_prefix_tokens": self.system_tokens,
+                "token_budget": self.token_budget,
+                "prompt_tokens": self._prompt_tokens,
+                "tokens_saved": self._saved_tokens,
+                "provider_cached_tokens": self._cached_tokens,
+                "tokeniser": "tiktoken" if TIKTOKEN_AVAILABLE else "approximate",
+            }
+
+    def _sections(self, research_data: Dict[str, Any], haram_check: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Payload sections in priority order, each with the share of budget it may use"""
+        financial = research_data.get("financial_data") or {}
+        facts = {}
+        if "error" not in financial:
+            for field in FINANCIAL_FIELDS:
+                if financial.get(field) not in (None, ""):
+                    facts[field] = _money(financial[field]) if field in MONEY_FIELDS else financial[field]
+        ratios = {
+            name: f"{r['value']}% (limit {r['limit']}%, {'compliant' if r['compliant'] else 'NOT compliant'})"
+            for name, r in (financial.get("sharia_ratios") or {}).items()
+            if isinstance(r, dict) and "value" in r
+        }
+        for key in ("methodology", "note"):
+            if (financial.get("sharia_ratios") or {}).get(key):
+                ratios[key] = financial["sharia_ratios"][key]
+        screening = {
+            "indicators": haram_check.get("haram_indicators_found") or {},
+            "risk_level": haram_check.get("risk_level"),
+            "category_scores": haram_check.get("category_scores") or {},
+        }
+
+        seen: set = set()
+        summary = _dedupe_sentences(financial.get("business_summary") or "", seen)
+        web = self._unique_snippets((research_data.get("web_research") or {}).get("results", []), seen)
+        news = self._unique_snippets((research_data.get("recent_news") or {}).get("news", []), seen)
+
+        return [
+            {"title": "COMPANY", "lines": [f"{k}: {v}" for k, v in facts.items()] or ["No financial data found"], "share": None},
+            {"title": "SHARIA RATIOS", "lines": [f"{k}: {v}" for k, v in ratios.items()] or ["Not available"], "share": None},
+            {"title": "AUTOMATED HARAM SCREENING", "lines": [json.dumps(screening, separators=(",", ":"), ensure_ascii=False)], "share": None},
+            {"title": "BUSINESS SUMMARY", "lines": [summary] if summary else [], "share": 0.5},
+            {"title": "WEB RESEARCH", "lines": web, "share": 0.3},
+            {"title": "RECENT NEWS", "lines": news, "share": 0.2},
+        ]
+
+    @staticmethod
+    def _unique_snippets(items: List[Dict[str, Any]], seen: set) -> List[str]:
+        """'title — snippet' lines without URLs, dropping sentences already used"""
+        lines = []
+        for item in items:
+            title = (item.get("title") or "").strip()
+            snippet = _dedupe_sentences(item.get("snippet") or "", seen)
+            if not snippet and (not title or _normalise(title) in seen):
+                continue
+            seen.add(_normalise(title))
+            lines.append(f"- {title} — {snippet}" if snippet and title else f"- {title or snippet}")
+        return lines
+
+    def _render(self, query: str, sections: List[Dict[str, Any]]) -> str:
+        header = f'SHARIA ANALYSIS REQUEST: "{query}"\n\nCOLLECTED RESEARCH DATA:'
+        fixed = [s for s in sections if s["share"] is None]
+        flexible = [s for s in sections if s["share"] is not None and s["lines"]]
+
+        blocks = [header] + [f"{s['title']}:\n" + "\n".join(s["lines"]) for s in fixed]
+        remaining = self.token_budget - count_tokens("\n\n".join(blocks), self.model)
+
+        # Unused share of a section flows down to the next one
+        carry = 0
+        for section in flexible:
+            budget = int(max(0, remaining) * section["share"]) + carry
+            text = "\n".join(section["lines"])
+            if budget < MIN_SECTION_TOKENS:
+                continue
+            fitted = _truncate(text, budget, self.model)
+            carry = max(0, budget - count_tokens(fitted, self.model))
+            blocks.append(f"{section['title']}:\n{fitted}")
+        return "\n\n".join(blocks)
+
+    def _baseline(self, query: str, research_data: Dict[str, Any], haram_check: Dict[str, Any]) -> str:
+        """The pre-compiler prompt: full research JSON plus the knowledge base in the user turn"""
+        screening = {k: v for k, v in haram_check.items() if k != "matches"}
+        return (
+            f'{ROLE}\n"{query}"\n{json.dumps(research_data, indent=2, default=str)}\n'
+            f"{json.dumps(screening, indent=2)}\n{self.knowledge_base}\n{ANALYSIS_INSTRUCTIONS}"
+        )
@@ -0,0 +1,150 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import settings
+
+@dataclass(frozen=True)
+class RatioDefinition:
+    """One screening ratio: sum of numerator columns over a denominator, in percent"""
+    numerator: Tuple[str, ...]
+    denominator: str
+    zero_if_missing: bool = False  # treat a missing numerator as 0 rather than "not screened"
+
+@dataclass(frozen=True)
+class Methodology:
+    """Ratio limits (in percent) of one Sharia screening standard"""
+    name: str
+    limits: Dict[str, float] = field(default_factory=dict)
+    description: str = ""
+
+# --- Ratio Definitions ---
+RATIOS: Dict[str, RatioDefinition] = {
+    "debt_to_market_capitalisation": RatioDefinition(("total_debt",), "market_capitalisation", zero_if_missing=True),
+    "cash_to_market_capitalisation": RatioDefinition(("total_cash",), "market_capitalisation", zero_if_missing=True),
+    "receivables_to_market_capitalisation": RatioDefinition(("receivables",), "market_capitalisation"),
+    "liquid_assets_to_market_capitalisation": RatioDefinition(("total_cash", "receivables"), "market_capitalisation"),
+    "interest_income_to_revenue": RatioDefinition(("interest_income",), "revenue"),
+}
+
+# --- Screening Standards ---
+# Market capitalisation stands in for the trailing average market value that
+# DJIM (24 months) and S&P (36 months) use; Yahoo only exposes the current one.
+METHODOLOGIES: Dict[str, Methodology] = {
+    "AAOIFI": Methodology("AAOIFI", {
+        "debt_to_market_capitalisation": 30.0,
+        "cash_to_market_capitalisation": 30.0,
+        "receivables_to_market_capitalisation": 33.0,
+        "interest_income_to_revenue": 5.0,
+    }, "AAOIFI Shari'ah Standard No. 21"),
+    "DJIM": Methodology("DJIM", {
+        "debt_to_market_capitalisation": 33.0,
+        "cash_to_market_capitalisation": 33.0,
+        "receivables_to_market_capitalisation": 33.0,
+        "interest_income_to_revenue": 5.0,
+    }, "Dow Jones Islamic Market indices"),
+    "SP": Methodology("SP", {
+        "debt_to_market_capitalisation": 33.0,
+        "cash_to_market_capitalisation": 33.0,
+        "liquid_assets_to_market_capitalisation": 49.0,
+        "interest_income_to_revenue": 5.0,
+    }, "S&P Shariah indices"),
+}
+METHODOLOGY_ALIASES = {"S&P": "SP", "S&P500": "SP", "DOW JONES": "DJIM", "DJ": "DJIM"}
+
+FUNDAMENTAL_COLUMNS = sorted({c for r in RATIOS.values() for c in r.numerator + (r.denominator,)})
+
+# Statement rows (first one present wins) for fundamentals missing from Ticker.info
+STATEMENT_ROWS = {
+    "interest_income": ("Interest Income", "Interest Income Non Operating"),
+    "receivables": ("Receivables", "Accounts Receivable", "Gross Accounts Receivable"),
+    "revenue": ("Total Revenue", "Operating Revenue"),
+}
+
+def get_methodology(name: Optional[str] = None) -> Methodology:
+    """Look up a screening standard by name (defaults to SHARIA_METHODOLOGY)"""
+    key = (name or settings.SHARIA_METHODOLOGY).strip().upper()
+    key = METHODOLOGY_ALIASES.get(key, key)
+    if key not in METHODOLOGIES:
+        raise ValueError(f"Unknown Sharia methodology '{name}'. Choose from: {', '.join(METHODOLOGIES)}")
+    return METHODOLOGIES[key]
+
+def screen_fundamentals(fundamentals: pd.DataFrame, methodology: Optional[str] = None) -> pd.DataFrame:
+    """
+    Vectorised ratio screen over a fundamentals table (one row per company).
+    Adds <ratio>_value / <ratio>_compliant columns for every ratio the standard
+    limits, plus ratios_screened and sharia_compliant. A ratio whose inputs are
+    missing (or whose denominator is not positive) is NaN and not counted.
+    """
+    method = get_methodology(methodology)
+    df = fundamentals.copy()
+    for col in FUNDAMENTAL_COLUMNS:
+        if col not in df.columns:
+            df[col] = np.nan
+    numeric = df[FUNDAMENTAL_COLUMNS].apply(pd.to_numeric, errors="coerce")
+
+    passed = np.ones(len(df), dtype=bool)
+    screened = np.zeros(len(df), dtype=np.int64)
+    for name, limit in method.limits.items():
+        ratio = RATIOS[name]
+        parts = numeric[list(ratio.numerator)]
+        if ratio.zero_if_missing:
+            parts = parts.fillna(0.0)
+        numerator = parts.sum(axis=1, min_count=len(ratio.numerator)).to_numpy(dtype=float)
+        denominator = numeric[ratio.denominator].to_numpy(dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            value = np.where(denominator > 0, numerator / denominator * 100.0, np.nan)
+        value = np.round(value, 2)
+        available = ~np.isnan(value)
+        df[f"{name}_value"] = value
+        df[f"{name}_compliant"] = pd.Series(value <= limit, index=df.index, dtype="boolean").mask(~available)
+        passed &= ~available | (value <= limit)
+        screened += available
+
+    df["ratios_screened"] = screened
+    df["sharia_compliant"] = pd.Series(passed, index=df.index, dtype="boolean").mask(screened == 0)
+    df["methodology"] = method.name
+    return df
+
+def ratios_for_company(financial_data: Dict[str, Any], methodology: Optional[str] = None) -> Dict[str, Any]:
+    """Ratio screen of a single company in the per-ratio dict format used in reports"""
+    method = get_methodology(methodology)
+    row = screen_fundamentals(pd.DataFrame([{c: financial_data.get(c) for c in FUNDAMENTAL_COLUMNS}]), method.name).iloc[0]
+
+    ratios: Dict[str, Any] = {}
+    skipped = []
+    for name, limit in method.limits.items():
+        value = row[f"{name}_value"]
+        if pd.isna(value):
+            skipped.append(name)
+            continue
+        ratios[name] = {"value": float(value), "limit": limit, "compliant": bool(value <= limit)}
+    ratios["methodology"] = method.name
+    if skipped:
+        ratios["note"] = f"Not screened (missing data): {', '.join(skipped)}"
+    return ratios
+
+def fundamentals_from_statements(income_statement: Optional[pd.DataFrame],
+                                 balance_sheet: Optional[pd.DataFrame]) -> Dict[str, float]:
+    """Latest interest income, revenue and receivables from yfinance statements"""
+    found: Dict[str, float] = {}
+    for statement in (income_statement, balance_sheet):
+        if statement is None or statement.empty:
+            continue
+        # yfinance orders columns newest first
+        latest = statement.iloc[:, 0]
+        for key, rows in STATEMENT_ROWS.items():
+            if key in found:
+                continue
+            for row in rows:
+                if row in latest.index and pd.notna(latest[row]):
+                    found[key] = float(latest[row])
+                    break
+    return found
+
+def fundamentals_frame(records: Iterable[Dict[str, Any]], index: str = "symbol") -> pd.DataFrame:
+    """Build a fundamentals table from per-company dicts (e.g. financial_data)"""
+    rows: List[Dict[str, Any]] = [{c: r.get(c) for c in FUNDAMENTAL_COLUMNS + [index]} for r in records]
+    return pd.DataFrame(rows, columns=FUNDAMENTAL_COLUMNS + [index]).set_index(index)
@@ -0,0 +1,199 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from config import settings
+from .batch_screening import classify_holding
+from .keyword_screener import haram_screener
+from .symbol_index import get_symbol_index
+
+# Free-text sector words mapped onto the sector names used in the listing
+SECTOR_SYNONYMS: Dict[str, List[str]] = {
+    "tech": ["Technology"],
+    "software": ["Technology"],
+    "semiconductor": ["Technology"],
+    "health": ["Healthcare"],
+    "pharma": ["Healthcare"],
+    "medical": ["Healthcare"],
+    "energy": ["Energy", "Utilities"],
+    "oil": ["Energy"],
+    "renewable": ["Utilities", "Energy"],
+    "consumer": ["Consumer Cyclical", "Consumer Defensive"],
+    "retail": ["Consumer Cyclical", "Consumer Defensive"],
+    "food": ["Consumer Defensive"],
+    "beverage": ["Consumer Defensive"],
+    "finance": ["Financial Services"],
+    "financial": ["Financial Services"],
+    "bank": ["Financial Services"],
+    "insurance": ["Financial Services"],
+    "reit": ["Real Estate"],
+    "property": ["Real Estate"],
+    "media": ["Communication Services"],
+    "telecom": ["Communication Services"],
+    "materials": ["Basic Materials"],
+    "mining": ["Basic Materials"],
+    "industrial": ["Industrials"],
+}
+# Order in which verdicts are offered as alternatives (HARAM is never offered)
+VERDICT_RANK = {"HALAL ✅": 0, "QUESTIONABLE ⚠️": 1}
+
+def match_sectors(sector: str, known: Iterable[str]) -> List[str]:
+    """Listing sectors matching a free-text sector ("tech", "Consumer", "Financial Services")"""
+    wanted = sector.strip().lower()
+    known = list(known)
+    matched = [s for s in known if wanted in s.lower() or s.lower() in wanted]
+    for word, sectors in SECTOR_SYNONYMS.items():
+        if word in wanted:
+            matched.extend(s for s in sectors if s in known)
+    return list(dict.fromkeys(matched))
+
+class SectorIndex:
+    """
+    Per-sector candidate universe (from the symbol index) with cached metrics.
+    Stale or missing metrics are fetched concurrently under a semaphore with a
+    per-ticker timeout, so a round costs roughly one lookup and returns
+    whatever finished in time. Rounds continue until enough compliant names
+    are found, the screened pool is exhausted or the time budget runs out.
+    A background loop keeps cached entries fresh.
+    """
+
+    def __init__(self, fetch: Callable[[str], Awaitable[Dict[str, Any]]],
+                 ttl_hours: float = None, concurrency: int = None, timeout: float = None,
+                 max_screened: int = None, budget_seconds: float = None):
+        self._fetch = fetch
+        self.ttl = timedelta(hours=ttl_hours if ttl_hours is not None else settings.SHARIA_SECTOR_TTL_HOURS)
+        self.timeout = timeout or settings.SHARIA_ALTERNATIVE_TIMEOUT_SECONDS
+        self.max_screened = max_screened or settings.SHARIA_ALTERNATIVES_MAX_SCREENED
+        self.budget = budget_seconds or settings.SHARIA_ALTERNATIVES_BUDGET_SECONDS
+        self._semaphore = asyncio.Semaphore(concurrency or settings.SHARIA_ALTERNATIVES_CONCURRENCY)
+        self._metrics: Dict[str, Dict[str, Any]] = {}
+        self._refreshed = 0
+
+    async def alternatives(self, sector: str, limit: int = None, exclude: Iterable[str] = ()) -> Dict[str, Any]:
+        """Compliant companies in a sector, ranked by verdict then market capitalisation"""
+        started = time.perf_counter()
+        limit = limit or settings.SHARIA_ALTERNATIVES_LIMIT
+        symbol_index = get_symbol_index()
+        listing_sectors = match_sectors(sector, {s for s in symbol_index.sectors if s})
+        excluded = {s.upper() for s in exclude}
+        universe = [
+            symbol for name in listing_sectors for symbol in symbol_index.symbols_in_sector(name)
+            if symbol not in excluded
+        ]
+
+        # Cached non-compliant names are skipped; each round screens a few spare
+        # candidates, and further rounds run only while compliant names are missing
+        pool = [s for s in universe if self._offerable(s)][:self.max_screened]
+        round_size = limit + 3
+        details: Dict[str, Dict[str, Any]] = {}
+        unavailable: Dict[str, str] = {}
+        from_cache = 0
+        compliant: List[str] = []
+        for start in range(0, len(pool), round_size):
+            if start and time.perf_counter() - started + self.timeout > self.budget:
+                break
+            enriched = await self.enrich(pool[start:start + round_size])
+            details.update(enriched["details"])
+            unavailable.update(enriched["unavailable"])
+            from_cache += enriched["from_cache"]
+            compliant = [s for s in pool if s in details and details[s]["verdict"] in VERDICT_RANK]
+            if len(compliant) >= limit:
+                break
+
+        ranked = sorted(
+            compliant,
+            key=lambda s: (VERDICT_RANK[details[s]["verdict"]], -(details[s].get("market_capitalisation") or 0)),
+        )[:limit]
+        return {
+            "sector": sector,
+            "listing_sectors": listing_sectors,
+            "suggested_alternatives": ranked,
+            "alternative_details": {s: details[s] for s in ranked},
+            "screened": len(details) + len(unavailable),
+            "unavailable": unavailable,
+            "from_cache": from_cache,
+            "elapsed_seconds": round(time.perf_counter() - started, 2),
+        }
+
+    async def enrich(self, symbols: List[str]) -> Dict[str, Any]:
+        """Metrics for each symbol: cached when fresh, otherwise fetched concurrently"""
+        now = datetime.utcnow()
+        details = {s: self._metrics[s] for s in symbols if self._is_fresh(s, now)}
+        stale = [s for s in symbols if s not in details]
+        from_cache = len(details)
+
+        results = await asyncio.gather(*(self._lookup(s) for s in stale), return_exceptions=True)
+        unavailable = {}
+        for symbol, result in zip(stale, results):
+            if isinstance(result, asyncio.TimeoutError):
+                unavailable[symbol] = f"timed out after {self.timeout}s"
+            elif isinstance(result, Exception):
+                unavailable[symbol] = str(result)
+            elif result is None:
+                unavailable[symbol] = "no financial data"
+            else:
+                details[symbol] = result
+        return {"details": details, "unavailable": unavailable, "from_cache": from_cache}
+
+    async def refresh_stale(self) -> int:
+        """Re-fetch every cached entry past its TTL; returns how many were refreshed"""
+        now = datetime.utcnow()
+        stale = [s for s in list(self._metrics) if not self._is_fresh(s, now)]
+        if stale:
+            result = await self.enrich(stale)
+            print(f"🔄 Sector index: refreshed {len(result['details'])}/{len(stale)} stale entries")
+            return len(result["details"])
+        return 0
+
+    async def run_refresh_loop(self, interval_minutes: float = None):
+        """Background task keeping cached sector metrics within their TTL"""
+        interval = (interval_minutes or settings.SHARIA_SECTOR_REFRESH_MINUTES) * 60
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.refresh_stale()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Sector index refresh error: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        return {
+            "cached_symbols": len(self._metrics),
+            "fresh": sum(self._is_fresh(s, now) for s in self._metrics),
+            "lookups": self._refreshed,
+            "ttl_hours": self.ttl.total_seconds() / 3600,
+        }
+
+    async def _lookup(self, symbol: str) -> Optional[Dict[str, Any]]:
+        async with self._semaphore:
+            info = await asyncio.wait_for(self._fetch(symbol), timeout=self.timeout)
+        if not info or "error" in info:
+            return None
+
+        keywords = haram_screener.screen({"financial_data": info})
+        decision = classify_holding(info, keywords)
+        metrics = {
+            "name": info.get("company_name"),
+            "price": info.get("current_price"),
+            "market_capitalisation": info.get("market_capitalisation"),
+            "sector": info.get("sector"),
+            "industry": info.get("industry"),
+            "verdict": decision["verdict"],
+            "reasons": decision["reasons"],
+            "sharia_ratios": info.get("sharia_ratios"),
+            "refreshed_at": datetime.utcnow(),
+        }
+        self._metrics[symbol] = metrics
+        self._refreshed += 1
+        return metrics
+
+    def _is_fresh(self, symbol: str, now: datetime) -> bool:
+        entry = self._metrics.get(symbol)
+        return entry is not None and now - entry["refreshed_at"] < self.ttl
+
+    def _offerable(self, symbol: str) -> bool:
+        entry = self._metrics.get(symbol)
+        return entry is None or entry["verdict"] in VERDICT_RANK
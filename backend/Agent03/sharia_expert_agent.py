@@ -2,16 +2,29 @@ import os
 import asyncio
 import json
 import re
-import requests
-import yfinance as yf
 from pathlib import Path
 from typing import Dict, List, Optional, Any, Union
 from datetime import datetime, timedelta
-import openai
-from openai import OpenAI
 from dataclasses import dataclass
-from bs4 import BeautifulSoup
 import time
+from Services.executors import run_in_executor, ExecutorSaturated
+from config import settings
+from Services.http_clients import get_web_session, get_yahoo_session
+from Services.tracing import traced, annotate
+from Services.lazy_imports import lazy_import
+from Database.token_ledger import token_ledger
+from .keyword_screener import haram_screener
+from .verdict_store import verdict_store, financial_fingerprint
+from .symbol_index import get_symbol_index
+from .ratio_engine import ratios_for_company, fundamentals_from_statements
+from .sector_index import SectorIndex
+from .prompt_compiler import PromptCompiler
+from .verdict_schema import VERDICT_SCHEMA, VERDICT_LABELS, parse_structured, parse_free_text, ratio_breaches
+
+# Research stack, imported on first use (or by the post-startup warm-up)
+yf = lazy_import("yfinance")
+openai = lazy_import("openai")
+bs4 = lazy_import("bs4")
 
 @dataclass
 class InvestmentInfo:
@@ -33,19 +46,25 @@ class ShariaExpertAgent:
     Expert Agent in Islamic Finance with research tools
     """
     
-    def __init__(self, openai_api_key: str, model_name: str = "gpt-4"):
+    def __init__(self, openai_api_key: str, model_name: str = "gpt-4", client: Optional["openai.OpenAI"] = None):
         self.openai_api_key = openai_api_key
         self.model_name = model_name
-        self.client = OpenAI(api_key=openai_api_key)
+        # Reuse the process-wide client when given one (see Services.agent_registry)
+        self.client = client or openai.OpenAI(api_key=openai_api_key)
         
         # Sharia knowledge base
         self.sharia_principles = self._load_sharia_knowledge()
+        # Static knowledge base goes in a cacheable system prefix; research is compacted
+        self.prompt_compiler = PromptCompiler(self.sharia_principles, model=model_name)
         
-        # Tools configuration
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
+        # Tools configuration: pooled keep-alive sessions shared across agents
+        self.session = get_web_session()
+        
+        # Sector universe with cached metrics for halal alternatives
+        self.sector_index = SectorIndex(self._get_yahoo_finance_info)
+        
+        # Statement fundamentals change once a quarter: kept per symbol for the verdict TTL
+        self._statement_cache: Dict[str, tuple] = {}  # symbol -> (fetched_at, fundamentals)
         
         print("🕌 Sharia Expert Agent initialised with research tools")
     
@@ -98,15 +117,17 @@ class ShariaExpertAgent:
 - Certified Islamic funds: Amana, Azzad, Wahed
 """
 
-    async def search_company_info(self, query: str) -> Dict[str, Any]:
+    @traced("sharia.research")
+    async def search_company_info(self, query: str, financial_info: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """
         Search for company information via different sources
         """
         try:
             print(f"🔍 Searching company info for: {query}")
             
-            # 1. Yahoo Finance (if it's a symbol)
-            financial_info = await self._get_yahoo_finance_info(query)
+            # 1. Yahoo Finance (if it's a symbol), unless already fetched
+            if financial_info is None:
+                financial_info = await self._get_yahoo_finance_info(query)
             
             # 2. General web search
             web_info = await self._search_web_company_info(query)
@@ -125,23 +146,40 @@ class ShariaExpertAgent:
             
             return combined_info
             
+        except ExecutorSaturated:
+            raise
         except Exception as e:
             print(f"❌ Error searching company info: {e}")
             return {"error": str(e), "query": query}
     
+    @traced("sharia.research.yahoo")
     async def _get_yahoo_finance_info(self, symbol_or_name: str) -> Dict[str, Any]:
         """
         Retrieves financial information via Yahoo Finance
         """
         try:
-            # Try as symbol first
-            if len(symbol_or_name) <= 5 and symbol_or_name.isalpha():
-                ticker = yf.Ticker(symbol_or_name.upper())
+            # Resolve names and tickers locally before any network call
+            resolved = self._resolve_symbol(symbol_or_name)
+            if resolved:
+                ticker = yf.Ticker(resolved["symbol"], session=get_yahoo_session())
+            elif len(symbol_or_name) <= 5 and symbol_or_name.isalpha():
+                ticker = yf.Ticker(symbol_or_name.upper(), session=get_yahoo_session())
             else:
-                # Search symbol by name
-                ticker = yf.Ticker(symbol_or_name)
-            
-            info = ticker.info
+                # Unknown to the index: let Yahoo try the raw text
+                ticker = yf.Ticker(symbol_or_name, session=get_yahoo_session())
+            
+            # Profile and statements are independent requests: fetch them together,
+            # or only the profile while the statements are cached
+            statements = self._cached_statements(ticker.ticker)
+            if statements is None:
+                info, statements = await asyncio.gather(
+                    run_in_executor("market-io", lambda: ticker.info),
+                    run_in_executor("market-io", self._get_statement_fundamentals, ticker),
+                )
+                if statements and info and 'symbol' in info:
+                    self._remember_statements(ticker.ticker, statements)
+            else:
+                info = await run_in_executor("market-io", lambda: ticker.info)
             
             if not info or 'symbol' not in info:
                 return {"error": "No financial data found"}
@@ -162,56 +200,71 @@ class ShariaExpertAgent:
                 "country": info.get("country"),
                 "employees": info.get("fullTimeEmployees"),
                 "pe_ratio": info.get("trailingPE"),
-                "debt_to_equity": info.get("debtToEquity")
+                "debt_to_equity": info.get("debtToEquity"),
+                "symbol_resolution": resolved
             }
             
+            # Interest income and receivables only come from the statements
+            for key, value in statements.items():
+                if financial_data.get(key) is None:
+                    financial_data[key] = value
+            
             # Calculate Sharia ratios
             ratios = self._calculate_sharia_ratios(financial_data)
             financial_data["sharia_ratios"] = ratios
             
             return financial_data
             
+        except ExecutorSaturated:
+            raise
         except Exception as e:
             print(f"⚠️ Yahoo Finance error: {e}")
             return {"error": f"Yahoo Finance error: {str(e)}"}
     
+    def _resolve_symbol(self, symbol_or_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Offline name → ticker resolution via the bundled symbol index
+        """
+        try:
+            return get_symbol_index().resolve(symbol_or_name)
+        except Exception as e:
+            print(f"⚠️ Symbol index unavailable: {e}")
+            return None
+    
+    def _get_statement_fundamentals(self, ticker) -> Dict[str, float]:
+        """
+        Interest income and receivables from the latest income statement and balance sheet
+        """
+        try:
+            return fundamentals_from_statements(ticker.income_stmt, ticker.balance_sheet)
+        except Exception as e:
+            print(f"⚠️ Financial statements unavailable: {e}")
+            return {}
+    
+    def _cached_statements(self, symbol: str) -> Optional[Dict[str, float]]:
+        entry = self._statement_cache.get(symbol.upper())
+        if entry and time.time() - entry[0] < settings.SHARIA_VERDICT_TTL_HOURS * 3600:
+            return entry[1]
+        return None
+    
+    def _remember_statements(self, symbol: str, statements: Dict[str, float]) -> None:
+        now = time.time()
+        ttl = settings.SHARIA_VERDICT_TTL_HOURS * 3600
+        # Drop expired entries so free-text lookups cannot grow the cache unbounded
+        for key in [k for k, (fetched_at, _) in self._statement_cache.items() if now - fetched_at >= ttl]:
+            del self._statement_cache[key]
+        self._statement_cache[symbol.upper()] = (now, statements)
+    
     def _calculate_sharia_ratios(self, financial_data: Dict) -> Dict[str, Any]:
         """
-        Calculate Sharia-compliant ratios
+        Calculate Sharia-compliant ratios under the configured methodology
         """
         try:
-            market_capitalisation = financial_data.get("market_capitalisation", 0)
-            total_debt = financial_data.get("total_debt", 0)
-            total_cash = financial_data.get("total_cash", 0)
-            revenue = financial_data.get("revenue", 0)
-            
-            ratios = {}
-            
-            # Debt/capitalisation ratio
-            if market_capitalisation and market_capitalisation > 0:
-                debt_ratio = (total_debt / market_capitalisation) * 100 if total_debt else 0
-                ratios["debt_to_market_capitalisation"] = {
-                    "value": round(debt_ratio, 2),
-                    "limit": 33.0,
-                    "compliant": debt_ratio <= 33.0
-                }
-                
-                # Cash/capitalisation ratio
-                cash_ratio = (total_cash / market_capitalisation) * 100 if total_cash else 0
-                ratios["cash_to_market_capitalisation"] = {
-                    "value": round(cash_ratio, 2),
-                    "limit": 33.0,
-                    "compliant": cash_ratio <= 33.0
-                }
-            
-            # Note: Interest income requires more detailed data
-            ratios["note"] = "Interest income requires detailed financial statement analysis"
-            
-            return ratios
-            
+            return ratios_for_company(financial_data)
         except Exception as e:
             return {"error": f"Ratio calculation error: {str(e)}"}
     
+    @traced("sharia.research.web")
     async def _search_web_company_info(self, query: str) -> Dict[str, Any]:
         """
         Web search for additional information
@@ -220,9 +273,9 @@ class ShariaExpertAgent:
             # DuckDuckGo search (no API key needed)
             search_url = f"https://duckduckgo.com/html/?q={query} company business model activities"
             
-            response = self.session.get(search_url, timeout=10)
+            response = await run_in_executor("market-io", self.session.get, search_url)
             if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
+                soup = bs4.BeautifulSoup(response.content, 'html.parser')
                 
                 # Extract search results
                 results = []
@@ -241,10 +294,13 @@ class ShariaExpertAgent:
             
             return {"error": "Web search failed"}
             
+        except ExecutorSaturated:
+            raise
         except Exception as e:
             print(f"⚠️ Web search error: {e}")
             return {"error": f"Web search error: {str(e)}"}
     
+    @traced("sharia.research.news")
     async def _search_company_news(self, query: str) -> Dict[str, Any]:
         """
         Search for recent company news
@@ -253,9 +309,9 @@ class ShariaExpertAgent:
             # News search via DuckDuckGo News
             news_url = f"https://duckduckgo.com/html/?q={query} news&iar=news&df=m"
             
-            response = self.session.get(news_url, timeout=10)
+            response = await run_in_executor("market-io", self.session.get, news_url)
             if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
+                soup = bs4.BeautifulSoup(response.content, 'html.parser')
                 
                 news_items = []
                 for item in soup.find_all('div', class_='news-result')[:5]:
@@ -275,61 +331,53 @@ class ShariaExpertAgent:
             
             return {"error": "News search failed"}
             
+        except ExecutorSaturated:
+            raise
         except Exception as e:
             print(f"⚠️ News search error: {e}")
             return {"error": f"News search error: {str(e)}"}
     
     async def check_haram_keywords(self, company_info: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Check for haram keywords in company information
+        Check for haram keywords in company information (word-boundary, field-weighted)
         """
         try:
-            haram_keywords = {
-                "alcohol": ["alcohol", "beer", "wine", "spirits", "brewery", "distillery"],
-                "pork": ["pork", "pig", "swine", "bacon", "ham"],
-                "gambling": ["casino", "gambling", "lottery", "betting", "gaming"],
-                "tobacco": ["tobacco", "cigarette", "smoking", "nicotine"],
-                "adult_entertainment": ["adult entertainment", "pornography", "strip club"],
-                "conventional_banking": ["interest", "usury", "conventional banking", "mortgage lending"]
-            }
-            
-            found_issues = {}
-            text_to_check = ""
-            
-            # Gather all text to check
-            if isinstance(company_info, dict):
-                for key, value in company_info.items():
-                    if isinstance(value, str):
-                        text_to_check += f" {value}"
-                    elif isinstance(value, dict):
-                        text_to_check += f" {json.dumps(value)}"
-            
-            text_to_check = text_to_check.lower()
-            
-            # Check each category
-            for category, keywords in haram_keywords.items():
-                found_keywords = [kw for kw in keywords if kw in text_to_check]
-                if found_keywords:
-                    found_issues[category] = found_keywords
-            
-            return {
-                "haram_indicators_found": found_issues,
-                "is_likely_haram": len(found_issues) > 0,
-                "risk_level": "HIGH" if len(found_issues) > 2 else "MEDIUM" if len(found_issues) > 0 else "LOW"
-            }
-            
+            return haram_screener.screen(company_info)
         except Exception as e:
             return {"error": f"Keyword check error: {str(e)}"}
     
-    async def analyse_investment_comprehensive(self, investment_query: str) -> Dict[str, Any]:
+    async def analyse_investment_comprehensive(self, investment_query: str, force_refresh: bool = False) -> Dict[str, Any]:
         """
-        Comprehensive investment analysis with real-time research
+        Comprehensive investment analysis with real-time research.
+        Verdicts are reused from the verdict store until fundamentals change.
         """
         try:
+            # 0. Verdict store: fresh entries are served without any upstream call
+            cached = None
+            if not force_refresh:
+                try:
+                    resolved = self._resolve_symbol(investment_query)
+                    cached = await run_in_executor(
+                        "db-io", verdict_store.lookup, resolved["symbol"] if resolved else investment_query
+                    )
+                except Exception as e:
+                    print(f"⚠️ Verdict store unavailable: {e}")
+            if cached and verdict_store.is_fresh(cached):
+                print(f"⚡ Sharia verdict cache hit for: {investment_query} ({cached.symbol})")
+                return await run_in_executor("db-io", verdict_store.cached_report, cached, "hit")
+            
             print(f"🕌 Starting comprehensive Sharia analysis for: {investment_query}")
+            financial_info = await self._get_yahoo_finance_info(investment_query)
+            fingerprint = financial_fingerprint(financial_info) if "error" not in financial_info else None
+            
+            # Stale entry: unchanged fundamentals extend it, otherwise re-analyse
+            if (cached and fingerprint == cached.fingerprint
+                    and not verdict_store.is_expired(cached)):
+                print(f"♻️ Fundamentals unchanged for {cached.symbol}, reusing verdict")
+                return await run_in_executor("db-io", verdict_store.cached_report, cached, "revalidated")
             
             # 1. Search company information
-            company_research = await self.search_company_info(investment_query)
+            company_research = await self.search_company_info(investment_query, financial_info)
             
             # 2. Check haram keywords
             haram_check = await self.check_haram_keywords(company_research)
@@ -347,8 +395,21 @@ class ShariaExpertAgent:
                 "agent_version": "Expert_Sharia_v2.0"
             }
             
+            # 5. Store the verdict under the resolved symbol
+            symbol = financial_info.get("symbol")
+            if symbol and fingerprint and sharia_analysis.get("status") == "success":
+                try:
+                    await run_in_executor(
+                        "db-io", verdict_store.save, symbol, investment_query, comprehensive_report, fingerprint
+                    )
+                except Exception as e:
+                    print(f"⚠️ Could not store Sharia verdict for {symbol}: {e}")
+            comprehensive_report["cache"] = {"status": "miss", "symbol": symbol}
+            
             return comprehensive_report
             
+        except ExecutorSaturated:
+            raise
         except Exception as e:
             print(f"❌ Comprehensive analysis error: {e}")
             return {
@@ -357,96 +418,45 @@ class ShariaExpertAgent:
                 "investment_query": investment_query
             }
     
+    @traced("sharia.verdict")
     async def _analyse_with_ai(self, query: str, research_data: Dict, haram_check: Dict) -> Dict[str, Any]:
         """
         AI analysis with all collected data
         """
         try:
-            prompt = f"""
-You are an Expert Mufti in Islamic Finance, certified by AAOIFI and Al-Azhar University.
-
-SHARIA ANALYSIS REQUEST:
-"{query}"
-
-COLLECTED RESEARCH DATA:
-{json.dumps(research_data, indent=2, default=str)}
-
-AUTOMATED HARAM SCREENING:
-{json.dumps(haram_check, indent=2)}
-
-SHARIA KNOWLEDGE BASE:
-{self.sharia_principles}
-
-ANALYSIS MISSION:
-1. Complete analysis according to Islamic Sharia principles
-2. Use the real-time research data collected
-3. Verify both business AND financial compliance
-4. Determine status: HALAL ✅, HARAM ❌, or QUESTIONABLE ⚠️
-5. Justify with precise references to Islamic principles
-6. Propose halal alternatives if necessary
-
-EVALUATION CRITERIA:
-- Main activity (>95% halal required)
-- Financial ratios (debt/capitalisation ≤33%, etc.)
-- Interest income (<5% of revenue)
-- Forbidden sectors (alcohol, gambling, tobacco, etc.)
-- Ethical governance
-
-MANDATORY RESPONSE FORMAT:
-## 🕌 SHARIA VERDICT: [HALAL ✅ / HARAM ❌ / QUESTIONABLE ⚠️]
-
-### 📊 BUSINESS ANALYSIS:
-[Analysis of main activity based on collected data]
-
-### 💰 FINANCIAL ANALYSIS:
-[Sharia ratios, debt, interest income]
-
-### 🔍 AUTOMATED SCREENING:
-[Results of haram screening and validation]
-
-### 🤲 ISLAMIC JUSTIFICATION:
-[References to hadiths, Quran, and Sharia principles]
-
-### 📈 RESEARCH DATA USED:
-[Which sources were used for analysis]
-
-### 💡 HALAL ALTERNATIVES:
-[If HARAM/QUESTIONABLE, propose compliant investments]
-
-### 🎯 CONFIDENCE LEVEL: [HIGH/MEDIUM/LOW]
-[Based on quality of available data]
-
-### 🔄 RECOMMENDATIONS:
-[Additional recommended actions]
-
-Respond in British English with precision and religious authority.
-"""
-
-            response = self.client.chat.completions.create(
-                model=self.model_name,
-                messages=[
-                    {"role": "system", "content": "You are an Expert Mufti in Islamic Finance with access to real-time research tools."},
-                    {"role": "user", "content": prompt}
-                ],
-                max_tokens=2500,
-                temperature=0.2
-            )
-            
-            analysis_text = response.choices[0].message.content
-            
-            # Extract verdict
-            verdict = "QUESTIONABLE ⚠️"
-            if "HALAL ✅" in analysis_text:
-                verdict = "HALAL ✅"
-            elif "HARAM ❌" in analysis_text:
-                verdict = "HARAM ❌"
-            
-            # Extract confidence level
-            confidence = "MEDIUM"
-            if "CONFIDENCE: HIGH" in analysis_text or "HIGH" in analysis_text:
-                confidence = "HIGH"
-            elif "CONFIDENCE: LOW" in analysis_text or "LOW" in analysis_text:
-                confidence = "LOW"
+            structured = settings.SHARIA_STRUCTURED_OUTPUT
+            compiled = self.prompt_compiler.compile(query, research_data, haram_check, structured=structured)
+            annotate({"llm.compiled_prompt_tokens": compiled.prompt_tokens, "llm.saved_tokens": compiled.saved_tokens})
+            print(f"✂️ Sharia prompt: {compiled.prompt_tokens} tokens ({compiled.saved_tokens} saved)")
+
+            try:
+                response = await self._complete_verdict(compiled, structured)
+            except openai.BadRequestError as e:
+                if not structured:
+                    raise
+                # Model without json_schema support: same prompt, prose answer
+                print(f"⚠️ Structured output rejected, using text mode: {e}")
+                structured = False
+                compiled = self.prompt_compiler.compile(query, research_data, haram_check)
+                response = await self._complete_verdict(compiled, structured)
+            
+            content = response.choices[0].message.content or ""
+            ratios = (research_data.get("financial_data") or {}).get("sharia_ratios") or {}
+            parsed = None
+            if structured:
+                try:
+                    parsed = parse_structured(content)
+                    # Computed breaches are authoritative; keep any the model missed
+                    listed = {b["ratio"] for b in parsed["ratio_breaches"]}
+                    parsed["ratio_breaches"] += [b for b in ratio_breaches(ratios) if b["ratio"] not in listed]
+                except ValueError as e:
+                    print(f"⚠️ Invalid structured verdict, reading prose: {e}")
+            if parsed is None:
+                parsed = parse_free_text(content, ratios)
+            
+            analysis_text = parsed.pop("analysis_markdown") or content
+            verdict = VERDICT_LABELS[parsed["verdict"]]
+            confidence = parsed["confidence"]
             
             return {
                 "status": "success",
@@ -454,15 +464,37 @@ Respond in British English with precision and religious authority.
                 "analysis_text": analysis_text,
                 "confidence_level": confidence,
                 "research_based": True,
-                "sources_used": ["Yahoo Finance", "Web Search", "News Search", "Haram Screening", "Sharia Knowledge Base"]
+                "sources_used": ["Yahoo Finance", "Web Search", "News Search", "Haram Screening", "Sharia Knowledge Base"],
+                "prompt_tokens": {"sent": compiled.prompt_tokens, "saved": compiled.saved_tokens},
+                "structured": parsed
             }
             
+        except ExecutorSaturated:
+            raise
         except Exception as e:
             return {
                 "status": "error",
                 "message": f"AI analysis error: {str(e)}"
             }
     
+    @traced("openai.chat")
+    async def _complete_verdict(self, compiled, structured: bool):
+        """
+        One verdict completion, in JSON-schema mode when structured
+        """
+        extra = {"response_format": {"type": "json_schema", "json_schema": VERDICT_SCHEMA}} if structured else {}
+        response = await run_in_executor(
+            "llm-io",
+            self.client.chat.completions.create,
+            model=token_ledger.select_model(self.model_name),
+            messages=compiled.messages(),
+            max_tokens=2500,
+            temperature=0.2,
+            **extra
+        )
+        self.prompt_compiler.record_usage(getattr(response, "usage", None))
+        return response
+    
     async def get_halal_alternatives(self, haram_investment: str, sector: str = None) -> Dict[str, Any]:
         """
         Propose halal alternatives with current data search
@@ -470,9 +502,12 @@ Respond in British English with precision and religious authority.
         try:
             print(f"🔍 Searching halal alternatives for: {haram_investment}")
             
-            # Search for alternatives by sector
+            # Search for alternatives by sector (taken from the listing when not given)
+            resolved = self._resolve_symbol(haram_investment)
+            sector = sector or (resolved or {}).get("sector")
             if sector:
-                sector_alternatives = await self._search_sector_alternatives(sector)
+                exclude = [resolved["symbol"]] if resolved else []
+                sector_alternatives = await self._search_sector_alternatives(sector, exclude)
             else:
                 sector_alternatives = {}
             
@@ -488,51 +523,22 @@ Respond in British English with precision and religious authority.
                 "timestamp": datetime.now().isoformat()
             }
             
+        except ExecutorSaturated:
+            raise
         except Exception as e:
             return {
                 "status": "error",
                 "message": f"Alternatives search error: {str(e)}"
             }
     
-    async def _search_sector_alternatives(self, sector: str) -> Dict[str, Any]:
+    async def _search_sector_alternatives(self, sector: str, exclude: List[str] = ()) -> Dict[str, Any]:
         """
         Search for halal alternatives in the same sector
         """
         try:
-            # Base of known alternatives
-            known_halal_companies = {
-                "technology": ["AAPL", "MSFT", "GOOGL", "INTC", "AMD"],
-                "healthcare": ["JNJ", "PFE", "ABT", "MDT"],
-                "energy": ["TSLA", "FSLR", "NEE"],
-                "consumer": ["AMZN", "COST", "WMT"],
-                "finance": ["Sukuk alternatives", "Islamic REITs"]
-            }
-            
-            sector_lower = sector.lower()
-            alternatives = []
-            
-            for cat, companies in known_halal_companies.items():
-                if cat in sector_lower or sector_lower in cat:
-                    alternatives.extend(companies)
-            
-            # Search for current information on these alternatives
-            alternative_info = {}
-            for alt in alternatives[:5]:  # Limit to 5 to avoid too many requests
-                info = await self._get_yahoo_finance_info(alt)
-                if info and "error" not in info:
-                    alternative_info[alt] = {
-                        "name": info.get("company_name"),
-                        "price": info.get("current_price"),
-                        "market_capitalisation": info.get("market_capitalisation"),
-                        "sector": info.get("sector")
-                    }
-            
-            return {
-                "sector": sector,
-                "suggested_alternatives": alternatives,
-                "alternative_details": alternative_info
-            }
-            
+            return await self.sector_index.alternatives(sector, exclude=exclude)
+        except ExecutorSaturated:
+            raise
         except Exception as e:
             return {"error": f"Sector alternatives error: {str(e)}"}
     
@@ -584,8 +590,10 @@ REQUIRED FORMAT:
 Be precise, practical and actionable in your recommendations.
 """
 
-            response = self.client.chat.completions.create(
-                model=self.model_name,
+            response = await run_in_executor(
+                "llm-io",
+                self.client.chat.completions.create,
+                model=token_ledger.select_model(self.model_name),
                 messages=[
                     {"role": "system", "content": "You are an expert in halal investments with access to market data."},
                     {"role": "user", "content": prompt}
@@ -600,6 +608,8 @@ Be precise, practical and actionable in your recommendations.
                 "based_on_research": True
             }
             
+        except ExecutorSaturated:
+            raise
         except Exception as e:
             return {
                 "status": "error",
@@ -633,6 +643,8 @@ Be precise, practical and actionable in your recommendations.
                 "Financial Ratio Calculator"
             ],
             "model": self.model_name,
+            "sector_index": self.sector_index.stats(),
+            "prompt_compiler": self.prompt_compiler.stats(),
             "sharia_knowledge_base": "Comprehensive Islamic Finance Principles"
         }
 
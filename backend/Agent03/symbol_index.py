@@ -0,0 +1,165 @@
+import csv
+import json
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import settings
+
+# --- Bundled Data ---
+DATA_DIR = Path(__file__).parent / "data"
+DEFAULT_LISTINGS = DATA_DIR / "listings.csv"
+DEFAULT_ALIASES = DATA_DIR / "symbol_aliases.json"
+
+# Legal-form and filler tokens dropped from company names before matching
+NAME_NOISE = {
+    "the", "inc", "incorporated", "corp", "corporation", "co", "company", "plc",
+    "ltd", "limited", "llc", "sa", "se", "nv", "ag", "as", "spa", "pjsc", "qpsc",
+    "kscp", "berhad", "holdings", "holding", "group", "class", "a", "b", "c",
+}
+# Words users add around a company name in research queries
+QUERY_NOISE = {
+    "stock", "stocks", "share", "shares", "equity", "ticker", "is", "are", "halal",
+    "haram", "sharia", "shariah", "compliant", "invest", "investing", "investment",
+    "in", "buy", "analysis", "of", "for",
+}
+FUZZY_THRESHOLD = 0.55
+
+def normalise_name(text: str, noise: set = NAME_NOISE) -> str:
+    """Lower-case, strip accents and punctuation, drop legal-form tokens"""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode()
+    text = text.lower().replace("&", " and ").replace("'", "")
+    tokens = re.sub(r"[^a-z0-9]+", " ", text).split()
+    kept = [t for t in tokens if t not in noise]
+    return " ".join(kept or tokens)
+
+def trigrams(text: str) -> List[str]:
+    padded = f"  {text} "
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+class SymbolIndex:
+    """
+    Offline company-name → ticker index built from a listing file.
+    Resolution order: exact ticker, alias, exact name, leading name word,
+    then trigram similarity (Dice coefficient) over an inverted index.
+    """
+
+    def __init__(self, listings: List[Dict[str, str]], aliases: Dict[str, str] = None):
+        self.symbols: List[str] = []
+        self.names: List[str] = []
+        self.sectors: List[Optional[str]] = []
+        self._by_symbol: Dict[str, int] = {}
+        self._by_name: Dict[str, int] = {}
+        self._by_first_word: Dict[str, int] = {}
+        self._grams: Dict[str, List[int]] = defaultdict(list)
+        self._gram_counts: List[int] = []
+
+        for row in listings:
+            symbol = (row.get("symbol") or "").strip().upper()
+            name = (row.get("name") or "").strip()
+            if not symbol or not name or symbol in self._by_symbol:
+                continue
+            idx = len(self.symbols)
+            self.symbols.append(symbol)
+            self.names.append(name)
+            self.sectors.append(row.get("sector") or None)
+            self._by_symbol[symbol] = idx
+
+            key = normalise_name(name)
+            self._by_name.setdefault(key, idx)
+            self._by_first_word.setdefault(key.split()[0], idx)
+            grams = set(trigrams(key))
+            self._gram_counts.append(len(grams))
+            for gram in grams:
+                self._grams[gram].append(idx)
+
+        self._aliases: Dict[str, int] = {}
+        for alias, symbol in (aliases or {}).items():
+            idx = self._by_symbol.get(symbol.upper())
+            if idx is not None:
+                self._aliases[normalise_name(alias)] = idx
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def resolve(self, query: str) -> Optional[Dict[str, Any]]:
+        """Best listing for a ticker or company-name query, or None"""
+        if not query or not query.strip():
+            return None
+        raw = query.strip()
+
+        idx = self._by_symbol.get(raw.upper())
+        if idx is not None:
+            return self._match(idx, "symbol", 1.0)
+
+        # Tickers typed in capitals inside a sentence ("Is MSFT halal?")
+        for token in re.findall(r"\b[A-Z][A-Z0-9.\-]{0,9}\b", raw):
+            idx = self._by_symbol.get(token)
+            if idx is not None and token.lower() not in QUERY_NOISE:
+                return self._match(idx, "symbol", 1.0)
+
+        key = normalise_name(raw, NAME_NOISE | QUERY_NOISE)
+        if not key:
+            return None
+        for method, table in (("alias", self._aliases), ("name", self._by_name)):
+            idx = table.get(key)
+            if idx is not None:
+                return self._match(idx, method, 1.0)
+
+        if " " not in key and key in self._by_first_word:
+            return self._match(self._by_first_word[key], "name_prefix", 0.9)
+
+        return self._fuzzy(key)
+
+    def sector_of(self, symbol: str) -> Optional[str]:
+        idx = self._by_symbol.get(symbol.upper())
+        return self.sectors[idx] if idx is not None else None
+
+    def symbols_in_sector(self, sector: str) -> List[str]:
+        wanted = sector.strip().lower()
+        return [s for s, sec in zip(self.symbols, self.sectors) if sec and sec.lower() == wanted]
+
+    def _fuzzy(self, key: str) -> Optional[Dict[str, Any]]:
+        grams = set(trigrams(key))
+        shared = Counter()
+        for gram in grams:
+            for idx in self._grams.get(gram, ()):
+                shared[idx] += 1
+        best_idx, best_score = None, 0.0
+        for idx, count in shared.items():
+            score = 2 * count / (len(grams) + self._gram_counts[idx])
+            if score > best_score:
+                best_idx, best_score = idx, score
+        if best_idx is None or best_score < FUZZY_THRESHOLD:
+            return None
+        return self._match(best_idx, "fuzzy", round(best_score, 3))
+
+    def _match(self, idx: int, method: str, score: float) -> Dict[str, Any]:
+        return {
+            "symbol": self.symbols[idx],
+            "name": self.names[idx],
+            "sector": self.sectors[idx],
+            "method": method,
+            "score": score,
+        }
+
+def load_symbol_index(listings_path: str = None, aliases_path: str = None) -> SymbolIndex:
+    """Build the index from the bundled files (or SYMBOL_LISTINGS_PATH when set)"""
+    listings_file = Path(listings_path or settings.SYMBOL_LISTINGS_PATH or DEFAULT_LISTINGS)
+    aliases_file = Path(aliases_path or DEFAULT_ALIASES)
+    with open(listings_file, newline="", encoding="utf-8") as f:
+        listings = list(csv.DictReader(f))
+    aliases = {}
+    if aliases_file.exists():
+        with open(aliases_file, encoding="utf-8") as f:
+            aliases = json.load(f)
+    index = SymbolIndex(listings, aliases)
+    print(f"📇 Symbol index loaded: {len(index)} listings, {len(aliases)} aliases")
+    return index
+
+def get_symbol_index() -> SymbolIndex:
+    """The shared index, built once (warmed at startup by the agent registry)"""
+    from Services.agent_registry import agent_registry
+    return agent_registry.get("symbol_index")
@@ -0,0 +1,127 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+# --- Labels ---
+VERDICT_LABELS = {"HALAL": "HALAL ✅", "HARAM": "HARAM ❌", "QUESTIONABLE": "QUESTIONABLE ⚠️"}
+CONFIDENCE_LEVELS = ("HIGH", "MEDIUM", "LOW")
+CRITERIA = (
+    "business_activity", "debt_ratio", "cash_ratio", "receivables_ratio",
+    "interest_income", "haram_screening", "governance",
+)
+FINDINGS = ("pass", "fail", "unclear")
+
+# --- JSON Schema (OpenAI strict structured output) ---
+VERDICT_SCHEMA: Dict[str, Any] = {
+    "name": "sharia_verdict",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "additionalProperties": False,
+        "required": ["verdict", "confidence", "criteria", "ratio_breaches", "halal_alternatives", "analysis_markdown"],
+        "properties": {
+            "verdict": {"type": "string", "enum": list(VERDICT_LABELS)},
+            "confidence": {"type": "string", "enum": list(CONFIDENCE_LEVELS)},
+            "criteria": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "additionalProperties": False,
+                    "required": ["criterion", "finding", "explanation"],
+                    "properties": {
+                        "criterion": {"type": "string", "enum": list(CRITERIA)},
+                        "finding": {"type": "string", "enum": list(FINDINGS)},
+                        "explanation": {"type": "string"},
+                    },
+                },
+            },
+            "ratio_breaches": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "additionalProperties": False,
+                    "required": ["ratio", "value", "limit"],
+                    "properties": {
+                        "ratio": {"type": "string"},
+                        "value": {"type": "number"},
+                        "limit": {"type": "number"},
+                    },
+                },
+            },
+            "halal_alternatives": {"type": "array", "items": {"type": "string"}},
+            "analysis_markdown": {"type": "string"},
+        },
+    },
+}
+
+STRUCTURED_INSTRUCTIONS = """OUTPUT:
+Reply with a JSON object matching the sharia_verdict schema. Put the full report,
+in the MANDATORY RESPONSE FORMAT above, in analysis_markdown; the other fields
+must agree with it. List every criterion you assessed and every ratio above its limit."""
+
+def parse_structured(content: str) -> Dict[str, Any]:
+    """Validate a structured reply; raises ValueError if it does not match the schema"""
+    data = json.loads(content)
+    if not isinstance(data, dict):
+        raise ValueError("Structured verdict is not an object")
+    verdict = str(data.get("verdict", "")).upper()
+    confidence = str(data.get("confidence", "")).upper()
+    if verdict not in VERDICT_LABELS or confidence not in CONFIDENCE_LEVELS:
+        raise ValueError(f"Invalid verdict/confidence: {verdict}/{confidence}")
+    criteria = [
+        {"criterion": c.get("criterion"), "finding": c.get("finding"), "explanation": c.get("explanation", "")}
+        for c in data.get("criteria") or [] if isinstance(c, dict) and c.get("finding") in FINDINGS
+    ]
+    breaches = []
+    for b in data.get("ratio_breaches") or []:
+        try:
+            breaches.append({"ratio": str(b["ratio"]), "value": float(b["value"]), "limit": float(b["limit"])})
+        except (KeyError, TypeError, ValueError):
+            continue
+    return {
+        "verdict": verdict,
+        "confidence": confidence,
+        "criteria": criteria,
+        "ratio_breaches": breaches,
+        "halal_alternatives": [str(a) for a in data.get("halal_alternatives") or []],
+        "analysis_markdown": str(data.get("analysis_markdown") or ""),
+        "source": "structured",
+    }
+
+# Heading lines of the mandated markdown format
+_VERDICT_LINE = re.compile(r"SHARIA\s+VERDICT\s*:?\s*\**\s*\[?\s*(HALAL|HARAM|QUESTIONABLE)\b", re.IGNORECASE)
+_CONFIDENCE_LINE = re.compile(
+    r"CONFIDENCE(?:\s+LEVEL)?\s*:?\s*\**\s*\[?\s*(HIGH|MEDIUM|LOW)\b"
+    r"|CONFIDENCE(?:\s+LEVEL)?\s*:?\s*\**\s*\n+\s*\**\s*(HIGH|MEDIUM|LOW)\b",
+    re.IGNORECASE,
+)
+
+def parse_free_text(text: str, ratios: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Fallback for prose replies: read the verdict and confidence from their
+    headings only (never from words elsewhere in the text), and take ratio
+    breaches from the computed ratios.
+    """
+    text = text or ""
+    verdict_match = _VERDICT_LINE.search(text)
+    confidence_match = _CONFIDENCE_LINE.search(text)
+    confidence = "MEDIUM"
+    if confidence_match:
+        confidence = (confidence_match.group(1) or confidence_match.group(2)).upper()
+    return {
+        "verdict": verdict_match.group(1).upper() if verdict_match else "QUESTIONABLE",
+        "confidence": confidence,
+        "criteria": [],
+        "ratio_breaches": ratio_breaches(ratios or {}),
+        "halal_alternatives": [],
+        "analysis_markdown": text,
+        "source": "text",
+    }
+
+def ratio_breaches(ratios: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Ratios above their limit, in the schema's ratio_breaches shape"""
+    return [
+        {"ratio": name, "value": float(r["value"]), "limit": float(r["limit"])}
+        for name, r in ratios.items()
+        if isinstance(r, dict) and r.get("compliant") is False
+    ]
@@ -0,0 +1,249 @@
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy import func
+
+from config import settings
+from Database.database import SessionLocal, ShariaVerdict
+
+# --- Logging Setup ---
+logger = logging.getLogger("abacus.verdicts")
+
+# Inputs that move a verdict: slow-changing fundamentals and the outcome of each
+# ratio screen. Market capitalisation and price are left out (they move daily);
+# their effect is captured by the ratio compliance flags.
+FINGERPRINT_FIELDS = ("symbol", "sector", "industry", "total_debt", "total_cash", "revenue")
+
+# Plain cache hits only bump an in-memory counter; the counts are written together
+# at most this often (and with the next revalidation), not once per hit
+HIT_FLUSH_SECONDS = 60.0
+
+def query_key(query: str) -> str:
+    """Normalised form of a free-text query used as a secondary lookup key"""
+    return re.sub(r"\s+", " ", query.strip().lower())
+
+def financial_fingerprint(financial_data: Dict[str, Any]) -> str:
+    """Stable hash of the fundamentals and ratio compliance a verdict was based on"""
+    basis = {field: financial_data.get(field) for field in FINGERPRINT_FIELDS}
+    ratios = financial_data.get("sharia_ratios") or {}
+    basis["ratio_compliance"] = {
+        name: ratio.get("compliant")
+        for name, ratio in sorted(ratios.items())
+        if isinstance(ratio, dict) and "compliant" in ratio
+    }
+    encoded = json.dumps(basis, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()[:32]
+
+def verdict_to_dict(row: ShariaVerdict) -> Dict[str, Any]:
+    """Serialise a verdict row into a plain dict"""
+    report = json.loads(row.report) if row.report else {}
+    return {
+        "symbol": row.symbol,
+        "company_name": row.company_name,
+        "verdict": row.verdict,
+        "confidence_level": row.confidence_level,
+        "ratio_inputs": json.loads(row.ratio_inputs) if row.ratio_inputs else {},
+        "structured": report.get("sharia_analysis", {}).get("structured"),
+        "fingerprint": row.fingerprint,
+        "model_used": row.model_used,
+        "hits": row.hits or 0,
+        "created_at": row.created_at.isoformat() if row.created_at else None,
+        "checked_at": row.checked_at.isoformat() if row.checked_at else None,
+    }
+
+class VerdictStore:
+    """
+    Persistent cache of Sharia verdicts keyed by resolved symbol.
+    - Within SHARIA_VERDICT_TTL_HOURS of the last check an entry is served as-is.
+    - After that the caller re-fetches fundamentals; an unchanged fingerprint
+      extends the entry, a changed one forces a fresh analysis.
+    - Entries older than SHARIA_VERDICT_MAX_AGE_DAYS are always re-analysed.
+    All methods except is_fresh/is_expired hit the database: call them from
+    an executor, not the event loop.
+    """
+
+    def __init__(self, session_factory: Callable = SessionLocal,
+                 ttl_hours: float = None, max_age_days: float = None):
+        self._session_factory = session_factory
+        self.ttl = timedelta(hours=ttl_hours if ttl_hours is not None else settings.SHARIA_VERDICT_TTL_HOURS)
+        self.max_age = timedelta(days=max_age_days if max_age_days is not None else settings.SHARIA_VERDICT_MAX_AGE_DAYS)
+        self._hits = 0
+        self._revalidated = 0
+        self._misses = 0
+        self._entries: Optional[int] = None  # counted once, then kept up to date by save/invalidate
+        self._pending_hits: Dict[str, int] = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def lookup(self, query: str) -> Optional[ShariaVerdict]:
+        """Find an entry by symbol (exact, upper-cased) or by the normalised query"""
+        db = self._session_factory()
+        try:
+            row = db.get(ShariaVerdict, query.strip().upper())
+            if row is None:
+                row = db.query(ShariaVerdict).filter(ShariaVerdict.query_key == query_key(query)).first()
+            if row is not None:
+                db.expunge(row)
+            self._count_entries(db)
+            return row
+        finally:
+            db.close()
+
+    def is_fresh(self, row: ShariaVerdict, now: datetime = None) -> bool:
+        """True when the entry can be served without touching any upstream"""
+        now = now or datetime.utcnow()
+        return bool(row.checked_at) and now - row.checked_at < self.ttl and not self.is_expired(row, now)
+
+    def is_expired(self, row: ShariaVerdict, now: datetime = None) -> bool:
+        """True when the entry is past its maximum age regardless of fingerprint"""
+        now = now or datetime.utcnow()
+        return not row.created_at or now - row.created_at >= self.max_age
+
+    def cached_report(self, row: ShariaVerdict, status: str) -> Dict[str, Any]:
+        """Rebuild the comprehensive report from a stored entry and count the hit"""
+        with self._lock:
+            self._pending_hits[row.symbol] = self._pending_hits.get(row.symbol, 0) + 1
+            flush_due = time.monotonic() - self._last_flush >= HIT_FLUSH_SECONDS
+        if status == "revalidated":
+            self._revalidated += 1
+            self._extend(row.symbol)
+        else:
+            self._hits += 1
+        if flush_due or status == "revalidated":
+            self.flush_hits()
+        report = json.loads(row.report) if row.report else {}
+        report["cache"] = {
+            "status": status,
+            "symbol": row.symbol,
+            "cached_at": row.created_at.isoformat() if row.created_at else None,
+            "fingerprint": row.fingerprint,
+        }
+        return report
+
+    def save(self, symbol: str, query: str, report: Dict[str, Any], fingerprint: str) -> None:
+        """Store or replace the verdict for symbol"""
+        self._misses += 1
+        analysis = report.get("sharia_analysis", {})
+        financial = report.get("research_data", {}).get("financial_data", {})
+        now = datetime.utcnow()
+        db = self._session_factory()
+        try:
+            self._count_entries(db)
+            existing = db.get(ShariaVerdict, symbol)
+            row = existing or ShariaVerdict(symbol=symbol, hits=0)
+            row.query_key = query_key(query)
+            row.company_name = financial.get("company_name")
+            row.verdict = analysis.get("verdict", "QUESTIONABLE ⚠️")
+            row.confidence_level = analysis.get("confidence_level")
+            row.analysis_text = analysis.get("analysis_text")
+            row.ratio_inputs = json.dumps({
+                "total_debt": financial.get("total_debt"),
+                "total_cash": financial.get("total_cash"),
+                "revenue": financial.get("revenue"),
+                "market_capitalisation": financial.get("market_capitalisation"),
+                "sharia_ratios": financial.get("sharia_ratios"),
+            }, default=str)
+            row.report = json.dumps(report, default=str)
+            row.fingerprint = fingerprint
+            row.model_used = settings.MODEL_NAME
+            row.created_at = now
+            row.checked_at = now
+            db.merge(row)
+            db.commit()
+            if existing is None:
+                with self._lock:
+                    self._entries += 1
+            logger.info(f"💾 Stored Sharia verdict for {symbol}: {row.verdict}")
+        finally:
+            db.close()
+
+    def invalidate(self, symbol: str) -> bool:
+        """Remove the entry for symbol; returns False if there was none"""
+        db = self._session_factory()
+        try:
+            self._count_entries(db)
+            deleted = db.query(ShariaVerdict).filter(ShariaVerdict.symbol == symbol.upper()).delete()
+            db.commit()
+            with self._lock:
+                self._entries -= deleted
+            return bool(deleted)
+        finally:
+            db.close()
+
+    def get(self, symbol: str) -> Optional[Dict[str, Any]]:
+        db = self._session_factory()
+        try:
+            row = db.get(ShariaVerdict, symbol.upper())
+            if row is None:
+                return None
+        finally:
+            db.close()
+        entry = verdict_to_dict(row)
+        with self._lock:
+            entry["hits"] += self._pending_hits.get(row.symbol, 0)
+        return entry
+
+    def flush_hits(self) -> int:
+        """Write the batched hit counts in one transaction; returns how many entries were updated"""
+        with self._lock:
+            pending, self._pending_hits = self._pending_hits, {}
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+        db = self._session_factory()
+        try:
+            for symbol, count in pending.items():
+                db.query(ShariaVerdict).filter(ShariaVerdict.symbol == symbol).update(
+                    {ShariaVerdict.hits: func.coalesce(ShariaVerdict.hits, 0) + count}, synchronize_session=False
+                )
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:  # keep the counts for the next flush
+                for symbol, count in pending.items():
+                    self._pending_hits[symbol] = self._pending_hits.get(symbol, 0) + count
+            raise
+        finally:
+            db.close()
+        return len(pending)
+
+    def stats(self) -> Dict[str, Any]:
+        """In-memory counters only, safe to call from the event loop; entries is None until first counted"""
+        served = self._hits + self._revalidated
+        total = served + self._misses
+        return {
+            "entries": self._entries,
+            "hits": self._hits,
+            "revalidated": self._revalidated,
+            "misses": self._misses,
+            "hit_ratio": round(served / total, 3) if total else 0.0,
+            "ttl_hours": self.ttl.total_seconds() / 3600,
+            "max_age_days": self.max_age.days,
+        }
+
+    def _count_entries(self, db) -> None:
+        if self._entries is None:
+            count = db.query(ShariaVerdict).count()
+            with self._lock:
+                if self._entries is None:
+                    self._entries = count
+
+    def _extend(self, symbol: str) -> None:
+        """Unchanged fundamentals: restart the TTL of the entry"""
+        db = self._session_factory()
+        try:
+            db.query(ShariaVerdict).filter(ShariaVerdict.symbol == symbol).update(
+                {"checked_at": datetime.utcnow()}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+
+# Global instance
+verdict_store = VerdictStore()
@@ -8,7 +8,10 @@ from .database import *
 from .auth import *
 
 __all__ = [
-    'create_tables', 'add_test_users', 'get_db', 'User',
+    'create_tables', 'add_test_users', 'get_db', 'User', 'StockAnalysisJob', 'ShariaVerdict',
+    'ChatSession', 'ChatTurn', 'TokenUsage',
     'authenticate_user', 'validate_email', 'validate_name', 
-    'get_current_user', 'create_user'
+    'get_current_user', 'get_optional_user', 'CurrentUser', 'create_user', 'require_admin',
+    'authenticate_user_async', 'create_user_async', 'issue_session_token',
+    'create_session_token', 'verify_session_token'
 ]
@@ -1,10 +1,16 @@
 from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 import re
-from fastapi import Depends, HTTPException
-from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
+import hmac
+from fastapi import Depends, HTTPException, Header
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from .database import get_db, User
+from .tokens import create_session_token, verify_session_token
+from config import settings
+from Services.executors import run_in_executor
 
 security = HTTPBearer(auto_error=False)
 
@@ -19,6 +25,16 @@ def get_password_hash(password):
     """Hash a password"""
     return pwd_context.hash(password)
 
+# bcrypt releases the GIL, so a small thread pool keeps hashing off the event
+# loop and caps how many logins burn CPU at once (the rest queue or get 429).
+async def verify_password_async(plain_password, hashed_password):
+    """verify_password on the capped auth executor"""
+    return await run_in_executor("cpu-auth", verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password):
+    """get_password_hash on the capped auth executor"""
+    return await run_in_executor("cpu-auth", get_password_hash, password)
+
 def validate_email(email):
     """Validate email format"""
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -32,6 +48,11 @@ def get_user_by_email(db: Session, email: str):
     """Get user by email"""
     return db.query(User).filter(User.email == email).first()
 
+async def get_user_by_email_async(db: AsyncSession, email: str):
+    """get_user_by_email on an AsyncSession (see get_async_db)"""
+    result = await db.execute(select(User).where(User.email == email))
+    return result.scalars().first()
+
 def authenticate_user(db: Session, email: str, password: str):
     """Authenticate a user"""
     user = get_user_by_email(db, email)
@@ -41,9 +62,17 @@ def authenticate_user(db: Session, email: str, password: str):
         return False
     return user
 
-def create_user(db: Session, name: str, email: str, password: str):
-    """Create a new user"""
-    # Validations
+async def authenticate_user_async(db: AsyncSession, email: str, password: str):
+    """Authenticate a user without blocking the event loop on bcrypt"""
+    user = await get_user_by_email_async(db, email)
+    if not user:
+        return False
+    if not await verify_password_async(password, user.password_hash):
+        return False
+    return user
+
+def _validate_new_user_fields(name: str, email: str, password: str):
+    """Raise ValueError if the registration details are malformed"""
     if not validate_name(name):
         raise ValueError("Name must contain at least 2 characters")
         
@@ -52,26 +81,87 @@ def create_user(db: Session, name: str, email: str, password: str):
         
     if len(password) < 4:
         raise ValueError("Password must contain at least 4 characters")
-        
+
+def _validate_new_user(db: Session, name: str, email: str, password: str):
+    """Raise ValueError if the registration details are not acceptable"""
+    _validate_new_user_fields(name, email, password)
     # Check if email already exists
     if get_user_by_email(db, email):
         raise ValueError("This email is already in use")
-        
-    # Create the user
-    hashed_password = get_password_hash(password)
-    db_user = User(
+
+def _new_user_row(name: str, email: str, hashed_password: str) -> User:
+    return User(
         name=name.strip(),
         email=email.lower().strip(),
         password_hash=hashed_password
     )
+
+def _insert_user(db: Session, name: str, email: str, hashed_password: str):
+    db_user = _new_user_row(name, email, hashed_password)
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
     return db_user
 
-def get_current_user(db: Session = Depends(get_db)) -> User:
-    """Get current user (simplified version)"""
-    user = db.query(User).filter(User.email == "test@test.com").first()
-    if not user:
-        raise HTTPException(status_code=401, detail="User not found")
-    return user
\ No newline at end of file
+def create_user(db: Session, name: str, email: str, password: str):
+    """Create a new user"""
+    _validate_new_user(db, name, email, password)
+    return _insert_user(db, name, email, get_password_hash(password))
+
+async def create_user_async(db: AsyncSession, name: str, email: str, password: str):
+    """Create a new user on an AsyncSession, hashing the password on the auth executor"""
+    _validate_new_user_fields(name, email, password)
+    if await get_user_by_email_async(db, email):
+        raise ValueError("This email is already in use")
+    db_user = _new_user_row(name, email, await get_password_hash_async(password))
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+def issue_session_token(user: User):
+    """Session token returned at login/registration"""
+    return create_session_token(user.id, user.email, user.name)
+
+class CurrentUser:
+    """Caller identity taken from verified token claims (no database round-trip)"""
+
+    def __init__(self, claims: dict):
+        self.id = claims["uid"]
+        self.email = claims["sub"]
+        self.name = claims.get("name")
+        self.expires_at = claims["exp"]
+
+    def __repr__(self):
+        return f"CurrentUser(id={self.id}, email={self.email!r})"
+
+def _user_from_credentials(credentials: Optional[HTTPAuthorizationCredentials]) -> Optional[CurrentUser]:
+    if credentials is None:
+        return None
+    claims = verify_session_token(credentials.credentials)
+    if not claims:
+        raise HTTPException(status_code=401, detail="Invalid or expired session token",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return CurrentUser(claims)
+
+def get_current_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> CurrentUser:
+    """Authenticated caller from the Bearer token; 401 if missing, tampered with or expired"""
+    user = _user_from_credentials(credentials)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Not authenticated",
+                            headers={"WWW-Authenticate": "Bearer"})
+    return user
+
+def get_optional_user(credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)) -> Optional[CurrentUser]:
+    """Like get_current_user, but anonymous callers get None (a bad token is still 401)"""
+    return _user_from_credentials(credentials)
+
+def require_admin(x_admin_key: str = Header(None)) -> bool:
+    """Admin guard: X-Admin-Key must match ADMIN_API_KEY (closed when unset unless opted in locally)"""
+    if not settings.ADMIN_API_KEY:
+        if settings.ADMIN_OPEN_WITHOUT_KEY and settings.ENVIRONMENT == "development":
+            return True
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled (ADMIN_API_KEY not set)")
+    if not x_admin_key or not hmac.compare_digest(x_admin_key, settings.ADMIN_API_KEY):
+        raise HTTPException(status_code=403, detail="Invalid admin key")
+    return True
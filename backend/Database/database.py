@@ -1,9 +1,14 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime
+from sqlalchemy import create_engine, event, inspect, select, func, case, or_, Column, Index, Integer, Float, String, DateTime, Text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import StaticPool
 from datetime import datetime
 import hashlib
 import os
 
+from config import settings
+
 try:
     from passlib.context import CryptContext
     pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -13,12 +18,88 @@ except ImportError:
     USE_PASSLIB = False
     print("ℹ️ Database: Using hashlib.sha256 for password hashing")
 
-# SQLite Configuration
-DATABASE_URL = "sqlite:///./finbot_users.db"
+# ========== ENGINE CONFIGURATION ==========
+
+DATABASE_URL = settings.DATABASE_URL
+
+# Async drivers per backend (aiosqlite / asyncpg in requirements.txt); async routes always use them
+ASYNC_DRIVERS = {"sqlite": ("sqlite+aiosqlite", "aiosqlite"), "postgresql": ("postgresql+asyncpg", "asyncpg")}
+
+def is_memory_sqlite(url: str) -> bool:
+    parsed = make_url(url)
+    return parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")
+
+def engine_options(url: str) -> dict:
+    """create_engine keyword arguments for a database URL"""
+    backend = make_url(url).get_backend_name()
+    if backend == "sqlite":
+        connect_args = {"check_same_thread": False, "timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000}
+        if is_memory_sqlite(url):
+            # One shared connection, otherwise every checkout sees an empty database
+            return {"connect_args": connect_args, "poolclass": StaticPool}
+        return {
+            "connect_args": connect_args,
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        }
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT_SECONDS,
+        "pool_recycle": settings.DB_POOL_RECYCLE_SECONDS,
+        "pool_pre_ping": True,
+    }
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record=None):
+    """
+    WAL lets readers run alongside the single writer (across uvicorn workers
+    too); busy_timeout makes writers wait for the lock instead of failing.
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute("PRAGMA foreign_keys=ON")
+    finally:
+        cursor.close()
+
+def build_engine(url: str):
+    """Engine with pool settings from config and SQLite pragmas on every new connection"""
+    db_engine = create_engine(url, **engine_options(url))
+    if db_engine.dialect.name == "sqlite" and not is_memory_sqlite(url):
+        event.listen(db_engine, "connect", apply_sqlite_pragmas)
+    return db_engine
+
+def async_database_url(url: str) -> str:
+    """Async-driver form of a sync URL (sqlite -> sqlite+aiosqlite, postgresql -> postgresql+asyncpg)"""
+    if settings.DATABASE_ASYNC_URL:
+        return settings.DATABASE_ASYNC_URL
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name())
+    return parsed.set(drivername=driver[0]).render_as_string(hide_password=False) if driver else ""
+
+def build_async_engine(url: str):
+    """Async engine for the async routes, with the same pool settings and pragmas"""
+    async_url = async_database_url(url)
+    if not async_url:
+        raise RuntimeError(
+            f"No async driver known for {make_url(url).get_backend_name()} databases; set DATABASE_ASYNC_URL"
+        )
+    async_engine = create_async_engine(async_url, **engine_options(url))
+    if async_engine.dialect.name == "sqlite" and not is_memory_sqlite(url):
+        event.listen(async_engine.sync_engine, "connect", apply_sqlite_pragmas)
+    return async_engine
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+engine = build_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = build_async_engine(DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 # ✅ NEW SQLAlchemy 2.0 SYNTAX
 Base = declarative_base()
 
@@ -30,8 +111,84 @@ class User(Base):
     name = Column(String, nullable=False)
     email = Column(String, unique=True, index=True, nullable=False)
     password_hash = Column(String, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+# Stock Analysis Job Model
+class StockAnalysisJob(Base):
+    __tablename__ = "stock_analysis_jobs"
+    
+    id = Column(String, primary_key=True)
+    symbol = Column(String, index=True, nullable=False)
+    user_id = Column(Integer, nullable=True)
+    status = Column(String, index=True, nullable=False, default="queued")
+    stage = Column(String, nullable=True)
+    progress = Column(Integer, nullable=False, default=0)
+    analysis = Column(Text, nullable=True)
+    recommendation = Column(Text, nullable=True)
+    model_used = Column(String, nullable=True)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    # Worker holding the job; others may take it over once the lease has expired
+    claimed_by = Column(String, index=True, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+
+# Sharia Verdict Cache Model
+class ShariaVerdict(Base):
+    __tablename__ = "sharia_verdicts"
+    
+    symbol = Column(String, primary_key=True)
+    query_key = Column(String, index=True, nullable=True)
+    company_name = Column(String, nullable=True)
+    verdict = Column(String, nullable=False)
+    confidence_level = Column(String, nullable=True)
+    analysis_text = Column(Text, nullable=True)
+    ratio_inputs = Column(Text, nullable=True)
+    report = Column(Text, nullable=True)
+    fingerprint = Column(String, nullable=False)
+    model_used = Column(String, nullable=True)
+    hits = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    checked_at = Column(DateTime, default=datetime.utcnow)
+
+# Chat Session Models (the uploaded DataFrame lives on disk, keyed by content hash)
+class ChatSession(Base):
+    __tablename__ = "chat_sessions"
+    
+    id = Column(String, primary_key=True)
+    user_id = Column(Integer, index=True, nullable=True)
+    dataset_hash = Column(String, nullable=True)
+    dataset_name = Column(String, nullable=True)
+    summary = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class ChatTurn(Base):
+    __tablename__ = "chat_turns"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    session_id = Column(String, index=True, nullable=False)
+    role = Column(String, nullable=False)
+    content = Column(Text, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+# LLM Token Ledger Model (one row per completion, written in batches by the ledger)
+class TokenUsage(Base):
+    __tablename__ = "token_usage"
+    __table_args__ = (Index("ix_token_usage_user_created", "user_id", "created_at"),)
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    route = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    user_id = Column(Integer, nullable=True)
+    session_id = Column(String, nullable=True)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    cached_tokens = Column(Integer, nullable=False, default=0)
+    latency_ms = Column(Float, nullable=True)
+
 # ========== COMPATIBLE HASH FUNCTIONS ==========
 
 def get_password_hash(password: str) -> str:
@@ -82,10 +239,33 @@ def migrate_old_passwords():
 
 # ========== UTILITY FUNCTIONS ==========
 
+# Columns added to existing tables after their first release (create_all only creates new tables)
+ADDED_COLUMNS = {
+    StockAnalysisJob.__tablename__: ("claimed_by", "lease_expires_at"),
+}
+
+def _add_missing_columns():
+    inspector = inspect(engine)
+    for table_name, column_names in ADDED_COLUMNS.items():
+        if not inspector.has_table(table_name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table_name)}
+        table = Base.metadata.tables[table_name]
+        with engine.begin() as connection:
+            for name in column_names:
+                if name not in existing:
+                    column_type = table.c[name].type.compile(dialect=engine.dialect)
+                    connection.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {name} {column_type}")
+                    print(f"✅ Added column {table_name}.{name}")
+
 def create_tables():
     """Create all tables"""
     try:
         Base.metadata.create_all(bind=engine)
+        _add_missing_columns()
+        # create_all skips indexes added to tables that already exist
+        for index in [*User.__table__.indexes, *StockAnalysisJob.__table__.indexes]:
+            index.create(bind=engine, checkfirst=True)
         print("✅ Tables created successfully!")
         return True
     except Exception as e:
@@ -100,8 +280,44 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    """AsyncSession dependency for async routes"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def dispose_engines():
+    """Close pooled connections at shutdown"""
+    await async_engine.dispose()
+    engine.dispose()
+
+def database_stats() -> dict:
+    """Backend, pool state and journal mode, for the health endpoints"""
+    stats = {
+        "backend": engine.dialect.name,
+        "pool": engine.pool.status(),
+        "async_driver": async_engine.driver,
+    }
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as connection:
+            stats["journal_mode"] = connection.exec_driver_sql("PRAGMA journal_mode").scalar()
+    return stats
+
 # ========== USER MANAGEMENT ==========
 
+def users_page_statement(limit: int, after_id: int = None, created_from: datetime = None, created_to: datetime = None):
+    """
+    One keyset page of users ordered by id: WHERE id > after_id ... LIMIT n
+    walks the primary key, so every page costs the same however deep it is.
+    """
+    statement = select(User.id, User.name, User.email, User.created_at).order_by(User.id).limit(limit)
+    if after_id is not None:
+        statement = statement.where(User.id > after_id)
+    if created_from is not None:
+        statement = statement.where(User.created_at >= created_from)
+    if created_to is not None:
+        statement = statement.where(User.created_at < created_to)
+    return statement
+
 def add_test_users():
     """Add test users with proper hash system"""
     
@@ -177,6 +393,7 @@ def authenticate_user(email: str, password: str):
                 new_hash = pwd_context.hash(password)
                 user.password_hash = new_hash
                 db.commit()
+                _forget_cached_profile(user.id)
                 print(f"🔄 Password migrated to bcrypt for {email}")
             except Exception as e:
                 print(f"⚠️ Migration failed for {email}: {e}")
@@ -332,6 +549,11 @@ def initialise_database():
 
 # ========== ADDITIONAL USER MANAGEMENT FUNCTIONS ==========
 
+def _forget_cached_profile(user_id: int):
+    """Drop the user's cached profile after their row changes (imported here: user_cache imports this module)"""
+    from .user_cache import user_cache
+    user_cache.invalidate(user_id)
+
 def delete_user_by_email(email: str):
     """Delete a user by email"""
     
@@ -346,6 +568,7 @@ def delete_user_by_email(email: str):
         
         db.delete(user)
         db.commit()
+        _forget_cached_profile(user.id)
         print(f"✅ User {user.name} ({email}) deleted successfully")
         return True
         
@@ -372,6 +595,7 @@ def update_user_password(email: str, new_password: str):
         new_hash = get_password_hash(new_password)
         user.password_hash = new_hash
         db.commit()
+        _forget_cached_profile(user.id)
         
         hash_method = "bcrypt" if USE_PASSLIB else "SHA256"
         print(f"✅ Password updated for {user.name} ({email}) - Hash: {hash_method}")
@@ -384,41 +608,48 @@ def update_user_password(email: str, new_password: str):
     finally:
         db.close()
 
+# bcrypt hashes are 60 characters with a "$2" prefix; legacy SHA-256 hex digests are 64
+def _hash_counts(db) -> dict:
+    """User and password-hash counts in a single aggregate query"""
+    length = func.length(User.password_hash)
+    row = db.execute(
+        select(
+            func.count(User.id).label("total"),
+            func.coalesce(func.sum(case((or_(length > 64, User.password_hash.like("$2%")), 1), else_=0)), 0).label("bcrypt"),
+            func.coalesce(func.sum(case((length == 64, 1), else_=0)), 0).label("sha256"),
+            func.coalesce(func.sum(case((or_(
+                User.name.is_(None), User.name == "",
+                User.email.is_(None), User.email == "",
+                User.password_hash.is_(None), User.password_hash == "",
+            ), 1), else_=0)), 0).label("invalid"),
+        )
+    ).one()
+    return {"total": row.total, "bcrypt": row.bcrypt, "sha256": row.sha256, "invalid": row.invalid}
+
 def get_user_stats():
     """Get database statistics"""
     
     db = SessionLocal()
     
     try:
-        total_users = db.query(User).count()
+        counts = _hash_counts(db)
         
-        if total_users == 0:
+        if counts["total"] == 0:
             return {"total_users": 0, "latest_user": None, "hash_distribution": {}}
         
-        # Get latest user
+        # Get latest user (served by the created_at index)
         latest_user = db.query(User).order_by(User.created_at.desc()).first()
         
-        # Check hash distribution
-        users = db.query(User).all()
-        bcrypt_count = 0
-        sha256_count = 0
-        
-        for user in users:
-            if len(user.password_hash) > 64:
-                bcrypt_count += 1
-            else:
-                sha256_count += 1
-        
         return {
-            "total_users": total_users,
+            "total_users": counts["total"],
             "latest_user": {
                 "name": latest_user.name,
                 "email": latest_user.email,
                 "created_at": latest_user.created_at.strftime('%d/%m/%Y at %H:%M')
             },
             "hash_distribution": {
-                "bcrypt": bcrypt_count,
-                "sha256": sha256_count
+                "bcrypt": counts["bcrypt"],
+                "sha256": counts["total"] - counts["bcrypt"]
             }
         }
         
@@ -434,44 +665,34 @@ def verify_database_integrity():
     print("🔍 VERIFYING DATABASE INTEGRITY")
     print("-" * 40)
     
+    db = SessionLocal()
     try:
         # Test connection
-        db = SessionLocal()
-        db.execute("SELECT 1").fetchone()
+        db.execute(select(1)).scalar()
         print("✅ Database connection: OK")
         
         # Check table existence
-        result = db.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='users'").fetchone()
-        if result:
+        if inspect(engine).has_table(User.__tablename__):
             print("✅ Users table: EXISTS")
         else:
             print("❌ Users table: MISSING")
             return False
         
-        # Check data integrity
-        users = db.query(User).all()
-        print(f"✅ Total users: {len(users)}")
-        
-        # Check for required fields
-        invalid_users = 0
-        for user in users:
-            if not user.name or not user.email or not user.password_hash:
-                invalid_users += 1
+        # Check data integrity and hash formats without loading any rows
+        counts = _hash_counts(db)
+        print(f"✅ Total users: {counts['total']}")
         
-        if invalid_users == 0:
+        if counts["invalid"] == 0:
             print("✅ Data integrity: ALL USERS VALID")
         else:
-            print(f"⚠️ Data integrity: {invalid_users} invalid users found")
-        
-        # Check hash formats
-        bcrypt_users = sum(1 for user in users if len(user.password_hash) > 64)
-        sha256_users = sum(1 for user in users if len(user.password_hash) == 64)
+            print(f"⚠️ Data integrity: {counts['invalid']} invalid users found")
         
-        print(f"🔐 Hash distribution: {bcrypt_users} bcrypt, {sha256_users} SHA256")
+        print(f"🔐 Hash distribution: {counts['bcrypt']} bcrypt, {counts['sha256']} SHA256")
         
-        db.close()
         return True
         
     except Exception as e:
-            print(f"❌ Database integrity check failed: {e}")
-            return False
\ No newline at end of file
+        print(f"❌ Database integrity check failed: {e}")
+        return False
+    finally:
+        db.close()
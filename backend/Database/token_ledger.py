@@ -0,0 +1,281 @@
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import func, insert, select
+
+from config import settings
+from Services.metrics import add_usage_listener
+from .database import SessionLocal, TokenUsage
+
+# --- Logging Setup ---
+logger = logging.getLogger("abacus.tokens")
+
+# Budget states, in order of increasing degradation
+BUDGET_OK = "ok"
+BUDGET_FALLBACK_MODEL = "fallback_model"
+BUDGET_SUMMARY_ONLY = "summary_only"
+
+# User and chat session the current request is spending tokens for (the route comes from metrics)
+_usage_tags: contextvars.ContextVar = contextvars.ContextVar("abacus_usage_tags", default={})
+
+def tag_usage(user_id: Optional[int] = None, session_id: Optional[str] = None):
+    """Attribute LLM calls made from here on (this request or task) to a user and session"""
+    return _usage_tags.set({"user_id": user_id, "session_id": session_id})
+
+@contextmanager
+def usage_tags(user_id: Optional[int] = None, session_id: Optional[str] = None):
+    """tag_usage for a block, e.g. a job on a long-lived worker thread"""
+    token = tag_usage(user_id, session_id)
+    try:
+        yield
+    finally:
+        _usage_tags.reset(token)
+
+def current_user_id() -> Optional[int]:
+    return _usage_tags.get().get("user_id")
+
+GROUP_COLUMNS = {
+    "route": TokenUsage.route,
+    "model": TokenUsage.model,
+    "user": TokenUsage.user_id,
+    "session": TokenUsage.session_id,
+    "day": func.date(TokenUsage.created_at),
+}
+
+class TokenLedger:
+    """
+    Per-call LLM token accounting. Calls are appended to an in-memory batch
+    and written with one INSERT every LLM_LEDGER_FLUSH_SECONDS by a daemon
+    thread. Daily spend per user is the flushed total (re-read from the
+    database at most once per flush interval, so other workers count too)
+    plus this worker's unflushed calls.
+    """
+
+    def __init__(self, session_factory: Callable = SessionLocal, flush_seconds: float = None,
+                 max_pending: int = None):
+        self._session_factory = session_factory
+        self.flush_seconds = flush_seconds or settings.LLM_LEDGER_FLUSH_SECONDS
+        self.max_pending = max_pending or settings.LLM_LEDGER_MAX_PENDING
+        self._pending: List[Dict[str, Any]] = []
+        self._flushed_today: Dict[int, tuple] = {}  # user_id -> (read at monotonic, tokens)
+        self._day = datetime.utcnow().date()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._tables_ready = False
+        self.recorded = 0
+        self.flushed = 0
+        self.dropped = 0
+        self.failures = 0
+
+    # --- Recording ---
+    def record(self, route: str, model: str, prompt_tokens: int, completion_tokens: int,
+               cached_tokens: int = 0, latency_ms: float = None):
+        """Add one completion to the batch (usage listener: runs on the calling thread)"""
+        tags = _usage_tags.get()
+        row = {
+            "created_at": datetime.utcnow(),
+            "route": route,
+            "model": model,
+            "user_id": tags.get("user_id"),
+            "session_id": tags.get("session_id"),
+            "prompt_tokens": int(prompt_tokens or 0),
+            "completion_tokens": int(completion_tokens or 0),
+            "cached_tokens": int(cached_tokens or 0),
+            "latency_ms": round(latency_ms, 1) if latency_ms is not None else None,
+        }
+        with self._lock:
+            self._pending.append(row)
+            self.recorded += 1
+            if len(self._pending) > self.max_pending:
+                # Database unreachable for a long time: keep the newest calls
+                overflow = len(self._pending) - self.max_pending
+                del self._pending[:overflow]
+                self.dropped += overflow
+            if len(self._pending) >= self.max_pending // 2:
+                self._wake.set()
+
+    def flush(self) -> int:
+        """Write the pending batch; on failure it is kept for the next attempt"""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        db = self._session_factory()
+        try:
+            self._ensure_tables(db)
+            db.execute(insert(TokenUsage), batch)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            with self._lock:
+                self._pending = batch + self._pending
+                self.failures += 1
+            logger.warning(f"⚠️ Token ledger flush failed ({len(batch)} calls kept): {e}")
+            return 0
+        finally:
+            db.close()
+
+        with self._lock:
+            self.flushed += len(batch)
+            today = self._today()
+            for row in batch:
+                cached = self._flushed_today.get(row["user_id"])
+                if cached is not None and row["created_at"].date() == today:
+                    self._flushed_today[row["user_id"]] = (cached[0], cached[1] + _total(row))
+        return len(batch)
+
+    # --- Budgets ---
+    def budget_for(self, user_id: Optional[int]) -> int:
+        """Daily token budget of a user (0 = unlimited; anonymous callers are not budgeted)"""
+        if user_id is None:
+            return 0
+        return settings.LLM_USER_TOKEN_BUDGETS.get(user_id, settings.LLM_DAILY_TOKEN_BUDGET)
+
+    def used_today(self, user_id: int) -> int:
+        with self._lock:
+            today = self._today()
+            cached = self._flushed_today.get(user_id)
+            pending = sum(_total(r) for r in self._pending if r["user_id"] == user_id and r["created_at"].date() == today)
+        if cached is None or time.monotonic() - cached[0] > self.flush_seconds:
+            cached = (time.monotonic(), self._flushed_total(user_id, today))
+            with self._lock:
+                self._flushed_today[user_id] = cached
+        return cached[1] + pending
+
+    def budget_status(self, user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Spend against budget and the degradation it triggers"""
+        budget = self.budget_for(user_id)
+        if not budget:
+            return {"user_id": user_id, "daily_budget": None, "used_today": None, "state": BUDGET_OK}
+        used = self.used_today(user_id)
+        if used >= budget * settings.LLM_BUDGET_SUMMARY_ONLY_FACTOR:
+            state = BUDGET_SUMMARY_ONLY
+        elif used >= budget:
+            state = BUDGET_FALLBACK_MODEL
+        else:
+            state = BUDGET_OK
+        return {"user_id": user_id, "daily_budget": budget, "used_today": used, "state": state}
+
+    def select_model(self, default: str) -> str:
+        """default, or the fallback model once the tagged user is over budget"""
+        if self.budget_status(current_user_id())["state"] == BUDGET_OK:
+            return default
+        return settings.LLM_BUDGET_FALLBACK_MODEL or default
+
+    # --- Reporting ---
+    def report(self, group_by: str = "route", since: datetime = None, user_id: int = None,
+               limit: int = 100) -> List[Dict[str, Any]]:
+        """Token totals grouped by route, model, user, session or day (pending calls flushed first)"""
+        column = GROUP_COLUMNS[group_by]
+        self.flush()
+        total = func.sum(TokenUsage.prompt_tokens + TokenUsage.completion_tokens)
+        statement = (
+            select(
+                column.label("key"),
+                func.count().label("calls"),
+                func.sum(TokenUsage.prompt_tokens).label("prompt_tokens"),
+                func.sum(TokenUsage.completion_tokens).label("completion_tokens"),
+                func.sum(TokenUsage.cached_tokens).label("cached_tokens"),
+                func.avg(TokenUsage.latency_ms).label("avg_latency_ms"),
+            )
+            .group_by(column)
+            .order_by(total.desc())
+            .limit(limit)
+        )
+        if since is not None:
+            statement = statement.where(TokenUsage.created_at >= since)
+        if user_id is not None:
+            statement = statement.where(TokenUsage.user_id == user_id)
+        db = self._session_factory()
+        try:
+            self._ensure_tables(db)
+            rows = db.execute(statement).all()
+        finally:
+            db.close()
+        return [
+            {
+                group_by: row.key,
+                "calls": row.calls,
+                "prompt_tokens": int(row.prompt_tokens or 0),
+                "completion_tokens": int(row.completion_tokens or 0),
+                "cached_tokens": int(row.cached_tokens or 0),
+                "total_tokens": int((row.prompt_tokens or 0) + (row.completion_tokens or 0)),
+                "avg_latency_ms": round(row.avg_latency_ms, 1) if row.avg_latency_ms is not None else None,
+            }
+            for row in rows
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "pending": len(self._pending),
+                "recorded": self.recorded,
+                "flushed": self.flushed,
+                "dropped": self.dropped,
+                "flush_failures": self.failures,
+                "flush_seconds": self.flush_seconds,
+                "running": bool(self._thread and self._thread.is_alive()),
+            }
+
+    # --- Background Flushing ---
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="token-ledger", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the flusher and write whatever is left"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+    # --- Internals ---
+    def _today(self):
+        """UTC date, dropping cached daily totals when it changes (call with the lock held)"""
+        today = datetime.utcnow().date()
+        if today != self._day:
+            self._day = today
+            self._flushed_today.clear()
+        return today
+
+    def _flushed_total(self, user_id: int, day) -> int:
+        start = datetime.combine(day, datetime.min.time())
+        statement = select(func.coalesce(func.sum(TokenUsage.prompt_tokens + TokenUsage.completion_tokens), 0)).where(
+            TokenUsage.user_id == user_id,
+            TokenUsage.created_at >= start,
+            TokenUsage.created_at < start + timedelta(days=1),
+        )
+        db = self._session_factory()
+        try:
+            self._ensure_tables(db)
+            return int(db.execute(statement).scalar() or 0)
+        finally:
+            db.close()
+
+    def _ensure_tables(self, db):
+        if not self._tables_ready:
+            TokenUsage.__table__.create(bind=db.get_bind(), checkfirst=True)
+            self._tables_ready = True
+
+def _total(row: Dict[str, Any]) -> int:
+    return row["prompt_tokens"] + row["completion_tokens"]
+
+token_ledger = TokenLedger()
+add_usage_listener(token_ledger.record)
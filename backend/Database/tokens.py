@@ -0,0 +1,66 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import time
+from typing import Any, Dict, Optional
+
+from config import settings
+
+# --- Logging Setup ---
+logger = logging.getLogger("abacus.auth")
+
+# Without a configured secret, tokens are signed with a per-process key: they stop
+# validating after a restart, and a token from one worker fails on every other one.
+# That is only tolerable for a single local development process.
+if settings.SESSION_SECRET_KEY:
+    _SECRET = settings.SESSION_SECRET_KEY.encode()
+elif settings.ENVIRONMENT == "production" or settings.WEB_CONCURRENCY > 1:
+    raise RuntimeError(
+        "SESSION_SECRET_KEY must be set in production and with more than one worker "
+        "(each process would otherwise sign tokens with its own random key)"
+    )
+else:
+    _SECRET = secrets.token_bytes(32)
+    logger.error("SESSION_SECRET_KEY not set: session tokens are signed with a per-process key "
+                 "and will not survive a restart")
+
+TOKEN_VERSION = 1
+
+def _b64encode(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+def _b64decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def _sign(payload: str) -> str:
+    return _b64encode(hmac.new(_SECRET, payload.encode(), hashlib.sha256).digest())
+
+def create_session_token(user_id: int, email: str, name: str = None, ttl_minutes: int = None) -> Dict[str, Any]:
+    """Signed, short-lived session token for an authenticated user"""
+    ttl = (ttl_minutes or settings.SESSION_TOKEN_TTL_MINUTES) * 60
+    now = int(time.time())
+    claims = {"v": TOKEN_VERSION, "uid": user_id, "sub": email, "name": name, "iat": now, "exp": now + ttl}
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return {
+        "access_token": f"{payload}.{_sign(payload)}",
+        "token_type": "bearer",
+        "expires_in": ttl,
+    }
+
+def verify_session_token(token: str) -> Optional[Dict[str, Any]]:
+    """Claims of a valid, unexpired token; None if malformed, tampered with or expired"""
+    if not token or token.count(".") != 1:
+        return None
+    payload, signature = token.split(".")
+    if not hmac.compare_digest(signature, _sign(payload)):
+        return None
+    try:
+        claims = json.loads(_b64decode(payload))
+    except (ValueError, json.JSONDecodeError):
+        return None
+    if claims.get("v") != TOKEN_VERSION or claims.get("exp", 0) <= time.time():
+        return None
+    return claims
@@ -0,0 +1,94 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from config import settings
+from .database import User
+
+def user_to_dict(user: User) -> Dict[str, Any]:
+    """Public profile fields of a user row (never the password hash)"""
+    return {
+        "id": user.id,
+        "name": user.name,
+        "email": user.email,
+        "created_at": user.created_at.isoformat() if user.created_at else None,
+    }
+
+class UserCache:
+    """
+    In-process profile cache keyed by user id. Entries expire after
+    USER_CACHE_TTL_SECONDS and the least recently used are evicted beyond
+    USER_CACHE_MAX_ENTRIES, so a profile lookup costs one query per TTL.
+    """
+
+    def __init__(self, ttl_seconds: float = None, max_entries: int = None):
+        self.ttl = ttl_seconds if ttl_seconds is not None else settings.USER_CACHE_TTL_SECONDS
+        self.max_entries = max_entries or settings.USER_CACHE_MAX_ENTRIES
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def peek(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Profile of user_id when cached and fresh, otherwise None (never touches the database)"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self._hits += 1
+                return entry[1]
+            self._misses += 1
+        return None
+
+    def get(self, db: Session, user_id: int) -> Optional[Dict[str, Any]]:
+        """Profile of user_id, from the cache when fresh, otherwise from the database"""
+        profile = self.peek(user_id)
+        if profile is None:
+            profile = self._remember(db.get(User, user_id))
+        return profile
+
+    async def get_async(self, db: AsyncSession, user_id: int) -> Optional[Dict[str, Any]]:
+        """get() for async routes: misses are loaded through the AsyncSession"""
+        profile = self.peek(user_id)
+        if profile is None:
+            profile = self._remember(await db.get(User, user_id))
+        return profile
+
+    def _remember(self, user: Optional[User]) -> Optional[Dict[str, Any]]:
+        profile = user_to_dict(user) if user else None
+        if profile:
+            self.put(profile)
+        return profile
+
+    def put(self, profile: Dict[str, Any]):
+        with self._lock:
+            self._entries[profile["id"]] = (time.monotonic() + self.ttl, profile)
+            self._entries.move_to_end(profile["id"])
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int = None):
+        """Drop one user (after a profile change) or everything"""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": round(self._hits / lookups, 3) if lookups else None,
+                "ttl_seconds": self.ttl,
+            }
+
+user_cache = UserCache()
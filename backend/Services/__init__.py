@@ -0,0 +1,25 @@
+# Services - Shared Infrastructure Module
+"""
+Shared infrastructure for the Abacus FinBot platform
+This module provides the process-wide services (executors, agent registry, HTTP clients, metrics, tracing, lazy imports, upstream health probes) used by the agents and routes.
+"""
+
+from .executors import *
+from .agent_registry import *
+from .http_clients import *
+from .metrics import *
+from .tracing import *
+from .lazy_imports import *
+from .health_monitor import *
+
+__all__ = [
+    'BoundedExecutor', 'ExecutorSaturated', 'get_executor',
+    'run_in_executor', 'executor_stats', 'shutdown_executors',
+    'AgentRegistry', 'agent_registry', 'get_openai_client', 'get_sharia_expert',
+    'get_yahoo_session', 'get_web_session', 'get_ddgs', 'get_openai_http_client',
+    'http_client_stats', 'close_http_clients',
+    'metrics_registry', 'MetricsMiddleware', 'record_llm_usage', 'observe_upstream',
+    'tracer', 'span', 'traced', 'TracingMiddleware',
+    'lazy_import', 'warm_up_imports', 'lazy_import_status', 'mark_startup', 'startup_timeline', 'profile_imports',
+    'health_monitor', 'response_cache'
+]
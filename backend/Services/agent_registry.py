@@ -0,0 +1,138 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from config import settings
+
+# --- Logging Setup ---
+logger = logging.getLogger("abacus.registry")
+
+class AgentRegistry:
+    """
+    Process-wide registry of lazily constructed singletons (agents, API clients).
+    Each entry is built once on first use, or ahead of time by warm_up().
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._instances: Dict[str, Any] = {}
+        self._errors: Dict[str, str] = {}
+        self._init_ms: Dict[str, float] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._registry_lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        """Register a factory; nothing is built until the entry is requested"""
+        with self._registry_lock:
+            self._factories[name] = factory
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name: str) -> Any:
+        """Return the shared instance, building it on first call"""
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        if name not in self._factories:
+            raise KeyError(f"Unknown registry entry: {name}")
+
+        with self._locks[name]:
+            if name in self._instances:
+                return self._instances[name]
+            started = time.perf_counter()
+            try:
+                instance = self._factories[name]()
+            except Exception as e:
+                self._errors[name] = str(e)
+                logger.error(f"❌ Registry: failed to initialise {name}: {e}")
+                raise
+            self._init_ms[name] = round((time.perf_counter() - started) * 1000, 1)
+            self._errors.pop(name, None)
+            self._instances[name] = instance
+            logger.info(f"✅ Registry: {name} initialised in {self._init_ms[name]} ms")
+            return instance
+
+    def peek(self, name: str) -> Optional[Any]:
+        """Return the instance only if it has already been built"""
+        return self._instances.get(name)
+
+    def proxy(self, name: str) -> "RegistryProxy":
+        """Module-level stand-in that resolves the entry on first attribute access"""
+        return RegistryProxy(self, name)
+
+    async def warm_up(self, names: Optional[Iterable[str]] = None):
+        """Build entries on a worker thread so the event loop stays responsive"""
+        for name in list(names or self._factories):
+            try:
+                await asyncio.to_thread(self.get, name)
+            except Exception:
+                pass  # already recorded in status()
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """Initialisation state of every registered entry"""
+        report = {}
+        for name in self._factories:
+            if name in self._instances:
+                report[name] = {"state": "ready", "init_ms": self._init_ms.get(name)}
+            elif name in self._errors:
+                report[name] = {"state": "error", "error": self._errors[name]}
+            else:
+                report[name] = {"state": "pending"}
+        return report
+
+class RegistryProxy:
+    """Attribute proxy for a registry entry (keeps `client.chat...` call sites unchanged)"""
+
+    __slots__ = ("_registry", "_name")
+
+    def __init__(self, registry: AgentRegistry, name: str):
+        object.__setattr__(self, "_registry", registry)
+        object.__setattr__(self, "_name", name)
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._registry.get(self._name), attr)
+
+    def __repr__(self) -> str:
+        return f"<RegistryProxy {self._name}>"
+
+# --- Shared Entries ---
+def _build_openai_client():
+    from openai import OpenAI
+    from Services.http_clients import get_openai_http_client
+    return OpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL or None,
+        timeout=settings.OPENAI_TIMEOUT_SECONDS,
+        max_retries=settings.HTTP_MAX_RETRIES,
+        http_client=get_openai_http_client(),
+    )
+
+def _build_sharia_expert():
+    from Agent03.sharia_expert_agent import ShariaExpertAgent
+    return ShariaExpertAgent(
+        settings.OPENAI_API_KEY,
+        settings.MODEL_NAME,
+        client=agent_registry.get("openai_client"),
+    )
+
+def _build_symbol_index():
+    from Agent03.symbol_index import load_symbol_index
+    return load_symbol_index()
+
+# Global instance
+agent_registry = AgentRegistry()
+agent_registry.register("openai_client", _build_openai_client)
+agent_registry.register("sharia_expert", _build_sharia_expert)
+agent_registry.register("symbol_index", _build_symbol_index)
+
+def get_openai_client():
+    """The single OpenAI client shared by every agent"""
+    return agent_registry.get("openai_client")
+
+def get_sharia_expert():
+    """The shared Sharia expert agent, or None if it cannot be initialised"""
+    try:
+        return agent_registry.get("sharia_expert")
+    except Exception:
+        return None
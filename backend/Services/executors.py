@@ -0,0 +1,166 @@
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from fastapi import HTTPException
+from config import settings
+
+# --- Logging Setup ---
+logger = logging.getLogger("abacus.executors")
+
+class ExecutorSaturated(HTTPException):
+    """Raised when an executor has no free worker or queue slot (back-pressure)"""
+
+    def __init__(self, name: str, status_code: int = 503, retry_after: int = 5):
+        super().__init__(
+            status_code=status_code,
+            detail=f"Server busy: '{name}' capacity exhausted, please retry shortly",
+            headers={"Retry-After": str(retry_after)},
+        )
+        self.name = name
+
+class BoundedExecutor:
+    """
+    Thread pool with a hard limit on queued work.
+    At most max_workers tasks run and max_queue more may wait; further
+    submissions are rejected immediately with ExecutorSaturated.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int, reject_status: int = 503, retry_after: int = 5):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.reject_status = reject_status
+        self.retry_after = retry_after
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._peak_in_flight = 0
+        self._submitted = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._total_wait = 0.0
+        self._total_run = 0.0
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        """Schedule fn or raise ExecutorSaturated if the executor is full"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            logger.warning(f"🚦 Executor '{self.name}' saturated, rejecting task")
+            raise ExecutorSaturated(self.name, self.reject_status, self.retry_after)
+
+        enqueued_at = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+            self._submitted += 1
+            self._peak_in_flight = max(self._peak_in_flight, self._queued + self._active)
+
+        def task():
+            started_at = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+                self._total_wait += started_at - enqueued_at
+            failed = False
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._completed += 1
+                    self._failed += int(failed)
+                    self._total_run += time.perf_counter() - started_at
+
+        try:
+            future = self._pool.submit(task)
+        except Exception:
+            with self._lock:
+                self._queued -= 1
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Await fn on this executor, preserving the caller's context variables"""
+        context = contextvars.copy_context()
+        return await asyncio.wrap_future(self.submit(context.run, fn, *args, **kwargs))
+
+    def stats(self) -> Dict[str, Any]:
+        """Saturation metrics for monitoring"""
+        with self._lock:
+            in_flight = self._queued + self._active
+            capacity = self.max_workers + self.max_queue
+            started = self._completed + self._active
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "active": self._active,
+                "queued": self._queued,
+                "in_flight": in_flight,
+                "saturation": round(in_flight / capacity, 3) if capacity else 0.0,
+                "peak_in_flight": self._peak_in_flight,
+                "submitted": self._submitted,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "avg_wait_ms": round(self._total_wait / started * 1000, 2) if started else 0.0,
+                "avg_run_ms": round(self._total_run / self._completed * 1000, 2) if self._completed else 0.0,
+            }
+
+    def shutdown(self, wait: bool = False):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+# --- Named Executors ---
+# Upstream and database I/O pools answer 503 when full (the dependency is the bottleneck);
+# CPU pools answer 429 (the caller is sending more work than we can render/parse).
+EXECUTOR_SPECS = {
+    "llm-io": lambda: (settings.EXECUTOR_LLM_IO_WORKERS, settings.EXECUTOR_LLM_IO_QUEUE, 503),
+    "market-io": lambda: (settings.EXECUTOR_MARKET_IO_WORKERS, settings.EXECUTOR_MARKET_IO_QUEUE, 503),
+    "db-io": lambda: (settings.EXECUTOR_DB_IO_WORKERS, settings.EXECUTOR_DB_IO_QUEUE, 503),
+    "cpu-render": lambda: (settings.EXECUTOR_CPU_RENDER_WORKERS, settings.EXECUTOR_CPU_RENDER_QUEUE, 429),
+    "cpu-parse": lambda: (settings.EXECUTOR_CPU_PARSE_WORKERS, settings.EXECUTOR_CPU_PARSE_QUEUE, 429),
+    "cpu-auth": lambda: (settings.EXECUTOR_CPU_AUTH_WORKERS, settings.EXECUTOR_CPU_AUTH_QUEUE, 429),
+}
+
+_executors: Dict[str, BoundedExecutor] = {}
+_executors_lock = threading.Lock()
+
+def get_executor(name: str) -> BoundedExecutor:
+    """Return the named executor, creating it on first use"""
+    executor = _executors.get(name)
+    if executor is not None:
+        return executor
+    if name not in EXECUTOR_SPECS:
+        raise KeyError(f"Unknown executor: {name}")
+    with _executors_lock:
+        if name not in _executors:
+            max_workers, max_queue, reject_status = EXECUTOR_SPECS[name]()
+            _executors[name] = BoundedExecutor(name, max_workers, max_queue, reject_status)
+        return _executors[name]
+
+async def run_in_executor(name: str, fn: Callable, *args, **kwargs) -> Any:
+    """Run a blocking callable on the named executor"""
+    return await get_executor(name).run(fn, *args, **kwargs)
+
+def executor_stats() -> Dict[str, Dict[str, Any]]:
+    """Saturation metrics for every executor (including ones not yet used)"""
+    return {name: get_executor(name).stats() for name in EXECUTOR_SPECS}
+
+def shutdown_executors():
+    """Stop all executors, cancelling queued work"""
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown()
+        _executors.clear()
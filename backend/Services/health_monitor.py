@@ -0,0 +1,216 @@
+"""
+Background upstream probes (OpenAI, Yahoo Finance, DuckDuckGo) and cached
+health responses, so liveness/readiness checks answer from a snapshot
+instead of doing work per request.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from config import settings
+from .metrics import metrics_registry
+
+# --- Logging Setup ---
+logger = logging.getLogger("abacus.health")
+
+YAHOO_PROBE_URL = "https://query2.finance.yahoo.com/v1/test/getcrumb"
+DUCKDUCKGO_PROBE_URL = "https://html.duckduckgo.com/html/"
+
+class ProbeFailed(Exception):
+    """The upstream answered, but not in a usable way (e.g. HTTP 5xx)"""
+
+class UpstreamProbe:
+    """Rolling window of probe results for one upstream"""
+
+    def __init__(self, name: str, check: Callable[[], Any], enabled: Callable[[], bool], critical: bool):
+        self.name = name
+        self.check = check
+        self.enabled = enabled
+        self.critical = critical
+        self.results: deque = deque(maxlen=max(1, settings.HEALTH_PROBE_WINDOW))  # (ok, latency_ms)
+        self.consecutive_failures = 0
+        self.last_error: Optional[str] = None
+        self.last_checked: Optional[float] = None
+
+    def record(self, ok: bool, latency_ms: float, error: Optional[str] = None):
+        self.results.append((ok, round(latency_ms, 1)))
+        self.consecutive_failures = 0 if ok else self.consecutive_failures + 1
+        self.last_error = None if ok else error
+        self.last_checked = time.time()
+
+    def status(self) -> str:
+        if not self.enabled():
+            return "disabled"
+        if not self.results:
+            return "unknown"
+        if self.consecutive_failures >= settings.HEALTH_FAILURE_THRESHOLD:
+            return "down"
+        latencies = [ms for ok, ms in self.results if ok]
+        slow = latencies and sum(latencies) / len(latencies) > settings.HEALTH_DEGRADED_LATENCY_MS
+        if slow or not all(ok for ok, _ in self.results):
+            return "degraded"
+        return "up"
+
+    def snapshot(self) -> Dict[str, Any]:
+        checks = len(self.results)
+        latencies = [ms for ok, ms in self.results if ok]
+        return {
+            "status": self.status(),
+            "critical": self.critical,
+            "latency_ms": self.results[-1][1] if checks else None,
+            "avg_latency_ms": round(sum(latencies) / len(latencies), 1) if latencies else None,
+            "error_rate": round(sum(1 for ok, _ in self.results if not ok) / checks, 3) if checks else None,
+            "checks": checks,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error,
+            "last_checked": self.last_checked,
+        }
+
+class HealthMonitor:
+    """
+    Probes every registered upstream each HEALTH_PROBE_INTERVAL_SECONDS and
+    keeps the latest snapshot. `version` changes after every round, so
+    callers can cache anything derived from it.
+    """
+
+    def __init__(self):
+        self._probes: Dict[str, UpstreamProbe] = {}
+        self._lock = asyncio.Lock()
+        self._snapshot: Dict[str, Any] = {}
+        self.version = 0
+        self.rounds = 0
+
+    def register(self, name: str, check: Callable[[], Any], enabled: Callable[[], bool] = lambda: True,
+                 critical: bool = False):
+        """check runs on a worker thread and raises on failure; disabled probes never run"""
+        self._probes[name] = UpstreamProbe(name, check, enabled, critical)
+        self._refresh_snapshot()
+
+    async def _run_probe(self, probe: UpstreamProbe):
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.to_thread(probe.check), settings.HEALTH_PROBE_TIMEOUT_SECONDS)
+            probe.record(True, (time.perf_counter() - started) * 1000)
+        except asyncio.TimeoutError:
+            probe.record(False, (time.perf_counter() - started) * 1000,
+                         f"timed out after {settings.HEALTH_PROBE_TIMEOUT_SECONDS:.0f}s")
+        except Exception as e:
+            probe.record(False, (time.perf_counter() - started) * 1000, f"{type(e).__name__}: {e}"[:300])
+        if probe.status() == "down" and probe.consecutive_failures == settings.HEALTH_FAILURE_THRESHOLD:
+            logger.warning(f"🔴 Health: {probe.name} is down ({probe.last_error})")
+
+    async def probe(self, names: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Probe now (all upstreams, or just `names`) and return the new snapshot"""
+        async with self._lock:
+            selected = [p for n, p in self._probes.items() if (names is None or n in names) and p.enabled()]
+            await asyncio.gather(*(self._run_probe(p) for p in selected))
+            self.rounds += 1
+            self._refresh_snapshot()
+        return self._snapshot
+
+    async def run_loop(self):
+        """Probe forever (started as a task at startup, cancelled at shutdown)"""
+        while True:
+            await self.probe()
+            await asyncio.sleep(settings.HEALTH_PROBE_INTERVAL_SECONDS)
+
+    def _refresh_snapshot(self):
+        upstreams = {name: probe.snapshot() for name, probe in self._probes.items()}
+        failing = [n for n, s in upstreams.items() if s["critical"] and s["status"] == "down"]
+        self._snapshot = {
+            "upstreams": upstreams,
+            "critical_down": failing,
+            "rounds": self.rounds,
+            "interval_seconds": settings.HEALTH_PROBE_INTERVAL_SECONDS,
+        }
+        self.version += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Latest results (built after each probe round, so this is free)"""
+        return self._snapshot
+
+    def upstream(self, name: str) -> Dict[str, Any]:
+        return self._snapshot["upstreams"].get(name, {"status": "unknown"})
+
+    def readiness(self) -> Tuple[bool, List[str]]:
+        """(no critical upstream is down, the ones that are)"""
+        failing = self._snapshot.get("critical_down", [])
+        return not failing, failing
+
+# --- Cached Responses ---
+class SnapshotCache:
+    """
+    Last value built per endpoint, rebuilt only when its state key changes
+    (or after max_age seconds, for parts that change without a key).
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[Hashable, float, Any]] = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+
+    def get(self, name: str, state: Hashable, build: Callable[[], Any], max_age: Optional[float] = None) -> Any:
+        entry = self._entries.get(name)
+        now = time.monotonic()
+        if entry is not None and entry[0] == state and (max_age is None or now - entry[1] < max_age):
+            return entry[2]
+        value = build()
+        with self._lock:
+            self._entries[name] = (state, now, value)
+            self.builds += 1
+        return value
+
+    def get_json(self, name: str, state: Hashable, build: Callable[[], Any], max_age: Optional[float] = None) -> bytes:
+        """As get(), but the value is kept already serialised"""
+        return self.get(name, state, lambda: json.dumps(build(), default=str).encode(), max_age)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# --- Default Probes ---
+def _check_http(response):
+    if response.status_code >= 500:
+        raise ProbeFailed(f"HTTP {response.status_code}")
+
+def _probe_openai():
+    # Lists models rather than asking for a completion: no tokens spent
+    from Services.agent_registry import get_openai_client
+    get_openai_client().with_options(timeout=settings.HEALTH_PROBE_TIMEOUT_SECONDS, max_retries=0).models.list()
+
+def _probe_yahoo():
+    # Any answer below 500 (getcrumb is 401 without a cookie) means Yahoo is reachable
+    from Services.http_clients import get_yahoo_session
+    _check_http(get_yahoo_session().get(YAHOO_PROBE_URL, timeout=settings.HEALTH_PROBE_TIMEOUT_SECONDS))
+
+def _probe_duckduckgo():
+    from Services.http_clients import get_web_session
+    _check_http(get_web_session().head(DUCKDUCKGO_PROBE_URL, timeout=settings.HEALTH_PROBE_TIMEOUT_SECONDS))
+
+def _critical_upstreams() -> List[str]:
+    return [name.strip() for name in settings.HEALTH_CRITICAL_UPSTREAMS.split(",") if name.strip()]
+
+# Global instance
+health_monitor = HealthMonitor()
+health_monitor.register("openai", _probe_openai, enabled=lambda: bool(settings.OPENAI_API_KEY),
+                        critical="openai" in _critical_upstreams())
+health_monitor.register("yahoo", _probe_yahoo, critical="yahoo" in _critical_upstreams())
+health_monitor.register("duckduckgo", _probe_duckduckgo, critical="duckduckgo" in _critical_upstreams())
+
+response_cache = SnapshotCache()
+
+def _collect_health():
+    upstreams = health_monitor.snapshot()["upstreams"]
+    probed = {n: s for n, s in upstreams.items() if s["status"] not in ("disabled", "unknown")}
+    yield ("upstream_up", "gauge", "1 if the last background probe reached the upstream",
+           [({"upstream": n}, 0 if s["status"] == "down" else 1) for n, s in probed.items()])
+    yield ("upstream_probe_latency_seconds", "gauge", "Latency of the last background probe",
+           [({"upstream": n}, s["latency_ms"] / 1000) for n, s in probed.items()])
+    yield ("upstream_probe_error_ratio", "gauge", "Failed probes in the rolling window",
+           [({"upstream": n}, s["error_rate"]) for n, s in probed.items()])
+
+metrics_registry.register_collector("health", _collect_health)
@@ -0,0 +1,275 @@
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit, urlunsplit
+
+from config import settings
+from .metrics import observe_upstream, record_llm_usage
+from .lazy_imports import is_available
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# --- Optional Dependency Management ---
+# Checked without importing: curl_cffi, httpx and ddgs load when their client is first built
+CURL_CFFI_AVAILABLE = is_available("curl_cffi")
+HTTPX_AVAILABLE = is_available("httpx")
+HTTP2_AVAILABLE = is_available("h2")  # enables HTTP/2 in httpx
+DDGS_AVAILABLE = is_available("ddgs")
+
+# --- Logging Setup ---
+logger = logging.getLogger("abacus.http")
+
+BROWSER_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0 Safari/537.36"
+)
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+MAX_RETRY_AFTER_SECONDS = 30.0
+
+class UpstreamStats:
+    """Request counters for one upstream (thread-safe), mirrored into /metrics"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.total_ms = 0.0
+
+    def record(self, elapsed_ms: float, failed: bool = False):
+        with self._lock:
+            self.requests += 1
+            self.errors += int(failed)
+            self.total_ms += elapsed_ms
+        observe_upstream(self.name, elapsed_ms / 1000, failed)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "avg_latency_ms": round(self.total_ms / self.requests, 1) if self.requests else 0.0,
+            }
+
+_stats: Dict[str, UpstreamStats] = {
+    "yahoo": UpstreamStats("yahoo"),
+    "duckduckgo": UpstreamStats("duckduckgo"),
+    "openai": UpstreamStats("openai"),
+}
+
+def _redirect(url: str) -> str:
+    """url on UPSTREAM_REDIRECT_URL (same path and query) when load testing, else unchanged"""
+    if not settings.UPSTREAM_REDIRECT_URL:
+        return url
+    target = urlsplit(settings.UPSTREAM_REDIRECT_URL)
+    parts = urlsplit(url)
+    return urlunsplit((target.scheme, target.netloc, parts.path, parts.query, parts.fragment))
+
+def _retry_delay(response, attempt: int) -> float:
+    """Exponential backoff, or the upstream's Retry-After (seconds, capped) when it sends one"""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    try:
+        return min(max(float(retry_after), 0.0), MAX_RETRY_AFTER_SECONDS)
+    except (TypeError, ValueError):
+        return 0.5 * (2 ** attempt)
+
+# --- Yahoo Finance (curl_cffi with browser impersonation) ---
+def _build_yahoo_session():
+    from curl_cffi import requests as curl_requests
+
+    class YahooSession(curl_requests.Session):
+        """curl_cffi session that keeps connections alive and counts requests"""
+
+        def request(self, method, url, *args, **kwargs):
+            kwargs.setdefault("timeout", settings.HTTP_TIMEOUT_SECONDS)
+            url = _redirect(url)
+            attempts = settings.HTTP_MAX_RETRIES + 1 if method.upper() in ("GET", "HEAD") else 1
+            for attempt in range(attempts):
+                started = time.perf_counter()
+                failed = True
+                response = None
+                try:
+                    response = super().request(method, url, *args, **kwargs)
+                    failed = response.status_code >= 500
+                    # Same statuses as the pooled sessions' Retry, 429 included
+                    if response.status_code not in RETRY_STATUSES or attempt == attempts - 1:
+                        return response
+                except curl_requests.RequestsError:
+                    if attempt == attempts - 1:
+                        raise
+                finally:
+                    _stats["yahoo"].record((time.perf_counter() - started) * 1000, failed)
+                time.sleep(_retry_delay(response, attempt))
+
+    return YahooSession(impersonate="chrome")
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter that applies the shared timeout when a caller gives none"""
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = settings.HTTP_TIMEOUT_SECONDS
+        if settings.UPSTREAM_REDIRECT_URL:
+            request.url = _redirect(request.url)
+        return super().send(request, **kwargs)
+
+def _build_pooled_session(upstream: str) -> requests.Session:
+    """requests.Session with a keep-alive pool, retries and request counting"""
+    session = requests.Session()
+    retry = Retry(
+        total=settings.HTTP_MAX_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+    )
+    adapter = TimeoutHTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=settings.HTTP_POOL_MAXSIZE,
+        max_retries=retry,
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": BROWSER_USER_AGENT})
+
+    def record(response, *args, **kwargs):
+        _stats[upstream].record(response.elapsed.total_seconds() * 1000, response.status_code >= 500)
+
+    session.hooks["response"].append(record)
+    return session
+
+def _pool_metrics(session: requests.Session) -> Dict[str, int]:
+    """Connection reuse from urllib3: requests served vs new connections opened"""
+    connections = served = 0
+    for adapter in {id(a): a for a in session.adapters.values()}.values():
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            connections += getattr(pool, "num_connections", 0)
+            served += getattr(pool, "num_requests", 0)
+    return {
+        "connections_opened": connections,
+        "requests_served": served,
+        "reused": max(served - connections, 0),
+    }
+
+# --- Shared Clients ---
+_clients: Dict[str, Any] = {}
+_clients_lock = threading.Lock()
+# DDGS is not thread-safe: one instance per executor thread, all closed on shutdown
+_ddgs_local = threading.local()
+_ddgs_instances: list = []
+
+def _get_or_build(name: str, factory):
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = factory()
+            logger.info(f"🔌 HTTP: pooled client '{name}' created")
+        return _clients[name]
+
+def get_yahoo_session():
+    """Session passed to yf.Ticker (curl_cffi when installed, else pooled requests)"""
+    if CURL_CFFI_AVAILABLE:
+        return _get_or_build("yahoo", _build_yahoo_session)
+    return _get_or_build("yahoo", lambda: _build_pooled_session("yahoo"))
+
+def get_web_session() -> requests.Session:
+    """Session for DuckDuckGo HTML search and news pages"""
+    return _get_or_build("duckduckgo", lambda: _build_pooled_session("duckduckgo"))
+
+def get_ddgs() -> Optional["DDGS"]:
+    """DDGS instance of the calling thread; it caches its search engines and their connections"""
+    if not DDGS_AVAILABLE or settings.UPSTREAM_REDIRECT_URL:
+        # ddgs picks its own backends and hosts, so it cannot be pointed at a stand-in
+        return None
+    ddgs = getattr(_ddgs_local, "instance", None)
+    if ddgs is None:
+        from ddgs import DDGS
+        ddgs = _ddgs_local.instance = DDGS(timeout=int(settings.HTTP_TIMEOUT_SECONDS))
+        with _clients_lock:
+            _ddgs_instances.append(ddgs)
+        logger.info(f"🔌 HTTP: DDGS client created for thread '{threading.current_thread().name}'")
+    return ddgs
+
+def _build_openai_http_client():
+    import httpx
+
+    # Time to response headers; the body may still be streaming
+    def mark(request):
+        request.extensions["abacus_started"] = time.perf_counter()
+
+    def record(response):
+        started = response.request.extensions.get("abacus_started", time.perf_counter())
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        _stats["openai"].record(elapsed_ms, response.status_code >= 500)
+        # Token usage for every completion, whichever agent made the call (not for streamed replies)
+        if response.status_code == 200 and response.headers.get("content-type", "").startswith("application/json"):
+            try:
+                body = json.loads(response.read())
+                record_llm_usage(body.get("usage"), body.get("model"), elapsed_ms)
+            except (ValueError, AttributeError):
+                pass
+
+    return httpx.Client(
+        http2=HTTP2_AVAILABLE,
+        timeout=httpx.Timeout(settings.OPENAI_TIMEOUT_SECONDS, connect=10.0),
+        limits=httpx.Limits(
+            max_connections=settings.HTTP_POOL_MAXSIZE,
+            max_keepalive_connections=settings.HTTP_POOL_MAXSIZE,
+            keepalive_expiry=60.0,
+        ),
+        event_hooks={"request": [mark], "response": [record]},
+    )
+
+def get_openai_http_client():
+    """httpx client given to the OpenAI SDK (HTTP/2 when h2 is installed)"""
+    if not HTTPX_AVAILABLE:
+        return None
+    return _get_or_build("openai", _build_openai_http_client)
+
+def http_client_stats() -> Dict[str, Any]:
+    """Per-upstream request counts, latency and connection reuse"""
+    report = {name: stats.snapshot() for name, stats in _stats.items()}
+    web_session = _clients.get("duckduckgo")
+    if web_session is not None:
+        report["duckduckgo"]["pool"] = _pool_metrics(web_session)
+    yahoo_session = _clients.get("yahoo")
+    if isinstance(yahoo_session, requests.Session):
+        report["yahoo"]["pool"] = _pool_metrics(yahoo_session)
+    openai_client = _clients.get("openai")
+    if openai_client is not None:
+        pool = getattr(openai_client._transport, "_pool", None)
+        report["openai"]["pool"] = {
+            "open_connections": len(getattr(pool, "connections", []) or []),
+            "http2": HTTP2_AVAILABLE,
+        }
+    report["yahoo"]["backend"] = "curl_cffi" if CURL_CFFI_AVAILABLE else "requests"
+    report["timeout_seconds"] = settings.HTTP_TIMEOUT_SECONDS
+    report["max_retries"] = settings.HTTP_MAX_RETRIES
+    return report
+
+def close_http_clients():
+    """Close pooled connections on shutdown"""
+    with _clients_lock:
+        for name, client in _clients.items():
+            close = getattr(client, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception as e:
+                    logger.warning(f"⚠️ HTTP: error closing '{name}': {e}")
+        _clients.clear()
+        for ddgs in _ddgs_instances:
+            close = getattr(ddgs, "close", None)
+            if callable(close):
+                try:
+                    close()
+                except Exception as e:
+                    logger.warning(f"⚠️ HTTP: error closing 'ddgs': {e}")
+        _ddgs_instances.clear()
@@ -0,0 +1,238 @@
+"""
+Deferred imports for the heavy stacks (charting, market data, research),
+startup timing, and an `-X importtime` report.
+
+    python -m Services.lazy_imports            # what `import main` costs, by package
+    python -m Services.lazy_imports --top 40 --module routes
+"""
+import argparse
+import asyncio
+import importlib
+import importlib.util
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# --- Logging Setup ---
+logger = logging.getLogger("abacus.imports")
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+def process_uptime() -> Optional[float]:
+    """Seconds since this process was started (Linux /proc), else None"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Fields after the parenthesised command name; starttime is field 22
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return round(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 3)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+_first_seen = time.perf_counter()
+
+def _since_start() -> float:
+    """Process age, or time since this module was imported where /proc is unavailable"""
+    uptime = process_uptime()
+    return uptime if uptime is not None else round(time.perf_counter() - _first_seen, 3)
+
+def is_available(name: str) -> bool:
+    """Whether a top-level package is installed, without importing it"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+# --- Lazy Modules ---
+class LazyModule:
+    """Module stand-in that imports on first attribute access (keeps `plt.subplots(...)` call sites unchanged)"""
+
+    __slots__ = ("_name", "_on_load", "_module", "_lock", "_error", "_load_ms", "_loaded_at")
+
+    def __init__(self, name: str):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_on_load", [])
+        object.__setattr__(self, "_module", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+        object.__setattr__(self, "_error", None)
+        object.__setattr__(self, "_load_ms", None)
+        object.__setattr__(self, "_loaded_at", None)
+
+    def _load(self):
+        module = self._module
+        if module is not None:
+            return module
+        with self._lock:
+            if self._module is not None:
+                return self._module
+            started = time.perf_counter()
+            try:
+                module = importlib.import_module(self._name)
+                for hook in self._on_load:
+                    hook(module)
+            except Exception as e:
+                object.__setattr__(self, "_error", str(e))
+                logger.error(f"❌ Lazy import: {self._name} failed: {e}")
+                raise
+            object.__setattr__(self, "_load_ms", round((time.perf_counter() - started) * 1000, 1))
+            object.__setattr__(self, "_loaded_at", _since_start())
+            object.__setattr__(self, "_error", None)
+            object.__setattr__(self, "_module", module)
+            logger.info(f"📦 Lazy import: {self._name} loaded in {self._load_ms} ms")
+            return module
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr: str, value: Any):
+        setattr(self._load(), attr, value)
+
+    def __delattr__(self, attr: str):
+        delattr(self._load(), attr)
+
+    def __dir__(self) -> List[str]:
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<LazyModule {self._name} ({state})>"
+
+_lazy_modules: Dict[str, LazyModule] = {}
+_lazy_lock = threading.Lock()
+
+def lazy_import(name: str, on_load: Optional[Callable[[Any], None]] = None) -> LazyModule:
+    """
+    Shared stand-in for `import name`; the module is imported on first use
+    (or by warm_up_imports). on_load runs once with the real module, e.g.
+    to apply a plotting style.
+    """
+    with _lazy_lock:
+        proxy = _lazy_modules.get(name)
+        if proxy is None:
+            proxy = _lazy_modules[name] = LazyModule(name)
+    if on_load is not None:
+        with proxy._lock:
+            loaded = proxy._module
+            if loaded is None:
+                proxy._on_load.append(on_load)
+        if loaded is not None:
+            on_load(loaded)
+    return proxy
+
+async def warm_up_imports(names: Optional[Iterable[str]] = None):
+    """Import deferred modules on a worker thread, one at a time, so the event loop stays responsive"""
+    for name in list(names or _lazy_modules):
+        try:
+            await asyncio.to_thread(_lazy_modules[name]._load)
+        except Exception:
+            pass  # already recorded in lazy_import_status()
+
+def lazy_import_status() -> Dict[str, Dict[str, Any]]:
+    report = {}
+    for name, proxy in sorted(_lazy_modules.items()):
+        if proxy._module is not None:
+            report[name] = {"state": "loaded", "load_ms": proxy._load_ms, "loaded_after_start_s": proxy._loaded_at}
+        elif proxy._error is not None:
+            report[name] = {"state": "error", "error": proxy._error}
+        else:
+            report[name] = {"state": "pending"}
+    return report
+
+# --- Startup Timeline ---
+_timeline: Dict[str, float] = {}
+
+def mark_startup(phase: str) -> float:
+    """Record when a startup phase finished (seconds since process start)"""
+    _timeline[phase] = _since_start()
+    return _timeline[phase]
+
+def startup_timeline() -> Dict[str, Any]:
+    return {
+        "phases_s": dict(_timeline),
+        "uptime_s": _since_start(),
+        "modules_imported": len(sys.modules),
+    }
+
+# --- Import Profiling (python -X importtime) ---
+def parse_importtime(output: str) -> List[Dict[str, Any]]:
+    """Rows of `-X importtime` stderr: module, self/cumulative ms and nesting depth"""
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            timing, name = line[len("import time:"):].rsplit("|", 1)
+            self_us, cumulative_us = (int(value) for value in timing.split("|"))
+        except ValueError:
+            continue
+        rows.append({
+            "module": name.strip(),
+            "self_ms": round(self_us / 1000, 1),
+            "cumulative_ms": round(cumulative_us / 1000, 1),
+            # One space after the bar, then two per level of nesting
+            "depth": (len(name) - len(name.lstrip(" ")) - 1) // 2,
+        })
+    return rows
+
+def profile_imports(module: str = "main", top: int = 25) -> Dict[str, Any]:
+    """
+    Import `module` in a fresh interpreter with -X importtime and summarise:
+    total time, self time per top-level package, and the slowest imports.
+    """
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, capture_output=True, text=True, timeout=120,
+    )
+    wall_ms = round((time.perf_counter() - started) * 1000, 1)
+    rows = parse_importtime(result.stderr)
+    if not rows:
+        return {"module": module, "error": (result.stderr or "no importtime output")[-500:]}
+
+    packages: Dict[str, float] = defaultdict(float)
+    for row in rows:
+        packages[row["module"].split(".")[0]] += row["self_ms"]
+    roots = [r for r in rows if r["depth"] == 0]
+    return {
+        "module": module,
+        "total_ms": round(sum(r["cumulative_ms"] for r in roots), 1),
+        "interpreter_wall_ms": wall_ms,
+        "modules": len(rows),
+        "packages": [
+            {"package": name, "self_ms": round(ms, 1)}
+            for name, ms in sorted(packages.items(), key=lambda item: -item[1])[:top]
+        ],
+        "slowest": sorted(rows, key=lambda r: -r["cumulative_ms"])[:top],
+        "ok": result.returncode == 0,
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Report what importing the backend costs")
+    parser.add_argument("--module", default="main", help="Module to import (from the backend directory)")
+    parser.add_argument("--top", type=int, default=25, help="Rows per table")
+    args = parser.parse_args()
+
+    report = profile_imports(args.module, args.top)
+    if "error" in report:
+        print(f"❌ Could not profile 'import {args.module}': {report['error']}")
+        return 1
+    print(f"⏱️ import {args.module}: {report['total_ms']:.0f} ms in {report['modules']} modules "
+          f"(interpreter wall time {report['interpreter_wall_ms']:.0f} ms)")
+    print(f"\n{'package':<32}{'self ms':>10}")
+    for row in report["packages"]:
+        print(f"{row['package']:<32}{row['self_ms']:>10.1f}")
+    print(f"\n{'module':<48}{'cumulative ms':>15}{'self ms':>10}")
+    for row in report["slowest"]:
+        print(f"{'  ' * row['depth'] + row['module']:<48}{row['cumulative_ms']:>15.1f}{row['self_ms']:>10.1f}")
+    return 0 if report["ok"] else 1
+
+if __name__ == "__main__":
+    sys.path.insert(0, str(BACKEND_DIR))
+    sys.exit(main())
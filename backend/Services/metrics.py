@@ -0,0 +1,291 @@
+import bisect
+import contextvars
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from .tracing import add_event, annotate
+
+# --- Logging Setup ---
+logger = logging.getLogger("abacus.metrics")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds: covers sub-millisecond cache hits up to multi-minute LLM analyses
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+ROW_BUCKETS = (10, 100, 1_000, 10_000, 100_000, 1_000_000)
+BYTE_BUCKETS = (10_000, 100_000, 1_000_000, 10_000_000, 100_000_000, 1_000_000_000)
+
+LabelKey = Tuple[str, ...]
+INF_LABEL = 'le="+Inf"'
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Iterable[str], values: Iterable[Any], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+# --- Metric Types ---
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.label_names, k)} {_format_value(v)}" for k, v in items]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, List[float]] = {}  # bucket counts..., sum, count
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return int(series[-1]) if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._series.items())
+        lines = self.header()
+        for key, series in items:
+            cumulative = 0
+            for bound, hits in zip(self.buckets, series):
+                cumulative += hits
+                le = 'le="' + _format_value(bound) + '"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, INF_LABEL)} {int(series[-1])}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {int(series[-1])}")
+        return lines
+
+# --- Registry ---
+# A collector returns (name, kind, help, [(labels, value), ...]) tuples read at scrape time
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]
+
+class MetricsRegistry:
+    """Process-local metrics rendered in the Prometheus text exposition format"""
+
+    def __init__(self, prefix: str = "abacus_"):
+        self.prefix = prefix
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: Dict[str, Collector] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labels: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(self.prefix + name, documentation, labels))
+
+    def gauge(self, name: str, documentation: str, labels: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(self.prefix + name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Iterable[str] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(self.prefix + name, documentation, labels, buckets))
+
+    def register_collector(self, name: str, collector: Collector):
+        """Add (or replace) a scrape-time collector, e.g. for executor or cache stats"""
+        with self._lock:
+            self._collectors[name] = collector
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.items())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector_name, collector in collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                logger.warning(f"⚠️ Metrics collector '{collector_name}' failed: {e}")
+                continue
+            for name, kind, documentation, samples in families:
+                full_name = self.prefix + name
+                lines += [f"# HELP {full_name} {documentation}", f"# TYPE {full_name} {kind}"]
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    lines.append(f"{full_name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+metrics_registry = MetricsRegistry()
+
+# --- Application Metrics ---
+HTTP_REQUEST_SECONDS = metrics_registry.histogram(
+    "http_request_duration_seconds", "Request latency by route template", ("method", "route", "status"))
+HTTP_IN_PROGRESS = metrics_registry.gauge("http_requests_in_progress", "Requests currently being handled")
+UPSTREAM_SECONDS = metrics_registry.histogram(
+    "upstream_request_duration_seconds", "Outbound call latency by upstream", ("upstream",))
+UPSTREAM_ERRORS = metrics_registry.counter("upstream_errors_total", "Failed outbound calls by upstream", ("upstream",))
+LLM_TOKENS = metrics_registry.counter("llm_tokens_total", "LLM tokens by route, model and kind", ("route", "model", "kind"))
+CHART_RENDER_SECONDS = metrics_registry.histogram("chart_render_duration_seconds", "Chart render time by kind", ("kind",))
+DATAFRAME_ROWS = metrics_registry.histogram("session_dataframe_rows", "Rows per uploaded session dataset", buckets=ROW_BUCKETS)
+DATAFRAME_BYTES = metrics_registry.histogram("session_dataframe_bytes", "In-memory size per uploaded session dataset", buckets=BYTE_BUCKETS)
+
+# The ASGI scope of the request being handled; FastAPI stores the matched route in it
+_request_scope: contextvars.ContextVar = contextvars.ContextVar("abacus_request_scope", default=None)
+
+def current_route() -> str:
+    """Route template of the current request ("background" outside a request)"""
+    scope = _request_scope.get()
+    if scope is None:
+        return "background"
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+def observe_upstream(upstream: str, elapsed_seconds: float, failed: bool = False):
+    UPSTREAM_SECONDS.observe(elapsed_seconds, upstream=upstream)
+    if failed:
+        UPSTREAM_ERRORS.inc(upstream=upstream)
+    # Shows each outbound call inside the stage span that made it
+    add_event("upstream.response", {"upstream": upstream, "elapsed_ms": round(elapsed_seconds * 1000, 1), "failed": failed})
+
+# Called with (route, model, prompt, completion, cached, latency_ms) for every completion
+_usage_listeners: List[Callable[..., None]] = []
+
+def add_usage_listener(listener: Callable[..., None]):
+    """Subscribe to per-call token usage (e.g. the token ledger)"""
+    if listener not in _usage_listeners:
+        _usage_listeners.append(listener)
+
+def record_llm_usage(usage: Any, model: str = None, latency_ms: float = None):
+    """Count prompt/completion/cached tokens from an OpenAI usage object or dict"""
+    if not usage:
+        return
+    get = usage.get if isinstance(usage, dict) else lambda k, d=None: getattr(usage, k, d)
+    details = get("prompt_tokens_details") or {}
+    cached = details.get("cached_tokens") if isinstance(details, dict) else getattr(details, "cached_tokens", None)
+    route, model = current_route(), model or "unknown"
+    counts = (("prompt", get("prompt_tokens")), ("completion", get("completion_tokens")), ("cached", cached))
+    for kind, value in counts:
+        if value:
+            LLM_TOKENS.inc(value, route=route, model=model, kind=kind)
+    annotate({"llm.model": model, **{f"llm.{kind}_tokens": value for kind, value in counts if value}})
+    for listener in _usage_listeners:
+        try:
+            listener(route, model, counts[0][1] or 0, counts[1][1] or 0, counts[2][1] or 0, latency_ms)
+        except Exception as e:
+            logger.warning(f"⚠️ Token usage listener failed: {e}")
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request. Latency is labelled with the
+    route template (/stock/jobs/{job_id}), never the raw path, so label
+    cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        token = _request_scope.set(scope)
+        HTTP_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_PROGRESS.dec()
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started, method=scope["method"], route=route, status=status["code"]
+            )
+            _request_scope.reset(token)
+
+def _collect_executors():
+    from Services.executors import executor_stats
+    stats = executor_stats()
+    yield ("executor_active", "gauge", "Tasks running per executor",
+           [({"executor": n}, s["active"]) for n, s in stats.items()])
+    yield ("executor_queue_depth", "gauge", "Tasks waiting per executor",
+           [({"executor": n}, s["queued"]) for n, s in stats.items()])
+    yield ("executor_rejected_total", "counter", "Tasks rejected because the executor was full",
+           [({"executor": n}, s["rejected"]) for n, s in stats.items()])
+
+metrics_registry.register_collector("executors", _collect_executors)
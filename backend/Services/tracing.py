@@ -0,0 +1,446 @@
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from config import settings
+
+# --- Logging Setup ---
+logger = logging.getLogger("abacus.tracing")
+
+# Spans are kept per trace until its root ends; a runaway loop cannot grow one without bound
+MAX_SPANS_PER_TRACE = 512
+MAX_EVENTS_PER_SPAN = 64
+EXPORT_BATCH_SIZE = 64
+
+# OTLP status codes
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+def _new_id(hex_chars: int) -> str:
+    return f"{random.getrandbits(hex_chars * 4):0{hex_chars}x}"
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items() if v is not None]
+
+# --- Spans ---
+class _Trace:
+    """Finished spans of one trace, held until the root span ends"""
+
+    def __init__(self, trace_id: str, sampled: bool):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans: List["Span"] = []
+        self.closed = False
+        self.lock = threading.Lock()
+
+class Span:
+    """One timed operation, with OpenTelemetry ids (32-hex trace, 16-hex span) and OTLP export shape"""
+
+    def __init__(self, name: str, trace: _Trace, parent_id: Optional[str] = None,
+                 attributes: Optional[Dict[str, Any]] = None, kind: int = 1, is_root: bool = False):
+        self.name = name
+        self.trace = trace
+        self.span_id = _new_id(16)
+        self.parent_id = parent_id
+        self.kind = kind  # 1 internal, 2 server
+        self.is_root = is_root  # first span of the trace in this process
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.events: List[Dict[str, Any]] = []
+        self.status = STATUS_UNSET
+        self.status_message = ""
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+
+    @property
+    def trace_id(self) -> str:
+        return self.trace.trace_id
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def set_attributes(self, attributes: Dict[str, Any]):
+        self.attributes.update(attributes)
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None):
+        if len(self.events) < MAX_EVENTS_PER_SPAN:
+            self.events.append({"name": name, "time_ns": time.time_ns(), "attributes": dict(attributes or {})})
+
+    def record_error(self, error: BaseException):
+        self.status = STATUS_ERROR
+        self.status_message = f"{type(error).__name__}: {error}"
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": _otlp_attributes(self.attributes),
+            "events": [
+                {"name": e["name"], "timeUnixNano": str(e["time_ns"]), "attributes": _otlp_attributes(e["attributes"])}
+                for e in self.events
+            ],
+            "status": {"code": self.status, "message": self.status_message} if self.status_message else {"code": self.status},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("abacus_current_span", default=None)
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+def annotate(attributes: Dict[str, Any]):
+    """Set attributes on the active span (no-op outside a trace)"""
+    active = _current_span.get()
+    if active is not None:
+        active.set_attributes(attributes)
+
+def add_event(name: str, attributes: Optional[Dict[str, Any]] = None):
+    """Record a point-in-time event, e.g. an upstream response, on the active span"""
+    active = _current_span.get()
+    if active is not None:
+        active.add_event(name, attributes)
+
+# --- Exporters ---
+class _BatchExporter:
+    """Exports finished traces from a daemon thread so request handlers never wait on I/O"""
+
+    def __init__(self):
+        self._queue: "queue.Queue[Optional[List[Span]]]" = queue.Queue(maxsize=1000)
+        self._thread = threading.Thread(target=self._run, name=f"trace-{type(self).__name__}", daemon=True)
+        self._thread.start()
+        self.exported = 0
+        self.dropped = 0
+        self.failures = 0
+
+    def submit(self, spans: List[Span]):
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += len(spans)
+
+    def shutdown(self, timeout: float = 5.0):
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            # Drain whatever else is waiting into the same request
+            while len(batch) < EXPORT_BATCH_SIZE * 8:
+                try:
+                    more = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if more is None:
+                    self._export_safely(batch)
+                    return
+                batch = batch + more
+            self._export_safely(batch)
+
+    def _export_safely(self, spans: List[Span]):
+        try:
+            self.export(spans)
+            self.exported += len(spans)
+        except Exception as e:
+            self.failures += 1
+            logger.warning(f"⚠️ Trace export failed ({len(spans)} spans): {e}")
+
+    def export(self, spans: List[Span]):
+        raise NotImplementedError
+
+def otlp_payload(spans: List[Span]) -> Dict[str, Any]:
+    """OTLP/JSON ExportTraceServiceRequest, as accepted on a collector's /v1/traces"""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": settings.TRACE_SERVICE_NAME})},
+            "scopeSpans": [{"scope": {"name": "abacus"}, "spans": [s.to_otlp() for s in spans]}],
+        }]
+    }
+
+class JsonFileExporter(_BatchExporter):
+    """Appends one OTLP/JSON document per batch to a file (collector filelog or offline analysis)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        super().__init__()
+
+    def export(self, spans: List[Span]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(otlp_payload(spans), separators=(",", ":")) + "\n")
+
+class OtlpHttpExporter(_BatchExporter):
+    """POSTs OTLP/JSON to a local collector (Jaeger, Tempo, otel-collector) on :4318/v1/traces"""
+
+    def __init__(self, endpoint: str):
+        import httpx
+        self.endpoint = endpoint
+        self._client = httpx.Client(timeout=5.0)
+        super().__init__()
+
+    def export(self, spans: List[Span]):
+        for start in range(0, len(spans), EXPORT_BATCH_SIZE):
+            response = self._client.post(self.endpoint, json=otlp_payload(spans[start:start + EXPORT_BATCH_SIZE]))
+            response.raise_for_status()
+
+# --- Tracer ---
+class Tracer:
+    """
+    Starts and finishes spans, keeps the slowest recent traces for
+    /traces/slow and hands sampled traces to the configured exporter.
+    Every trace is timed; TRACE_SAMPLE_RATE only decides what is exported.
+    """
+
+    def __init__(self, enabled: bool = None, exporter: Optional[_BatchExporter] = None,
+                 sample_rate: float = None, slow_seconds: float = None, slow_keep: int = None):
+        self.enabled = settings.TRACING_ENABLED if enabled is None else enabled
+        self.exporter = exporter
+        self.sample_rate = settings.TRACE_SAMPLE_RATE if sample_rate is None else sample_rate
+        self.slow_seconds = settings.TRACE_SLOW_REQUEST_SECONDS if slow_seconds is None else slow_seconds
+        self._slow: deque = deque(maxlen=slow_keep or settings.TRACE_SLOW_KEEP)
+        self._lock = threading.Lock()
+        self.traces = 0
+
+    def start_span(self, name: str, attributes: Optional[Dict[str, Any]] = None,
+                   parent: Optional[Span] = None, remote: Optional[tuple] = None, kind: int = 1) -> Span:
+        """Child of parent (or of the active span); a new root when there is none"""
+        parent = parent if parent is not None else _current_span.get()
+        if parent is not None:
+            return Span(name, parent.trace, parent.span_id, attributes, kind)
+        if remote is not None:
+            trace_id, parent_id, sampled = remote
+            return Span(name, _Trace(trace_id, sampled), parent_id, attributes, kind, is_root=True)
+        sampled = self.sample_rate >= 1.0 or random.random() < self.sample_rate
+        return Span(name, _Trace(_new_id(32), sampled), None, attributes, kind, is_root=True)
+
+    def end_span(self, span: Span):
+        span.end_ns = time.time_ns()
+        trace = span.trace
+        with trace.lock:
+            late = trace.closed
+            if not late:
+                if len(trace.spans) < MAX_SPANS_PER_TRACE:
+                    trace.spans.append(span)
+                trace.closed = span.is_root
+        if late:
+            # Outlived its root (e.g. a background task): export on its own
+            if trace.sampled and self.exporter is not None:
+                self.exporter.submit([span])
+        elif span.is_root:
+            self._finish_trace(span, trace)
+
+    def _finish_trace(self, root: Span, trace: _Trace):
+        self.traces += 1
+        if root.duration_ms >= self.slow_seconds * 1000:
+            with self._lock:
+                self._slow.append(breakdown(root, trace.spans))
+        if trace.sampled and self.exporter is not None:
+            self.exporter.submit(list(trace.spans))
+
+    @contextmanager
+    def span(self, name: str, attributes: Optional[Dict[str, Any]] = None, **kwargs):
+        if not self.enabled:
+            yield None
+            return
+        active = self.start_span(name, attributes, **kwargs)
+        token = _current_span.set(active)
+        try:
+            yield active
+        except BaseException as e:
+            active.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end_span(active)
+
+    def slow_traces(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recent slow traces first"""
+        with self._lock:
+            return list(reversed(self._slow))[:limit]
+
+    def stats(self) -> Dict[str, Any]:
+        exporter = self.exporter
+        return {
+            "enabled": self.enabled,
+            "exporter": type(exporter).__name__ if exporter else None,
+            "sample_rate": self.sample_rate,
+            "traces": self.traces,
+            "slow_traces_kept": len(self._slow),
+            "exported_spans": exporter.exported if exporter else 0,
+            "dropped_spans": exporter.dropped if exporter else 0,
+        }
+
+    def shutdown(self):
+        if self.exporter is not None:
+            self.exporter.shutdown()
+            self.exporter = None
+
+def breakdown(root: Span, spans: List[Span]) -> Dict[str, Any]:
+    """Summary of one trace: every span as an offset/duration from the root, plus time per span name"""
+    ordered = sorted(spans, key=lambda s: s.start_ns)
+    by_name: Dict[str, float] = {}
+    for s in ordered:
+        if s is not root:
+            by_name[s.name] = round(by_name.get(s.name, 0.0) + s.duration_ms, 1)
+    return {
+        "trace_id": root.trace_id,
+        "name": root.name,
+        "duration_ms": round(root.duration_ms, 1),
+        "started_at": root.start_ns // 1_000_000,
+        "status": "error" if root.status == STATUS_ERROR else "ok",
+        "time_by_span_ms": dict(sorted(by_name.items(), key=lambda kv: -kv[1])),
+        "spans": [
+            {
+                "name": s.name,
+                "span_id": s.span_id,
+                "parent_id": s.parent_id,
+                "offset_ms": round((s.start_ns - root.start_ns) / 1e6, 1),
+                "duration_ms": round(s.duration_ms, 1),
+                "status": "error" if s.status == STATUS_ERROR else "ok",
+                **({"attributes": s.attributes} if s.attributes else {}),
+            }
+            for s in ordered
+        ],
+    }
+
+def _build_exporter() -> Optional[_BatchExporter]:
+    kind = (settings.TRACE_EXPORTER or "").strip().lower()
+    try:
+        if kind == "jsonl":
+            return JsonFileExporter(settings.TRACE_FILE_PATH)
+        if kind == "otlp":
+            return OtlpHttpExporter(settings.TRACE_OTLP_ENDPOINT)
+    except Exception as e:
+        logger.warning(f"⚠️ Trace exporter '{kind}' unavailable: {e}")
+        return None
+    if kind:
+        logger.warning(f"⚠️ Unknown TRACE_EXPORTER '{kind}' (use jsonl or otlp): traces kept in memory only")
+    return None
+
+tracer = Tracer(exporter=_build_exporter() if settings.TRACING_ENABLED else None)
+
+def span(name: str, attributes: Optional[Dict[str, Any]] = None):
+    """Context manager timing a block as a child of the active span"""
+    return tracer.span(name, attributes)
+
+def traced(name: str, attributes: Optional[Dict[str, Any]] = None) -> Callable:
+    """Decorator wrapping each call (sync or async) in a span"""
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(name, attributes):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.span(name, attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class StageSpans:
+    """
+    Sequential stages of one operation: start() ends the previous stage's
+    span and opens the next, so stage progress reporting doubles as tracing.
+    """
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self._stage = None
+
+    def start(self, stage: str, attributes: Optional[Dict[str, Any]] = None):
+        self.close()
+        self._stage = tracer.span(f"{self.prefix}.{stage}", attributes)
+        self._stage.__enter__()
+
+    def close(self, error: BaseException = None):
+        stage, self._stage = self._stage, None
+        if stage is not None:
+            if error is not None:
+                stage.__exit__(type(error), error, error.__traceback__)
+            else:
+                stage.__exit__(None, None, None)
+
+# --- ASGI Middleware ---
+def parse_traceparent(header: str) -> Optional[tuple]:
+    """(trace_id, parent_span_id, sampled) from a W3C traceparent header, or None"""
+    parts = (header or "").strip().split("-")
+    if len(parts) != 4 or parts[0] != "00" or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], sampled
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening a server span per HTTP request, continuing the
+    caller's trace when a W3C traceparent header is sent. The span is named
+    after the route template and the trace id is returned in traceparent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        remote = parse_traceparent(headers.get(b"traceparent", b"").decode("latin-1"))
+
+        with tracer.span(f"{scope['method']} {scope['path']}", {"http.method": scope["method"]},
+                         remote=remote, kind=2) as root:
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    root.set_attributes({"http.status_code": message["status"]})
+                    if message["status"] >= 500:
+                        root.status = STATUS_ERROR
+                    flags = "01" if root.trace.sampled else "00"
+                    traceparent = f"00-{root.trace_id}-{root.span_id}-{flags}".encode()
+                    message.setdefault("headers", [])
+                    message["headers"] = list(message["headers"]) + [(b"traceparent", traceparent)]
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    root.name = f"{scope['method']} {route}"
+                    root.set_attributes({"http.route": route})
@@ -10,11 +10,136 @@ class Settings(BaseSettings):
     MODEL_NAME: str = "gpt-4o"
     SAMPLE_MIN_ROWS: int = 200
     SAMPLE_MAX_ROWS: int = 400
+    # Uploaded frames are compacted before caching: date strings -> datetime64, text with at most
+    # DATAFRAME_CATEGORY_MAX_RATIO distinct values per row -> category, lossless numeric downcasts
+    DATAFRAME_OPTIMISE_MEMORY: bool = True
+    DATAFRAME_CATEGORY_MAX_RATIO: float = 0.5
     MAX_FILE_BYTES: int = 10 * 1024 * 1024
     ALLOWED_ORIGINS: list[str] = ["*"]
     ENVIRONMENT: str = os.getenv("ENVIRONMENT", "development")
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./finbot_users.db")
+    # Connection pool per worker process (ignored for in-memory SQLite)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_SECONDS: float = 30.0
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    # SQLite: how long a writer waits for the lock, and page cache per connection
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 16384
+    # Async driver URL for async routes; derived from DATABASE_URL when empty
+    DATABASE_ASYNC_URL: str = ""
+    USERS_PAGE_SIZE: int = 50
+    USERS_PAGE_MAX: int = 500
     PORT: int = int(os.getenv("PORT", 8000))
+    STOCK_JOB_WORKERS: int = 2
+    # Each worker renews the lease on its jobs every heartbeat; jobs whose lease has lapsed
+    # (their worker died) are taken over by another worker's next heartbeat or restart
+    STOCK_JOB_LEASE_SECONDS: float = 120.0
+    STOCK_JOB_HEARTBEAT_SECONDS: float = 30.0
+    # Completed, failed and cancelled jobs are deleted this long after finishing (0 = keep forever)
+    STOCK_JOB_RETENTION_DAYS: float = 7.0
+    # Dedicated executors for blocking work: worker threads and extra queued tasks
+    EXECUTOR_LLM_IO_WORKERS: int = 8
+    EXECUTOR_LLM_IO_QUEUE: int = 32
+    EXECUTOR_MARKET_IO_WORKERS: int = 8
+    EXECUTOR_MARKET_IO_QUEUE: int = 64
+    # Sync database calls (sessions, ledger, stats); keep workers <= DB_POOL_SIZE + DB_MAX_OVERFLOW
+    EXECUTOR_DB_IO_WORKERS: int = 8
+    EXECUTOR_DB_IO_QUEUE: int = 64
+    EXECUTOR_CPU_RENDER_WORKERS: int = 2
+    EXECUTOR_CPU_RENDER_QUEUE: int = 8
+    EXECUTOR_CPU_PARSE_WORKERS: int = 2
+    EXECUTOR_CPU_PARSE_QUEUE: int = 8
+    EXECUTOR_CPU_AUTH_WORKERS: int = 2  # bcrypt is ~250 ms of CPU per hash/verify
+    EXECUTOR_CPU_AUTH_QUEUE: int = 32
+    # Outbound HTTP: shared pooled clients per upstream
+    HTTP_TIMEOUT_SECONDS: float = 15.0
+    HTTP_MAX_RETRIES: int = 2
+    HTTP_POOL_MAXSIZE: int = 20
+    OPENAI_TIMEOUT_SECONDS: float = 60.0
+    # Charting, market-data and research stacks are imported on first use; preload them
+    # in the background this long after startup so /health answers first
+    PRELOAD_HEAVY_IMPORTS: bool = True
+    PRELOAD_DELAY_SECONDS: float = 2.0
+    # Load testing: point OpenAI, Yahoo and DuckDuckGo at a local stand-in
+    # (abacus_testing/load_testing/mock_upstreams.py), e.g. http://127.0.0.1:8900
+    OPENAI_BASE_URL: str = ""
+    UPSTREAM_REDIRECT_URL: str = ""
+    # Background upstream probes behind /ready and /health/upstreams: an upstream is "down"
+    # after HEALTH_FAILURE_THRESHOLD failed probes in a row, "degraded" on errors or slow
+    # probes in the window; /ready fails (503) while a HEALTH_CRITICAL_UPSTREAMS entry is down
+    HEALTH_PROBES_ENABLED: bool = True
+    HEALTH_PROBE_INTERVAL_SECONDS: float = 30.0
+    HEALTH_PROBE_TIMEOUT_SECONDS: float = 5.0
+    HEALTH_PROBE_WINDOW: int = 20
+    HEALTH_FAILURE_THRESHOLD: int = 2
+    HEALTH_DEGRADED_LATENCY_MS: float = 2000.0
+    HEALTH_CRITICAL_UPSTREAMS: str = "openai"
+    # Parts of health responses with no state key (e.g. verdict counts) are rebuilt this often
+    HEALTH_CACHE_SECONDS: float = 10.0
+    # Bulk portfolio screening
+    SHARIA_BATCH_MAX_TICKERS: int = 500
+    SHARIA_BATCH_CONCURRENCY: int = 8
+    SHARIA_BATCH_LLM_CONCURRENCY: int = 4
+    SHARIA_BORDERLINE_MARGIN: float = 0.8  # ratios at >= 80% of a limit go to review
+    # Sharia verdict store: serve as-is within the TTL, re-analyse after the max age
+    SHARIA_VERDICT_TTL_HOURS: float = 24.0
+    SHARIA_VERDICT_MAX_AGE_DAYS: float = 90.0
+    ADMIN_API_KEY: str = ""
+    # Local development only: open admin routes when ADMIN_API_KEY is unset (never in production)
+    ADMIN_OPEN_WITHOUT_KEY: bool = False
+    # Signed session tokens issued at login (set a fixed secret so they survive restarts)
+    SESSION_SECRET_KEY: str = ""
+    # uvicorn's --workers default; more than one worker requires SESSION_SECRET_KEY
+    WEB_CONCURRENCY: int = 1
+    SESSION_TOKEN_TTL_MINUTES: int = 60
+    # Chat sessions: uploaded datasets on disk (Parquet) and per-worker caches
+    SESSION_DATA_DIR: str = "./session_data"
+    SESSION_CACHE_SIZE: int = 256
+    SESSION_DATASET_CACHE_SIZE: int = 16
+    # Sessions idle this long are deleted with their turns and unused datasets (0 = keep forever)
+    SESSION_RETENTION_DAYS: float = 30.0
+    SESSION_CLEANUP_INTERVAL_HOURS: float = 6.0
+    # Per-process profile cache behind token-authenticated requests
+    USER_CACHE_TTL_SECONDS: float = 300.0
+    USER_CACHE_MAX_ENTRIES: int = 1024
+    # LLM token ledger: usage batched in memory and written every LLM_LEDGER_FLUSH_SECONDS.
+    # Daily per-user budgets (0 = unlimited, overrides as JSON {"user_id": tokens}): past the
+    # budget replies use LLM_BUDGET_FALLBACK_MODEL, past budget x SUMMARY_ONLY_FACTOR chat
+    # also drops to summary-only context
+    LLM_LEDGER_FLUSH_SECONDS: float = 30.0
+    LLM_LEDGER_MAX_PENDING: int = 5000
+    LLM_DAILY_TOKEN_BUDGET: int = 0
+    LLM_USER_TOKEN_BUDGETS: dict[int, int] = {}
+    LLM_BUDGET_FALLBACK_MODEL: str = "gpt-4o-mini"
+    LLM_BUDGET_SUMMARY_ONLY_FACTOR: float = 1.5
+    # Request tracing (OTLP/JSON spans): TRACE_EXPORTER "" keeps traces in memory, "jsonl" appends
+    # to TRACE_FILE_PATH, "otlp" posts to a local collector; slow traces are listed at /traces/slow
+    TRACING_ENABLED: bool = True
+    TRACE_EXPORTER: str = ""
+    TRACE_FILE_PATH: str = "./traces.jsonl"
+    TRACE_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    TRACE_SERVICE_NAME: str = "abacus-finbot"
+    TRACE_SAMPLE_RATE: float = 1.0
+    TRACE_SLOW_REQUEST_SECONDS: float = 5.0
+    TRACE_SLOW_KEEP: int = 50
+    # Optional full exchange listing (symbol,name[,exchange,sector]) replacing the bundled one
+    SYMBOL_LISTINGS_PATH: str = ""
+    # Ratio screening standard: AAOIFI, DJIM or SP
+    SHARIA_METHODOLOGY: str = "DJIM"
+    # Halal alternatives: cached sector metrics, fetched concurrently with a per-ticker timeout
+    SHARIA_ALTERNATIVES_LIMIT: int = 5
+    SHARIA_ALTERNATIVES_CONCURRENCY: int = 8
+    SHARIA_ALTERNATIVE_TIMEOUT_SECONDS: float = 10.0
+    # Screening continues in rounds until enough compliant names are found, within these bounds
+    SHARIA_ALTERNATIVES_MAX_SCREENED: int = 40
+    SHARIA_ALTERNATIVES_BUDGET_SECONDS: float = 25.0
+    SHARIA_SECTOR_TTL_HOURS: float = 12.0
+    SHARIA_SECTOR_REFRESH_MINUTES: float = 60.0
+    # Token budget for the research payload of a verdict prompt (system prefix excluded)
+    SHARIA_PROMPT_TOKEN_BUDGET: int = 1200
+    # Ask for JSON-schema verdicts (typed fields next to the prose); falls back to text
+    SHARIA_STRUCTURED_OUTPUT: bool = True
 
     def get_cors_origins(self):
         """Returns CORS origins according to environment"""
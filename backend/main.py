@@ -1,26 +1,31 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 import uvicorn
+import asyncio
 import os
-import time
 from pathlib import Path
 from config import settings
-from routes import router
+from routes import router, SHARIA_EXPERT_AVAILABLE
 from Database.database import create_tables, add_test_users
+from Agent01.session_store import session_store
+from Services.agent_registry import agent_registry
+from Services.metrics import MetricsMiddleware
+from Services.tracing import TracingMiddleware
+from Services.lazy_imports import mark_startup, warm_up_imports
+from Services.health_monitor import health_monitor, response_cache
+
+# Heavy stacks (charts, market data, research) are deferred, so this is the whole import cost
+IMPORTED_AFTER = mark_startup("imports")
 
 ENVIRONMENT = settings.ENVIRONMENT
 PORT = settings.PORT
 
-# --- Try importing Sharia Expert Agent ---
-try:
-    from Agent03.sharia_expert_agent import initialise_sharia_expert
-    sharia_expert_agent = initialise_sharia_expert(settings.OPENAI_API_KEY, settings.MODEL_NAME)
-    SHARIA_EXPERT_AVAILABLE = True
-    print("✅ Main: Sharia Expert Agent initialised with research tools")
-except ImportError as e:
-    print(f"⚠️ Main: Sharia Expert Agent not available - {e}")
-    SHARIA_EXPERT_AVAILABLE = False
-    sharia_expert_agent = None
+# --- Sharia Expert Agent: shared with routes, built lazily by the registry ---
+if SHARIA_EXPERT_AVAILABLE:
+    print("✅ Main: Sharia Expert Agent available (warmed in background after startup)")
+else:
+    print("⚠️ Main: Sharia Expert Agent not available")
 
 # --- Enhanced FastAPI App Setup ---
 app = FastAPI(
@@ -37,6 +42,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Root span per request (continues an incoming traceparent); slow ones at /traces/slow
+app.add_middleware(TracingMiddleware)
+
+# Outermost, so latency includes CORS handling; exposed at /metrics
+app.add_middleware(MetricsMiddleware)
+
 # --- Global Agent Initialisation Status ---
 agents_initialised = {
     "agent01": False,  # Enhanced Chat FinBot with Banking Analytics
@@ -91,6 +102,20 @@ def add_custom_users():
     finally:
         db.close()
 
+# --- Background Refresh ---
+async def _refresh_sector_index():
+    """Keep cached halal-alternative metrics fresh once the Sharia agent is built"""
+    await app.state.registry_warm_up
+    sharia_expert = agent_registry.peek("sharia_expert")
+    if sharia_expert is not None:
+        await sharia_expert.sector_index.run_refresh_loop()
+
+async def _preload_heavy_imports():
+    """Import the deferred stacks once health checks are being answered"""
+    await asyncio.sleep(settings.PRELOAD_DELAY_SECONDS)
+    await warm_up_imports()
+    mark_startup("preloaded")
+
 # --- Enhanced Startup Event ---
 @app.on_event("startup")
 async def startup_event():
@@ -105,6 +130,10 @@ async def startup_event():
         print("\n📊 Initialising Agent01 (Enhanced Chat FinBot)...")
         create_tables()
         print("✅ Database tables created/verified")
+
+        from Database.token_ledger import token_ledger
+        token_ledger.start()
+        print(f"✅ Token ledger flushing every {token_ledger.flush_seconds:.0f}s")
         
         # 🔥 AUTOMATIC ADDITION OF BASE USERS
         add_custom_users()
@@ -126,7 +155,10 @@ async def startup_event():
         print("\n📈 Initialising Agent02 (Stock Analysis)...")
         # Test import of stock tools
         from Agent02.tools import get_current_stock_price
+        from Agent02.job_queue import stock_job_queue
         print("✅ Stock analysis tools imported")
+        resumed_jobs = stock_job_queue.recover()
+        print(f"✅ Analysis job queue ready ({resumed_jobs} interrupted job(s) resumed)")
         print("✅ Real-time price feeds")
         print("✅ GPT-4o analysis engine")
         agents_initialised["agent02"] = True
@@ -150,15 +182,11 @@ async def startup_event():
             print("   💡 Halal alternatives research")
             print("   📈 Sharia ratio calculations")
             
-            # Test expert capabilities
-            try:
-                status = sharia_expert_agent.get_agent_status()
-                print(f"✅ Expert status verified: {status.get('status', 'unknown')}")
-                agents_initialised["agent03"] = True
-                print("✅ Agent03 (Sharia Expert) ready with research tools!")
-            except Exception as e:
-                print(f"⚠️ Expert status check failed: {e}")
-                agents_initialised["agent03"] = True  # Continue anyway
+            # Build shared agents off the event loop; /ready reports progress
+            app.state.registry_warm_up = asyncio.create_task(agent_registry.warm_up())
+            app.state.sector_refresh = asyncio.create_task(_refresh_sector_index())
+            agents_initialised["agent03"] = True
+            print("✅ Agent03 (Sharia Expert) warming up in background")
                 
         else:
             print("❌ Sharia Expert requirements not met")
@@ -170,6 +198,22 @@ async def startup_event():
         print(f"❌ Error Agent03: {e}")
         agents_initialised["agent03"] = False
 
+    # ========== DEFERRED IMPORTS ==========
+    if settings.PRELOAD_HEAVY_IMPORTS:
+        app.state.import_warm_up = asyncio.create_task(_preload_heavy_imports())
+        print(f"💤 Charting, market-data and research modules preload in {settings.PRELOAD_DELAY_SECONDS:.0f}s")
+
+    # ========== UPSTREAM HEALTH PROBES ==========
+    if settings.HEALTH_PROBES_ENABLED:
+        app.state.health_probes = asyncio.create_task(health_monitor.run_loop())
+        print(f"🩺 Probing OpenAI, Yahoo Finance and DuckDuckGo every {settings.HEALTH_PROBE_INTERVAL_SECONDS:.0f}s")
+
+    # ========== SESSION CLEANUP ==========
+    if settings.SESSION_RETENTION_DAYS > 0:
+        app.state.session_cleanup = asyncio.create_task(session_store.run_cleanup_loop())
+        print(f"🧹 Chat sessions idle for {settings.SESSION_RETENTION_DAYS:g} days are purged every "
+              f"{settings.SESSION_CLEANUP_INTERVAL_HOURS:g}h")
+
     # ========== ENHANCED SUMMARY ==========
     print("\n" + "="*80)
     print("🏦 ABACUS FINBOT - ENHANCED BANKING ANALYTICS PLATFORM")
@@ -237,6 +281,7 @@ async def startup_event():
         print("   POST /chat - AI chat with banking intelligence")
         print("   POST /generate-chart - Comprehensive chart generation")
         print("   POST /banking-analysis - Professional banking analysis")
+        print("   POST /stock/jobs - Queue a stock analysis (poll GET /stock/jobs/{job_id})")
         print("   GET /chart-types - All supported chart types")
         
         if SHARIA_EXPERT_AVAILABLE:
@@ -246,17 +291,61 @@ async def startup_event():
             print("   POST /islamic/research-company - Company research")
             print("   GET /islamic/expert-status - Agent capabilities")
 
-    print(f"\n⏱️ Startup completed in {time.time():.1f}s")
+    started_after = mark_startup("startup")
+    print(f"\n⏱️ Imports done {IMPORTED_AFTER:.2f}s after process start, startup completed at {started_after:.2f}s")
+
+# --- Shutdown Event ---
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task_name in ("sector_refresh", "import_warm_up", "health_probes", "session_cleanup"):
+        task = getattr(app.state, task_name, None)
+        if task is not None:
+            task.cancel()
+
+    try:
+        from Agent02.job_queue import stock_job_queue
+        stock_job_queue.shutdown()
+    except Exception as e:
+        print(f"⚠️ Job queue shutdown error: {e}")
+
+    try:
+        from Agent03.verdict_store import verdict_store
+        verdict_store.flush_hits()
+    except Exception as e:
+        print(f"⚠️ Verdict hit flush error: {e}")
+
+    from Services.executors import shutdown_executors
+    from Services.http_clients import close_http_clients
+    from Services.tracing import tracer
+    from Database.token_ledger import token_ledger
+    shutdown_executors()
+    close_http_clients()
+    tracer.shutdown()
+    token_ledger.stop()
+
+    from Database.database import dispose_engines
+    await dispose_engines()
 
 # --- Include Enhanced API Routes ---
 app.include_router(router)
 
-@app.get("/")
-async def root():
+# --- Cached Health Responses ---
+# Probes hit these constantly; each body is built once per state change and kept serialised
+def _agents_state():
+    return tuple(agents_initialised.values())
+
+def _registry_state():
+    return tuple(entry["state"] for entry in agent_registry.status().values())
+
+def _json_response(body: bytes, status_code: int = 200) -> Response:
+    return Response(content=body, status_code=status_code, media_type="application/json")
+
+def _build_root_info():
     total_agents = sum(agents_initialised.values())
     
     # Enhanced info about Sharia expert
     expert_info = {}
+    sharia_expert_agent = agent_registry.peek("sharia_expert")
     if SHARIA_EXPERT_AVAILABLE and sharia_expert_agent:
         try:
             expert_status = sharia_expert_agent.get_agent_status()
@@ -362,19 +451,26 @@ async def root():
         "environment": ENVIRONMENT,
         "openai_configured": bool(settings.OPENAI_API_KEY)
     }
+
+@app.get("/")
+async def root():
+    state = (_agents_state(), agent_registry.peek("sharia_expert") is not None)
+    return _json_response(response_cache.get_json("root", state, _build_root_info))
+
 @app.head("/")
 async def root_head():
     """Handle HEAD requests for health checks"""
     return {}
 
-@app.get("/ready")
-async def readiness_check():
+def _build_readiness():
     total_agents = sum(agents_initialised.values())
     
     # Enhanced detailed status
     banking_ready = agents_initialised["agent01"]
     expert_ready = False
     expert_details = {}
+    registry_status = agent_registry.status()
+    sharia_expert_agent = agent_registry.peek("sharia_expert")
     
     if SHARIA_EXPERT_AVAILABLE and sharia_expert_agent:
         try:
@@ -388,14 +484,16 @@ async def readiness_check():
         except Exception as e:
             expert_details = {"error": str(e)}
     
+    upstreams_ok, upstreams_down = health_monitor.readiness()
     return {
-        "ready": total_agents >= 2,
+        "ready": total_agents >= 2 and upstreams_ok,
         "agents_ready": total_agents,
         "total_agents": 3,
         "all_systems": "operational" if total_agents == 3 else "partial",
         "banking_analytics": "ready" if banking_ready else "limited",
         "expert_analysis": "ready" if expert_ready else "limited",
         "expert_details": expert_details,
+        "shared_agents": registry_status,
         "banking_features": {
             "transaction_analysis": banking_ready,
             "chart_generation": banking_ready,
@@ -409,11 +507,20 @@ async def readiness_check():
         },
         "openai_configured": bool(settings.OPENAI_API_KEY),
         "research_tools": "available" if agents_initialised["agent03"] else "unavailable",
-        "platform_type": "Enhanced Banking Analytics with Comprehensive Charts"
+        "platform_type": "Enhanced Banking Analytics with Comprehensive Charts",
+        "upstreams": {name: probe["status"] for name, probe in health_monitor.snapshot()["upstreams"].items()},
+        "upstreams_down": upstreams_down
     }
 
-@app.get("/health")
-async def health_check():
+@app.get("/ready")
+async def readiness_check():
+    """Readiness from the last upstream probe round; 503 while agents or a critical upstream are down"""
+    state = (_agents_state(), _registry_state(), health_monitor.version)
+    ready = sum(agents_initialised.values()) >= 2 and health_monitor.readiness()[0]
+    body = response_cache.get_json("ready", state, _build_readiness)
+    return _json_response(body, 200 if ready else 503)
+
+def _build_liveness():
     return {
         "status": "healthy",
         "service": "abacus-finbot-enhanced-banking",
@@ -435,6 +542,12 @@ async def health_check():
             "sharia_expert": agents_initialised["agent03"]
         }
     }
+
+@app.get("/health")
+async def health_check():
+    """Liveness: never touches upstreams"""
+    return _json_response(response_cache.get_json("health", _agents_state(), _build_liveness))
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", settings.PORT))
     print(f"🌟 Starting Enhanced Banking Analytics Platform...")
@@ -2,20 +2,18 @@ import json
 import re
 import uuid
 from Agent01.functions import *
-from fastapi import APIRouter, HTTPException, UploadFile, Form, File, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, UploadFile, Form, File, Depends, BackgroundTasks, Query
+from fastapi.responses import StreamingResponse, Response
 from enum import Enum
-from typing import Dict, Any, Optional, List    
+from typing import Dict, Any, Optional, List, Tuple
 from pydantic import BaseModel
 import os
 import random
 import numpy as np
 import time
 import logging
-import openai
 from datetime import datetime, timedelta
-from openai import OpenAI, OpenAIError
 import io, base64
-import matplotlib.pyplot as plt
 import pandas as pd
 import asyncio
 import sys
@@ -24,27 +22,45 @@ from pandas.api.types import (
     is_numeric_dtype,
     is_datetime64_any_dtype,
 )
-from sqlalchemy.orm import Session
-from Database.database import get_db, User
-from Database.auth import authenticate_user, validate_email, validate_name, get_current_user
+from sqlalchemy.ext.asyncio import AsyncSession
+from Database.database import (
+    get_async_db, database_stats, get_user_stats, users_page_statement, User,
+)
+from Database.auth import (
+    authenticate_user_async, create_user_async, issue_session_token,
+    validate_email, validate_name, get_current_user, get_optional_user, require_admin, CurrentUser,
+)
+from Database.user_cache import user_cache
+from Database.token_ledger import token_ledger, tag_usage, GROUP_COLUMNS, BUDGET_SUMMARY_ONLY
+from Agent01.session_store import session_store
+from Database.tokens import create_session_token
 from config import settings
 from Agent02.direct_analysis import run_stock_analysis_direct, get_analysis_results_direct
+from Agent02.job_queue import stock_job_queue
+from Services.executors import run_in_executor, executor_stats, ExecutorSaturated
+from Services.http_clients import http_client_stats
+from Services.metrics import metrics_registry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from Services.tracing import tracer
+from Services.lazy_imports import startup_timeline, lazy_import_status, profile_imports
+from Services.agent_registry import agent_registry, get_sharia_expert
+from Services.health_monitor import health_monitor, response_cache
 from Agent02.tools import *
 
 # ==================== SHARIA EXPERT AGENT IMPORT ====================
+# The agent itself is built lazily by the shared registry (see Services.agent_registry)
 try:
-    from Agent03.sharia_expert_agent import initialise_sharia_expert
-    sharia_expert_agent = initialise_sharia_expert(settings.OPENAI_API_KEY, settings.MODEL_NAME)
+    from Agent03.sharia_expert_agent import ShariaExpertAgent
+    from Agent03.batch_screening import BatchScreener, normalise_tickers, tickers_from_dataframe, tickers_from_text
+    from Agent03.verdict_store import verdict_store
+    from Agent03.ratio_engine import screen_fundamentals, get_methodology, METHODOLOGIES, FUNDAMENTAL_COLUMNS
     SHARIA_EXPERT_AVAILABLE = True
-    print("✅ Routes: Sharia Expert Agent imported with research tools")
+    print("✅ Routes: Sharia Expert Agent available (shared instance, initialised on first use)")
 except ImportError as e:
     print(f"⚠️ Routes: Sharia Expert Agent unavailable - {e}")
     SHARIA_EXPERT_AVAILABLE = False
-    sharia_expert_agent = None
 except Exception as e:
-    print(f"⚠️ Routes: Error initialising Sharia Expert Agent - {e}")
+    print(f"⚠️ Routes: Error importing Sharia Expert Agent - {e}")
     SHARIA_EXPERT_AVAILABLE = False
-    sharia_expert_agent = None
 
 # ==================== STOCK ANALYSIS IMPORT ====================
 try:
@@ -65,6 +81,9 @@ class LoginResponse(BaseModel):
     message: str
     user_name: Optional[str] = None
     user_email: Optional[str] = None
+    access_token: Optional[str] = None
+    token_type: Optional[str] = None
+    expires_in: Optional[int] = None
 
 class RegisterRequest(BaseModel):
     name: str
@@ -82,6 +101,7 @@ class SessionResponse(BaseModel):
 class UploadResponse(BaseModel):
     session_id: str
     summary: Dict[str, Any]
+    memory: Optional[Dict[str, Any]] = None
 
 class ChatRequest(BaseModel):
     session_id: Optional[str] = None        
@@ -106,6 +126,22 @@ class StockAnalysisResponse(BaseModel):
     task_id: Optional[str] = None
     model_used: Optional[str] = None
 
+class StockJobResponse(BaseModel):
+    job_id: str
+    symbol: str
+    status: str
+    stage: Optional[str] = None
+    progress: int = 0
+    deduplicated: bool = False
+    analysis: Optional[str] = None
+    recommendation: Optional[str] = None
+    model_used: Optional[str] = None
+    error: Optional[str] = None
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    message: Optional[str] = None
+
 class StockPriceResponse(BaseModel):
     symbol: str
     price: str
@@ -134,6 +170,8 @@ class ShariaAnalysisResponse(BaseModel):
     agent_type: Optional[str] = None
     timestamp: Optional[str] = None
     message: Optional[str] = None
+    cache: Optional[Dict[str, Any]] = None
+    structured_verdict: Optional[Dict[str, Any]] = None
 
 class ShariaAlternativesRequest(BaseModel):
     haram_investment: str
@@ -148,6 +186,10 @@ class ShariaAlternativesResponse(BaseModel):
     timestamp: Optional[str] = None
     message: Optional[str] = None
 
+class ShariaBatchRequest(BaseModel):
+    tickers: List[str]
+    use_llm: bool = True
+
 class CompanyResearchRequest(BaseModel):
     company_name: str
 
@@ -162,67 +204,28 @@ class CompanyResearchResponse(BaseModel):
 
 # ==================== SESSION MANAGEMENT ====================
 
-SESSIONS: Dict[str, Dict[str, Any]] = {}
+# Sessions are persisted by Agent01.session_store (chat turns in the database,
+# datasets on disk), so any worker can serve them after a restart. They belong
+# to the user whose token created them (None for anonymous callers); another
+# user's session id behaves as if it did not exist.
 
-def get_session(session_id: str) -> Optional[Dict[str, Any]]:
-    return SESSIONS.get(session_id)
+def _owner_id(user: Optional[CurrentUser]) -> Optional[int]:
+    return user.id if user else None
 
-def save_session(session_id: str, session_data: Dict[str, Any]) -> None:
-    SESSIONS[session_id] = session_data
+async def get_session(session_id: str, user: Optional[CurrentUser] = None) -> Optional[Dict[str, Any]]:
+    session = await run_in_executor("db-io", session_store.get, session_id)
+    if session is None or session.get("owner") != _owner_id(user):
+        return None
+    return session
 
-# ==================== STOCK ANALYSIS BACKGROUND TASKS ====================
-
-active_stock_tasks = {}
+async def new_session(user: Optional[CurrentUser] = None) -> Tuple[str, Dict[str, Any]]:
+    session_id = str(uuid.uuid4())
+    return session_id, await run_in_executor("db-io", session_store.create, session_id, _owner_id(user))
 
-def run_stock_analysis_background(symbol: str, task_id: str, user_id: int = None):
-    """Execute stock analysis in background"""
-    if not STOCK_ANALYSIS_AVAILABLE:
-        active_stock_tasks[task_id] = {
-            "status": "error",
-            "error": "Stock analysis service unavailable"
-        }
-        return
-
-    try:
-        print(f"🚀 Background analysis of {symbol} (task: {task_id})")
-        
-        active_stock_tasks[task_id] = {
-            "status": "running",
-            "symbol": symbol,
-            "user_id": user_id,
-            "progress": "GPT-4o analysis in progress..."
-        }
-        
-        result = run_stock_analysis_direct(symbol)
-        
-        if result.get("status") == "success":
-            analysis_data = get_analysis_results_direct(symbol)
-            
-            active_stock_tasks[task_id] = {
-                "status": "completed",
-                "symbol": symbol,
-                "user_id": user_id,
-                "analysis": analysis_data.get("analysis", ""),
-                "recommendation": analysis_data.get("recommendation", ""),
-                "model_used": "GPT-4o",
-                "completed_at": result.get("timestamp"),
-                "message": f"Analysis of {symbol} completed"
-            }
-        else:
-            active_stock_tasks[task_id] = {
-                "status": "error",
-                "symbol": symbol,
-                "user_id": user_id,
-                "error": result.get("error", "Unknown error")
-            }
-            
-    except Exception as e:
-        active_stock_tasks[task_id] = {
-            "status": "error",
-            "symbol": symbol,
-            "user_id": user_id,
-            "error": str(e)
-        }
+async def load_session_dataset(session: Dict[str, Any]):
+    """Read a restored session's DataFrame from disk (off the event loop) on first use"""
+    if session["df"] is None and session.get("dataset_hash"):
+        await run_in_executor("db-io", session_store.dataset, session)
 
 # ==================== ROUTER INITIALISATION ====================
 
@@ -234,53 +237,56 @@ router = APIRouter()
 async def upload_file(
     file: UploadFile = File(...),
     session_id: str = Form(None),
+    user: Optional[CurrentUser] = Depends(get_optional_user),
 ):
     """Attach an Excel/CSV to an existing session (if provided) or create new."""
-    if session_id and (session := get_session(session_id)):
+    if session_id and (session := await get_session(session_id, user)):
         pass
     else:
-        session_id = str(uuid.uuid4())
-        session = {
-            "df": None,
-            "summary": {},
-            "chat": [
-                {"role": "system", "content": "You are FinBot, an AI financial adviser."}
-            ],
-        }
-        save_session(session_id, session)
+        session_id, session = await new_session(user)
 
+    raw = await file.read()
     try:
-        raw = await file.read()
-        df = read_excel_any(raw, file.filename)
+        df = await run_in_executor("cpu-parse", read_excel_any, raw, file.filename)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Could not read file: {e}")
 
-    summary = summarise_dataframe(df)
-    session["df"] = df
-    session["summary"] = summary
-    save_session(session_id, session)
+    # Sessions keep the frame in memory, so compact it before it is cached
+    df, memory = await run_in_executor("cpu-parse", optimise_dataframe_memory, df)
+    summary = await run_in_executor("cpu-parse", summarise_dataframe, df)
+    try:
+        await run_in_executor(
+            "db-io", session_store.attach_dataset, session_id, session, df, summary, raw, file.filename
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Could not store file: {e}")
 
-    return UploadResponse(session_id=session_id, summary=summary)
+    return UploadResponse(session_id=session_id, summary=summary, memory=memory)
 
 @router.post("/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest):
+async def chat(req: ChatRequest, user: Optional[CurrentUser] = Depends(get_optional_user)):
     """Chat with FinBot + chart generation"""
     session_id = req.session_id
-    session = get_session(session_id) if session_id else None
+    session = await get_session(session_id, user) if session_id else None
 
     if session is None:
-        session_id = str(uuid.uuid4())
-        session = {
-            "df": None,
-            "summary": {},
-            "chat": [
-                {"role": "system", "content": "You are FinBot, an AI financial adviser."}
-            ],
-        }
-        save_session(session_id, session)
+        session_id, session = await new_session(user)
+
+    tag_usage(_owner_id(user), session_id)
+    if req.context_mode != ContextMode.summary and token_ledger.budget_for(_owner_id(user)):
+        budget = await run_in_executor("db-io", token_ledger.budget_status, _owner_id(user))
+        if budget["state"] == BUDGET_SUMMARY_ONLY:
+            # Well past the daily token budget: answer from the dataset summary alone
+            req.context_mode = ContextMode.summary
+
+    if req.context_mode != ContextMode.summary:
+        await load_session_dataset(session)
 
     chat_history = session["chat"]
-    chat_history.append({"role": "user", "content": req.message})
+    user_turn = {"role": "user", "content": req.message}
+    chat_history.append(user_turn)
 
     messages = chat_history.copy()
     if session["summary"]:
@@ -300,7 +306,7 @@ async def chat(req: ChatRequest):
             "content": f"spreadsheet_rows={rows_df.to_dict(orient='records')}",
         })
 
-    assistant_text = call_openai(messages)
+    assistant_text = await run_in_executor("llm-io", call_openai, messages)
 
     # Chart handling
     chart_base64: str | None = None
@@ -314,10 +320,13 @@ async def chat(req: ChatRequest):
         try:
             spec = json.loads(m.group(1))
             if spec.get("action") == "plot":
+                await load_session_dataset(session)
                 if session["df"] is None:
                     raise HTTPException(status_code=400, detail="Please upload your dataset first before requesting a chart.")
 
-                chart_base64 = make_chart(
+                chart_base64 = await run_in_executor(
+                    "cpu-render",
+                    make_chart,
                     session["df"],
                     spec["kind"],
                     spec.get("columns", []),
@@ -326,7 +335,9 @@ async def chat(req: ChatRequest):
         except (json.JSONDecodeError, ValueError):
             pass
 
-    chat_history.append({"role": "assistant", "content": assistant_text})
+    assistant_turn = {"role": "assistant", "content": assistant_text}
+    chat_history.append(assistant_turn)
+    await run_in_executor("db-io", session_store.append_turns, session_id, session, [user_turn, assistant_turn])
     return ChatResponse(
         answer=assistant_text,
         session_id=session_id,
@@ -334,28 +345,15 @@ async def chat(req: ChatRequest):
     )
 
 @router.post("/session", response_model=SessionResponse)
-async def create_session():
+async def create_session(user: Optional[CurrentUser] = Depends(get_optional_user)):
     """Create a brand-new session with no spreadsheet attached."""
-    session_id = str(uuid.uuid4())
-    save_session(
-        session_id,
-        {
-            "df": None,
-            "summary": {},
-            "chat": [
-                {
-                    "role": "system",
-                    "content": "You are FinBot, an AI financial adviser.",
-                }
-            ],
-        },
-    )
+    session_id, _ = await new_session(user)
     return SessionResponse(session_id=session_id)
 
 # ==================== AUTHENTICATION ROUTES ====================
 
 @router.post("/login", response_model=LoginResponse)
-async def login(request: LoginRequest, db: Session = Depends(get_db)):
+async def login(request: LoginRequest, db: AsyncSession = Depends(get_async_db)):
     """Login route"""
     try:
         if not validate_email(request.email):
@@ -364,7 +362,7 @@ async def login(request: LoginRequest, db: Session = Depends(get_db)):
         if not request.password or len(request.password.strip()) < 1:
             return LoginResponse(success=False, message="Password required")
         
-        user = authenticate_user(db, request.email.lower().strip(), request.password)
+        user = await authenticate_user_async(db, request.email.lower().strip(), request.password)
         
         if not user:
             return LoginResponse(success=False, message="Incorrect email or password")
@@ -373,19 +371,20 @@ async def login(request: LoginRequest, db: Session = Depends(get_db)):
             success=True,
             message="Login successful",
             user_name=user.name,
-            user_email=user.email
+            user_email=user.email,
+            **issue_session_token(user)
         )
         
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         return LoginResponse(success=False, message=f"Login error: {str(e)}")
 
 @router.post("/register", response_model=LoginResponse)
-async def register(request: RegisterRequest, db: Session = Depends(get_db)):
+async def register(request: RegisterRequest, db: AsyncSession = Depends(get_async_db)):
     """Registration route"""
     try:
-        from Database.auth import create_user
-        
-        user = create_user(
+        user = await create_user_async(
             db=db,
             name=request.name,
             email=request.email,
@@ -396,28 +395,95 @@ async def register(request: RegisterRequest, db: Session = Depends(get_db)):
             success=True,
             message="Account created successfully",
             user_name=user.name,
-            user_email=user.email
+            user_email=user.email,
+            **issue_session_token(user)
         )
         
+    except ExecutorSaturated:
+        raise
     except ValueError as e:
         return LoginResponse(success=False, message=str(e))
     except Exception as e:
         return LoginResponse(success=False, message=f"Error: {str(e)}")
 
+@router.post("/token/refresh", response_model=LoginResponse)
+async def refresh_token(user: CurrentUser = Depends(get_current_user)):
+    """Exchange a valid session token for a fresh one (no password, no bcrypt)"""
+    return LoginResponse(
+        success=True,
+        message="Session refreshed",
+        user_name=user.name,
+        user_email=user.email,
+        **create_session_token(user.id, user.email, user.name)
+    )
+
+@router.get("/me")
+async def current_user_profile(user: CurrentUser = Depends(get_current_user), db: AsyncSession = Depends(get_async_db)):
+    """Profile of the signed-in user (served from the in-process user cache)"""
+    profile = await user_cache.get_async(db, user.id)
+    if not profile:
+        raise HTTPException(status_code=401, detail="User no longer exists")
+    return {**profile, "token_expires_at": datetime.utcfromtimestamp(user.expires_at).isoformat()}
+
 @router.get("/users")
-async def list_users(db: Session = Depends(get_db)):
-    """List users (debug)"""
-    users = db.query(User).all()
-    return [{"name": u.name, "email": u.email, "created_at": u.created_at} for u in users]
+async def list_users(
+    limit: int = Query(settings.USERS_PAGE_SIZE, ge=1, le=settings.USERS_PAGE_MAX),
+    after_id: Optional[int] = Query(None, description="next_cursor of the previous page"),
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db),
+    _: bool = Depends(require_admin),
+):
+    """List users for admins, one keyset page at a time"""
+    statement = users_page_statement(limit, after_id, created_from, created_to)
+    rows = (await db.execute(statement)).all()
+    return {
+        "users": [{"id": r.id, "name": r.name, "email": r.email, "created_at": r.created_at} for r in rows],
+        "count": len(rows),
+        "next_cursor": rows[-1].id if len(rows) == limit else None,
+    }
+
+@router.get("/me/usage")
+async def current_user_token_usage(user: CurrentUser = Depends(get_current_user),
+                                   days: int = Query(7, ge=1, le=90)):
+    """LLM tokens spent by the signed-in user, per route, and today's budget state"""
+    since = datetime.utcnow() - timedelta(days=days)
+    return {
+        "budget": await run_in_executor("db-io", token_ledger.budget_status, user.id),
+        "by_route": await run_in_executor("db-io", token_ledger.report, "route", since, user.id),
+    }
+
+@router.get("/usage/tokens")
+async def token_usage_report(
+    group_by: str = Query("route", pattern="^(" + "|".join(GROUP_COLUMNS) + ")$"),
+    days: int = Query(7, ge=1, le=365),
+    user_id: Optional[int] = Query(None),
+    limit: int = Query(100, ge=1, le=1000),
+    _: bool = Depends(require_admin),
+):
+    """LLM token totals and latency grouped by route, model, user, session or day"""
+    since = datetime.utcnow() - timedelta(days=days)
+    return {
+        "group_by": group_by,
+        "since": since.isoformat(),
+        "rows": await run_in_executor("db-io", token_ledger.report, group_by, since, user_id, limit),
+        "ledger": token_ledger.stats(),
+    }
+
+@router.get("/users/stats")
+async def user_statistics(_: bool = Depends(require_admin)):
+    """User count, latest sign-up and password-hash distribution (aggregate queries only)"""
+    return await run_in_executor("db-io", get_user_stats)
 
 # ==================== STOCK ANALYSIS ROUTES ====================
 
 @router.post("/stock/analyze-sync", response_model=StockAnalysisResponse)
 async def analyse_stock_sync(
     request: StockSymbolRequest,
-    db: Session = Depends(get_db)
+    user: Optional[CurrentUser] = Depends(get_optional_user)
 ):
     """Synchronous stock analysis (immediate result)"""
+    tag_usage(_owner_id(user))
     if not STOCK_ANALYSIS_AVAILABLE:
         raise HTTPException(
             status_code=503,
@@ -431,9 +497,7 @@ async def analyse_stock_sync(
         
         print(f"🔍 Synchronous analysis of {symbol}")
         
-        result = await asyncio.get_event_loop().run_in_executor(
-            None, run_stock_analysis_direct, symbol
-        )
+        result = await run_in_executor("llm-io", run_stock_analysis_direct, symbol)
         
         if result.get("status") == "error":
             raise HTTPException(
@@ -457,6 +521,37 @@ async def analyse_stock_sync(
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
+@router.post("/stock/jobs", response_model=StockJobResponse, status_code=202)
+async def submit_stock_job(request: StockSymbolRequest, user: Optional[CurrentUser] = Depends(get_optional_user)):
+    """Queue a stock analysis and return immediately with a job to poll"""
+    if not STOCK_ANALYSIS_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Stock analysis service unavailable")
+    
+    symbol = request.symbol.upper().strip()
+    if not symbol:
+        raise HTTPException(status_code=400, detail="Stock symbol required")
+    
+    job, created = await run_in_executor("db-io", stock_job_queue.submit, symbol, user_id=_owner_id(user))
+    message = f"Analysis of {symbol} queued" if created else f"Analysis of {symbol} already in progress"
+    return StockJobResponse(**job, deduplicated=not created, message=message)
+
+@router.get("/stock/jobs/{job_id}", response_model=StockJobResponse)
+async def get_stock_job(job_id: str, user: Optional[CurrentUser] = Depends(get_optional_user)):
+    """Poll the status, stage and result of a stock analysis job"""
+    job = await run_in_executor("db-io", stock_job_queue.get, job_id, user_id=_owner_id(user))
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return StockJobResponse(**job)
+
+@router.delete("/stock/jobs/{job_id}", response_model=StockJobResponse)
+async def cancel_stock_job(job_id: str, user: Optional[CurrentUser] = Depends(get_optional_user)):
+    """Cancel a queued or running stock analysis job"""
+    job = await run_in_executor("db-io", stock_job_queue.cancel, job_id, user_id=_owner_id(user))
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    message = "Job cancelled" if job["status"] == "cancelled" else f"Job already {job['status']}"
+    return StockJobResponse(**job, message=message)
+
 @router.post("/stock/price", response_model=StockPriceResponse)
 async def get_stock_price(request: StockSymbolRequest):
     """Real-time stock price"""
@@ -468,7 +563,7 @@ async def get_stock_price(request: StockSymbolRequest):
         if not symbol:
             raise HTTPException(status_code=400, detail="Symbol required")
         
-        price_result = get_current_stock_price(symbol)
+        price_result = await run_in_executor("market-io", get_current_stock_price, symbol)
         
         if "Error" in price_result or "unavailable" in price_result:
             return StockPriceResponse(
@@ -481,6 +576,8 @@ async def get_stock_price(request: StockSymbolRequest):
             message=f"Price retrieved for {symbol}"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
@@ -495,7 +592,7 @@ async def get_stock_info(request: StockSymbolRequest):
         if not symbol:
             raise HTTPException(status_code=400, detail="Symbol required")
         
-        info_result = get_company_info(symbol)
+        info_result = await run_in_executor("market-io", get_company_info, symbol)
         
         if "Error" in info_result or "unavailable" in info_result:
             return StockInfoResponse(
@@ -508,6 +605,8 @@ async def get_stock_info(request: StockSymbolRequest):
             message=f"Information retrieved for {symbol}"
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
@@ -524,8 +623,10 @@ async def stock_service_health():
             "company_info": STOCK_ANALYSIS_AVAILABLE,
             "model": "GPT-4o" if STOCK_ANALYSIS_AVAILABLE else "N/A"
         },
+        "jobs": await run_in_executor("db-io", stock_job_queue.stats),
         "endpoints": {
             "/stock/analyze-sync": "Synchronous analysis",
+            "/stock/jobs": "Queue an analysis (POST), poll (GET /stock/jobs/{job_id}) or cancel (DELETE)",
             "/stock/price": "Real-time price",
             "/stock/info": "Company information"
         }
@@ -534,11 +635,17 @@ async def stock_service_health():
 # ==================== SHARIA EXPERT ROUTES ====================
 
 @router.post("/islamic/expert-analyze", response_model=ShariaAnalysisResponse)
-async def expert_sharia_analysis(request: ShariaAnalysisRequest):
+async def expert_sharia_analysis(request: ShariaAnalysisRequest, user: Optional[CurrentUser] = Depends(get_optional_user)):
     """
-    Expert Sharia analysis with real-time research
+    Expert Sharia analysis with real-time research (verdicts cached per symbol)
     """
+    tag_usage(_owner_id(user))
+    return await _run_expert_analysis(request)
+
+async def _run_expert_analysis(request: ShariaAnalysisRequest, force_refresh: bool = False) -> ShariaAnalysisResponse:
+    """Shared body of the analysis routes; force_refresh bypasses the verdict store"""
     try:
+        sharia_expert_agent = get_sharia_expert() if SHARIA_EXPERT_AVAILABLE else None
         if not SHARIA_EXPERT_AVAILABLE or not sharia_expert_agent:
             raise HTTPException(status_code=503, detail="Sharia Expert Agent not available")
         
@@ -548,7 +655,7 @@ async def expert_sharia_analysis(request: ShariaAnalysisRequest):
         
         print(f"🕌 Expert Sharia analysis with research tools: {investment_query}")
         
-        result = await sharia_expert_agent.analyse_investment_comprehensive(investment_query)
+        result = await sharia_expert_agent.analyse_investment_comprehensive(investment_query, force_refresh=force_refresh)
         
         if result.get("status") == "error":
             raise HTTPException(status_code=500, detail=result.get("message"))
@@ -568,7 +675,9 @@ async def expert_sharia_analysis(request: ShariaAnalysisRequest):
             sources_used=sharia_analysis.get("sources_used", []),
             agent_type="Sharia Expert with Research Tools",
             timestamp=result.get("timestamp"),
-            message="Analysis completed with research tools"
+            message="Analysis completed with research tools",
+            cache=result.get("cache"),
+            structured_verdict=sharia_analysis.get("structured")
         )
         
     except HTTPException:
@@ -576,12 +685,42 @@ async def expert_sharia_analysis(request: ShariaAnalysisRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Expert analysis error: {str(e)}")
 
+@router.get("/islamic/verdicts/{symbol}")
+async def get_stored_verdict(symbol: str):
+    """
+    Stored Sharia verdict and the ratio inputs it was based on
+    """
+    if not SHARIA_EXPERT_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Sharia Expert Agent not available")
+    entry = await run_in_executor("db-io", verdict_store.get, symbol)
+    if not entry:
+        raise HTTPException(status_code=404, detail=f"No stored verdict for {symbol.upper()}")
+    return entry
+
+@router.post("/islamic/verdicts/{symbol}/refresh", response_model=ShariaAnalysisResponse)
+async def refresh_stored_verdict(symbol: str, _: bool = Depends(require_admin)):
+    """
+    Admin: re-run the full analysis for symbol and replace the stored verdict
+    """
+    return await _run_expert_analysis(ShariaAnalysisRequest(investment_query=symbol), force_refresh=True)
+
+@router.delete("/islamic/verdicts/{symbol}")
+async def invalidate_stored_verdict(symbol: str, _: bool = Depends(require_admin)):
+    """
+    Admin: drop the stored verdict so the next query re-analyses
+    """
+    if not SHARIA_EXPERT_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Sharia Expert Agent not available")
+    return {"symbol": symbol.upper(), "invalidated": await run_in_executor("db-io", verdict_store.invalidate, symbol)}
+
 @router.post("/islamic/expert-alternatives", response_model=ShariaAlternativesResponse)
-async def expert_halal_alternatives(request: ShariaAlternativesRequest):
+async def expert_halal_alternatives(request: ShariaAlternativesRequest, user: Optional[CurrentUser] = Depends(get_optional_user)):
     """
     Halal alternatives with expert research
     """
+    tag_usage(_owner_id(user))
     try:
+        sharia_expert_agent = get_sharia_expert() if SHARIA_EXPERT_AVAILABLE else None
         if not SHARIA_EXPERT_AVAILABLE or not sharia_expert_agent:
             raise HTTPException(status_code=503, detail="Sharia Expert Agent not available")
         
@@ -621,6 +760,7 @@ async def research_company_islamic(request: CompanyResearchRequest):
     In-depth company research for Sharia analysis
     """
     try:
+        sharia_expert_agent = get_sharia_expert() if SHARIA_EXPERT_AVAILABLE else None
         if not SHARIA_EXPERT_AVAILABLE or not sharia_expert_agent:
             raise HTTPException(status_code=503, detail="Sharia Expert Agent not available")
         
@@ -649,12 +789,147 @@ async def research_company_islamic(request: CompanyResearchRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Company research error: {str(e)}")
 
+def _parse_holdings_file(raw: bytes, filename: str) -> List[Any]:
+    """Tickers from an uploaded holdings file (CSV/Excel, or a plain-text list)"""
+    if os.path.splitext(filename or "")[-1].lower() in (".txt", ""):
+        return tickers_from_text(raw.decode("utf-8", errors="ignore"))
+    return tickers_from_dataframe(read_excel_any(raw, filename))
+
+async def _stream_batch_screening(raw_tickers: List[Any], use_llm: bool) -> StreamingResponse:
+    """Validate tickers and stream one NDJSON line per holding"""
+    sharia_expert_agent = get_sharia_expert() if SHARIA_EXPERT_AVAILABLE else None
+    if not SHARIA_EXPERT_AVAILABLE or not sharia_expert_agent:
+        raise HTTPException(status_code=503, detail="Sharia Expert Agent not available")
+
+    parsed = normalise_tickers(raw_tickers)
+    tickers = parsed["tickers"]
+    if not tickers:
+        raise HTTPException(status_code=400, detail="No valid tickers provided")
+    if len(tickers) > settings.SHARIA_BATCH_MAX_TICKERS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Too many tickers ({len(tickers)}); maximum is {settings.SHARIA_BATCH_MAX_TICKERS}"
+        )
+
+    print(f"🕌 Batch Sharia screening: {len(tickers)} tickers (LLM review: {use_llm})")
+    screener = BatchScreener(sharia_expert_agent, use_llm=use_llm)
+
+    async def ndjson():
+        yield json.dumps({"type": "start", "total": len(tickers), "invalid": parsed["invalid"]}) + "\n"
+        try:
+            async for item in screener.screen(tickers):
+                yield json.dumps(item, default=str) + "\n"
+        except ExecutorSaturated as e:
+            # The 200 is already sent: end the stream with an error record instead of truncating it
+            yield json.dumps({
+                "type": "error", "error": e.detail, "status": e.status_code,
+                "retry_after": int(e.headers.get("Retry-After", 5)),
+            }) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@router.post("/islamic/batch-screen")
+async def batch_sharia_screen(request: ShariaBatchRequest, user: Optional[CurrentUser] = Depends(get_optional_user)):
+    """
+    Screen a list of tickers; streams NDJSON results as each holding completes
+    """
+    tag_usage(_owner_id(user))
+    return await _stream_batch_screening(request.tickers, request.use_llm)
+
+@router.post("/islamic/batch-screen/upload")
+async def batch_sharia_screen_upload(
+    file: UploadFile = File(...),
+    use_llm: bool = Form(True),
+    user: Optional[CurrentUser] = Depends(get_optional_user),
+):
+    """
+    Screen the holdings in an uploaded CSV/Excel/text file (ticker or symbol column)
+    """
+    tag_usage(_owner_id(user))
+    raw = await file.read()
+    if len(raw) > settings.MAX_FILE_BYTES:
+        raise HTTPException(status_code=413, detail="File too large")
+    try:
+        raw_tickers = await run_in_executor("cpu-parse", _parse_holdings_file, raw, file.filename)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not read holdings file: {e}")
+    return await _stream_batch_screening(raw_tickers, use_llm)
+
+def _screen_fundamentals_file(raw: bytes, filename: str, methodology: str) -> Dict[str, Any]:
+    """Vectorised ratio screen of an uploaded fundamentals table (one row per company)"""
+    df = read_excel_any(raw, filename)
+    df.columns = [str(c).strip().lower() for c in df.columns]
+    key = next((c for c in ("symbol", "ticker") if c in df.columns), None)
+    if key is None or not any(c in df.columns for c in FUNDAMENTAL_COLUMNS):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Expected a symbol column and fundamentals columns: {', '.join(FUNDAMENTAL_COLUMNS)}"
+        )
+    screened = screen_fundamentals(df.set_index(key), methodology)
+    ratio_columns = [f"{name}_{part}" for name in get_methodology(methodology).limits for part in ("value", "compliant")]
+    results = screened[ratio_columns + ["ratios_screened", "sharia_compliant"]]
+    compliant = screened["sharia_compliant"]
+    return {
+        "methodology": get_methodology(methodology).name,
+        "limits": get_methodology(methodology).limits,
+        "summary": {
+            "companies": len(screened),
+            "compliant": int(compliant.eq(True).sum()),
+            "non_compliant": int(compliant.eq(False).sum()),
+            "not_screened": int(compliant.isna().sum()),
+        },
+        "results": json.loads(results.reset_index().to_json(orient="records")),
+    }
+
+@router.post("/islamic/ratio-screen/upload")
+async def ratio_screen_upload(
+    file: UploadFile = File(...),
+    methodology: str = Form(None),
+):
+    """
+    Screen a fundamentals table (symbol, total_debt, total_cash, receivables,
+    interest_income, revenue, market_capitalisation) in one vectorised pass
+    """
+    if not SHARIA_EXPERT_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Sharia screening not available")
+    try:
+        get_methodology(methodology)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    raw = await file.read()
+    if len(raw) > settings.MAX_FILE_BYTES:
+        raise HTTPException(status_code=413, detail="File too large")
+    try:
+        return await run_in_executor("cpu-parse", _screen_fundamentals_file, raw, file.filename, methodology)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not screen fundamentals file: {e}")
+
+@router.get("/islamic/methodologies")
+async def list_sharia_methodologies():
+    """
+    Ratio limits of each supported screening standard
+    """
+    if not SHARIA_EXPERT_AVAILABLE:
+        raise HTTPException(status_code=503, detail="Sharia screening not available")
+    return {
+        "default": get_methodology().name,
+        "methodologies": {
+            name: {"description": m.description, "limits": m.limits}
+            for name, m in METHODOLOGIES.items()
+        },
+    }
+
 @router.get("/islamic/expert-status")
 async def expert_agent_status():
     """
     Status of the Sharia expert agent
     """
     try:
+        sharia_expert_agent = get_sharia_expert() if SHARIA_EXPERT_AVAILABLE else None
         if not SHARIA_EXPERT_AVAILABLE or not sharia_expert_agent:
             return {
                 "status": "unavailable",
@@ -672,8 +947,17 @@ async def expert_agent_status():
 
 @router.get("/islamic/health")
 async def islamic_health():
-    """Islamic analysis service health check with expert capabilities"""
+    """Islamic analysis service health check with expert capabilities (cached between state changes)"""
+    expert_state = agent_registry.status().get("sharia_expert", {}).get("state")
+    return response_cache.get(
+        "islamic_health", (expert_state, health_monitor.version), _build_islamic_health,
+        max_age=settings.HEALTH_CACHE_SECONDS,
+    )
+
+def _build_islamic_health():
     try:
+        # Reports the agent as it is, without forcing initialisation
+        sharia_expert_agent = agent_registry.peek("sharia_expert") if SHARIA_EXPERT_AVAILABLE else None
         if not SHARIA_EXPERT_AVAILABLE or not sharia_expert_agent:
             return {
                 "service": "sharia_expert_analysis",
@@ -682,6 +966,7 @@ async def islamic_health():
             }
         
         status_info = sharia_expert_agent.get_agent_status()
+        upstreams = health_monitor.snapshot()["upstreams"]
         
         return {
             "service": "sharia_expert_analysis",
@@ -700,10 +985,14 @@ async def islamic_health():
                 "alternative_research": True,
                 "model": status_info.get("model", "unknown")
             },
+            "verdict_cache": verdict_store.stats(),
+            "upstreams": {name: upstreams[name]["status"] for name in ("openai", "yahoo", "duckduckgo") if name in upstreams},
             "endpoints": {
                 "/islamic/expert-analyze": "Comprehensive Sharia analysis with research",
                 "/islamic/expert-alternatives": "Research-based halal alternatives",
                 "/islamic/research-company": "Company research for Sharia analysis",
+                "/islamic/batch-screen": "Bulk portfolio screening (NDJSON stream)",
+                "/islamic/verdicts/{symbol}": "Stored verdict (admin: /refresh, DELETE to invalidate)",
                 "/islamic/expert-status": "Expert agent status"
             }
         }
@@ -717,11 +1006,11 @@ async def islamic_health():
 
 
 @router.post("/islamic/analyze", response_model=ShariaAnalysisResponse)
-async def islamic_analyse_investment(request: ShariaAnalysisRequest):
+async def islamic_analyse_investment(request: ShariaAnalysisRequest, user: Optional[CurrentUser] = Depends(get_optional_user)):
     """
     Simplified Islamic analysis (redirects to expert)
     """
-    return await expert_sharia_analysis(request)
+    return await expert_sharia_analysis(request, user)
 
 @router.post("/islamic/alternatives", response_model=ShariaAlternativesResponse)
 async def islamic_get_alternatives(request: ShariaAlternativesRequest):
@@ -746,15 +1035,14 @@ async def health_all_services():
         # Check each service
         stock_health = {"status": "operational" if STOCK_ANALYSIS_AVAILABLE else "unavailable", "service": "Agent02"}
         
-        # Check Sharia Expert
-        if SHARIA_EXPERT_AVAILABLE and sharia_expert_agent:
-            try:
-                expert_status = sharia_expert_agent.get_agent_status()
-                expert_health = {"status": "operational", "service": "Agent03_Expert"}
-            except Exception:
-                expert_health = {"status": "error", "service": "Agent03_Expert"}
-        else:
+        # Check Sharia Expert (without forcing initialisation)
+        expert_state = agent_registry.status().get("sharia_expert", {}).get("state")
+        if not SHARIA_EXPERT_AVAILABLE:
             expert_health = {"status": "unavailable", "service": "Agent03_Expert"}
+        elif expert_state == "error":
+            expert_health = {"status": "error", "service": "Agent03_Expert"}
+        else:
+            expert_health = {"status": "operational", "service": "Agent03_Expert", "initialisation": expert_state}
         
         total_operational = sum([
             1,  # Agent01 always operational (chat)
@@ -793,9 +1081,83 @@ async def health_all_services():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Global health error: {str(e)}")
 
+@router.get("/health/executors")
+async def health_executors():
+    """Queue depth and saturation of the dedicated executors"""
+    return {"executors": executor_stats()}
+
+@router.get("/health/http")
+async def health_http():
+    """Request counts, latency and connection reuse of the pooled outbound clients"""
+    return {"upstreams": http_client_stats()}
+
+@router.get("/health/database")
+async def health_database():
+    """Database backend, connection pool state and SQLite journal mode"""
+    try:
+        stats = await run_in_executor("db-io", database_stats)
+        return {"status": "healthy", "database": stats, "sessions": session_store.stats()}
+    except Exception as e:
+        return {"status": "error", "error": str(e)}
+
+@router.get("/health/imports")
+async def health_imports(
+    profile: bool = Query(False, description="Also time `import main` in a fresh interpreter (-X importtime)"),
+    top: int = Query(25, ge=1, le=200),
+    _: bool = Depends(require_admin),
+):
+    """Startup timeline, deferred heavy modules and, optionally, an import-time profile"""
+    report = {"startup": startup_timeline(), "lazy_modules": lazy_import_status()}
+    if profile:
+        report["profile"] = await run_in_executor("cpu-parse", profile_imports, "main", top)
+    return report
+
+# ==================== METRICS ====================
+
+def _collect_cache_metrics():
+    """Hit/miss counters of the in-process caches, read at scrape time"""
+    caches = {"user_profile": user_cache.stats()}
+    if SHARIA_EXPERT_AVAILABLE:
+        caches["sharia_verdict"] = verdict_store.stats()
+    yield ("cache_hits_total", "counter", "Cache hits by cache",
+           [({"cache": name}, stats["hits"] + stats.get("revalidated", 0)) for name, stats in caches.items()])
+    yield ("cache_misses_total", "counter", "Cache misses by cache",
+           [({"cache": name}, stats["misses"]) for name, stats in caches.items()])
+    sessions = session_store.stats()
+    yield ("session_cache_entries", "gauge", "Chat sessions and datasets held by this worker",
+           [({"cache": "sessions"}, sessions["cached_sessions"]), ({"cache": "datasets"}, sessions["cached_datasets"])])
+    yield ("session_restores_total", "counter", "Sessions rebuilt from the database and datasets read from disk",
+           [({"kind": "session"}, sessions["sessions_restored"]), ({"kind": "dataset"}, sessions["datasets_loaded_from_disk"])])
+
+metrics_registry.register_collector("caches", _collect_cache_metrics)
+
+@router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus text exposition of request, upstream, token, chart, cache and executor metrics"""
+    return Response(content=metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
+@router.get("/traces/slow")
+async def slow_traces(limit: int = Query(20, ge=1, le=200), _: bool = Depends(require_admin)):
+    """Recent requests slower than TRACE_SLOW_REQUEST_SECONDS, broken down by span"""
+    return {
+        "threshold_seconds": tracer.slow_seconds,
+        "tracing": tracer.stats(),
+        "traces": tracer.slow_traces(limit),
+    }
+
+@router.get("/health/upstreams")
+async def health_upstreams():
+    """Reachability, latency and error rate of OpenAI, Yahoo Finance and DuckDuckGo from the background probes"""
+    return health_monitor.snapshot()
+
+@router.post("/health/upstreams/probe")
+async def probe_upstreams(_: bool = Depends(require_admin)):
+    """Run a probe round now instead of waiting for the next one"""
+    return await health_monitor.probe()
+
 @router.get("/test-openai")
-async def test_openai_connection():
-    """Test OpenAI API connectivity"""
+async def test_openai_connection(live: bool = Query(False, description="Make a real completion call (spends tokens)")):
+    """Test OpenAI API connectivity (from the background probe unless live=true)"""
     try:
         # Check if API key is configured
         if not settings.OPENAI_API_KEY or settings.OPENAI_API_KEY.strip() == "":
@@ -805,9 +1167,23 @@ async def test_openai_connection():
                 "openai_configured": False
             }
         
+        if not live:
+            probe = health_monitor.upstream("openai")
+            if probe["status"] == "unknown":
+                # No probe round yet: list models once (no tokens spent)
+                probe = (await health_monitor.probe(["openai"]))["upstreams"]["openai"]
+            reachable = probe["status"] in ("up", "degraded")
+            return {
+                "status": "success" if reachable else "error",
+                "message": "OpenAI API reachable" if reachable else f"OpenAI API unreachable: {probe.get('last_error')}",
+                "openai_configured": True,
+                "probe": probe,
+                "model": settings.MODEL_NAME
+            }
+        
         # Test simple OpenAI call
         test_messages = [{"role": "user", "content": "Say 'Hello, this is a test'"}]
-        response = call_openai(test_messages)
+        response = await run_in_executor("llm-io", call_openai, test_messages)
         
         return {
             "status": "success",
@@ -858,7 +1234,9 @@ async def create_chart_endpoint(request: ChartRequest):
                 'merchant': ['Store A', 'Gas Station', 'Cinema', 'Electric Co', 'Hospital']
             })
         if request.interactive:
-            chart_result = create_interactive_chart(
+            chart_result = await run_in_executor(
+                "cpu-render",
+                create_interactive_chart,
                 df, 
                 request.chart_type, 
                 request.columns, 
@@ -874,7 +1252,9 @@ async def create_chart_endpoint(request: ChartRequest):
                 "chart_data": result_data
             }
         else:
-            chart_base64 = make_chart(
+            chart_base64 = await run_in_executor(
+                "cpu-render",
+                make_chart,
                 df, 
                 request.chart_type, 
                 request.columns, 
@@ -895,6 +1275,8 @@ async def create_chart_endpoint(request: ChartRequest):
                 "chart_image": chart_base64
             }
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating chart: {e}")
         raise HTTPException(status_code=500, detail=f"Chart creation failed: {str(e)}")
@@ -989,13 +1371,15 @@ async def smart_visualisation(request: VisualisationRequest):
         If the request is not about creating a chart, respond with explanatory text instead.
         """
         
-        ai_response = call_openai([{"role": "user", "content": ai_prompt}])
+        ai_response = await run_in_executor("llm-io", call_openai, [{"role": "user", "content": ai_prompt}])
         
         try:
             chart_config = json.loads(ai_response)
             
             if chart_config.get("action") == "plot":
-                chart_result = create_interactive_chart(
+                chart_result = await run_in_executor(
+                    "cpu-render",
+                    create_interactive_chart,
                     df,
                     chart_config.get("kind", "bar"),
                     chart_config.get("columns", []),
@@ -1035,6 +1419,8 @@ async def smart_visualisation(request: VisualisationRequest):
                 "chart_data": None
             }
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in smart visualisation: {e}")
         raise HTTPException(status_code=500, detail=f"Smart visualisation failed: {str(e)}")
@@ -1051,7 +1437,7 @@ async def upload_and_visualise(
     """
     try:
         file_content = await file.read()
-        df = read_excel_any(file_content, file.filename)
+        df = await run_in_executor("cpu-parse", read_excel_any, file_content, file.filename)
         selected_columns = [col.strip() for col in columns.split(",") if col.strip()] if columns else []
         
         if chart_type == "auto":
@@ -1064,7 +1450,9 @@ async def upload_and_visualise(
         if len(df) > 1000:
             df = sample_df(df)
         if interactive:
-            chart_result = create_interactive_chart(df, chart_type, selected_columns, f"Analysis of {file.filename}")
+            chart_result = await run_in_executor(
+                "cpu-render", create_interactive_chart, df, chart_type, selected_columns, f"Analysis of {file.filename}"
+            )
             
             try:
                 result_data = json.loads(chart_result)
@@ -1099,7 +1487,9 @@ async def upload_and_visualise(
                     }
                 }
         else:
-            chart_base64 = make_chart(df, chart_type, selected_columns, f"Analysis of {file.filename}", interactive=False)
+            chart_base64 = await run_in_executor(
+                "cpu-render", make_chart, df, chart_type, selected_columns, f"Analysis of {file.filename}", interactive=False
+            )
             
             try:
                 error_data = json.loads(chart_base64)
@@ -1122,6 +1512,8 @@ async def upload_and_visualise(
                 }
             }
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in upload and visualise: {e}")
         raise HTTPException(status_code=500, detail=f"Upload and visualisation failed: {str(e)}")
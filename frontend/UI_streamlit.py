@@ -47,7 +47,7 @@ def create_chart_request(chart_type, columns, title="", interactive=True, data=N
             "data": data
         }
         
-        response = requests.post(f"{BACKEND}/finbot/create-chart", json=payload, timeout=120)
+        response = requests.post(f"{BACKEND}/finbot/create-chart", json=payload, headers=auth_headers(), timeout=120)
         response.raise_for_status()
         return response.json()
     except Exception as e:
@@ -57,7 +57,7 @@ def smart_visualisation_request(user_prompt):
     try:
         payload = {"user_prompt": user_prompt}
         
-        response = requests.post(f"{BACKEND}/finbot/smart-visualization", json=payload, timeout=180)
+        response = requests.post(f"{BACKEND}/finbot/smart-visualization", json=payload, headers=auth_headers(), timeout=180)
         response.raise_for_status()
         return response.json()
     except Exception as e:
@@ -72,7 +72,7 @@ def upload_and_visualise_request(uploaded_file, chart_type="auto", columns="", i
             "interactive": str(interactive).lower()
         }
         
-        response = requests.post(f"{BACKEND}/finbot/upload-and-visualize", data=data, files=files, timeout=120)
+        response = requests.post(f"{BACKEND}/finbot/upload-and-visualize", data=data, files=files, headers=auth_headers(), timeout=120)
         response.raise_for_status()
         return response.json()
     except Exception as e:
@@ -80,7 +80,7 @@ def upload_and_visualise_request(uploaded_file, chart_type="auto", columns="", i
 
 def get_chart_types():
     try:
-        response = requests.get(f"{BACKEND}/finbot/chart-types", timeout=30)
+        response = requests.get(f"{BACKEND}/finbot/chart-types", headers=auth_headers(), timeout=30)
         response.raise_for_status()
         result = response.json()
         if result.get("success"):
@@ -169,7 +169,7 @@ def analyse_islamic_investment_request(investment_query):
         
         with st.spinner(f"🕌 EXPERT SHARIA ANALYSIS WITH INTERNET RESEARCH..."):
             # Use expert API that does internet research
-            r = requests.post(f"{BACKEND}/islamic/expert-analyze", json=payload, timeout=240)
+            r = requests.post(f"{BACKEND}/islamic/expert-analyze", json=payload, headers=auth_headers(), timeout=240)
             r.raise_for_status()
             result = r.json()
             
@@ -282,7 +282,7 @@ def get_islamic_alternatives_request(haram_investment):
         payload = {"haram_investment": haram_investment}
         with st.spinner(f"🔍 SEARCHING FOR HALAL ALTERNATIVES VIA EXPERT AGENT..."):
             # Use expert endpoint for alternatives
-            r = requests.post(f"{BACKEND}/islamic/expert-alternatives", json=payload, timeout=180)
+            r = requests.post(f"{BACKEND}/islamic/expert-alternatives", json=payload, headers=auth_headers(), timeout=180)
             r.raise_for_status()
             result = r.json()
             
@@ -335,7 +335,7 @@ def get_islamic_alternatives_request(haram_investment):
 def get_islamic_status_request():
     """Get Expert Islamic Agent status"""
     try:
-        r = requests.get(f"{BACKEND}/islamic/expert-status", timeout=10)
+        r = requests.get(f"{BACKEND}/islamic/expert-status", headers=auth_headers(), timeout=10)
         r.raise_for_status()
         return r.json()
     except Exception as e:
@@ -346,7 +346,7 @@ def research_company_islamic_request(company_name):
     try:
         payload = {"company_name": company_name}
         with st.spinner(f"🔍 DEEP RESEARCH: {company_name}..."):
-            r = requests.post(f"{BACKEND}/islamic/research-company", json=payload, timeout=180)
+            r = requests.post(f"{BACKEND}/islamic/research-company", json=payload, headers=auth_headers(), timeout=180)
             r.raise_for_status()
             result = r.json()
             
@@ -404,16 +404,47 @@ def research_company_islamic_request(company_name):
         return {"status": "error", "message": f"Research error: {str(e)}"}
 
 # ---------- Stock Functions ----------
-def analyse_stock_request(symbol):
-    """Launch synchronous stock analysis"""
+STOCK_JOB_STAGES = {
+    "queued": "Waiting for a free analyst...",
+    "data": "Collecting financial data...",
+    "financial": "Running financial analysis...",
+    "market": "Analysing market context and news...",
+    "recommendation": "Writing investment recommendation...",
+}
+
+def analyse_stock_request(symbol, max_wait=600, poll_interval=2):
+    """Queue a stock analysis job and poll it until it finishes"""
     try:
         payload = {"symbol": symbol}
-        with st.spinner(f"🤖 FINBOT ANALYSING YOUR STOCK {symbol}"):
-            r = requests.post(f"{BACKEND}/stock/analyze-sync", json=payload, timeout=300)
+        r = requests.post(f"{BACKEND}/stock/jobs", json=payload, headers=auth_headers(), timeout=10)
+        r.raise_for_status()
+        job = r.json()
+
+        progress_bar = st.progress(0, text=f"🤖 FINBOT ANALYSING YOUR STOCK {symbol}")
+        deadline = time.time() + max_wait
+        while job.get("status") in ("queued", "running"):
+            if time.time() > deadline:
+                return {"status": "error", "message": "Timeout - Analysis taking longer than expected."}
+            stage_text = STOCK_JOB_STAGES.get(job.get("stage"), "Analysing...")
+            progress_bar.progress(min(int(job.get("progress", 0)), 100), text=f"🤖 {symbol}: {stage_text}")
+            time.sleep(poll_interval)
+            r = requests.get(f"{BACKEND}/stock/jobs/{job['job_id']}", headers=auth_headers(), timeout=10)
             r.raise_for_status()
-            return r.json()
+            job = r.json()
+        progress_bar.empty()
+
+        if job.get("status") == "completed":
+            return {
+                "status": "success",
+                "symbol": job.get("symbol", symbol),
+                "analysis": job.get("analysis", ""),
+                "recommendation": job.get("recommendation", ""),
+                "model_used": job.get("model_used"),
+                "message": f"Analysis of {symbol} completed successfully"
+            }
+        return {"status": "error", "message": job.get("error") or f"Analysis {job.get('status')}"}
     except requests.exceptions.Timeout:
-        return {"status": "error", "message": "Timeout - Analysis taking longer than expected."}
+        return {"status": "error", "message": "Timeout - Backend not responding."}
     except Exception as e:
         return {"status": "error", "message": f"Error: {str(e)}"}
 
@@ -421,7 +452,7 @@ def get_stock_price_request(symbol):
     """Get stock price"""
     try:
         payload = {"symbol": symbol}
-        r = requests.post(f"{BACKEND}/stock/price", json=payload, timeout=30)
+        r = requests.post(f"{BACKEND}/stock/price", json=payload, headers=auth_headers(), timeout=30)
         r.raise_for_status()
         return r.json()
     except Exception as e:
@@ -431,13 +462,52 @@ def get_stock_info_request(symbol):
     """Get company information"""
     try:
         payload = {"symbol": symbol}
-        r = requests.post(f"{BACKEND}/stock/info", json=payload, timeout=30)
+        r = requests.post(f"{BACKEND}/stock/info", json=payload, headers=auth_headers(), timeout=30)
         r.raise_for_status()
         return r.json()
     except Exception as e:
         return {"status": "error", "message": f"Error: {str(e)}"}
 
 # ---------- Authentication Functions ----------
+TOKEN_REFRESH_MARGIN = 300  # seconds before expiry at which the token is renewed
+
+def store_session_token(result):
+    """Keep the signed session token returned by /login or /token/refresh"""
+    if result.get("access_token"):
+        st.session_state.auth_token = result["access_token"]
+        st.session_state.auth_token_expires_at = time.time() + result.get("expires_in", 0)
+
+def refresh_session_token():
+    """Renew the session token without asking for the password again"""
+    try:
+        r = requests.post(
+            f"{BACKEND}/token/refresh",
+            headers={"Authorization": f"Bearer {st.session_state.auth_token}"},
+            timeout=10,
+        )
+    except Exception:
+        return  # keep the current token; the backend decides whether it is still valid
+    if r.status_code == 401:
+        expire_login()
+    if r.ok:
+        store_session_token(r.json())
+
+def expire_login():
+    """The backend rejected the session: forget the login and go back to the sign-in form"""
+    logout()
+    st.session_state.show_login = True
+    st.session_state.login_error = "Your session has expired, please sign in again"
+    st.rerun()
+
+def auth_headers():
+    """Authorization header for backend calls, renewing the token when close to expiry"""
+    if not st.session_state.get("auth_token"):
+        return {}
+    if time.time() > st.session_state.get("auth_token_expires_at", 0) - TOKEN_REFRESH_MARGIN:
+        refresh_session_token()
+    token = st.session_state.get("auth_token")
+    return {"Authorization": f"Bearer {token}"} if token else {}
+
 def authenticate_user(email, password):
     """Authenticate user via API"""
     try:
@@ -452,7 +522,7 @@ def authenticate_user(email, password):
 def ensure_session():
     """Guarantee that we have a valid session_id from the backend."""
     if st.session_state.get("session_id") is None:
-        r = requests.post(f"{BACKEND}/session", timeout=10)
+        r = requests.post(f"{BACKEND}/session", headers=auth_headers(), timeout=10)
         r.raise_for_status()
         st.session_state.session_id = r.json()["session_id"]
 
@@ -470,6 +540,7 @@ def logout():
     """Logout user and clear ALL chat sessions"""
     st.session_state.chat_started = False
     st.session_state.user_info = None
+    st.session_state.auth_token = None
     st.session_state.current_page = "menu"
     
     # Clear FinBot session
@@ -490,7 +561,7 @@ def logout():
 def ensure_finbot_session():
     """Guarantee that we have a valid session_id for FinBot."""
     if st.session_state.get("finbot_session_id") is None:
-        r = requests.post(f"{BACKEND}/session", timeout=10)
+        r = requests.post(f"{BACKEND}/session", headers=auth_headers(), timeout=10)
         r.raise_for_status()
         st.session_state.finbot_session_id = r.json()["session_id"]
 
@@ -507,7 +578,7 @@ def confirm_finbot_upload():
     try:
         files = {"file": (file.name, file.getvalue())}
         data = {"session_id": st.session_state.finbot_session_id}
-        r = requests.post(f"{BACKEND}/upload", files=files, data=data, timeout=60)
+        r = requests.post(f"{BACKEND}/upload", files=files, data=data, headers=auth_headers(), timeout=60)
         r.raise_for_status()
         res = r.json()
 
@@ -551,7 +622,7 @@ def submit_finbot_message(msg: str):
             "message": msg,
             "context_mode": ss.finbot_context,
         }
-        r = requests.post(f"{BACKEND}/chat", json=payload, timeout=120)
+        r = requests.post(f"{BACKEND}/chat", json=payload, headers=auth_headers(), timeout=120)
         r.raise_for_status()
         data = r.json()
         ss.finbot_session_id = data.get("session_id", ss.finbot_session_id)
@@ -627,6 +698,7 @@ def submit_login():
         "name": auth_result["user_name"], 
         "email": auth_result["user_email"]
     }
+    store_session_token(auth_result)
     st.session_state.show_login = False
     st.session_state.chat_started = True
     st.session_state.login_error = ""
@@ -653,7 +725,7 @@ def confirm_upload():
     try:
         files = {"file": (file.name, file.getvalue())}
         data = {"session_id": st.session_state.session_id}
-        r = requests.post(f"{BACKEND}/upload", files=files, data=data, timeout=60)
+        r = requests.post(f"{BACKEND}/upload", files=files, data=data, headers=auth_headers(), timeout=60)
         r.raise_for_status()
         res = r.json()
 
@@ -697,7 +769,7 @@ def submit_message(msg: str):
             "message": msg,
             "context_mode": ss.context,
         }
-        r = requests.post(f"{BACKEND}/chat", json=payload, timeout=120)
+        r = requests.post(f"{BACKEND}/chat", json=payload, headers=auth_headers(), timeout=120)
         r.raise_for_status()
         data = r.json()
         ss.session_id = data.get("session_id", ss.session_id)
@@ -836,6 +908,8 @@ ss.setdefault("forgot_password_message", "")
 ss.setdefault("forgot_password_success", False)
 ss.setdefault("login_error", "")
 ss.setdefault("user_info", None)
+ss.setdefault("auth_token", None)
+ss.setdefault("auth_token_expires_at", 0)
 ss.setdefault("current_page", "menu")
 
 # FINBOT CHAT - 